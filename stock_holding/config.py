@@ -47,6 +47,8 @@ INSTITUTION_TYPES = [
 
 # 性能优化配置
 BATCH_SIZE = 100  # 股票信息获取批处理大小
+STOCK_INFO_TTL = 7 * 24 * 3600  # 股票信息表（股本、名称、行业）有效期（秒）
+STOCK_INFO_RETRY_TTL = 24 * 3600  # 获取失败的股票多久后重试（秒）
 REQUEST_DELAY = 0.1  # 请求间隔（秒），避免请求过于频繁
 MAX_RETRIES = 3  # 最大重试次数
 TIMEOUT = 30  # 请求超时时间（秒）
@@ -173,6 +175,9 @@ CSV_SEPARATOR = ','
 # 数据验证
 ENABLE_DATA_VALIDATION = True
 
+# 抽样验证行数（数据超过该行数时只对随机抽样的行做验证和异常值检测，None 表示验证全部数据）
+VALIDATION_SAMPLE_SIZE = None
+
 # 跳过已存在的文件
 SKIP_EXISTING_FILES = True
 
@@ -293,6 +298,7 @@ def get_config():
         'file_encoding': FILE_ENCODING,
         'csv_separator': CSV_SEPARATOR,
         'enable_data_validation': ENABLE_DATA_VALIDATION,
+        'validation_sample_size': VALIDATION_SAMPLE_SIZE,
         'skip_existing_files': SKIP_EXISTING_FILES,
         'generate_detailed_report': GENERATE_DETAILED_REPORT,
         'save_intermediate_results': SAVE_INTERMEDIATE_RESULTS,
@@ -305,6 +311,8 @@ def get_config():
         'max_workers': MAX_WORKERS,
         'chunk_size': CHUNK_SIZE,
         'batch_size': BATCH_SIZE,
+        'stock_info_ttl': STOCK_INFO_TTL,
+        'stock_info_retry_ttl': STOCK_INFO_RETRY_TTL,
         'timeout': TIMEOUT,
         'memory_cleanup_interval': MEMORY_CLEANUP_INTERVAL,
         'max_concurrent_requests': MAX_CONCURRENT_REQUESTS
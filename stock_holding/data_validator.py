@@ -4,6 +4,12 @@
 数据验证和清洗模块
 
 提供数据质量检查、异常值检测和数据清洗功能
+
+- 规则列先做一次 factorize，空值数、唯一值数以及格式/长度/允许值检查都在唯一值上完成，
+  再按各唯一值的出现次数计数，避免对每一行做字符串处理
+- 数值列的统计量（分位数、均值、标准差）和范围、异常值掩码由 NumericProfile
+  对所有数值列按列一次性向量化计算
+- 数据量很大时可设置 sample_size 只对随机抽样的行做验证和异常值检测（清洗仍处理全部数据）
 """
 
 import pandas as pd
@@ -12,6 +18,88 @@ import logging
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 import warnings
+from functools import cached_property
+
+
+class NumericProfile:
+    """
+    数值列的列向统计，所有列在一个 float64 矩阵上按列计算（分位数、均值和标准差在首次使用时计算）
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: List[str]):
+        """
+        Args:
+            df: 数据
+            columns: 要统计的列，非数值类型的列先按 pd.to_numeric(errors='coerce') 转换
+        """
+        self.columns = list(columns)
+        self.index = df.index
+        frame = df[self.columns]
+        non_numeric = [column for column in self.columns
+                       if not pd.api.types.is_numeric_dtype(frame[column])
+                       or pd.api.types.is_bool_dtype(frame[column])]
+        if non_numeric:
+            frame = frame.assign(**{column: pd.to_numeric(frame[column], errors='coerce')
+                                    for column in non_numeric})
+        # 按列连续存放（列 x 行），按列统计时访问连续内存；values 为其 行 x 列 视图
+        self._by_column = np.ascontiguousarray(
+            frame.to_numpy(dtype='float64', na_value=np.nan).reshape(len(frame), len(self.columns)).T
+        )
+        self.values = self._by_column.T
+        self.count = (~np.isnan(self._by_column)).sum(axis=1)
+
+    @cached_property
+    def quartiles(self) -> Tuple[np.ndarray, np.ndarray]:
+        """各列的 (Q1, Q3)，全为空值的列为NaN"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            # 没有空值时直接按列计算分位数（nanquantile 会逐列处理）
+            quantile = np.quantile if (self.count == self.values.shape[0]).all() else np.nanquantile
+            q1, q3 = quantile(self._by_column, [0.25, 0.75], axis=1)
+        return q1, q3
+
+    @cached_property
+    def moments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """各列的 (均值, 样本标准差)，全为空值或只有一个值的列为NaN"""
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmean(self._by_column, axis=1), np.nanstd(self._by_column, axis=1, ddof=1)
+
+    def range_violations(self, min_values: List[float], max_values: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        各列小于最小值、大于最大值的个数（NaN不计入）
+
+        Args:
+            min_values: 各列最小值，不限制时为 -inf
+            max_values: 各列最大值，不限制时为 inf
+
+        Returns:
+            (小于最小值的个数数组, 大于最大值的个数数组)
+        """
+        below = (self.values < np.asarray(min_values, dtype='float64')).sum(axis=0)
+        above = (self.values > np.asarray(max_values, dtype='float64')).sum(axis=0)
+        return below, above
+
+    def outlier_mask(self, method: str = 'iqr', threshold: float = 3.0) -> np.ndarray:
+        """
+        所有列的异常值掩码（行 x 列），NaN 不算异常值
+
+        Args:
+            method: 'iqr'（超出 [Q1-1.5IQR, Q3+1.5IQR]）或 'zscore'（|z| 大于 threshold）
+            threshold: Z-score 阈值
+
+        Returns:
+            布尔矩阵
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if method == 'iqr':
+                q1, q3 = self.quartiles
+                iqr = q3 - q1
+                return (self.values < q1 - 1.5 * iqr) | (self.values > q3 + 1.5 * iqr)
+            if method == 'zscore':
+                mean, std = self.moments
+                return np.abs((self.values - mean) / std) > threshold
+        raise ValueError(f"未知的异常值检测方法: {method}")
 
 
 class DataValidator:
@@ -19,14 +107,19 @@ class DataValidator:
     数据验证器
     """
     
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    def __init__(self, logger: Optional[logging.Logger] = None, sample_size: Optional[int] = None,
+                 random_state: int = 0):
         """
         初始化数据验证器
         
         Args:
             logger: 日志记录器
+            sample_size: 抽样验证的行数，数据超过该行数时只验证随机抽样的行（None 表示验证全部）
+            random_state: 抽样的随机种子（固定种子使结果可复现）
         """
         self.logger = logger or logging.getLogger(__name__)
+        self.sample_size = sample_size
+        self.random_state = random_state
         
         # 定义数据质量规则
         self.validation_rules = {
@@ -87,13 +180,24 @@ class DataValidator:
             }
         }
     
-    def validate_dataframe(self, df: pd.DataFrame, strict: bool = False) -> Dict:
+    def _sample(self, df: pd.DataFrame, sample_size: Optional[int]) -> pd.DataFrame:
+        """
+        抽样（行数不超过 sample_size 时返回原数据）
+        """
+        if sample_size is None or len(df) <= sample_size:
+            return df
+        return df.sample(n=sample_size, random_state=self.random_state)
+    
+    def validate_dataframe(self, df: pd.DataFrame, strict: bool = False,
+                           sample_size: Optional[int] = None) -> Dict:
         """
         验证DataFrame的数据质量
         
         Args:
             df: 要验证的DataFrame
             strict: 是否严格模式（严格模式下会抛出异常）
+            sample_size: 抽样验证的行数，为None时使用初始化时的设置；
+                抽样时错误和警告中的计数均为样本中的计数，结果中 sampled_rows 为样本行数
             
         Returns:
             验证结果字典
@@ -127,16 +231,40 @@ class DataValidator:
             if strict:
                 raise ValueError(error_msg)
         
+        sampled = self._sample(df, sample_size if sample_size is not None else self.sample_size)
+        if len(sampled) < len(df):
+            validation_result['sampled_rows'] = len(sampled)
+            self.logger.info(f"抽样验证 {len(sampled)} 行")
+        df = sampled
+        
+        # 有范围规则的数值列一次性计算越界个数
+        rule_columns = [column for column in df.columns if column in self.validation_rules]
+        range_columns = [
+            column for column in rule_columns
+            if ('min_value' in self.validation_rules[column] or 'max_value' in self.validation_rules[column])
+            and pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])
+        ]
+        range_violations = {}
+        if range_columns:
+            below, above = NumericProfile(df, range_columns).range_violations(
+                [self.validation_rules[column].get('min_value', -np.inf) for column in range_columns],
+                [self.validation_rules[column].get('max_value', np.inf) for column in range_columns]
+            )
+            range_violations = {column: (int(below[i]), int(above[i])) for i, column in enumerate(range_columns)}
+        
+        # 每列只 factorize 一次，规则检查和重复行检查共用
+        factorized = {column: pd.factorize(df[column]) for column in df.columns}
+        
         # 逐列验证
-        for column in df.columns:
-            if column in self.validation_rules:
-                column_result = self._validate_column(df[column], column)
-                validation_result['errors'].extend(column_result['errors'])
-                validation_result['warnings'].extend(column_result['warnings'])
-                validation_result['statistics'][column] = column_result['statistics']
+        for column in rule_columns:
+            column_result = self._validate_column(df[column], column, range_violations.get(column),
+                                                  factorized[column])
+            validation_result['errors'].extend(column_result['errors'])
+            validation_result['warnings'].extend(column_result['warnings'])
+            validation_result['statistics'][column] = column_result['statistics']
         
         # 检查重复行
-        duplicate_count = df.duplicated().sum()
+        duplicate_count = self._count_duplicates(factorized.values(), len(df))
         if duplicate_count > 0:
             warning_msg = f"发现 {duplicate_count} 行重复数据"
             validation_result['warnings'].append(warning_msg)
@@ -155,31 +283,60 @@ class DataValidator:
         
         return validation_result
     
-    def _validate_column(self, series: pd.Series, column_name: str) -> Dict:
+    @staticmethod
+    def _count_duplicates(factorized, row_count: int) -> int:
+        """
+        由各列的 factorize 结果统计重复行数（与 DataFrame.duplicated 相同，空值视为相等）
+        
+        各列编码按混合进制合并为一个整数键，键的取值范围过大时先压缩为连续编号
+        """
+        key = np.zeros(row_count, dtype=np.int64)
+        size = 1
+        for codes, uniques in factorized:
+            radix = len(uniques) + 1
+            if size * radix >= 2 ** 62:
+                key, key_uniques = pd.factorize(key)
+                size = len(key_uniques)
+            key = key * radix + (codes + 1)
+            size *= radix
+        return int(pd.Series(key).duplicated().sum())
+    
+    def _validate_column(self, series: pd.Series, column_name: str,
+                         range_violations: Optional[Tuple[int, int]] = None,
+                         factorized: Optional[Tuple[np.ndarray, pd.Index]] = None) -> Dict:
         """
         验证单列数据
         
+        先 factorize 得到唯一值及其出现次数，字符串长度、格式和允许值只对唯一值检查
+        
         Args:
             series: 要验证的Series
             column_name: 列名
+            range_violations: 已计算的 (小于最小值个数, 大于最大值个数)，为None时在此计算
+            factorized: 已计算的 pd.factorize(series) 结果
             
         Returns:
             验证结果
         """
         rules = self.validation_rules[column_name]
+        codes, uniques = factorized if factorized is not None else pd.factorize(series)
+        valid_codes = codes[codes >= 0]
+        counts = np.bincount(valid_codes, minlength=len(uniques))
+        uniques = pd.Series(uniques)
+        null_count = len(codes) - len(valid_codes)
+        
         result = {
             'errors': [],
             'warnings': [],
             'statistics': {
-                'null_count': series.isnull().sum(),
-                'null_percentage': series.isnull().mean() * 100,
-                'unique_count': series.nunique(),
+                'null_count': null_count,
+                'null_percentage': null_count / len(series) * 100 if len(series) else np.nan,
+                'unique_count': len(uniques),
                 'total_count': len(series)
             }
         }
         
         # 检查空值
-        null_count = series.isnull().sum()
         if null_count > 0:
             if rules.get('required', False):
                 result['errors'].append(f"{column_name}: 发现 {null_count} 个空值（必需字段）")
@@ -187,58 +344,60 @@ class DataValidator:
                 result['warnings'].append(f"{column_name}: 发现 {null_count} 个空值")
         
         # 对非空值进行验证
-        non_null_series = series.dropna()
-        if len(non_null_series) == 0:
+        if len(uniques) == 0:
             return result
         
-        # 类型检查
+        def violations(mask) -> int:
+            """唯一值掩码对应的行数"""
+            return int(counts[np.asarray(mask, dtype=bool)].sum())
+        
+        # 类型检查（按列类型判断）
         expected_type = rules.get('type')
         if expected_type:
-            if not self._check_type(non_null_series, expected_type):
+            if not self._check_type(series, expected_type):
                 result['errors'].append(f"{column_name}: 数据类型不符合要求 {expected_type}")
         
         # 数值范围检查
         if 'min_value' in rules or 'max_value' in rules:
-            numeric_series = pd.to_numeric(non_null_series, errors='coerce')
-            
-            if 'min_value' in rules:
-                min_violations = (numeric_series < rules['min_value']).sum()
-                if min_violations > 0:
-                    result['errors'].append(f"{column_name}: {min_violations} 个值小于最小值 {rules['min_value']}")
+            if range_violations is not None:
+                min_violations, max_violations = range_violations
+            else:
+                numeric_uniques = pd.to_numeric(uniques, errors='coerce')
+                min_violations = violations(numeric_uniques < rules['min_value']) if 'min_value' in rules else 0
+                max_violations = violations(numeric_uniques > rules['max_value']) if 'max_value' in rules else 0
             
-            if 'max_value' in rules:
-                max_violations = (numeric_series > rules['max_value']).sum()
-                if max_violations > 0:
-                    result['errors'].append(f"{column_name}: {max_violations} 个值大于最大值 {rules['max_value']}")
+            if min_violations > 0:
+                result['errors'].append(f"{column_name}: {min_violations} 个值小于最小值 {rules['min_value']}")
+            if max_violations > 0:
+                result['errors'].append(f"{column_name}: {max_violations} 个值大于最大值 {rules['max_value']}")
         
         # 字符串长度检查
         if 'min_length' in rules or 'max_length' in rules:
-            string_lengths = non_null_series.astype(str).str.len()
+            string_lengths = uniques.astype(str).str.len()
             
             if 'min_length' in rules:
-                short_count = (string_lengths < rules['min_length']).sum()
+                short_count = violations(string_lengths < rules['min_length'])
                 if short_count > 0:
                     result['errors'].append(f"{column_name}: {short_count} 个值长度小于 {rules['min_length']}")
             
             if 'max_length' in rules:
-                long_count = (string_lengths > rules['max_length']).sum()
+                long_count = violations(string_lengths > rules['max_length'])
                 if long_count > 0:
                     result['errors'].append(f"{column_name}: {long_count} 个值长度大于 {rules['max_length']}")
         
         # 正则表达式检查
         if 'pattern' in rules:
-            pattern_violations = ~non_null_series.astype(str).str.match(rules['pattern'])
-            violation_count = pattern_violations.sum()
+            violation_count = violations(~uniques.astype(str).str.match(rules['pattern']))
             if violation_count > 0:
                 result['errors'].append(f"{column_name}: {violation_count} 个值不符合格式要求")
         
         # 允许值检查
         if 'allowed_values' in rules:
-            invalid_values = ~non_null_series.isin(rules['allowed_values'])
-            invalid_count = invalid_values.sum()
+            invalid_values = ~uniques.isin(rules['allowed_values'])
+            invalid_count = violations(invalid_values)
             if invalid_count > 0:
-                unique_invalid = non_null_series[invalid_values].unique()[:5]  # 只显示前5个
-                result['errors'].append(f"{column_name}: {invalid_count} 个无效值，例如: {list(unique_invalid)}")
+                unique_invalid = uniques[invalid_values].tolist()[:5]  # 只显示前5个
+                result['errors'].append(f"{column_name}: {invalid_count} 个无效值，例如: {unique_invalid}")
         
         return result
     
@@ -285,10 +444,10 @@ class DataValidator:
         """
         errors = []
         
-        # 检查日期格式一致性
+        # 检查日期格式一致性（报告期只有少数几个不同的值，只解析唯一值）
         if 'report_date' in df.columns:
             try:
-                pd.to_datetime(df['report_date'], format='%Y%m%d', errors='raise')
+                pd.to_datetime(pd.Series(df['report_date'].unique()), format='%Y%m%d', errors='raise')
             except ValueError:
                 errors.append("report_date: 日期格式不一致")
         
@@ -402,14 +561,17 @@ class DataValidator:
         return cleaned_df, cleaning_report
     
     def detect_outliers(self, df: pd.DataFrame, columns: List[str] = None, 
-                       method: str = 'iqr') -> Dict:
+                       method: str = 'iqr', threshold: float = 3.0,
+                       sample_size: Optional[int] = None) -> Dict:
         """
-        检测异常值
+        检测异常值（所有列在 NumericProfile 中一次性计算）
         
         Args:
             df: 要检测的DataFrame
             columns: 要检测的列，为None时检测所有数值列
             method: 检测方法 ('iqr', 'zscore')
+            threshold: Z-score 方法的阈值
+            sample_size: 抽样检测的行数，为None时使用初始化时的设置
             
         Returns:
             异常值检测结果
@@ -423,51 +585,33 @@ class DataValidator:
             'total_outliers': 0
         }
         
-        for column in columns:
-            if column not in df.columns:
-                continue
-            
-            series = df[column].dropna()
-            if len(series) == 0:
-                continue
-            
-            if method == 'iqr':
-                outliers = self._detect_outliers_iqr(series)
-            elif method == 'zscore':
-                outliers = self._detect_outliers_zscore(series)
-            else:
-                self.logger.warning(f"未知的异常值检测方法: {method}")
+        if method not in ('iqr', 'zscore'):
+            self.logger.warning(f"未知的异常值检测方法: {method}")
+            return outlier_result
+        
+        columns = [column for column in columns if column in df.columns]
+        if not columns:
+            return outlier_result
+        
+        profile = NumericProfile(self._sample(df, sample_size if sample_size is not None else self.sample_size),
+                                 columns)
+        masks = profile.outlier_mask(method, threshold)
+        outlier_counts = masks.sum(axis=0)
+        
+        for i, column in enumerate(profile.columns):
+            if profile.count[i] == 0:
                 continue
             
-            outlier_count = outliers.sum()
+            outlier_count = int(outlier_counts[i])
             outlier_result['outliers_by_column'][column] = {
                 'count': outlier_count,
-                'percentage': outlier_count / len(series) * 100,
-                'indices': df.index[outliers].tolist() if outlier_count > 0 else []
+                'percentage': outlier_count / profile.count[i] * 100,
+                'indices': profile.index[masks[:, i]].tolist() if outlier_count > 0 else []
             }
             outlier_result['total_outliers'] += outlier_count
         
         return outlier_result
     
-    def _detect_outliers_iqr(self, series: pd.Series) -> pd.Series:
-        """
-        使用IQR方法检测异常值
-        """
-        Q1 = series.quantile(0.25)
-        Q3 = series.quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        
-        return (series < lower_bound) | (series > upper_bound)
-    
-    def _detect_outliers_zscore(self, series: pd.Series, threshold: float = 3.0) -> pd.Series:
-        """
-        使用Z-score方法检测异常值
-        """
-        z_scores = np.abs((series - series.mean()) / series.std())
-        return z_scores > threshold
-    
     def validate_holdings_data(self, df: pd.DataFrame, strict: bool = False) -> pd.DataFrame:
         """
         验证持仓数据
@@ -23,6 +23,8 @@ from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from merged_store import MergedHoldingsStore
+
 # 导入自定义模块
 try:
     from data_validator import DataValidator, validate_and_clean_data
@@ -66,6 +68,12 @@ except ImportError:
     }
 
 
+# 股票信息表的列（合并持股数据时按股票代码关联）
+STOCK_INFO_COLUMNS = ['总股本', '流通股本', '股票名称', '所属行业']
+# 计算持股比例时追加在原始数据列之后的列
+RATIO_COLUMNS = STOCK_INFO_COLUMNS + ['占总股本比例', '占流通股比例']
+
+
 class InstitutionalHoldingsAnalyzer:
     """
     机构持股数据分析器
@@ -88,6 +96,7 @@ class InstitutionalHoldingsAnalyzer:
         self.processed_data_dir = os.path.join(self.base_dir, "processed_data")
         self.logs_dir = os.path.join(self.base_dir, "logs")
         self.analysis_dir = os.path.join(self.base_dir, "analysis")
+        self.stock_info_table_file = os.path.join(self.processed_data_dir, "stock_info_table.csv")
         
         # 从配置获取机构类型列表
         self.institution_types = self.config.get('institution_types', [
@@ -100,6 +109,9 @@ class InstitutionalHoldingsAnalyzer:
         self.retry_delay_base = self.config.get('retry_delay_base', 2)
         self.top_holdings_count = self.config.get('top_holdings_count', 20)
         self.skip_existing_files = self.config.get('skip_existing_files', True)
+        # 股票信息表有效期（秒），获取失败的股票在较短时间后重试
+        self.stock_info_ttl = self.config.get('stock_info_ttl', 7 * 24 * 3600)
+        self.stock_info_retry_ttl = self.config.get('stock_info_retry_ttl', 24 * 3600)
         
         # 创建目录结构
         self._create_directories()
@@ -107,9 +119,16 @@ class InstitutionalHoldingsAnalyzer:
         # 设置日志
         self._setup_logging()
         
+        # 按报告期分区的合并数据存储（增量合并）
+        self.merged_store = MergedHoldingsStore(
+            os.path.join(self.processed_data_dir, 'merged_store'),
+            file_encoding=self.config.get('file_encoding', 'utf-8-sig'),
+            logger=self.logger
+        )
+        
         # 初始化增强功能模块
         try:
-            self.data_validator = DataValidator()
+            self.data_validator = DataValidator(sample_size=self.config.get('validation_sample_size'))
             self.performance_monitor = PerformanceMonitor()
             self.error_handler = ErrorHandler()
             self.retry_handler = RetryHandler()
@@ -425,7 +444,13 @@ class InstitutionalHoldingsAnalyzer:
     
     def load_and_merge_data(self, calculate_holding_ratio: bool = True) -> pd.DataFrame:
         """
-        加载并合并所有原始数据，可选择是否计算持股比例
+        增量合并原始数据，可选择是否计算持股比例
+        
+        已合并的原始文件记录在合并清单中（文件名、大小、修改时间），按报告期分区保存在
+        processed_data/merged_store。每次只解析新增或变化的原始文件，并对这些数据一次性计算持股比例；
+        已合并分区中未获取到股本信息的股票在信息表中获取成功后，这些分区也重新关联股本信息。
+        合并结果按原始目录的文件列出顺序拼接，与全量读取合并的结果相同；merged_holdings_data.csv
+        在新增文件位于末尾且列和类型不变时直接追加，否则由分区重新生成。
         
         Args:
             calculate_holding_ratio: 是否计算持股比例
@@ -433,164 +458,248 @@ class InstitutionalHoldingsAnalyzer:
         Returns:
             合并后的DataFrame
         """
-        self.logger.info("开始加载和合并原始数据")
-        
-        all_data = []
-        csv_files = [f for f in os.listdir(self.raw_data_dir) if f.endswith('.csv')]
-        
-        self.logger.info(f"找到 {len(csv_files)} 个原始数据文件")
-        
-        for filename in csv_files:
-            filepath = os.path.join(self.raw_data_dir, filename)
+        self.logger.info("开始增量合并原始数据")
+        store = self.merged_store
+        merged_filepath = os.path.join(self.processed_data_dir, "merged_holdings_data.csv")
+        
+        if store.with_ratios is not None and store.with_ratios != calculate_holding_ratio:
+            self.logger.info("持股比例设置与已合并数据不一致，重新合并全部文件")
+            store.reset(calculate_holding_ratio)
+        store.manifest['with_ratios'] = calculate_holding_ratio
+        
+        listed, changed, removed = store.scan(self.raw_data_dir)
+        replaced = [filename for filename in changed if filename in store.files]
+        self.logger.info(f"原始数据文件: 已合并 {len(store.files) - len(replaced) - len(removed)} 个，"
+                         f"新增 {len(changed) - len(replaced)} 个，变化 {len(replaced)} 个，删除 {len(removed)} 个")
+        
+        # 之前未获取到股本信息、现在已获取成功的股票，所在分区重新关联股本信息和持股比例
+        refreshed = self._resolved_partitions(set(changed) | set(removed)) if calculate_holding_ratio else []
+        if refreshed:
+            self.logger.info(f"{len(refreshed)} 个已合并分区中有股票的股本信息已获取成功，重新计算持股比例")
+        
+        if not changed and not removed and not refreshed and os.path.exists(merged_filepath):
+            self.logger.info("没有新的原始数据文件，使用已合并的数据")
+            return self._load_merged_store(listed)
+        
+        new_frames = {}
+        for filename in refreshed:
+            data = store.read_partition(store.files[filename]['partition'])
+            new_frames[filename] = data.drop(columns=RATIO_COLUMNS, errors='ignore')
+        for filename in changed:
             try:
-                data = pd.read_csv(filepath, encoding='utf-8-sig')
-                if not data.empty:
-                    # 确保股票代码格式统一为6位数字字符串
-                    if '股票代码' in data.columns:
-                        data['股票代码'] = data['股票代码'].astype(str).str.zfill(6)
-                    all_data.append(data)
-                    self.logger.debug(f"加载文件: {filename}, 记录数: {len(data)}")
+                data = store.read_raw(os.path.join(self.raw_data_dir, filename))
             except Exception as e:
                 self.logger.error(f"加载文件失败 {filename}: {str(e)}")
-        
-        if all_data:
-            merged_data = pd.concat(all_data, ignore_index=True)
-            self.logger.info(f"数据合并完成，总记录数: {len(merged_data)}")
-            
-            # 确保股票代码格式统一为6位数字字符串
-            if '股票代码' in merged_data.columns:
-                self.logger.info("开始格式化股票代码为6位数字格式")
-                original_codes = merged_data['股票代码'].nunique()
-                merged_data['股票代码'] = merged_data['股票代码'].astype(str).str.zfill(6)
-                formatted_codes = merged_data['股票代码'].nunique()
-                self.logger.info(f"股票代码格式化完成: {original_codes} -> {formatted_codes} 只股票")
-            
-            # 如果需要计算持股比例，获取股本信息
-            if calculate_holding_ratio and '股票代码' in merged_data.columns:
-                merged_data = self._add_stock_info_and_ratios(merged_data)
-            
-            # 保存合并后的数据
-            merged_filepath = os.path.join(self.processed_data_dir, "merged_holdings_data.csv")
-            merged_data.to_csv(merged_filepath, index=False, encoding='utf-8-sig')
-            self.logger.info(f"合并数据已保存: {merged_filepath}")
-            
+                continue
+            self.logger.debug(f"加载文件: {filename}, 记录数: {len(data)}")
+            new_frames[filename] = data
+        
+        # 本次新读取的数据拼接后一次性计算持股比例（股票信息表只加载、保存一次），再按文件拆回各分区
+        non_empty = [filename for filename, data in new_frames.items() if not data.empty]
+        if calculate_holding_ratio and non_empty:
+            combined = pd.concat([new_frames[filename] for filename in non_empty], ignore_index=True)
+            if '股票代码' in combined.columns:
+                combined = self._add_stock_info_and_ratios(combined)
+                offset = 0
+                for filename in non_empty:
+                    rows = len(new_frames[filename])
+                    new_frames[filename] = combined.iloc[offset:offset + rows].reset_index(drop=True)
+                    offset += rows
+        
+        for filename, data in new_frames.items():
+            unresolved = []
+            if '总股本' in data.columns:
+                unresolved = sorted(data.loc[data['总股本'] <= 0, '股票代码'].astype(str).unique())
+            store.write_partition(filename, os.path.join(self.raw_data_dir, filename), data, unresolved)
+            # 每写完一个分区就保存清单，中断后已处理的文件不必重做
+            store.save_manifest()
+        for filename in removed:
+            store.remove(filename)
+        store.save_manifest()
+        
+        merged_data = self._load_merged_store(listed)
+        if merged_data.empty:
+            self.logger.warning("没有找到有效的数据文件")
             return merged_data
+        self.logger.info(f"数据合并完成，总记录数: {len(merged_data)}")
+        
+        # 保存合并后的数据：只有新增文件、且新增文件位于上次写出的文件之后、列和类型都不变时追加
+        # （追加部分不能再写BOM），否则由分区重新生成，保证与全量合并写出的内容一致
+        order = [filename for filename in listed if filename in store.files]
+        previous_order = store.manifest.get('csv_order') or []
+        appended = order[len(previous_order):]
+        dtypes = [[column, str(dtype)] for column, dtype in merged_data.dtypes.items()]
+        if (not replaced and not removed and not refreshed and previous_order and order[:len(previous_order)] == previous_order
+                and set(appended) <= set(new_frames) and store.manifest.get('csv_dtypes') == dtypes
+                and self._read_csv_header(merged_filepath) == list(merged_data.columns)):
+            appended_rows = sum(len(new_frames[filename]) for filename in appended)
+            merged_data.iloc[len(merged_data) - appended_rows:].to_csv(
+                merged_filepath, mode='a', header=False, index=False, encoding='utf-8')
+            self.logger.info(f"合并数据已追加 {appended_rows} 条记录: {merged_filepath}")
         else:
-            self.logger.warning("没有找到有效的数据文件")
-            return pd.DataFrame()
+            merged_data.to_csv(merged_filepath, index=False, encoding='utf-8-sig')
+            self.logger.info(f"合并数据已保存: {merged_filepath}")
+        store.manifest['csv_order'] = order
+        store.manifest['csv_dtypes'] = dtypes
+        store.save_manifest()
+        
+        return merged_data
     
-    def _add_stock_info_and_ratios(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _resolved_partitions(self, skip) -> List[str]:
         """
-        为数据添加股本信息和持股比例
+        找出含有股本信息已获取成功的股票的已合并分区
+        
+        清单中记录了各分区未获取到股本信息的股票代码，这些股票通过 get_stock_info_table 查询
+        （获取失败的记录超过 stock_info_retry_ttl 后重新获取）。
         
         Args:
-            data: 原始持股数据
+            skip: 本次需要重新解析或删除的原始文件名，不必检查
             
         Returns:
-            添加了股本信息和持股比例的数据
+            需要重新关联股本信息的原始文件名列表
         """
-        self.logger.info("开始获取股本信息并计算持股比例")
-        
-        # 获取所有唯一的股票代码
-        unique_stocks = data['股票代码'].unique()
-        stock_info_dict = {}
+        pending = {filename: entry['unresolved'] for filename, entry in self.merged_store.files.items()
+                   if entry.get('unresolved') and entry.get('partition') and filename not in skip}
+        if not pending:
+            return []
+        stock_info = self.get_stock_info_table(sorted(set().union(*pending.values())))
+        resolved = set(stock_info.index[(stock_info['总股本'] > 0).to_numpy()])
+        return [filename for filename, codes in pending.items() if resolved.intersection(codes)]
+    
+    def _load_merged_store(self, order: List[str]) -> pd.DataFrame:
+        """
+        按原始文件顺序读取全部分区，股本信息和持股比例列放在原始数据列之后（与全量合并一致）
         
-        # 批量获取股本信息（利用缓存避免重复获取）
-        self.logger.info(f"需要获取 {len(unique_stocks)} 只股票的基本信息")
+        Args:
+            order: 原始文件名顺序
+            
+        Returns:
+            合并后的DataFrame
+        """
+        merged_data = self.merged_store.load_all(order)
+        ratio_columns = [column for column in RATIO_COLUMNS if column in merged_data.columns]
+        if ratio_columns:
+            merged_data = merged_data[[column for column in merged_data.columns if column not in ratio_columns] + ratio_columns]
+        return merged_data
+    
+    def _read_csv_header(self, filepath: str) -> Optional[List[str]]:
+        """读取CSV文件的列名，文件不存在或为空时返回None"""
+        if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
+            return None
+        return list(pd.read_csv(filepath, encoding='utf-8-sig', nrows=0).columns)
+    
+    def get_stock_info_table(self, stock_codes) -> pd.DataFrame:
+        """
+        获取股票基本信息表（股本、名称、行业），优先使用磁盘上未过期的记录
         
-        # 分批处理，避免内存问题
-        batch_size = CONFIG.get('batch_size', 100)  # 从配置获取批处理大小
-        total_batches = (len(unique_stocks) + batch_size - 1) // batch_size
+        信息表保存在 processed_data/stock_info_table.csv，每只股票记录获取时间：
+        未超过 stock_info_ttl 的记录直接使用，获取失败的记录在 stock_info_retry_ttl 后重试，
+        只有缺失或过期的股票才调用 fetch_stock_info。
         
-        for batch_idx in range(total_batches):
-            start_idx = batch_idx * batch_size
-            end_idx = min((batch_idx + 1) * batch_size, len(unique_stocks))
-            batch_stocks = unique_stocks[start_idx:end_idx]
-            
-            self.logger.info(f"处理第 {batch_idx + 1}/{total_batches} 批股票 ({len(batch_stocks)} 只)")
+        Args:
+            stock_codes: 股票代码列表（6位字符串）
             
-            for i, stock_code in enumerate(batch_stocks, 1):
-                # 确保stock_code是字符串类型，避免numpy.int64错误
-                stock_code_str = str(stock_code).zfill(6)  # 转换为6位字符串格式
-                
-                # 显示进度
-                global_idx = start_idx + i
-                if global_idx % 50 == 0 or global_idx == len(unique_stocks):
-                    self.logger.info(f"正在获取股票信息进度: {global_idx}/{len(unique_stocks)}")
-                
+        Returns:
+            以股票代码为索引的DataFrame，列为 STOCK_INFO_COLUMNS
+        """
+        stock_codes = pd.Index(pd.unique(pd.Series(stock_codes, dtype=str)))
+        table = self._load_stock_info_table()
+        
+        now = time.time()
+        age = now - table['fetch_timestamp']
+        fetched_ok = table['总股本'] > 0
+        fresh = (fetched_ok & (age < self.stock_info_ttl)) | (~fetched_ok & (age < self.stock_info_retry_ttl))
+        to_fetch = stock_codes.difference(table.index[fresh.to_numpy()], sort=False)
+        self.logger.info(f"需要 {len(stock_codes)} 只股票的基本信息，其中 {len(stock_codes) - len(to_fetch)} 只使用信息表缓存，"
+                         f"{len(to_fetch)} 只需要重新获取")
+        
+        if len(to_fetch) > 0:
+            rows = []
+            for i, stock_code in enumerate(to_fetch, 1):
+                if i % 50 == 0 or i == len(to_fetch):
+                    self.logger.info(f"正在获取股票信息进度: {i}/{len(to_fetch)}")
                 try:
-                    stock_info = self.fetch_stock_info(stock_code_str)
-                    if stock_info:
-                        stock_info_dict[stock_code] = stock_info
-                    else:
-                        # 如果获取失败，使用默认值
-                        stock_info_dict[stock_code] = {
-                            'total_shares': 0,
-                            'circulating_shares': 0,
-                            'stock_name': '',
-                            'industry': ''
-                        }
+                    stock_info = self.fetch_stock_info(stock_code)
                 except Exception as e:
-                    self.logger.error(f"获取股票 {stock_code_str} 信息时发生错误: {str(e)}")
-                    stock_info_dict[stock_code] = {
-                        'total_shares': 0,
-                        'circulating_shares': 0,
-                        'stock_name': '',
-                        'industry': ''
-                    }
+                    self.logger.error(f"获取股票 {stock_code} 信息时发生错误: {str(e)}")
+                    stock_info = None
+                stock_info = stock_info or {}
+                rows.append({
+                    '股票代码': stock_code,
+                    '总股本': stock_info.get('total_shares', 0),
+                    '流通股本': stock_info.get('circulating_shares', 0),
+                    '股票名称': stock_info.get('stock_name', ''),
+                    '所属行业': stock_info.get('industry', ''),
+                    'fetch_timestamp': time.time()
+                })
+            fetched = pd.DataFrame(rows).set_index('股票代码')
+            table = pd.concat([table.drop(index=to_fetch, errors='ignore'), fetched])
+            self._save_stock_info_table(table)
+        
+        result = table.reindex(stock_codes)[STOCK_INFO_COLUMNS]
+        self.logger.info(f"股票基本信息获取完成，成功获取 {int((result['总股本'] > 0).sum())} 只股票信息")
+        return result
+    
+    def _load_stock_info_table(self) -> pd.DataFrame:
+        """读取磁盘上的股票信息表，不存在或读取失败时返回空表"""
+        empty = pd.DataFrame(columns=STOCK_INFO_COLUMNS + ['fetch_timestamp'],
+                             index=pd.Index([], dtype=str, name='股票代码'))
+        empty = empty.astype({'总股本': float, '流通股本': float, 'fetch_timestamp': float})
+        if not os.path.exists(self.stock_info_table_file):
+            return empty
+        try:
+            table = pd.read_csv(self.stock_info_table_file, encoding=self.config.get('file_encoding', 'utf-8-sig'),
+                                dtype={'股票代码': str, '股票名称': str, '所属行业': str})
+            table = table.drop_duplicates(subset='股票代码', keep='last').set_index('股票代码')
+            table[['股票名称', '所属行业']] = table[['股票名称', '所属行业']].fillna('')
+            table[['总股本', '流通股本', 'fetch_timestamp']] = table[['总股本', '流通股本', 'fetch_timestamp']].fillna(0)
+            return table[STOCK_INFO_COLUMNS + ['fetch_timestamp']]
+        except Exception as e:
+            self.logger.warning(f"读取股票信息表失败，将重新获取: {e}")
+            return empty
+    
+    def _save_stock_info_table(self, table: pd.DataFrame):
+        """保存股票信息表（先写临时文件再替换，中断时不会留下不完整的文件）"""
+        tmp_file = f"{self.stock_info_table_file}.tmp"
+        try:
+            table.reset_index().to_csv(tmp_file, index=False, encoding=self.config.get('file_encoding', 'utf-8-sig'))
+            os.replace(tmp_file, self.stock_info_table_file)
+            self.logger.info(f"股票信息表已保存: {self.stock_info_table_file}，共 {len(table)} 只股票")
+        except Exception as e:
+            self.logger.error(f"保存股票信息表失败: {e}")
+    
+    def _add_stock_info_and_ratios(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        为数据添加股本信息和持股比例
+        
+        Args:
+            data: 原始持股数据
             
-            # 批处理完成后进行垃圾回收
-            import gc
-            gc.collect()
+        Returns:
+            添加了股本信息和持股比例的数据
+        """
+        self.logger.info("开始获取股本信息并计算持股比例")
         
-        self.logger.info(f"股票基本信息获取完成，成功获取 {sum(1 for v in stock_info_dict.values() if v.get('total_shares', 0) > 0)} 只股票信息")
+        stock_codes = data['股票代码'].astype(str)
+        stock_info = self.get_stock_info_table(stock_codes.unique())
         
-        # 添加股本信息列
-        data['总股本'] = data['股票代码'].map(lambda x: stock_info_dict.get(x, {}).get('total_shares', 0))
-        data['流通股本'] = data['股票代码'].map(lambda x: stock_info_dict.get(x, {}).get('circulating_shares', 0))
-        data['股票名称'] = data['股票代码'].map(lambda x: stock_info_dict.get(x, {}).get('stock_name', ''))
-        data['所属行业'] = data['股票代码'].map(lambda x: stock_info_dict.get(x, {}).get('industry', ''))
+        # 按股票代码一次性关联股本信息，获取失败的股票使用默认值
+        matched = stock_info.reindex(stock_codes.to_numpy())
+        data['总股本'] = matched['总股本'].fillna(0).to_numpy()
+        data['流通股本'] = matched['流通股本'].fillna(0).to_numpy()
+        data['股票名称'] = matched['股票名称'].fillna('').to_numpy()
+        data['所属行业'] = matched['所属行业'].fillna('').to_numpy()
         
-        # 计算持股比例
-        # 确保持股数量列存在且为数值类型
+        # 计算持股比例（%），股本为0（未获取到）时比例为0
         if '持股总数' in data.columns:
             data['持股总数'] = pd.to_numeric(data['持股总数'], errors='coerce').fillna(0)
+            holdings = data['持股总数'].to_numpy(dtype=float)
+            for ratio_column, shares_column in (('占总股本比例', '总股本'), ('占流通股比例', '流通股本')):
+                shares = data[shares_column].to_numpy(dtype=float)
+                ratio = np.divide(holdings, shares, out=np.zeros(len(data)), where=shares > 0)
+                data[ratio_column] = ratio * 100
             
-            # 安全计算持股比例，避免DataFrame索引错误
-            try:
-                # 计算占总股本比例（%）
-                total_share_ratios = []
-                for _, row in data.iterrows():
-                    try:
-                        if row['总股本'] > 0:
-                            ratio = (row['持股总数'] / row['总股本'] * 100)
-                        else:
-                            ratio = 0.0
-                        total_share_ratios.append(ratio)
-                    except (ZeroDivisionError, TypeError, ValueError):
-                        total_share_ratios.append(0.0)
-                
-                data['占总股本比例'] = total_share_ratios
-                
-                # 计算占流通股本比例（%）
-                circulating_share_ratios = []
-                for _, row in data.iterrows():
-                    try:
-                        if row['流通股本'] > 0:
-                            ratio = (row['持股总数'] / row['流通股本'] * 100)
-                        else:
-                            ratio = 0.0
-                        circulating_share_ratios.append(ratio)
-                    except (ZeroDivisionError, TypeError, ValueError):
-                        circulating_share_ratios.append(0.0)
-                
-                data['占流通股比例'] = circulating_share_ratios
-                
-                self.logger.info(f"成功计算 {len(unique_stocks)} 只股票的持股比例")
-            except Exception as e:
-                self.logger.error(f"计算持股比例时发生错误: {str(e)}")
-                data['占总股本比例'] = 0.0
-                data['占流通股比例'] = 0.0
+            self.logger.info(f"成功计算 {len(stock_info)} 只股票的持股比例")
         else:
             self.logger.warning("数据中未找到持股数量列(持股总数)，无法计算持股比例")
             data['占总股本比例'] = 0
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合并数据存储模块
+
+按报告期分区保存已合并的原始数据文件，配合清单（manifest）实现增量合并：
+- 清单记录每个已合并原始文件的文件名、大小、修改时间和对应分区，以及分区中未获取到股本信息的股票代码
+  （这些股票的信息之后获取成功时，分区需要重新关联股本信息）
+- 只有新增或变化的原始文件需要重新解析，删除的原始文件对应分区一并删除
+- 分区使用列式格式保存：安装了 pyarrow 时为 parquet，否则为 pandas pickle
+- 数值列仍由 pandas 推断类型，合并结果按原始目录的文件列出顺序拼接，与全量读取合并的结果一致
+"""
+
+import os
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARTITION_FORMAT = 'parquet'
+except ImportError:
+    PARTITION_FORMAT = 'pickle'
+
+# 按文本读取的原始数据列（股票代码保留前导0，其余列跳过类型推断）；数值列由 pandas 推断，
+# 与全量合并时的类型一致（如整数股数写出时不带小数点）
+RAW_TEXT_COLUMNS = ['股票代码', '股票简称', 'stock_name', '持股变化', 'institution_type', 'fetch_time']
+
+MANIFEST_VERSION = 3
+
+
+def _report_date_from_filename(filename: str) -> str:
+    """从原始文件名（如 基金_20240930.csv）中提取报告期"""
+    match = re.search(r'(\d{8})\.csv$', filename)
+    return match.group(1) if match else 'unknown'
+
+
+class MergedHoldingsStore:
+    """
+    按报告期分区的合并数据存储
+    """
+
+    def __init__(self, store_dir: str, file_encoding: str = 'utf-8-sig',
+                 logger: Optional[logging.Logger] = None):
+        """
+        初始化存储
+
+        Args:
+            store_dir: 分区存储目录（其中的 manifest.json 为清单文件）
+            file_encoding: 原始CSV文件编码
+            logger: 日志记录器
+        """
+        self.store_dir = store_dir
+        self.manifest_file = os.path.join(store_dir, 'manifest.json')
+        self.file_encoding = file_encoding
+        self.logger = logger or logging.getLogger(__name__)
+        os.makedirs(store_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    @property
+    def files(self) -> Dict[str, Dict]:
+        """已合并的原始文件 {文件名: 清单记录}"""
+        return self.manifest['files']
+
+    @property
+    def with_ratios(self) -> Optional[bool]:
+        """分区数据是否已计算持股比例（空存储时为None）"""
+        return self.manifest.get('with_ratios')
+
+    def _load_manifest(self) -> Dict:
+        """读取清单，不存在或版本不符时返回空清单"""
+        empty = {'version': MANIFEST_VERSION, 'with_ratios': None, 'files': {}, 'csv_order': [], 'csv_dtypes': None}
+        if not os.path.exists(self.manifest_file):
+            return empty
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"读取合并清单失败，将重新合并全部文件: {e}")
+            return empty
+        if manifest.get('version') != MANIFEST_VERSION:
+            return empty
+        return manifest
+
+    def save_manifest(self):
+        """保存清单（先写临时文件再替换）"""
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+    def reset(self, with_ratios: bool):
+        """清空存储（如持股比例设置变化时需要全部重新合并）"""
+        for filename in list(self.files):
+            self.remove(filename)
+        self.manifest['with_ratios'] = with_ratios
+        self.manifest['csv_order'] = []
+        self.manifest['csv_dtypes'] = None
+
+    def scan(self, raw_data_dir: str) -> Tuple[List[str], List[str], List[str]]:
+        """
+        对比原始数据目录和清单
+
+        Args:
+            raw_data_dir: 原始数据目录
+
+        Returns:
+            (目录中的全部文件名（按 os.listdir 顺序）, 新增或变化的文件名列表, 已删除的文件名列表)
+        """
+        current = {}
+        for filename in os.listdir(raw_data_dir):
+            if filename.endswith('.csv'):
+                stat = os.stat(os.path.join(raw_data_dir, filename))
+                current[filename] = (stat.st_size, stat.st_mtime_ns)
+
+        changed = [
+            filename for filename, (size, mtime_ns) in current.items()
+            if filename not in self.files
+            or self.files[filename]['size'] != size or self.files[filename]['mtime_ns'] != mtime_ns
+        ]
+        removed = [filename for filename in self.files if filename not in current]
+        return list(current), changed, removed
+
+    def read_raw(self, filepath: str) -> pd.DataFrame:
+        """
+        解析原始CSV文件（文本列按字符串读取），股票代码统一为6位字符串
+
+        Args:
+            filepath: 原始文件路径
+
+        Returns:
+            原始数据DataFrame
+        """
+        header = pd.read_csv(filepath, encoding=self.file_encoding, nrows=0).columns
+        dtypes = {column: str for column in RAW_TEXT_COLUMNS if column in header}
+        data = pd.read_csv(filepath, encoding=self.file_encoding, dtype=dtypes)
+        if '股票代码' in data.columns:
+            data['股票代码'] = data['股票代码'].str.zfill(6)
+        return data
+
+    def write_partition(self, filename: str, filepath: str, data: pd.DataFrame,
+                        unresolved: Optional[List[str]] = None):
+        """
+        保存原始文件对应的分区并更新清单记录（调用 save_manifest 后生效）
+
+        Args:
+            filename: 原始文件名
+            filepath: 原始文件路径（记录其大小和修改时间）
+            data: 合并处理后的数据，为空时只记录清单
+            unresolved: 分区中未获取到股本信息的股票代码
+        """
+        old_partition = self.files.get(filename, {}).get('partition')
+        partition = None
+        if not data.empty:
+            extension = 'parquet' if PARTITION_FORMAT == 'parquet' else 'pkl'
+            partition = os.path.join(f"report_date={_report_date_from_filename(filename)}",
+                                     f"{os.path.splitext(filename)[0]}.{extension}")
+            partition_path = os.path.join(self.store_dir, partition)
+            os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+            if PARTITION_FORMAT == 'parquet':
+                data.to_parquet(partition_path, index=False)
+            else:
+                data.to_pickle(partition_path)
+        if old_partition and old_partition != partition:
+            self._delete_partition(old_partition)
+
+        stat = os.stat(filepath)
+        self.files[filename] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'partition': partition,
+            'rows': len(data),
+            'unresolved': list(unresolved or [])
+        }
+
+    def remove(self, filename: str):
+        """删除原始文件对应的分区和清单记录"""
+        entry = self.files.pop(filename, None)
+        if entry and entry.get('partition'):
+            self._delete_partition(entry['partition'])
+
+    def _delete_partition(self, partition: str):
+        try:
+            os.remove(os.path.join(self.store_dir, partition))
+        except FileNotFoundError:
+            pass
+
+    def read_partition(self, partition: str) -> pd.DataFrame:
+        """读取一个分区"""
+        partition_path = os.path.join(self.store_dir, partition)
+        if partition.endswith('.parquet'):
+            return pd.read_parquet(partition_path)
+        return pd.read_pickle(partition_path)
+
+    def load_all(self, order: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取全部分区
+
+        Args:
+            order: 原始文件名顺序（与全量合并时的读取顺序一致），为None时使用上次写出CSV时的顺序
+
+        Returns:
+            合并后的DataFrame，没有数据时为空DataFrame
+        """
+        order = self.manifest.get('csv_order', []) if order is None else order
+        filenames = [filename for filename in order if filename in self.files]
+        listed = set(filenames)
+        filenames += [filename for filename in self.files if filename not in listed]
+        partitions = [self.files[filename]['partition'] for filename in filenames if self.files[filename].get('partition')]
+        frames = [self.read_partition(partition) for partition in partitions]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
@@ -1,15 +1,17 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory
 # 导入新的数据模块
 from data import (
     ensure_cache_directories,
-    get_lhb_top10,
-    get_stock_financial_data,
-    get_hkstock_data,
     get_hkstock_finance,
-    fetch_macro_china_money_supply,
-    institutional_holdings_data
+    institutional_holdings_data,
+    refresh_scheduler,
+    shared_store
 )
-from data.hkstock_data import get_us_interest_rate_data
+from data.cache_utils import read_cache
+from data.payload_cache import PayloadCache
+from data.series_levels import SeriesLevelsCache, SeriesSpec, parse_bound
+from data.stock_finance import is_valid_stock_code
+from datetime import date
 import os
 import logging
 # 从logging.handlers中移除RotatingFileHandler导入
@@ -54,9 +56,115 @@ logger.addHandler(file_handler)
 # 确保缓存目录存在
 ensure_cache_directories()
 
+# 启动后台刷新：龙虎榜、财务、港股通、利率、恒指、货币供应量等数据由后台线程预热和刷新，
+# 请求只读取最近一次成功获取的快照。
+# 由 serve.py 以多进程方式启动时应用在主进程中预加载，后台线程不能跨fork，改为在各工作进程中启动
+if not os.environ.get('STOCK_INFO_PRELOAD'):
+    refresh_scheduler.start()
+
 # 设置静态文件缓存时间（开发模式设为0，禁用缓存）
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
+# 预序列化的JSON响应体（按数据版本缓存，多进程运行时通过共享存储在进程间复用）
+response_cache = PayloadCache(max_entries=512, shared_store=shared_store)
+
+# 支持 start/end/max_points 参数的长序列接口：序列预先聚合为多个分辨率，按请求的点数选择
+# 恒生指数：日线聚合为周/月/季/年线，收盘价取区间最后一个值，并提供区间内收盘价的最高/最低值
+HSI_SERIES = SeriesSpec('hsi_data', '日期', base='day',
+                        aggregations={'最高价': ('收盘价', 'max'), '最低价': ('收盘价', 'min')})
+# 货币供应量等月度指标（存量、同比、指数）均取区间最后一个值
+MONEY_SUPPLY_SERIES = SeriesSpec('data', '月份', base='month', date_format='%Y.%m')
+# 上海房价：成交面积为流量，取区间内月均值（与月度数据单位一致），指数和价格取最后一个值
+SH_HOUSE_PRICE_SERIES = SeriesSpec('data', 'date', base='month', date_format='%Y-%m',
+                                   aggregations={'total_area': 'mean'})
+# 机构持股趋势：按报告期（季度）的持股比例
+HOLDINGS_TREND_SERIES = SeriesSpec('data', 'date', base='quarter')
+
+series_levels_cache = SeriesLevelsCache(max_entries=64)
+
+def series_args():
+    """
+    解析序列接口的 start/end/max_points 参数
+    
+    Returns:
+        tuple: (start, end, max_points)，都未提供时返回None（返回完整序列）
+    
+    Raises:
+        ValueError: 参数格式错误
+    """
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    max_points = request.args.get('max_points') or None
+    if start is None and end is None and max_points is None:
+        return None
+    parse_bound(start)
+    parse_bound(end, is_end=True)
+    if max_points is not None:
+        try:
+            max_points = int(max_points)
+        except ValueError:
+            raise ValueError('max_points 应为整数')
+        if max_points < 2:
+            raise ValueError('max_points 不能小于2')
+    return start, end, max_points
+
+def downsample_series(data, spec, key, version, args):
+    """
+    按 start/end 截取序列，并选择点数不超过 max_points 的最细分辨率（响应中的其他字段不变）
+    
+    Args:
+        data: 完整响应数据
+        spec: SeriesSpec
+        key: 序列标识（用于缓存多分辨率聚合结果）
+        version: 数据版本
+        args: series_args() 的结果
+    """
+    start, end, max_points = args
+    levels = series_levels_cache.get(key, version, spec, lambda: data.get(spec.field) or [])
+    resolution, rows = levels.select(parse_bound(start), parse_bound(end, is_end=True), max_points)
+    result = dict(data)
+    result[spec.field] = rows
+    result['resolution'] = resolution
+    return result
+
+def series_error_response(error):
+    """序列参数错误"""
+    return jsonify({'status': 'error', 'message': str(error)}), 400
+
+def scheduler_series_response(name, spec):
+    """后台刷新数据集的序列响应：未指定参数时返回完整快照，否则按参数降采样"""
+    args = series_args()
+    if args is None:
+        return payload_response(refresh_scheduler.get_payload(name))
+    data, version = refresh_scheduler.get_versioned(name)
+    payload = response_cache.get(
+        (name,) + args, version,
+        lambda: downsample_series(data, spec, name, version, args)
+    )
+    return payload_response(payload)
+
+def payload_response(payload):
+    """
+    返回预序列化的JSON响应：ETag匹配时返回304，客户端支持时直接返回预压缩的响应体
+    （每种编码的响应体使用各自的ETag）
+    
+    Args:
+        payload: data.payload_cache.Payload
+    """
+    encoding = payload.negotiate(request.headers.get('Accept-Encoding', ''))
+    etag = payload.etag_for(encoding)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload.encoded(encoding), mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # 每次使用前向服务器确认，数据未变化时只返回304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # 主页
 @app.route('/')
 def index():
@@ -96,8 +204,7 @@ def lhb_data():
     # 确保缓存目录存在
     ensure_cache_directories()
     # 获取龙虎榜数据
-    data = get_lhb_top10()
-    return jsonify(data)
+    return payload_response(refresh_scheduler.get_payload('lhb'))
 
 # API路由 - A股财务数据
 @app.route('/api/stock_finance')
@@ -107,16 +214,16 @@ def stock_finance():
     stock_code = request.args.get('code', '')
     if not stock_code:
         return jsonify({'error': '请提供股票代码'})
+    if not is_valid_stock_code(stock_code):
+        return jsonify({'error': '请输入正确的股票代码（6位数字）'})
     
-    data = get_stock_financial_data(stock_code)
-    return jsonify(data)
+    return payload_response(refresh_scheduler.get_payload('stock_finance', stock_code))
 
 # API路由 - 港股通南向资金数据
 @app.route('/api/hkstock')
 def api_hkstock_data():
     """获取港股通南向资金数据API"""
-    data = get_hkstock_data()
-    return jsonify(data)
+    return payload_response(refresh_scheduler.get_payload('hkstock'))
 
 
 
@@ -136,8 +243,7 @@ def api_hkstock_info(stock_code):
 def api_us_interest_rate():
     """获取美国利率数据API"""
     try:
-        data = get_us_interest_rate_data()
-        return jsonify(data)
+        return payload_response(refresh_scheduler.get_payload('us_interest_rate'))
     except Exception as e:
         app.logger.error(f"获取美国利率数据出错: {e}")
         return jsonify({'error': str(e)}), 500
@@ -145,11 +251,11 @@ def api_us_interest_rate():
 # API路由 - 恒生指数历史数据
 @app.route('/api/hsi_historical')
 def api_hsi_historical():
-    """获取恒生指数历史数据API"""
+    """获取恒生指数历史数据API（可选参数 start、end、max_points）"""
     try:
-        from data.hkstock_data import get_hsi_historical_data
-        data = get_hsi_historical_data()
-        return jsonify(data)
+        return scheduler_series_response('hsi_historical', HSI_SERIES)
+    except ValueError as e:
+        return series_error_response(e)
     except Exception as e:
         app.logger.error(f"获取恒生指数历史数据出错: {e}")
         return jsonify({'error': str(e)}), 500
@@ -157,10 +263,11 @@ def api_hsi_historical():
 # API路由 - 中国货币供应量数据
 @app.route('/api/macro/money_supply')
 def macro_money_supply():
-    """获取中国货币供应量数据API"""
+    """获取中国货币供应量数据API（可选参数 start、end、max_points）"""
     try:
-        data = fetch_macro_china_money_supply()
-        return jsonify(data)
+        return scheduler_series_response('money_supply', MONEY_SUPPLY_SERIES)
+    except ValueError as e:
+        return series_error_response(e)
     except Exception as e:
         app.logger.error(f"获取货币供应量数据时出错: {e}")
         return jsonify({"status": "error", "message": str(e)})
@@ -230,11 +337,75 @@ def serve_house_price_image(image_name):
     
     return "图片未找到", 404
 
+# 上海房价图表数据
+def _build_sh_house_price_data(house_data):
+    """由上海房价数据文件内容生成图表数据"""
+    # 获取最新数据日期
+    latest_data_date = house_data.get('latest_data_date', '')
+    
+    # 提取数据用于图表
+    chart_data = []
+    for date_key, data_item in house_data['data'].items():
+        chart_data.append({
+            'date': date_key,
+            'year': data_item['year'],
+            'month': data_item['month'],
+            'price_index': data_item['price_index'],
+            'total_area': data_item['total_area'],
+            'avg_price': data_item['avg_price'],
+            'yoy_change': data_item['yoy_change']
+        })
+    
+    # 按日期排序
+    chart_data.sort(key=lambda x: (x['year'], x['month']))
+    
+    # 对最新月份的成交量进行估算（如果是当月数据且不完整）
+    if chart_data and latest_data_date:
+        latest_item = chart_data[-1]
+        latest_year = latest_item['year']
+        latest_month = latest_item['month']
+        
+        # 解析最新数据日期
+        try:
+            from datetime import datetime
+            latest_date = datetime.strptime(latest_data_date, '%Y.%m.%d')
+            
+            # 如果最新数据是当月的，进行估算
+            if latest_date.year == latest_year and latest_date.month == latest_month:
+                # 计算当月总天数
+                import calendar
+                days_in_month = calendar.monthrange(latest_year, latest_month)[1]
+                
+                # 计算已过天数
+                days_passed = latest_date.day
+                
+                # 估算全月成交量（按比例放大）
+                if days_passed > 0 and days_passed < days_in_month:
+                    actual_area = latest_item['total_area']  # 保存实际值
+                    estimated_total_area = actual_area * (days_in_month / days_passed)
+                    latest_item['actual_value'] = actual_area  # 实际值
+                    latest_item['total_area'] = round(estimated_total_area, 2)  # 估算总值
+                    latest_item['is_estimated'] = True
+                else:
+                    latest_item['is_estimated'] = False
+            else:
+                latest_item['is_estimated'] = False
+        except:
+            latest_item['is_estimated'] = False
+    
+    return {
+        'status': 'success',
+        'data': chart_data,
+        'base_period': house_data['base_period'],
+        'base_index': house_data['base_index'],
+        'description': house_data['description'],
+        'latest_data_date': latest_data_date
+    }
+
 # 获取上海房价数据API
 @app.route('/api/sh_house_price/data')
 def sh_house_price_data():
     try:
-        import json
         # 读取上海房价数据文件
         data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                                 'cache', 'outsource', 'shanghai_house_price_index.json')
@@ -245,70 +416,23 @@ def sh_house_price_data():
                 'message': '数据文件不存在'
             })
         
-        with open(data_file, 'r', encoding='utf-8') as f:
-            house_data = json.load(f)
-        
-        # 获取最新数据日期
-        latest_data_date = house_data.get('latest_data_date', '')
-        
-        # 提取数据用于图表
-        chart_data = []
-        for date_key, data_item in house_data['data'].items():
-            chart_data.append({
-                'date': date_key,
-                'year': data_item['year'],
-                'month': data_item['month'],
-                'price_index': data_item['price_index'],
-                'total_area': data_item['total_area'],
-                'avg_price': data_item['avg_price'],
-                'yoy_change': data_item['yoy_change']
-            })
-        
-        # 按日期排序
-        chart_data.sort(key=lambda x: (x['year'], x['month']))
-        
-        # 对最新月份的成交量进行估算（如果是当月数据且不完整）
-        if chart_data and latest_data_date:
-            latest_item = chart_data[-1]
-            latest_year = latest_item['year']
-            latest_month = latest_item['month']
-            
-            # 解析最新数据日期
-            try:
-                from datetime import datetime
-                latest_date = datetime.strptime(latest_data_date, '%Y.%m.%d')
-                
-                # 如果最新数据是当月的，进行估算
-                if latest_date.year == latest_year and latest_date.month == latest_month:
-                    # 计算当月总天数
-                    import calendar
-                    days_in_month = calendar.monthrange(latest_year, latest_month)[1]
-                    
-                    # 计算已过天数
-                    days_passed = latest_date.day
-                    
-                    # 估算全月成交量（按比例放大）
-                    if days_passed > 0 and days_passed < days_in_month:
-                        actual_area = latest_item['total_area']  # 保存实际值
-                        estimated_total_area = actual_area * (days_in_month / days_passed)
-                        latest_item['actual_value'] = actual_area  # 实际值
-                        latest_item['total_area'] = round(estimated_total_area, 2)  # 估算总值
-                        latest_item['is_estimated'] = True
-                    else:
-                        latest_item['is_estimated'] = False
-                else:
-                    latest_item['is_estimated'] = False
-            except:
-                latest_item['is_estimated'] = False
-        
-        return jsonify({
-            'status': 'success',
-            'data': chart_data,
-            'base_period': house_data['base_period'],
-            'base_index': house_data['base_index'],
-            'description': house_data['description'],
-            'latest_data_date': latest_data_date
-        })
+        # 数据文件未修改时直接复用已生成的响应体
+        version = os.path.getmtime(data_file)
+        args = series_args()
+        if args is None:
+            payload = response_cache.get(
+                'sh_house_price', version,
+                lambda: _build_sh_house_price_data(read_cache(data_file))
+            )
+        else:
+            payload = response_cache.get(
+                ('sh_house_price',) + args, version,
+                lambda: downsample_series(_build_sh_house_price_data(read_cache(data_file)),
+                                          SH_HOUSE_PRICE_SERIES, 'sh_house_price', version, args)
+            )
+        return payload_response(payload)
+    except ValueError as e:
+        return series_error_response(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -341,11 +465,14 @@ def institutional_holdings():
 def get_available_report_dates():
     """获取可用报告期列表API"""
     try:
-        dates = institutional_holdings_data.get_available_report_dates()
-        return jsonify({
-            'status': 'success',
-            'data': dates
-        })
+        payload = response_cache.get(
+            'holdings_report_dates', institutional_holdings_data.data_version(),
+            lambda: {
+                'status': 'success',
+                'data': institutional_holdings_data.get_available_report_dates()
+            }
+        )
+        return payload_response(payload)
     except Exception as e:
         logger.error(f"获取可用报告期失败: {e}")
         return jsonify({
@@ -368,13 +495,16 @@ def get_institutional_holdings_data(category):
                     'message': '报告期格式错误，应为整数格式如20240930'
                 }), 400
         
-        data = institutional_holdings_data.get_top_holdings(category, report_date=report_date)
-        return jsonify({
-            'status': 'success',
-            'data': data,
-            'category': category,
-            'report_date': report_date
-        })
+        payload = response_cache.get(
+            ('holdings_top', category, report_date), institutional_holdings_data.data_version(),
+            lambda: {
+                'status': 'success',
+                'data': institutional_holdings_data.get_top_holdings(category, report_date=report_date),
+                'category': category,
+                'report_date': report_date
+            }
+        )
+        return payload_response(payload)
     except Exception as e:
         logger.error(f"获取机构持股数据失败: {e}")
         return jsonify({
@@ -385,15 +515,30 @@ def get_institutional_holdings_data(category):
 # API路由 - 机构持股趋势数据
 @app.route('/api/institutional_holdings/<category>/<stock_code>/trend')
 def api_institutional_holdings_trend(category, stock_code):
-    """获取机构持股趋势数据API"""
+    """获取机构持股趋势数据API（可选参数 start、end、max_points）"""
     try:
-        data = institutional_holdings_data.get_stock_trend(category, stock_code)
-        return jsonify({
+        args = series_args()
+        # 没有真实数据的股票使用按当天日期生成的模拟趋势，版本中包含日期
+        version = institutional_holdings_data.data_version()
+        if version is not None:
+            version = (version, date.today().isoformat())
+        key = ('holdings_trend', category, stock_code)
+        build = lambda: {
             'status': 'success',
-            'data': data,
+            'data': institutional_holdings_data.get_stock_trend(category, stock_code),
             'category': category,
             'stock_code': stock_code
-        })
+        }
+        if args is None:
+            payload = response_cache.get(key, version, build)
+        else:
+            payload = response_cache.get(
+                key + args, version,
+                lambda: downsample_series(build(), HOLDINGS_TREND_SERIES, key, version, args)
+            )
+        return payload_response(payload)
+    except ValueError as e:
+        return series_error_response(e)
     except Exception as e:
         app.logger.error(f"获取机构持股趋势数据出错: {e}")
         return jsonify({
@@ -406,12 +551,15 @@ def api_institutional_holdings_trend(category, stock_code):
 def api_stock_holdings_detail(stock_code):
     """获取个股详细持股信息API - 展示各个报告期和不同机构的持股情况"""
     try:
-        data = institutional_holdings_data.get_stock_holdings_detail(stock_code)
-        return jsonify({
-            'status': 'success',
-            'data': data,
-            'stock_code': stock_code
-        })
+        payload = response_cache.get(
+            ('holdings_detail', stock_code), institutional_holdings_data.data_version(),
+            lambda: {
+                'status': 'success',
+                'data': institutional_holdings_data.get_stock_holdings_detail(stock_code),
+                'stock_code': stock_code
+            }
+        )
+        return payload_response(payload)
     except Exception as e:
         app.logger.error(f"获取个股详细持股信息出错: {e}")
         return jsonify({
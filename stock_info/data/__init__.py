@@ -7,9 +7,17 @@ from .institutional_holdings import InstitutionalHoldingsData
 
 from .hkstock_finance import get_hkstock_finance
 from .macro_data import fetch_macro_china_money_supply
+from .refresh_scheduler import RefreshScheduler, create_refresh_scheduler
+from .shared_store import SharedStore, open_shared_store
 
 # 创建机构持股数据实例
 institutional_holdings_data = InstitutionalHoldingsData()
 
+# 多进程共享存储（由 serve.py 通过环境变量启用，单进程运行时为None）
+shared_store = open_shared_store()
+
+# 后台刷新调度器（由 app 启动）
+refresh_scheduler = create_refresh_scheduler(shared_store=shared_store)
+
 # 版本信息
 __version__ = '1.0.0'
\ No newline at end of file
@@ -3,7 +3,10 @@
 """
 import os
 import json
+import pickle
 import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
 # 缓存目录路径
@@ -33,35 +36,100 @@ def ensure_cache_directories():
     if not os.path.exists(os.path.join(CACHE_DIR, 'outsource')):
         os.makedirs(os.path.join(CACHE_DIR, 'outsource'))
 
+# 进程内已解析的缓存文件（按最近使用淘汰）：{路径: ((修改时间ns, 文件大小), pickle后的数据)}
+# 保存pickle快照而不是对象本身：每次读取都得到独立的副本，且 pickle.loads 比重新解析JSON快
+DECODED_CACHE_MAXSIZE = 128
+_decoded_cache = OrderedDict()
+_decoded_lock = threading.Lock()
+
+def _remember_decoded(cache_file, signature, data):
+    """记录已解析的缓存文件，超过 DECODED_CACHE_MAXSIZE 时淘汰最久未使用的文件"""
+    snapshot = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    with _decoded_lock:
+        _decoded_cache[cache_file] = (signature, snapshot)
+        _decoded_cache.move_to_end(cache_file)
+        while len(_decoded_cache) > DECODED_CACHE_MAXSIZE:
+            _decoded_cache.popitem(last=False)
+
+def _file_signature(cache_file):
+    """缓存文件的 (修改时间ns, 文件大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(cache_file)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
 def read_cache(cache_file):
-    """读取缓存文件"""
-    if not os.path.exists(cache_file):
+    """
+    读取缓存文件
+    
+    文件未变化时复用进程内已解析的数据，返回其副本，调用方修改返回值不影响缓存。
+    
+    Args:
+        cache_file: 缓存文件路径
+        
+    Returns:
+        文件中的JSON数据，文件不存在或解析失败时返回None
+    """
+    signature = _file_signature(cache_file)
+    if signature is None:
         return None
     
+    with _decoded_lock:
+        cached = _decoded_cache.get(cache_file)
+        if cached is not None and cached[0] == signature:
+            _decoded_cache.move_to_end(cache_file)
+    if cached is not None and cached[0] == signature:
+        return pickle.loads(cached[1])
+    
     try:
         with open(cache_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            data = json.load(f)
     except Exception as e:
         print(f"读取缓存文件出错: {e}")
         return None
+    _remember_decoded(cache_file, signature, data)
+    return data
 
-def save_cache(cache_file, data):
-    """保存数据到缓存文件"""
+def write_cache(cache_file, data):
+    """
+    原样写入缓存文件（紧凑JSON）
+    
+    先写入临时文件再替换，其他进程/线程不会读到写了一半的文件。
+    
+    Args:
+        cache_file: 缓存文件路径
+        data: 可JSON序列化的数据
+    """
     try:
-        # 确保缓存目录存在
-        cache_dir = os.path.dirname(cache_file)
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-            
-        cache_data = {
-            'data': data,
-            'timestamp': time.time()
-        }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, cache_file)
+        _remember_decoded(cache_file, _file_signature(cache_file), data)
     except Exception as e:
         print(f"保存缓存文件出错: {e}")
 
+def save_cache(cache_file, data):
+    """保存数据到缓存文件（附带写入时间戳，配合 is_cache_expired 使用）"""
+    write_cache(cache_file, {
+        'data': data,
+        'timestamp': time.time()
+    })
+
+def cache_age(cache_file):
+    """
+    缓存文件距上次写入的秒数
+    
+    Returns:
+        float: 秒数，文件不存在时返回None
+    """
+    try:
+        return time.time() - os.path.getmtime(cache_file)
+    except OSError:
+        return None
+
 def is_cache_expired(timestamp, hours=24):
     """
     检查缓存是否已过期
@@ -0,0 +1,158 @@
+"""
+数据源并发获取模块 - 同一请求中相互独立的akshare调用在共享的有界线程池中并发执行
+
+- 每个数据源调用以 (数据源, 参数) 为键提交，同一键正在获取时复用该任务，成功结果保留一段时间供后续请求复用
+- gather 按超时等待一组任务，返回已完成的结果和仍在获取的任务，调用方可先返回部分结果
+- 超时的任务不会被取消，在后台继续执行；when_done 在全部完成后回调（用于补全缓存）
+- akshare 调用无法设置超时，也无法中断：某个数据源有调用运行超过 stuck_after 秒时视为卡住，
+  在它返回之前该数据源的新调用直接以 TimeoutError 失败，不再占用工作线程
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class FetchPool:
+    """数据源调用线程池"""
+
+    def __init__(self, max_workers=8, keep_results=600, stuck_after=120):
+        """
+        Args:
+            max_workers: 同时进行的数据源调用数量上限
+            keep_results: 成功结果保留多少秒供相同调用复用
+            stuck_after: 调用运行超过多少秒视为卡住，之后同一数据源的新调用直接失败
+        """
+        self.keep_results = keep_results
+        self.stuck_after = stuck_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='source-fetch')
+        # {键: (Future, 完成时间)}，未完成时完成时间为None
+        self._tasks = {}
+        # {键: 开始执行时间}，只包含正在工作线程中执行的调用
+        self._started = {}
+        # 已登记完成回调的键，避免同一份数据被多个请求重复补全
+        self._completions = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        提交数据源调用，相同键正在获取或结果仍在保留期内时直接返回已有任务
+
+        Args:
+            key: 调用标识，如 ('ths_debt', '600519')
+            fn: 调用的函数
+
+        Returns:
+            Future: 结果为 fn 的返回值；数据源有卡住的调用时为已失败（TimeoutError）的 Future
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            task = self._tasks.get(key)
+            if task is not None:
+                return task[0]
+            stuck = self._stuck_call(key[0], now)
+            if stuck is not None:
+                future = Future()
+                future.set_exception(TimeoutError(
+                    f"数据源 {key[0]} 的调用 {stuck} 超过{self.stuck_after}秒未返回，暂停提交新调用"))
+                return future
+            future = self._executor.submit(self._run, key, fn, args, kwargs)
+            self._tasks[key] = (future, None)
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def gather(self, futures, timeout):
+        """
+        等待一组任务，最多等待 timeout 秒
+
+        Args:
+            futures: {名称: Future}
+            timeout: 最长等待时间（秒），所有任务共享同一截止时间
+
+        Returns:
+            tuple: (已完成的结果 {名称: 结果}, 失败的任务 {名称: 异常}, 仍在获取的任务 {名称: Future})
+        """
+        wait(list(futures.values()), timeout=timeout)
+        results, errors, pending = {}, {}, {}
+        for name, future in futures.items():
+            if not future.done():
+                pending[name] = future
+            elif future.exception() is not None:
+                errors[name] = future.exception()
+            else:
+                results[name] = future.result()
+        return results, errors, pending
+
+    def when_done(self, key, futures, callback):
+        """
+        所有任务完成后调用 callback()（在最后完成的任务线程中执行），同一键只登记一次
+
+        Args:
+            key: 回调标识，如 ('stock_finance', '600519')
+            futures: Future 列表
+            callback: 无参数回调
+        """
+        futures = list(futures)
+        with self._lock:
+            if key in self._completions:
+                return
+            self._completions.add(key)
+        remaining = [len(futures)]
+        counter_lock = threading.Lock()
+
+        def _on_done(_):
+            with counter_lock:
+                remaining[0] -= 1
+                if remaining[0] != 0:
+                    return
+            with self._lock:
+                self._completions.discard(key)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"后台补全 {key} 失败: {e}")
+
+        for future in futures:
+            future.add_done_callback(_on_done)
+
+    def _run(self, key, fn, args, kwargs):
+        """在工作线程中执行调用，并记录开始时间用于判断是否卡住"""
+        with self._lock:
+            self._started[key] = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._started.pop(key, None)
+
+    def _stuck_call(self, source, now):
+        """返回该数据源中运行超过 stuck_after 秒的调用键，没有时返回None"""
+        for key, started_at in self._started.items():
+            if key[0] == source and now - started_at > self.stuck_after:
+                logger.warning(f"数据源调用 {key} 已运行 {now - started_at:.0f} 秒未返回")
+                return key
+        return None
+
+    def _finished(self, key, future):
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None or task[0] is not future:
+                return
+            if future.cancelled() or future.exception() is not None:
+                # 失败的调用不保留，下次请求重新获取
+                del self._tasks[key]
+            else:
+                self._tasks[key] = (future, time.time())
+
+    def _prune(self, now):
+        expired = [key for key, (_, finished_at) in self._tasks.items()
+                   if finished_at is not None and now - finished_at > self.keep_results]
+        for key in expired:
+            del self._tasks[key]
+
+
+# 各数据模块共享的线程池
+fetch_pool = FetchPool()
@@ -9,25 +9,34 @@ import urllib3
 import akshare as ak
 import pandas as pd
 from datetime import datetime, timedelta
-from .cache_utils import CACHE_DIR, ensure_cache_directories
+from .cache_utils import CACHE_DIR, ensure_cache_directories, read_cache, write_cache, cache_age
 
-def get_hkstock_data():
-    """获取港股通(南向资金)数据"""
+# 缓存文件路径
+SOUTHBOUND_CACHE_FILE = os.path.join(CACHE_DIR, 'hkstock', 'southbound_flow.json')
+US_INTEREST_RATE_CACHE_FILE = os.path.join(CACHE_DIR, 'hkstock', 'us_interest_rate.json')
+HSI_HISTORICAL_CACHE_FILE = os.path.join(CACHE_DIR, 'hkstock', 'hsi_historical.json')
+
+def get_hkstock_data(force_refresh=False):
+    """
+    获取港股通(南向资金)数据
+    
+    Args:
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
+    """
     # 确保缓存目录存在
     ensure_cache_directories()
     
     # 设置缓存文件路径
-    cache_file = os.path.join(CACHE_DIR, 'hkstock', 'southbound_flow.json')
+    cache_file = SOUTHBOUND_CACHE_FILE
     os.makedirs(os.path.dirname(cache_file), exist_ok=True)
     
     # 检查缓存文件是否存在且未过期
-    if os.path.exists(cache_file):
-        file_time = os.path.getmtime(cache_file)
-        current_time = time.time()
-        # 如果文件存在且未超过4小时，直接返回缓存数据
-        if current_time - file_time < 4 * 60 * 60:  # 4小时 = 4 * 60 * 60秒
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+    age = None if force_refresh else cache_age(cache_file)
+    # 如果文件存在且未超过4小时，直接返回缓存数据
+    if age is not None and age < 4 * 60 * 60:  # 4小时 = 4 * 60 * 60秒
+        cached = read_cache(cache_file)
+        if cached is not None:
+            return cached
     
     try:
         # 使用akshare获取南向资金数据
@@ -70,17 +79,16 @@ def get_hkstock_data():
         }
         
         # 保存到缓存文件
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_cache(cache_file, result)
         
         return result
     
     except Exception as e:
         print(f"获取港股通数据失败: {e}")
         # 如果获取失败但缓存文件存在，返回缓存数据
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        cached = read_cache(cache_file)
+        if cached is not None:
+            return cached
         # 否则返回空数据
         return {
             'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -88,23 +96,27 @@ def get_hkstock_data():
 
         }
 
-def get_us_interest_rate_data():
-    """获取美国利率数据"""
+def get_us_interest_rate_data(force_refresh=False):
+    """
+    获取美国利率数据
+    
+    Args:
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
+    """
     # 确保缓存目录存在
     ensure_cache_directories()
     
     # 设置缓存文件路径
-    cache_file = os.path.join(CACHE_DIR, 'hkstock', 'us_interest_rate.json')
+    cache_file = US_INTEREST_RATE_CACHE_FILE
     os.makedirs(os.path.dirname(cache_file), exist_ok=True)
     
     # 检查缓存文件是否存在且未过期
-    if os.path.exists(cache_file):
-        file_time = os.path.getmtime(cache_file)
-        current_time = time.time()
-        # 如果文件存在且未超过24小时，直接返回缓存数据
-        if current_time - file_time < 24 * 60 * 60:  # 24小时
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+    age = None if force_refresh else cache_age(cache_file)
+    # 如果文件存在且未超过24小时，直接返回缓存数据
+    if age is not None and age < 24 * 60 * 60:  # 24小时
+        cached = read_cache(cache_file)
+        if cached is not None:
+            return cached
     
     try:
         # 使用akshare获取美国利率数据
@@ -133,40 +145,43 @@ def get_us_interest_rate_data():
         }
         
         # 保存到缓存文件
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_cache(cache_file, result)
         
         return result
     
     except Exception as e:
         print(f"获取美国利率数据失败: {e}")
         # 如果获取失败但缓存文件存在，返回缓存数据
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        cached = read_cache(cache_file)
+        if cached is not None:
+            return cached
         # 否则返回空数据
         return {
             'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'rate_data': []
         }
 
-def get_hsi_historical_data():
-    """获取恒生指数历史数据"""
+def get_hsi_historical_data(force_refresh=False):
+    """
+    获取恒生指数历史数据
+    
+    Args:
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
+    """
     # 确保缓存目录存在
     ensure_cache_directories()
     
     # 设置缓存文件路径
-    cache_file = os.path.join(CACHE_DIR, 'hkstock', 'hsi_historical.json')
+    cache_file = HSI_HISTORICAL_CACHE_FILE
     os.makedirs(os.path.dirname(cache_file), exist_ok=True)
     
     # 检查缓存文件是否存在且未过期
-    if os.path.exists(cache_file):
-        file_time = os.path.getmtime(cache_file)
-        current_time = time.time()
-        # 如果文件存在且未超过24小时，直接返回缓存数据
-        if current_time - file_time < 24 * 60 * 60:  # 24小时
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+    age = None if force_refresh else cache_age(cache_file)
+    # 如果文件存在且未超过24小时，直接返回缓存数据
+    if age is not None and age < 24 * 60 * 60:  # 24小时
+        cached = read_cache(cache_file)
+        if cached is not None:
+            return cached
     
     # 尝试多种方法获取数据
     max_retries = 3
@@ -217,8 +232,7 @@ def get_hsi_historical_data():
             }
             
             # 保存到缓存文件
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            write_cache(cache_file, result)
             
             print(f"成功获取恒生指数历史数据，共{len(hsi_data)}条记录")
             return result
@@ -264,8 +278,7 @@ def get_hsi_historical_data():
         }
         
         # 保存到缓存文件
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_cache(cache_file, result)
         
         print(f"使用新浪接口成功获取恒生指数历史数据，共{len(hsi_data)}条记录")
         return result
@@ -274,10 +287,10 @@ def get_hsi_historical_data():
         print(f"新浪接口也获取失败: {e}")
         
         # 如果获取失败但缓存文件存在，返回缓存数据
-        if os.path.exists(cache_file):
+        cached = read_cache(cache_file)
+        if cached is not None:
             print("使用缓存数据")
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return cached
         
         # 否则返回空数据
         print("返回空数据")
@@ -7,38 +7,100 @@ import time
 import akshare as ak
 import pandas as pd
 from datetime import datetime
-from .cache_utils import CACHE_DIR  # 确保导入CACHE_DIR
+from .cache_utils import CACHE_DIR, read_cache, save_cache, is_cache_expired
+from .fetch_pool import fetch_pool
 
-def get_hkstock_finance(stock_code):
-    """获取港股财务数据"""
+# 单次请求等待各数据源的最长时间（秒），超时的数据源在后台继续获取并补全缓存
+FETCH_TIMEOUT = 15
+
+# 报表名称: 接口 symbol 参数
+REPORT_SOURCES = {
+    'balance_sheet': '资产负债表',
+    'income_statement': '利润表',
+    'cash_flow': '现金流量表',
+}
+
+def hkstock_finance_cache_file(stock_code):
+    """港股财务数据缓存文件路径"""
+    return os.path.join(CACHE_DIR, 'hkstock_finance', f"{stock_code}_finance.json")
+
+def get_hkstock_finance(stock_code, timeout=FETCH_TIMEOUT):
+    """
+    获取港股财务数据
+    
+    三张报表并发获取，最多等待 timeout 秒；超时的报表不再等待，返回带 partial 标记的部分结果，
+    这些报表在后台获取完成后写入缓存。
+    
+    Args:
+        stock_code: 港股代码
+        timeout: 等待各报表的最长时间（秒）
+        
+    Returns:
+        dict: 港股财务数据
+    """
     # 确保股票代码格式正确（5位数字）
     stock_code = stock_code.zfill(5)
     
     # 检查缓存
-    # 修改缓存路径，使用CACHE_DIR常量
     cache_dir = os.path.join(CACHE_DIR, 'hkstock_finance')
     os.makedirs(cache_dir, exist_ok=True)
-    cache_file = os.path.join(cache_dir, f"{stock_code}_finance.json")
+    cache_file = hkstock_finance_cache_file(stock_code)
     
     # 如果缓存存在且未过期（24小时内），则使用缓存
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
+    cache_data = read_cache(cache_file)
+    if cache_data and not is_cache_expired(cache_data.get('timestamp', 0)):
+        return cache_data['data']
+    
+    futures = {
+        name: fetch_pool.submit(('hk_report', stock_code, symbol), ak.stock_financial_hk_report_em,
+                                stock=stock_code, symbol=symbol, indicator="年度")
+        for name, symbol in REPORT_SOURCES.items()
+    }
+    results, errors, pending = fetch_pool.gather(futures, timeout)
+    if errors:
+        name, error = next(iter(errors.items()))
+        print(f"获取港股财务数据出错（{REPORT_SOURCES[name]}）: {error}")
+        raise Exception(f"获取港股财务数据失败: {error}")
+    
+    if pending:
+        print(f"港股{stock_code}的报表 {[REPORT_SOURCES[name] for name in pending]} 超过{timeout}秒未返回，先返回部分结果")
+        fetch_pool.when_done(('hkstock_finance', stock_code), futures.values(),
+                             lambda: _complete_hkstock_finance(stock_code, futures))
+        return _build_hkstock_finance(stock_code, results, pending)
+    
+    result = _build_hkstock_finance(stock_code, results)
+    
+    # 缓存结果
+    save_cache(cache_file, result)
+    
+    return result
+
+def _complete_hkstock_finance(stock_code, futures):
+    """后台报表全部获取完成后组装完整数据并写入缓存"""
+    results, errors, pending = fetch_pool.gather(futures, 0)
+    if errors or pending:
+        return
+    save_cache(hkstock_finance_cache_file(stock_code), _build_hkstock_finance(stock_code, results))
+    print(f"港股{stock_code}财务数据已在后台补全")
+
+def _build_hkstock_finance(stock_code, reports, pending=()):
+    """
+    组装港股财务数据
+    
+    Args:
+        stock_code: 港股代码
+        reports: 已获取的报表 {'balance_sheet', 'income_statement', 'cash_flow'}，仍在获取的报表按空表处理
+        pending: 仍在获取的报表名称
         
-        # 检查缓存是否过期（24小时）
-        if time.time() - cache_data.get('timestamp', 0) < 86400:
-            return cache_data['data']
+    Returns:
+        dict: 包含概览数据和完整财务报表数据的字典，有报表未返回时带 partial 标记
+    """
+    empty_report = pd.DataFrame(columns=['REPORT_DATE', 'STD_ITEM_NAME', 'AMOUNT'])
+    balance_sheet_df = reports.get('balance_sheet', empty_report)
+    income_statement_df = reports.get('income_statement', empty_report)
+    cash_flow_df = reports.get('cash_flow', empty_report)
     
     try:
-        # 获取资产负债表数据
-        balance_sheet_df = ak.stock_financial_hk_report_em(stock=stock_code, symbol="资产负债表", indicator="年度")
-        
-        # 获取利润表数据
-        income_statement_df = ak.stock_financial_hk_report_em(stock=stock_code, symbol="利润表", indicator="年度")
-        
-        # 获取现金流量表数据
-        cash_flow_df = ak.stock_financial_hk_report_em(stock=stock_code, symbol="现金流量表", indicator="年度")
-        
         # 保留原始数据用于完整展示
         balance_sheet_original = balance_sheet_df.copy()
         income_statement_original = income_statement_df.copy()
@@ -183,18 +245,17 @@ def get_hkstock_finance(stock_code):
             else:
                 return obj
         
-        # 清理结果中的NaN值
-        result = clean_nan_values(result)
+        if pending:
+            # 部分报表仍在获取，结果不写入缓存
+            result['partial'] = True
+            result['pending_sources'] = sorted(pending)
         
-        # 缓存结果
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump({"data": result, "timestamp": time.time()}, f, ensure_ascii=False, indent=2)
-        
-        return result
+        # 清理结果中的NaN值
+        return clean_nan_values(result)
     
     except Exception as e:
         print(f"获取港股财务数据出错: {e}")
         # 添加更详细的错误日志
         import traceback
         print(traceback.format_exc())
-        raise Exception(f"获取港股财务数据失败: {e}")
\ No newline at end of file
+        raise Exception(f"获取港股财务数据失败: {e}")
@@ -0,0 +1,339 @@
+"""
+机构持股常驻数据表 - 合并持股文件只解析一次，按股票代码和报告期建立索引
+
+- 读取时只保留用到的列并统一为规范列名和类型（股票代码为字符串，报告期为整数，比例为浮点数）
+- 行按 (股票代码, 报告期) 稳定排序，预先计算每只股票的行区间，单只股票的明细/趋势只访问该股票的行
+- 每个 (类别, 报告期) 的前N名在加载时一次算好
+- ResidentHoldingsTable 在每次访问时比较文件修改时间，文件被重新生成后自动重新加载
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 持股比例的取值优先级：占流通股比例 > 占总股本比例 > 持股比例 > holding_ratio
+RATIO_COLUMNS = ('占流通股比例', '占总股本比例', '持股比例', 'holding_ratio')
+# 趋势和按机构类型汇总只使用前两种比例
+TREND_RATIO_COLUMNS = ('占流通股比例', '占总股本比例')
+CODE_COLUMNS = ('股票代码', 'stock_code')
+NAME_COLUMNS = ('股票名称', '股票简称', 'stock_name')
+TYPE_COLUMNS = ('institution_type', '机构类型')
+COUNT_COLUMNS = ('持有基金家数', 'holding_count')
+VALUE_COLUMNS = ('持股市值', 'market_value')
+USED_COLUMNS = set(RATIO_COLUMNS + CODE_COLUMNS + NAME_COLUMNS + TYPE_COLUMNS + COUNT_COLUMNS
+                   + VALUE_COLUMNS + ('report_date',))
+
+# 明细和趋势中按机构类型筛选使用的关键字
+INSTITUTION_TYPES = ('基金', '保险', 'QFII', '社保')
+CATEGORY_TYPES = {
+    'fund': '基金',
+    'insurance': '保险',
+    'qfii': 'QFII',
+    'social-security': '社保'
+}
+CATEGORIES = ('all', 'fund', 'insurance', 'qfii', 'social-security')
+
+
+def top_count_for(category):
+    """全部机构显示前30名，其他类别显示前10名"""
+    return 30 if category == 'all' else 10
+
+
+def _first_column(df, names, default=''):
+    """返回第一个存在的列，都不存在时返回常数列"""
+    for name in names:
+        if name in df.columns:
+            return df[name]
+    return pd.Series(default, index=df.index)
+
+
+def _ratio_column(df, names):
+    """按优先级取第一个非空的比例值，都为空时为0"""
+    ratio = pd.Series(np.nan, index=df.index)
+    for name in names:
+        if name in df.columns:
+            ratio = ratio.fillna(pd.to_numeric(df[name], errors='coerce'))
+    return ratio.fillna(0.0).astype('float64')
+
+
+def _classify(institution_type):
+    """按机构类型字符串划分类别（与逐行判断的优先级一致：基金 > 保险 > QFII > 社保）"""
+    lower = institution_type.str.lower()
+    conditions = [
+        institution_type.str.contains('基金', regex=False) | lower.str.contains('fund', regex=False),
+        institution_type.str.contains('保险', regex=False) | lower.str.contains('insurance', regex=False),
+        lower.str.contains('qfii', regex=False),
+        institution_type.str.contains('社保', regex=False) | lower.str.contains('social', regex=False),
+    ]
+    return pd.Series(np.select(conditions, list(CATEGORY_TYPES), default=''), index=institution_type.index)
+
+
+class HoldingsTable:
+    """某一时刻合并持股文件的只读快照"""
+
+    def __init__(self, raw_df, mtime=None):
+        """
+        Args:
+            raw_df: 合并持股文件的原始DataFrame（保持文件行序）
+            mtime: 数据文件的修改时间
+        """
+        self.mtime = mtime
+        df = self._normalize(raw_df)
+        # 前N名在文件行序上计算，持股比例相同时的先后顺序与逐行处理一致
+        self._top = self._build_top_holdings(df)
+        self.report_dates = sorted((int(d) for d in df['report_date'].unique()), reverse=True)
+
+        df = df.sort_values(['stock_code', 'report_date'], kind='mergesort').reset_index(drop=True)
+        codes = df['stock_code'].to_numpy()
+        if len(codes):
+            starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+            ends = np.append(starts[1:], len(codes))
+            self._offsets = {codes[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+        else:
+            self._offsets = {}
+        self.df = df
+        logger.info(f"机构持股常驻表加载完成: {len(df)} 行, {len(self._offsets)} 只股票, "
+                    f"{len(self.report_dates)} 个报告期")
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """从合并持股文件创建快照"""
+        mtime = os.path.getmtime(file_path)
+        raw_df = pd.read_csv(file_path, encoding='utf-8', usecols=lambda c: c in USED_COLUMNS,
+                             dtype={'股票代码': str, 'stock_code': str})
+        logger.info(f"成功读取合并文件 {file_path}，包含 {len(raw_df)} 行数据")
+        return cls(raw_df, mtime)
+
+    @staticmethod
+    def _normalize(raw_df):
+        """统一为规范列名和类型"""
+        report_date = pd.to_numeric(raw_df['report_date'], errors='coerce')
+        raw_df = raw_df[report_date.notna()]
+        institution_type = _first_column(raw_df, TYPE_COLUMNS).astype(str)
+        df = pd.DataFrame({
+            'stock_code': _first_column(raw_df, CODE_COLUMNS).astype(str).str.strip(),
+            'stock_name': _first_column(raw_df, NAME_COLUMNS).astype(str),
+            'institution_type': institution_type,
+            'category': _classify(institution_type),
+            'report_date': report_date[report_date.notna()].astype('int64'),
+            'holding_ratio': _ratio_column(raw_df, RATIO_COLUMNS),
+            'trend_ratio': _ratio_column(raw_df, TREND_RATIO_COLUMNS),
+            'holding_count': pd.to_numeric(_first_column(raw_df, COUNT_COLUMNS, 0), errors='coerce')
+                .fillna(0).astype('int64'),
+            'market_value': pd.to_numeric(_first_column(raw_df, VALUE_COLUMNS, 0), errors='coerce')
+                .fillna(0.0).astype('float64'),
+        })
+        # 明细和趋势分别在两个机构类型列中查找关键字（institution_type 不区分大小写）
+        for inst_type in INSTITUTION_TYPES:
+            match = pd.Series(False, index=raw_df.index)
+            if 'institution_type' in raw_df.columns:
+                match |= raw_df['institution_type'].astype('string').str.contains(
+                    inst_type, case=False, regex=False).fillna(False).astype(bool)
+            if '机构类型' in raw_df.columns:
+                match |= raw_df['机构类型'].astype('string').str.contains(
+                    inst_type, regex=False).fillna(False).astype(bool)
+            df[f'match_{inst_type}'] = match
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def _build_top_holdings(df):
+        """
+        预计算每个 (类别, 报告期) 的前N名
+
+        Returns:
+            dict: {(类别, 报告期): [{'stock_code', 'stock_name', 'holding_ratio', 'report_date'}, ...]}
+        """
+        valid = df[(df['stock_code'] != '') & (df['stock_name'] != '') & (df['holding_ratio'] > 0)]
+        keys = ['report_date', 'stock_code', 'stock_name']
+        top = {}
+        for category in CATEGORIES:
+            if category == 'all':
+                # 全部机构：汇总每个股票的总持股比例
+                grouped = valid.groupby(keys, sort=False)['holding_ratio'].sum()
+            else:
+                # 其他类别：同一股票有多条记录时保留持股比例最高的
+                subset = valid[valid['category'] == category]
+                grouped = subset.groupby(keys, sort=False)['holding_ratio'].max()
+            ranked = grouped.reset_index().sort_values(['report_date', 'holding_ratio'],
+                                                        ascending=[True, False], kind='mergesort')
+            ranked = ranked.groupby('report_date', sort=False).head(top_count_for(category))
+            for report_date, rows in ranked.groupby('report_date', sort=False):
+                top[(category, int(report_date))] = [
+                    {
+                        'stock_code': code,
+                        'stock_name': name,
+                        'holding_ratio': float(ratio),
+                        'report_date': int(report_date)
+                    }
+                    for code, name, ratio in zip(rows['stock_code'], rows['stock_name'], rows['holding_ratio'])
+                ]
+        return top
+
+    @property
+    def latest_report_date(self):
+        return self.report_dates[0] if self.report_dates else None
+
+    def has_report_date(self, report_date):
+        return report_date in self.report_dates
+
+    def top_holdings(self, category, report_date=None):
+        """
+        获取指定类别、报告期的前N名
+
+        Args:
+            category: 类别
+            report_date: 报告期，为None时使用最新报告期
+
+        Returns:
+            list: 前N名记录（全部机构30名，其他类别10名）
+        """
+        if report_date is None:
+            report_date = self.latest_report_date
+        return list(self._top.get((category, int(report_date)), []))
+
+    def stock_rows(self, stock_code):
+        """获取指定股票的全部行（按报告期升序），未找到时返回None"""
+        offsets = self._offsets.get(str(stock_code).strip())
+        if offsets is None:
+            return None
+        return self.df.iloc[offsets[0]:offsets[1]]
+
+    def stock_detail(self, stock_code):
+        """
+        指定股票在各个报告期和不同机构的持股情况
+
+        Returns:
+            dict: {'stock_info', 'by_report_date', 'by_institution_type'}，未找到股票时返回None
+        """
+        rows = self.stock_rows(stock_code)
+        if rows is None:
+            return None
+        dates = rows['report_date'].to_numpy()
+        ratios = rows['holding_ratio'].to_numpy()
+        trend_ratios = rows['trend_ratio'].to_numpy()
+        types = rows['institution_type'].to_numpy()
+        counts = rows['holding_count'].to_numpy()
+        values = rows['market_value'].to_numpy()
+
+        detail_data = {
+            'stock_info': {
+                'stock_code': stock_code,
+                'stock_name': rows['stock_name'].iat[0]
+            },
+            'by_report_date': {},
+            'by_institution_type': {}
+        }
+
+        # 按报告期分组（行已按报告期排序，每个报告期是一段连续区间）
+        boundaries = np.flatnonzero(np.diff(dates)) + 1
+        spans = list(zip(np.concatenate(([0], boundaries)), np.append(boundaries, len(dates))))
+        for start, end in reversed(spans):
+            institutions = [
+                {
+                    'institution_type': str(types[i]),
+                    'holding_ratio': float(ratios[i]),
+                    'holding_count': int(counts[i]),
+                    'market_value': float(values[i])
+                }
+                for i in range(start, end) if ratios[i] > 0
+            ]
+            institutions.sort(key=lambda x: x['holding_ratio'], reverse=True)
+            detail_data['by_report_date'][str(int(dates[start]))] = institutions
+
+        # 按机构类型分组
+        for inst_type in INSTITUTION_TYPES:
+            match = rows[f'match_{inst_type}'].to_numpy()
+            if not match.any():
+                continue
+            periods = []
+            for start, end in reversed(spans):
+                period_match = match[start:end]
+                if not period_match.any():
+                    continue
+                total_ratio = float(trend_ratios[start:end][period_match].sum())
+                if total_ratio > 0:
+                    periods.append({
+                        'report_date': int(dates[start]),
+                        'holding_ratio': round(total_ratio, 2),
+                        'institution_count': int(period_match.sum())
+                    })
+            detail_data['by_institution_type'][inst_type] = periods
+
+        return detail_data
+
+    def stock_trend(self, category, stock_code):
+        """
+        指定股票按报告期汇总的持股比例趋势
+
+        Returns:
+            list: [{'date', 'holding_ratio', 'change_ratio'}, ...]（按报告期升序），没有数据时返回None
+        """
+        rows = self.stock_rows(stock_code)
+        if rows is None:
+            return None
+        if category in CATEGORY_TYPES:
+            rows = rows[rows[f'match_{CATEGORY_TYPES[category]}'].to_numpy()]
+        if rows.empty:
+            return None
+
+        totals = rows.groupby('report_date', sort=True)['trend_ratio'].sum()
+        trend_data = [
+            {
+                'date': str(int(report_date)),
+                'holding_ratio': round(float(total_ratio), 2),
+                'change_ratio': 0
+            }
+            for report_date, total_ratio in totals.items() if total_ratio > 0
+        ]
+
+        # 计算相对第一个报告期的变化比例
+        if len(trend_data) > 1:
+            base_ratio = trend_data[0]['holding_ratio']
+            for item in trend_data:
+                item['change_ratio'] = round((item['holding_ratio'] / base_ratio - 1) * 100, 2)
+
+        return trend_data if trend_data else None
+
+
+class ResidentHoldingsTable:
+    """常驻内存的机构持股表，文件修改时间变化时自动重新加载"""
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path: 合并持股数据文件路径
+        """
+        self.file_path = file_path
+        self._table = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        获取当前快照
+
+        Returns:
+            HoldingsTable: 数据文件不存在或加载失败时返回None
+        """
+        try:
+            mtime = os.path.getmtime(self.file_path)
+        except OSError:
+            return None
+        table = self._table
+        if table is not None and table.mtime == mtime:
+            return table
+        with self._lock:
+            # 等锁期间其他线程可能已经完成加载
+            table = self._table
+            if table is not None and table.mtime == mtime:
+                return table
+            try:
+                self._table = HoldingsTable.from_csv(self.file_path)
+            except Exception as e:
+                logger.error(f"加载机构持股常驻表失败: {e}")
+                # 保留上一份快照，避免文件写入过程中读取失败导致数据不可用
+                return table
+            return self._table
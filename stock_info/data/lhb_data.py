@@ -11,15 +11,18 @@ LHB_CACHE_DIR = os.path.join(CACHE_DIR, 'lhb')
 os.makedirs(LHB_CACHE_DIR, exist_ok=True)
 LHB_CACHE_FILE = os.path.join(LHB_CACHE_DIR, 'lhb_top1000_cache.json')
 
-def get_lhb_top10():
+def get_lhb_top10(force_refresh=False):
     """
     获取近三年龙虎榜出现次数前300的股票，使用缓存机制
     
+    Args:
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
+    
     Returns:
         dict: 包含龙虎榜前300股票的代码和出现次数
     """
     # 检查缓存是否存在且有效
-    cache_data = read_cache(LHB_CACHE_FILE)
+    cache_data = None if force_refresh else read_cache(LHB_CACHE_FILE)
     if cache_data and not is_cache_expired(cache_data.get('timestamp', 0)):
         print("使用缓存的龙虎榜数据")
         return cache_data.get('data')
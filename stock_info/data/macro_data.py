@@ -1,21 +1,123 @@
 """
 宏观经济数据模块 - 提供宏观经济数据相关的获取函数
+
+各数据源（货币供应量、沪深300、中证商品期货指数、滚动4Q净利润/TTM市盈率、商品价格指数、
+上海房价、自制房价指数、PMI）先各自整理为以月度 PeriodIndex 为索引的表，再按月份 join，
+"最近一次季度数据" 用 merge_asof 向后匹配，不再逐月扫描各数据源的全部键。
 """
 import os
 import json
 import time
 import akshare as ak
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from cache_utils import CACHE_DIR
+from cache_utils import CACHE_DIR, read_cache, write_cache, cache_age
+
+# 货币供应量缓存文件路径
+MONEY_SUPPLY_CACHE_FILE = os.path.join(CACHE_DIR, 'macro', 'money_supply.json')
+
+# 外部数据文件路径
+ROLLING_4Q_PROFIT_FILE = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\true_quarterly_analysis.json'
+COMMODITY_PRICE_INDEX_FILE = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\commodity_price_index.json'
+PMI_DATA_FILE = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\pmi_data.json'
+CUSTOM_HOUSE_PRICE_FILE = os.path.join(CACHE_DIR, 'outsource', 'shanghai_house_price_index.json')
+
+# 只输出2000年以后的数据
+START_MONTH = pd.Period('2000-01', freq='M')
+# 指数基准月份（2016.1=100）
+BASE_MONTH = pd.Period('2016-01', freq='M')
+# 2024年1月M1统计口径变更：当月环比记为0，指数沿用2023年12月的值，之后的月份按总量变化接续
+M1_CHANGE_MONTH = pd.Period('2024-01', freq='M')
+
+# 货币供应量：(输出列名, 接口列名, 列名关键字)
+MONEY_GROWTH_COLUMNS = [
+    ('货币和准货币_广义货币M2_同比', '货币和准货币(M2)-同比增长', 'M2'),
+    ('货币_狭义货币M1_同比', '货币(M1)-同比增长', 'M1'),
+    ('流通中现金_M0_同比', '流通中的现金(M0)-同比增长', 'M0'),
+]
+MONEY_TOTAL_COLUMNS = [
+    ('M2', '货币和准货币(M2)-数量(亿元)'),
+    ('M1', '货币(M1)-数量(亿元)'),
+    ('M0', '流通中的现金(M0)-数量(亿元)'),
+]
+HS300_COLUMNS = ['沪深300指数', '沪深300指数_同比', '沪深300指数_线性拟合', '沪深300指数_+90%', '沪深300指数_-90%']
+# 滚动4Q数据：净利润只在有真实季度数据的月份输出，市盈率按当月沪深300指数折算
+ROLLING_4Q_PROFIT_COLUMNS = ['滚动4Q净利润', '银行滚动4Q净利润', '非银行滚动4Q净利润']
+ROLLING_4Q_PE_COLUMNS = ['TTM市盈率', '银行TTM市盈率', '非银行TTM市盈率']
+# 上海房价：(输出列名, 接口列名)，同比/环比指数减去100转换为增长率
+HOUSE_PRICE_COLUMNS = [
+    ('上海新建商品住宅价格指数_同比', '新建商品住宅价格指数-同比'),
+    ('上海二手住宅价格指数_同比', '二手住宅价格指数-同比'),
+    ('上海新建商品住宅价格指数_环比', '新建商品住宅价格指数-环比'),
+    ('上海二手住宅价格指数_环比', '二手住宅价格指数-环比'),
+]
+HOUSE_INDEX_COLUMNS = [
+    ('上海新建商品住宅价格指数(2016.1=100)', '新建商品住宅价格指数-环比'),
+    ('上海二手住宅价格指数(2016.1=100)', '二手住宅价格指数-环比'),
+]
+PMI_COLUMNS = [
+    '新订单指数(%)',
+    '新出口订单指数(%)',
+    '工业生产者购进价格指数(2011年1月=100)',
+    '燃料、动力类购进价格指数(2011年1月=100)',
+]
 
-def fetch_macro_china_money_supply():
+
+def _to_months(values):
+    """
+    把日期字符串（'2025年07月份'、'2025-07'、'2025-07-31'、'2025.7' 等）解析为月度 PeriodIndex
+
+    Args:
+        values: 日期序列
+
+    Returns:
+        pd.PeriodIndex: 与输入逐项对应，无法解析的为 NaT
+    """
+    # 只解析不重复的日期字符串，再按编码展开
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype=object).astype(str))
+    parts = pd.Series(uniques, dtype=object).str.extract(r'(\d{4})\s*[年\-./]\s*(\d{1,2})')
+    dates = pd.to_datetime(pd.DataFrame({
+        'year': pd.to_numeric(parts[0]),
+        'month': pd.to_numeric(parts[1]),
+        'day': 1,
+    }), errors='coerce')
+    return pd.PeriodIndex(dates.dt.to_period('M')).take(codes)
+
+
+def _month_label(period):
+    """月度 Period 转换为输出使用的 'YYYY.M' 格式"""
+    return f"{period.year}.{period.month}"
+
+
+def _round2(values):
+    """逐项保留两位小数（使用内置round，与逐行计算的结果一致），缺失值保持缺失"""
+    return values.map(lambda v: v if pd.isna(v) else round(v, 2))
+
+
+def _numeric_column(df, column):
+    """把数据列转换为浮点数组，列不存在或无法转换的值为NaN"""
+    if column is None or column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def _last_per_month(frame):
+    """去掉无法解析月份的行，同一月份保留最后一行，按月份升序排列"""
+    frame = frame[frame.index.notna()]
+    return frame[~frame.index.duplicated(keep='last')].sort_index()
+
+
+def fetch_macro_china_money_supply(force_refresh=False):
     """
     获取中国货币供应量数据（仅2000年以后的数据）
-    
+
+    Args:
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
+
     Returns:
         dict: 包含货币供应量数据的字典，包括M2/M1/M0总量和增速，以及房价同比和环比数据
     """
@@ -23,697 +125,19 @@ def fetch_macro_china_money_supply():
         # 检查缓存
         cache_dir = os.path.join(CACHE_DIR, 'macro')
         os.makedirs(cache_dir, exist_ok=True)
-        cache_file = os.path.join(cache_dir, 'money_supply.json')
-        
+        cache_file = MONEY_SUPPLY_CACHE_FILE
+
         # 检查缓存是否存在且在2小时内
-        if os.path.exists(cache_file):
-            file_time = os.path.getmtime(cache_file)
-            current_time = datetime.now().timestamp()
-            # 如果缓存文件在2小时内，直接返回缓存数据
-            if current_time - file_time < 2 * 60 * 60:
-                try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        if content:  # 检查文件是否为空
-                            return json.loads(content)
-                        else:
-                            print(f"缓存文件为空，将重新获取数据: {cache_file}")
-                except (json.JSONDecodeError, Exception) as e:
-                    print(f"读取缓存文件失败: {e}，将重新获取数据")
-        
-        # 获取货币供应量数据（统一接口包含所有数据）
+        age = None if force_refresh else cache_age(cache_file)
+        if age is not None and age < 2 * 60 * 60:
+            # 如果缓存文件在2小时内，直接返回缓存数据（文件为空或损坏时重新获取）
+            cached = read_cache(cache_file)
+            if cached:
+                return cached
+            print(f"缓存文件为空或无法解析，将重新获取数据: {cache_file}")
+
+        # 获取货币供应量数据（统一接口包含增速和总量）
         money_supply_df = ak.macro_china_money_supply()
-        
-        # 使用同一个DataFrame，因为新接口包含了所有数据
-        money_supply_total_df = money_supply_df.copy()
-        
-        # 根据实际列名确定日期列和数据列
-        # 尝试可能的日期列名
-        date_col = None
-        for possible_date_col in ['统计时间', '月份', '日期']:
-            if possible_date_col in money_supply_df.columns:
-                date_col = possible_date_col
-                break
-        
-        if date_col is None:
-            # 如果找不到预期的日期列，使用第一列作为日期列
-            date_col = money_supply_df.columns[0]
-        
-        # 根据新接口的列名设置增长率列名
-        m2_growth_col = '货币和准货币(M2)-同比增长'
-        m1_growth_col = '货币(M1)-同比增长'
-        m0_growth_col = '流通中的现金(M0)-同比增长'
-        
-        # 验证列名是否存在，如果不存在则尝试查找
-        if m2_growth_col not in money_supply_df.columns:
-            for col in money_supply_df.columns:
-                if 'M2' in col and '同比' in col:
-                    m2_growth_col = col
-                    break
-        
-        if m1_growth_col not in money_supply_df.columns:
-            for col in money_supply_df.columns:
-                if 'M1' in col and '同比' in col:
-                    m1_growth_col = col
-                    break
-        
-        if m0_growth_col not in money_supply_df.columns:
-            for col in money_supply_df.columns:
-                if 'M0' in col and '同比' in col:
-                    m0_growth_col = col
-                    break
-        
-        # 创建货币总量的映射字典
-        money_total_dict = {}
-        
-        # 确定货币总量数据的列名
-        total_date_col = None
-        for possible_date_col in ['统计时间', '月份', '日期']:
-            if possible_date_col in money_supply_total_df.columns:
-                total_date_col = possible_date_col
-                break
-        
-        if total_date_col is None:
-            # 如果找不到预期的日期列，使用第一列作为日期列
-            total_date_col = money_supply_total_df.columns[0]
-        
-        # 确定总量数据的列名
-        m2_total_col = '货币和准货币(M2)-数量(亿元)'
-        m1_total_col = '货币(M1)-数量(亿元)'
-        m0_total_col = '流通中的现金(M0)-数量(亿元)'
-        
-        # 处理货币总量数据，并准备计算环比数据
-        # 首先将数据按日期排序
-        money_supply_total_df['sort_date'] = money_supply_total_df[total_date_col].astype(str)
-        money_supply_total_df = money_supply_total_df.sort_values(by='sort_date')
-        
-        # 创建一个列表来存储处理后的总量数据，以便计算环比
-        processed_total_data = []
-        
-        for _, row in money_supply_total_df.iterrows():
-            try:
-                date_str = str(row[total_date_col])
-                
-                # 将"2025年03月份"格式转换为"2025.3"格式
-                # 提取年份和月份
-                import re
-                match = re.search(r'(\d{4})年(\d{2})月', date_str)
-                if match:
-                    year = match.group(1)
-                    month = match.group(2).lstrip('0')  # 去掉前导零
-                    formatted_date = f"{year}.{month}"
-                else:
-                    # 如果无法匹配，保持原样
-                    formatted_date = date_str
-                
-                # 使用正确的列名获取总量数据
-                m2_total = None
-                m1_total = None
-                m0_total = None
-                
-                # 检查列是否存在并获取数据
-                if m2_total_col in money_supply_total_df.columns:
-                    m2_total = row[m2_total_col]
-                    if pd.isna(m2_total):
-                        m2_total = None
-                    else:
-                        try:
-                            m2_total = float(m2_total)
-                            m2_total = round(m2_total, 2)
-                        except (ValueError, TypeError):
-                            m2_total = None
-                
-                if m1_total_col in money_supply_total_df.columns:
-                    m1_total = row[m1_total_col]
-                    if pd.isna(m1_total):
-                        m1_total = None
-                    else:
-                        try:
-                            m1_total = float(m1_total)
-                            m1_total = round(m1_total, 2)
-                        except (ValueError, TypeError):
-                            m1_total = None
-                
-                if m0_total_col in money_supply_total_df.columns:
-                    m0_total = row[m0_total_col]
-                    if pd.isna(m0_total):
-                        m0_total = None
-                    else:
-                        try:
-                            m0_total = float(m0_total)
-                            m0_total = round(m0_total, 2)
-                        except (ValueError, TypeError):
-                            m0_total = None
-                
-                # 将处理后的数据添加到列表中
-                processed_total_data.append({
-                    'date': formatted_date,
-                    'M2总量(亿元)': m2_total,
-                    'M1总量(亿元)': m1_total,
-                    'M0总量(亿元)': m0_total
-                })
-                
-            except Exception as e:
-                print(f"处理货币总量数据行时出错: {e}")
-                continue
-        
-        # 计算环比数据
-        for i in range(1, len(processed_total_data)):
-            current = processed_total_data[i]
-            previous = processed_total_data[i-1]
-            
-            # 计算M2环比
-            if current['M2总量(亿元)'] is not None and previous['M2总量(亿元)'] is not None and previous['M2总量(亿元)'] != 0:
-                m2_mom = ((current['M2总量(亿元)'] - previous['M2总量(亿元)']) / previous['M2总量(亿元)']) * 100
-                current['M2总量环比(%)'] = round(m2_mom, 2)
-            else:
-                current['M2总量环比(%)'] = None
-            
-            # 计算M1环比
-            # 特殊处理2024年1月的M1环比值
-            current_date = current.get('date', '')
-            if current_date == '2024.1':
-                # 2024年1月M1计算方法变更，将环比值设为0
-                current['M1总量环比(%)'] = 0
-            elif current['M1总量(亿元)'] is not None and previous['M1总量(亿元)'] is not None and previous['M1总量(亿元)'] != 0:
-                m1_mom = ((current['M1总量(亿元)'] - previous['M1总量(亿元)']) / previous['M1总量(亿元)']) * 100
-                current['M1总量环比(%)'] = round(m1_mom, 2)
-            else:
-                current['M1总量环比(%)'] = None
-            
-            # 计算M0环比
-            if current['M0总量(亿元)'] is not None and previous['M0总量(亿元)'] is not None and previous['M0总量(亿元)'] != 0:
-                m0_mom = ((current['M0总量(亿元)'] - previous['M0总量(亿元)']) / previous['M0总量(亿元)']) * 100
-                current['M0总量环比(%)'] = round(m0_mom, 2)
-            else:
-                current['M0总量环比(%)'] = None
-        
-        # 第一个数据点没有前值，所以环比为None
-        if processed_total_data:
-            processed_total_data[0]['M2总量环比(%)'] = None
-            processed_total_data[0]['M1总量环比(%)'] = None
-            processed_total_data[0]['M0总量环比(%)'] = None
-        
-        # 将处理后的数据转换为字典，以日期为键
-        for item in processed_total_data:
-            date = item.pop('date')
-            money_total_dict[date] = item
-        
-        # 新增：计算从2016年1月开始的指数值
-        # 首先找到2016年1月的数据作为基准点
-        base_date = "2016.1"
-        base_data = None
-        
-        # 创建一个按日期排序的数据列表，用于计算指数
-        sorted_dates = []
-        for date_str in money_total_dict.keys():
-            try:
-                # 解析日期格式为年和月
-                if '.' in date_str:
-                    year, month = date_str.split('.')
-                    year = int(year)
-                    month = int(month)
-                    # 创建一个可排序的日期字符串 (YYYYMM格式)
-                    sort_key = f"{year:04d}{month:02d}"
-                    sorted_dates.append((sort_key, date_str))
-            except Exception as e:
-                print(f"解析日期 {date_str} 出错: {e}")
-                continue
-        
-        # 按日期排序
-        sorted_dates.sort()
-        sorted_date_strings = [date_tuple[1] for date_tuple in sorted_dates]
-        
-        # 查找基准日期
-        if base_date in money_total_dict:
-            base_data = money_total_dict[base_date]
-        else:
-            # 如果找不到精确的2016.1，尝试找最接近的日期
-            for date_str in sorted_date_strings:
-                if '.' in date_str:
-                    year, month = date_str.split('.')
-                    if int(year) == 2016 and int(month) == 1:
-                        base_date = date_str
-                        base_data = money_total_dict[date_str]
-                        break
-        
-        # 如果找到了基准日期，计算指数
-        if base_data:
-            # 获取基准值
-            base_m2 = base_data.get('M2总量(亿元)')
-            base_m1 = base_data.get('M1总量(亿元)')
-            base_m0 = base_data.get('M0总量(亿元)')
-            
-            # 为每个日期计算指数值
-            for date_str in sorted_date_strings:
-                if date_str in money_total_dict:
-                    current_data = money_total_dict[date_str]
-                    
-                    # 计算M2指数
-                    if base_m2 is not None and current_data.get('M2总量(亿元)') is not None:
-                        m2_index = (current_data['M2总量(亿元)'] / base_m2) * 100
-                        current_data['M2指数(2016.1=100)'] = round(m2_index, 2)
-                    else:
-                        current_data['M2指数(2016.1=100)'] = None
-                    
-                    # 特殊处理M1指数
-                    if date_str == '2023.12' and base_m1 is not None and current_data.get('M1总量(亿元)') is not None:
-                        # 记录2023年12月的M1指数值
-                        m1_index = (current_data['M1总量(亿元)'] / base_m1) * 100
-                        dec_2023_m1_index = round(m1_index, 2)
-                        current_data['M1指数(2016.1=100)'] = dec_2023_m1_index
-                    elif date_str == '2024.1':
-                        # 2024年1月的M1指数与2023年12月保持一致
-                        if dec_2023_m1_index is not None:
-                            current_data['M1指数(2016.1=100)'] = dec_2023_m1_index
-                        else:
-                            # 如果没有找到2023年12月的数据，仍然使用常规计算方法
-                            if base_m1 is not None and current_data.get('M1总量(亿元)') is not None:
-                                m1_index = (current_data['M1总量(亿元)'] / base_m1) * 100
-                                current_data['M1指数(2016.1=100)'] = round(m1_index, 2)
-                            else:
-                                current_data['M1指数(2016.1=100)'] = None
-                    elif date_str > '2024.1' and base_m1 is not None:
-                        # 2024年1月之后的月份，基于2024年1月的指数值和总量变化计算
-                        # 查找2024年1月的数据
-                        jan_2024_data = None
-                        for d in sorted_date_strings:
-                            if d == '2024.1' and d in money_total_dict:
-                                jan_2024_data = money_total_dict[d]
-                                break
-                        
-                        if jan_2024_data and 'M1指数(2016.1=100)' in jan_2024_data and jan_2024_data['M1指数(2016.1=100)'] is not None and jan_2024_data.get('M1总量(亿元)') is not None and current_data.get('M1总量(亿元)') is not None:
-                            # 基于2024年1月的指数和总量变化计算
-                            m1_index = jan_2024_data['M1指数(2016.1=100)'] * (current_data['M1总量(亿元)'] / jan_2024_data['M1总量(亿元)'])
-                            current_data['M1指数(2016.1=100)'] = round(m1_index, 2)
-                        else:
-                            # 如果没有找到2024年1月的数据，使用常规计算方法
-                            if current_data.get('M1总量(亿元)') is not None:
-                                m1_index = (current_data['M1总量(亿元)'] / base_m1) * 100
-                                current_data['M1指数(2016.1=100)'] = round(m1_index, 2)
-                            else:
-                                current_data['M1指数(2016.1=100)'] = None
-                    else:
-                        # 2024年1月之前的月份，使用常规计算方法
-                        if base_m1 is not None and current_data.get('M1总量(亿元)') is not None:
-                            m1_index = (current_data['M1总量(亿元)'] / base_m1) * 100
-                            current_data['M1指数(2016.1=100)'] = round(m1_index, 2)
-                        else:
-                            current_data['M1指数(2016.1=100)'] = None
-                    
-                    # 计算M0指数
-                    if base_m0 is not None and current_data.get('M0总量(亿元)') is not None:
-                        m0_index = (current_data['M0总量(亿元)'] / base_m0) * 100
-                        current_data['M0指数(2016.1=100)'] = round(m0_index, 2)
-                    else:
-                        current_data['M0指数(2016.1=100)'] = None
-        
-        
-        # 获取沪深300指数数据
-        hs300_dict = {}
-        try:
-            # 获取沪深300指数历史数据
-            hs300_df = ak.stock_zh_index_daily(symbol="sh000300")
-            
-            # 确保日期列是字符串类型
-            hs300_df['date'] = hs300_df['date'].astype(str)
-            
-            # 按日期排序
-            hs300_df = hs300_df.sort_values(by='date')
-            
-            # 处理沪深300数据，按月份聚合（取每月最后一个交易日的收盘价）
-            hs300_monthly = {}
-            hs300_monthly_dot = {}
-            
-            # 按月份分组，保留每月最后一个交易日的数据
-            for _, row in hs300_df.iterrows():
-                date_str = row['date']
-                close_price = float(row['close'])
-                
-                # 提取年月
-                if len(date_str) >= 7:  # 格式如 "2023-01-01"
-                    year_month = date_str[:7]  # "2023-01"
-                    year, month = year_month.split('-')
-                    month = month.lstrip('0')  # 去掉前导零
-                    year_month_dot = f"{year}.{month}"  # "2023.1"
-                    
-                    # 由于数据是按日期排序的，后面的日期会覆盖前面的，这样就能得到每月最后一个交易日的数据
-                    hs300_monthly[year_month] = close_price
-                    hs300_monthly_dot[year_month_dot] = close_price
-            
-            # 合并两个字典
-            hs300_monthly.update(hs300_monthly_dot)
-            
-            # 计算沪深300指数的同比增长率
-            sorted_months = sorted(hs300_monthly.keys())
-            for month_key in sorted_months:
-                if '.' in month_key:  # 只处理点格式的键
-                    year, month = month_key.split('.')
-                    current_year = int(year)
-                    current_month = int(month)
-                    
-                    # 计算去年同期的键
-                    prev_year = current_year - 1
-                    prev_month_key = f"{prev_year}.{month}"
-                    
-                    if prev_month_key in hs300_monthly:
-                        current_price = hs300_monthly[month_key]
-                        prev_price = hs300_monthly[prev_month_key]
-                        
-                        if prev_price != 0:
-                            yoy_growth = ((current_price - prev_price) / prev_price) * 100
-                            hs300_dict[month_key] = {
-                                '沪深300指数': current_price,
-                                '沪深300指数_同比': round(yoy_growth, 2)
-                            }
-                        else:
-                            hs300_dict[month_key] = {
-                                '沪深300指数': current_price,
-                                '沪深300指数_同比': None
-                            }
-                    else:
-                        hs300_dict[month_key] = {
-                            '沪深300指数': hs300_monthly[month_key],
-                            '沪深300指数_同比': None
-                        }
-        
-        except Exception as e:
-            print(f"获取沪深300指数数据失败: {e}")
-            hs300_dict = {}
-        
-        # 计算沪深300指数的线性拟合（最小二乘法）并生成每月对应的拟合值
-        hs300_fit_dict = {}
-        hs300_band_upper_dict = {}
-        hs300_band_lower_dict = {}
-        try:
-            # 提取可用的(月份, 指数)并按时间排序
-            def _parse_month_key(k):
-                try:
-                    if '.' in k:
-                        y, m = k.split('.')
-                        return int(y), int(m)
-                    elif '-' in k:
-                        y, m = k.split('-')
-                        return int(y), int(m)
-                except Exception:
-                    pass
-                return (0, 0)
-
-            hs300_items = [(k, v.get('沪深300指数')) for k, v in hs300_dict.items() if v.get('沪深300指数') is not None]
-            hs300_items.sort(key=lambda x: _parse_month_key(x[0]))
-
-            if len(hs300_items) >= 2:
-                # 构造X（时间索引）与Y（指数值）
-                X = list(range(len(hs300_items)))
-                Y = [val for _, val in hs300_items]
-
-                # 计算均值
-                mean_x = sum(X) / len(X)
-                mean_y = sum(Y) / len(Y)
-
-                # 计算斜率b与截距a（最小二乘法）
-                numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(X, Y))
-                denominator = sum((x - mean_x) ** 2 for x in X) if sum((x - mean_x) ** 2 for x in X) != 0 else 1e-9
-                b = numerator / denominator
-                a = mean_y - b * mean_x
-
-                # 生成每月拟合值字典，并收集残差
-                residuals_abs = []
-                for idx, (month_key, price) in enumerate(hs300_items):
-                    fitted = a + b * idx
-                    hs300_fit_dict[month_key] = round(float(fitted), 2)
-                    try:
-                        residuals_abs.append(abs(float(price) - float(fitted)))
-                    except Exception:
-                        pass
-
-                # 计算使约90%点位位于上下带之间的对称距离（绝对残差的90分位）
-                if len(residuals_abs) >= 1:
-                    residuals_abs_sorted = sorted(residuals_abs)
-                    # 使用分位数索引法，选择0.90分位附近的元素
-                    p = 0.90
-                    idx_q = int(round((len(residuals_abs_sorted) - 1) * p))
-                    d = float(residuals_abs_sorted[max(0, min(len(residuals_abs_sorted) - 1, idx_q))])
-                    # 生成上/下平行带（与拟合线平行，距离相同）
-                    for idx, (month_key, _) in enumerate(hs300_items):
-                        fitted = a + b * idx
-                        hs300_band_upper_dict[month_key] = round(float(fitted + d), 2)
-                        hs300_band_lower_dict[month_key] = round(float(fitted - d), 2)
-                else:
-                    hs300_band_upper_dict = {}
-                    hs300_band_lower_dict = {}
-            else:
-                # 数据不足时不生成拟合
-                hs300_fit_dict = {}
-                hs300_band_upper_dict = {}
-                hs300_band_lower_dict = {}
-        except Exception as e:
-            print(f"计算沪深300指数线性拟合失败: {e}")
-            hs300_fit_dict = {}
-            hs300_band_upper_dict = {}
-            hs300_band_lower_dict = {}
-
-        # 获取中证商品期货指数数据
-        ccidx_dict = get_ccidx_futures_index()
-        
-        # 获取滚动4Q净利润和TTM市盈率数据
-        rolling_4q_dict = get_rolling_4q_profit_data()
-        print(f"DEBUG: 滚动4Q净利润和TTM市盈率数据获取成功，共{len(rolling_4q_dict)}条记录")
-        
-        # 获取商品价格指数数据
-        print("DEBUG: 开始获取商品价格指数数据...")
-        commodity_dict = get_commodity_price_index_data()
-        print(f"DEBUG: 商品价格指数数据获取完成，共{len(commodity_dict)}条记录")
-        if len(commodity_dict) > 0:
-            sample_keys = list(commodity_dict.keys())[:3]
-            print(f"DEBUG: 商品价格指数数据样本键: {sample_keys}")
-        else:
-            print("DEBUG: 警告 - 商品价格指数数据为空！")
-        
-        # 获取上海新房价格数据
-        house_price_dict = {}  # 初始化为空字典
-        try:
-            print("DEBUG: 开始获取上海房价数据...")
-            # 获取上海房价数据
-            house_price_df = ak.macro_china_new_house_price(city_first="上海")
-            print(f"DEBUG: 成功获取房价数据，共{len(house_price_df)}条记录")
-            
-            # 确保日期列是字符串类型
-            house_price_df['日期'] = house_price_df['日期'].astype(str)
-            print(f"DEBUG: 房价数据列名: {list(house_price_df.columns)}")
-            print(f"DEBUG: 房价数据前3行: {house_price_df.head(3).to_dict('records')}")
-            
-            # 创建日期到房价数据的映射
-            house_price_dict = {}
-            
-            # 按日期排序，用于计算环比数据
-            house_price_df = house_price_df.sort_values(by='日期')
-            
-            for _, row in house_price_df.iterrows():
-                date_str = row['日期']
-                
-                # 转换日期格式为 YYYY-MM 或 YYYY.MM
-                if '-' in date_str:
-                    # 如果日期格式为 "2023-01-01"，转换为 "2023-01"
-                    year_month = '-'.join(date_str.split('-')[:2])
-                    # 也创建 YYYY.MM 格式的键
-                    year, month = year_month.split('-')
-                    month = month.lstrip('0')  # 去掉前导零
-                    year_month_dot = f"{year}.{month}"
-                else:
-                    # 处理其他可能的格式
-                    year_month = date_str
-                    year_month_dot = date_str
-                
-                # 获取房价指数并转换为同比增长率（即减去100）：
-                new_house_price_yoy = float(row['新建商品住宅价格指数-同比']) if '新建商品住宅价格指数-同比' in row and not pd.isna(row['新建商品住宅价格指数-同比']) else None
-                second_house_price_yoy = float(row['二手住宅价格指数-同比']) if '二手住宅价格指数-同比' in row and not pd.isna(row['二手住宅价格指数-同比']) else None
-                
-                # 获取环比数据
-                new_house_price_mom = float(row['新建商品住宅价格指数-环比']) if '新建商品住宅价格指数-环比' in row and not pd.isna(row['新建商品住宅价格指数-环比']) else None
-                second_house_price_mom = float(row['二手住宅价格指数-环比']) if '二手住宅价格指数-环比' in row and not pd.isna(row['二手住宅价格指数-环比']) else None
-                
-                # 将指数转换为增长率（减去100）
-                if new_house_price_yoy is not None:
-                    new_house_price_yoy = round(new_house_price_yoy - 100, 2)
-                if second_house_price_yoy is not None:
-                    second_house_price_yoy = round(second_house_price_yoy - 100, 2)
-                
-                # 环比数据也需要减去100，转换为与同比相同的格式
-                if new_house_price_mom is not None:
-                    new_house_price_mom = round(new_house_price_mom - 100, 2)
-                if second_house_price_mom is not None:
-                    second_house_price_mom = round(second_house_price_mom - 100, 2)
-                
-                # 使用两种格式的日期作为键，确保能匹配到货币供应量数据
-                house_data = {
-                    '新建商品住宅价格指数_同比': new_house_price_yoy,
-                    '二手住宅价格指数_同比': second_house_price_yoy,
-                    '新建商品住宅价格指数_环比': new_house_price_mom,
-                    '二手住宅价格指数_环比': second_house_price_mom
-                }
-                
-                house_price_dict[year_month] = house_data
-                house_price_dict[year_month_dot] = house_data
-        
-        except Exception as e:
-            print(f"获取上海房价数据失败: {e}")
-            import traceback
-            print(f"详细错误信息: {traceback.format_exc()}")
-            house_price_dict = {}
-        
-        print(f"房价数据获取完成，house_price_dict长度: {len(house_price_dict)}")
-        if house_price_dict:
-            print(f"房价数据样本: {list(house_price_dict.items())[:3]}")
-
-        # 新增：计算上海住宅价格指数
-        # 找到基准日期（2016.1）的房价数据
-        base_house_price_data = None
-        for date_str in sorted_date_strings:
-            if date_str in house_price_dict and '.' in date_str:
-                year, month = date_str.split('.')
-                if int(year) == 2016 and int(month) == 1:
-                    base_date_house = date_str
-                    base_house_price_data = house_price_dict[date_str]
-                    break
-        
-        # 如果找不到2016.1的数据，使用最早的数据作为基准
-        if base_house_price_data is None and house_price_dict:
-            earliest_date = sorted_date_strings[0]
-            for date_str in sorted_date_strings:
-                if date_str in house_price_dict:
-                    earliest_date = date_str
-                    base_house_price_data = house_price_dict[date_str]
-                    break
-            print(f"未找到2016.1的房价数据，使用{earliest_date}作为基准")
-        
-        # 如果找到了基准日期的房价数据，计算指数
-        if base_house_price_data:
-            # 使用累积环比方法计算以2016.1=100为基准的指数
-            try:
-                house_price_df_full = ak.macro_china_new_house_price(city_first="上海")
-                house_price_df_full['日期'] = house_price_df_full['日期'].astype(str)
-                
-                # 按日期排序
-                house_price_df_full = house_price_df_full.sort_values(by='日期')
-                
-                # 找到2016年1月的数据作为基准
-                base_date = None
-                base_new_mom = None
-                base_second_mom = None
-                
-                for _, row in house_price_df_full.iterrows():
-                    date_str = row['日期']
-                    if '2016-01' in date_str:
-                        base_date = date_str
-                        base_new_mom = row.get('新建商品住宅价格指数-环比', 100.0)
-                        base_second_mom = row.get('二手住宅价格指数-环比', 100.0)
-                        break
-                
-                if base_date is None:
-                    print("警告：未找到2016年1月数据，无法计算基准指数")
-                else:
-                    print(f"DEBUG: 找到基准日期 {base_date}，开始计算累积指数")
-                    
-                    # 初始化累积指数
-                    new_house_index = 100.0  # 2016年1月设为100
-                    second_house_index = 100.0
-                    
-                    for _, row in house_price_df_full.iterrows():
-                        date_str = row['日期']
-                        
-                        # 转换日期格式
-                        if '-' in date_str:
-                            year_month = '-'.join(date_str.split('-')[:2])
-                            year, month = year_month.split('-')
-                            month = month.lstrip('0')
-                            year_month_dot = f"{year}.{month}"
-                        else:
-                            year_month_dot = date_str
-                            year_month = date_str.replace('.', '-')
-                        
-                        if date_str == base_date:
-                            # 2016年1月设为基准100
-                            calculated_new_index = 100.0
-                            calculated_second_index = 100.0
-                        elif date_str < base_date:
-                            # 2016年1月之前的数据，向前推算
-                            continue  # 暂时跳过，先处理2016年1月之后的数据
-                        else:
-                            # 2016年1月之后的数据，使用环比累积计算
-                            new_mom = row.get('新建商品住宅价格指数-环比')
-                            second_mom = row.get('二手住宅价格指数-环比')
-                            
-                            if new_mom is not None:
-                                new_house_index = new_house_index * (new_mom / 100.0)
-                                calculated_new_index = new_house_index
-                            else:
-                                calculated_new_index = None
-                                
-                            if second_mom is not None:
-                                second_house_index = second_house_index * (second_mom / 100.0)
-                                calculated_second_index = second_house_index
-                            else:
-                                calculated_second_index = None
-                        
-                        # 更新house_price_dict中的数据
-                        if year_month_dot in house_price_dict:
-                            house_price_dict[year_month_dot]['新建商品住宅价格指数(2016.1=100)'] = round(calculated_new_index, 2) if calculated_new_index is not None else None
-                            house_price_dict[year_month_dot]['二手住宅价格指数(2016.1=100)'] = round(calculated_second_index, 2) if calculated_second_index is not None else None
-                        
-                        if year_month in house_price_dict:
-                            house_price_dict[year_month]['新建商品住宅价格指数(2016.1=100)'] = round(calculated_new_index, 2) if calculated_new_index is not None else None
-                            house_price_dict[year_month]['二手住宅价格指数(2016.1=100)'] = round(calculated_second_index, 2) if calculated_second_index is not None else None
-                        
-                        print(f"DEBUG: 计算 {year_month_dot} 指数 - 新建: {calculated_new_index}, 二手: {calculated_second_index}")
-                        
-            except Exception as e:
-                print(f"计算房价指数失败: {e}")
-                import traceback
-                print(f"详细错误: {traceback.format_exc()}")
-
-        # 读取自制上海房价指数数据
-        custom_house_price_dict = {}
-        try:
-            # 构建JSON文件路径
-            json_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'outsource', 'shanghai_house_price_index.json')
-            print(f"DEBUG: 尝试读取自制房价指数文件: {json_file_path}")
-            
-            if os.path.exists(json_file_path):
-                with open(json_file_path, 'r', encoding='utf-8') as f:
-                    custom_house_data = json.load(f)
-                
-                print(f"DEBUG: 成功读取自制房价指数数据，基准期: {custom_house_data.get('base_period')}")
-                
-                # 处理数据，转换为与现有数据格式兼容的格式
-                for date_key, data_item in custom_house_data.get('data', {}).items():
-                    price_index = data_item.get('price_index')
-                    if price_index is not None:
-                        # 转换日期格式
-                        if '-' in date_key:
-                            # 格式如 "2016-01"
-                            year, month = date_key.split('-')
-                            month = month.lstrip('0') if month != '0' else '0'
-                            year_month_dot = f"{year}.{month}"
-                        else:
-                            year_month_dot = date_key
-                        
-                        # 存储自制房价指数数据
-                        custom_house_price_dict[year_month_dot] = price_index
-                        custom_house_price_dict[date_key] = price_index
-                
-                print(f"DEBUG: 自制房价指数数据处理完成，共{len(custom_house_price_dict)}条记录")
-                if custom_house_price_dict:
-                    sample_keys = list(custom_house_price_dict.keys())[:5]
-                    print(f"DEBUG: 自制房价指数数据样本: {[(k, custom_house_price_dict[k]) for k in sample_keys]}")
-            else:
-                print(f"WARNING: 自制房价指数文件不存在: {json_file_path}")
-        
-        except Exception as e:
-            print(f"读取自制房价指数数据失败: {e}")
-            import traceback
-            print(f"详细错误信息: {traceback.format_exc()}")
-            custom_house_price_dict = {}
 
         # 确保数据框不为空
         if money_supply_df.empty:
@@ -721,796 +145,46 @@ def fetch_macro_china_money_supply():
                 'status': 'error',
                 'message': '获取的数据为空'
             }
-        
-        # 转换为字典列表
-        data = []
-        
-        # 修改排序逻辑：先将日期转换为可比较的格式再排序
-        def convert_date_for_sorting(date_str):
-            # 处理格式如 "2023.9" 或 "2023-09"
-            if '.' in date_str:
-                year, month = date_str.split('.')
-                # 确保月份是两位数
-                month = month.zfill(2)
-                return f"{year}{month}"
-            elif '-' in date_str:
-                year, month = date_str.split('-')[:2]
-                return f"{year}{month}"
-            return date_str
-        
-        # 创建一个临时列用于排序
-        money_supply_df['sort_date'] = money_supply_df[date_col].astype(str).apply(convert_date_for_sorting)
-        # 按日期排序（从新到旧）
-        money_supply_df = money_supply_df.sort_values(by='sort_date', ascending=False)
-        
-        # 确定数据获取的起始月份：使用沪深300指数的最新月份作为截止点
-        end_year_month = None
-        if hs300_dict:
-            # 找到沪深300指数的最新月份
-            latest_hs300_date = max(hs300_dict.keys(), key=lambda x: (int(x.split('.')[0]), int(x.split('.')[1])))
-            end_year_month = latest_hs300_date
-            print(f"使用沪深300指数最新月份作为截止点: {end_year_month}")
-        else:
-            # 如果没有沪深300数据，默认获取所有数据
-            end_year_month = None
-            print("未找到沪深300指数数据，获取所有可用数据")
-        
-        # 解析截止年月
-        end_year = None
-        end_month = None
-        if end_year_month:
-            end_year, end_month = end_year_month.split('.')
-            end_year = int(end_year)
-            end_month = int(end_month)
-        
-        processed_rows = 0
-        matched_with_total = 0
-        
-        for _, row in money_supply_df.iterrows():
-            try:
-                date_str = str(row[date_col])
-                
-                # 处理日期格式
-                if '年' in date_str and '月' in date_str:
-                    # 处理格式如 "2025年07月份"
-                    import re
-                    match = re.search(r'(\d{4})年(\d{1,2})月', date_str)
-                    if match:
-                        year = int(match.group(1))
-                        month = int(match.group(2))
-                        formatted_date = f"{year}.{month}"
-                    else:
-                        continue
-                elif '-' in date_str:
-                    # 如果日期格式为 "2023-01"，转换为点格式
-                    year = int(date_str.split('-')[0])
-                    month = int(date_str.split('-')[1])
-                    formatted_date = f"{year}.{month}"
-                else:
-                    # 处理格式如 "2023.01" 或 "2023.1"
-                    formatted_date = date_str
-                    # 提取年份和月份
-                    year = int(formatted_date.split('.')[0])
-                    month = int(formatted_date.split('.')[1])
-                
-                # 只保留2000年以后且不超过沪深300指数最新月份的数据
-                if year < 2000:
-                    continue
-                
-                # 如果设置了截止月份，则过滤超出该月份的数据
-                if end_year is not None and end_month is not None:
-                    if year > end_year or (year == end_year and month > end_month):
-                        continue
-                
-                # 处理NaN值，将其转换为None，并保留两位小数
-                m2_growth = None
-                m1_growth = None
-                m0_growth = None
-                
-                if m2_growth_col and m2_growth_col in row.index:
-                    m2_growth = float(row[m2_growth_col]) if not pd.isna(row[m2_growth_col]) else None
-                
-                if m1_growth_col and m1_growth_col in row.index:
-                    m1_growth = float(row[m1_growth_col]) if not pd.isna(row[m1_growth_col]) else None
-                
-                if m0_growth_col and m0_growth_col in row.index:
-                    m0_growth = float(row[m0_growth_col]) if not pd.isna(row[m0_growth_col]) else None
-                
-                # 保留两位小数
-                if m2_growth is not None:
-                    m2_growth = round(m2_growth, 2)
-                if m1_growth is not None:
-                    m1_growth = round(m1_growth, 2)
-                if m0_growth is not None:
-                    m0_growth = round(m0_growth, 2)
-                
-                # 创建基本数据项
-                item = {
-                    '月份': formatted_date,
-                    '货币和准货币_广义货币M2_同比': m2_growth,
-                    '货币_狭义货币M1_同比': m1_growth,
-                    '流通中现金_M0_同比': m0_growth
-                }
-                
-                # 添加货币总量数据和环比数据（如果存在）
-                if formatted_date in money_total_dict:
-                    item['M2总量(亿元)'] = money_total_dict[formatted_date]['M2总量(亿元)']
-                    item['M1总量(亿元)'] = money_total_dict[formatted_date]['M1总量(亿元)']
-                    item['M0总量(亿元)'] = money_total_dict[formatted_date]['M0总量(亿元)']
-                    # 添加环比数据
-                    item['M2总量环比(%)'] = money_total_dict[formatted_date].get('M2总量环比(%)')
-                    item['M1总量环比(%)'] = money_total_dict[formatted_date].get('M1总量环比(%)')
-                    item['M0总量环比(%)'] = money_total_dict[formatted_date].get('M0总量环比(%)')
-                    # 添加指数数据
-                    item['M2指数(2016.1=100)'] = money_total_dict[formatted_date].get('M2指数(2016.1=100)')
-                    item['M1指数(2016.1=100)'] = money_total_dict[formatted_date].get('M1指数(2016.1=100)')
-                    item['M0指数(2016.1=100)'] = money_total_dict[formatted_date].get('M0指数(2016.1=100)')
-                    matched_with_total += 1
-                else:
-                    # 尝试其他可能的日期格式
-                    found = False
-                    for key in money_total_dict.keys():
-                        # 检查年份和月份是否匹配
-                        if '.' in formatted_date and '.' in key:
-                            if formatted_date.split('.')[0] == key.split('.')[0] and formatted_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                item['M2总量(亿元)'] = money_total_dict[key]['M2总量(亿元)']
-                                item['M1总量(亿元)'] = money_total_dict[key]['M1总量(亿元)']
-                                item['M0总量(亿元)'] = money_total_dict[key]['M0总量(亿元)']
-                                # 添加环比数据
-                                item['M2总量环比(%)'] = money_total_dict[key].get('M2总量环比(%)')
-                                item['M1总量环比(%)'] = money_total_dict[key].get('M1总量环比(%)')
-                                item['M0总量环比(%)'] = money_total_dict[key].get('M0总量环比(%)')
-                                # 添加指数数据
-                                item['M2指数(2016.1=100)'] = money_total_dict[key].get('M2指数(2016.1=100)')
-                                item['M1指数(2016.1=100)'] = money_total_dict[key].get('M1指数(2016.1=100)')
-                                item['M0指数(2016.1=100)'] = money_total_dict[key].get('M0指数(2016.1=100)')
-                                found = True
-                                matched_with_total += 1
-                                break
-                    
-                    if not found:
-                        item['M2总量(亿元)'] = None
-                        item['M1总量(亿元)'] = None
-                        item['M0总量(亿元)'] = None
-                        item['M2总量环比(%)'] = None
-                        item['M1总量环比(%)'] = None
-                        item['M0总量环比(%)'] = None
-                        item['M2指数(2016.1=100)'] = None
-                        item['M1指数(2016.1=100)'] = None
-                        item['M0指数(2016.1=100)'] = None
-                
-                # 添加沪深300指数数据（如果存在）
-                if formatted_date in hs300_dict:
-                    item['沪深300指数'] = hs300_dict[formatted_date]['沪深300指数']
-                    item['沪深300指数_同比'] = hs300_dict[formatted_date]['沪深300指数_同比']
-                    # 添加线性拟合值（如果存在）
-                    item['沪深300指数_线性拟合'] = hs300_fit_dict.get(formatted_date)
-                    # 添加±90%平行带（如果存在）
-                    item['沪深300指数_+90%'] = hs300_band_upper_dict.get(formatted_date)
-                    item['沪深300指数_-90%'] = hs300_band_lower_dict.get(formatted_date)
-                else:
-                    # 尝试其他可能的日期格式
-                    found = False
-                    for key in hs300_dict.keys():
-                        # 检查年份和月份是否匹配
-                        if '.' in formatted_date and '.' in key:
-                            if formatted_date.split('.')[0] == key.split('.')[0] and formatted_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                item['沪深300指数'] = hs300_dict[key]['沪深300指数']
-                                item['沪深300指数_同比'] = hs300_dict[key]['沪深300指数_同比']
-                                item['沪深300指数_线性拟合'] = hs300_fit_dict.get(key)
-                                item['沪深300指数_+90%'] = hs300_band_upper_dict.get(key)
-                                item['沪深300指数_-90%'] = hs300_band_lower_dict.get(key)
-                                found = True
-                                break
-
-                    if not found:
-                        item['沪深300指数'] = None
-                        item['沪深300指数_同比'] = None
-                        item['沪深300指数_线性拟合'] = None
-                        item['沪深300指数_+90%'] = None
-                        item['沪深300指数_-90%'] = None
-                
-                # 添加中证商品期货价格指数数据（如果存在）
-                if formatted_date in ccidx_dict:
-                    item['中证商品期货价格指数'] = ccidx_dict[formatted_date]['中证商品期货价格指数']
-                else:
-                    # 尝试其他可能的日期格式
-                    found = False
-                    for key in ccidx_dict.keys():
-                        # 检查年份和月份是否匹配
-                        if '.' in formatted_date and '.' in key:
-                            if formatted_date.split('.')[0] == key.split('.')[0] and formatted_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                item['中证商品期货价格指数'] = ccidx_dict[key]['中证商品期货价格指数']
-                                found = True
-                                break
-                    
-                    if not found:
-                        item['中证商品期货价格指数'] = None
-                
-                # 添加滚动4Q净利润和TTM市盈率数据（如果存在）
-                def find_latest_rolling_data(target_date, rolling_dict):
-                    """查找最近一次的滚动4Q数据"""
-                    if target_date in rolling_dict:
-                        return rolling_dict[target_date], target_date
-                    
-                    # 尝试其他可能的日期格式匹配
-                    for key in rolling_dict.keys():
-                        if '.' in target_date and '.' in key:
-                            if target_date.split('.')[0] == key.split('.')[0] and target_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                return rolling_dict[key], key
-                    
-                    # 如果没有精确匹配，查找最近一次的数据
-                    try:
-                        target_year = int(target_date.split('.')[0])
-                        target_month = int(target_date.split('.')[1].lstrip('0'))
-                        
-                        # 按时间倒序排列所有可用的数据键
-                        available_dates = []
-                        for key in rolling_dict.keys():
-                            try:
-                                key_year = int(key.split('.')[0])
-                                key_month = int(key.split('.')[1].lstrip('0'))
-                                key_date = key_year * 12 + key_month
-                                target_date_num = target_year * 12 + target_month
-                                
-                                # 只考虑目标日期之前的数据
-                                if key_date <= target_date_num:
-                                    available_dates.append((key_date, key))
-                            except:
-                                continue
-                        
-                        if available_dates:
-                            # 按时间倒序排列，取最近的一个
-                            available_dates.sort(reverse=True)
-                            latest_key = available_dates[0][1]
-                            return rolling_dict[latest_key], latest_key
-                    except:
-                        pass
-                    
-                    return None, None
-                
-                rolling_data, matched_key = find_latest_rolling_data(formatted_date, rolling_4q_dict)
-                
-                if rolling_data:
-                    # 检查当前月份是否超过了最新的季度数据，如果是，则不设置净利润数据
-                    # 这样可以避免显示补全的净利润数据
-                    should_set_profit_data = (matched_key == formatted_date)
-                    
-                    if should_set_profit_data:
-                        # 获取滚动4Q净利润数据（只有当月份有真实季度数据时才设置）
-                        item['滚动4Q净利润'] = rolling_data['滚动4Q净利润']
-                        item['银行滚动4Q净利润'] = rolling_data['银行滚动4Q净利润']
-                        item['非银行滚动4Q净利润'] = rolling_data['非银行滚动4Q净利润']
-                    else:
-                        # 对于没有真实季度数据的月份，净利润保持为None
-                        item['滚动4Q净利润'] = None
-                        item['银行滚动4Q净利润'] = None
-                        item['非银行滚动4Q净利润'] = None
-                    
-                    # 根据当月沪深300指数重新计算TTM市盈率
-                    # TTM市盈率 = 当月市值 / 滚动4Q净利润
-                    # 假设基准季度的市值 = 基准季度TTM市盈率 * 滚动4Q净利润
-                    # 当月市值 = 基准市值 * (当月沪深300指数 / 基准沪深300指数)
-                    # 当月TTM市盈率 = 当月市值 / 滚动4Q净利润
-                    
-                    base_ttm_pe = rolling_data['TTM市盈率']
-                    base_bank_ttm_pe = rolling_data['银行TTM市盈率']
-                    base_non_bank_ttm_pe = rolling_data['非银行TTM市盈率']
-                    
-                    # 获取基准季度的沪深300指数（从matched_key对应的数据中获取）
-                    base_hs300_index = None
-                    if matched_key in hs300_dict:
-                        base_hs300_index = hs300_dict[matched_key]['沪深300指数']
-                    
-                    # 获取当月的沪深300指数
-                    current_hs300_index = item.get('沪深300指数')
-                    
-                    if (base_ttm_pe is not None and base_hs300_index is not None and 
-                        current_hs300_index is not None and base_hs300_index != 0):
-                        # 计算指数比率
-                        index_ratio = current_hs300_index / base_hs300_index
-                        # 重新计算TTM市盈率
-                        item['TTM市盈率'] = round(base_ttm_pe * index_ratio, 2)
-                    else:
-                        item['TTM市盈率'] = base_ttm_pe
-                    
-                    # 计算银行TTM市盈率
-                    if (base_bank_ttm_pe is not None and base_hs300_index is not None and 
-                        current_hs300_index is not None and base_hs300_index != 0):
-                        index_ratio = current_hs300_index / base_hs300_index
-                        item['银行TTM市盈率'] = round(base_bank_ttm_pe * index_ratio, 2)
-                    else:
-                        item['银行TTM市盈率'] = base_bank_ttm_pe
-                    
-                    # 计算非银行TTM市盈率
-                    if (base_non_bank_ttm_pe is not None and base_hs300_index is not None and 
-                        current_hs300_index is not None and base_hs300_index != 0):
-                        index_ratio = current_hs300_index / base_hs300_index
-                        item['非银行TTM市盈率'] = round(base_non_bank_ttm_pe * index_ratio, 2)
-                    else:
-                        item['非银行TTM市盈率'] = base_non_bank_ttm_pe
-                    
-                    if matched_key == formatted_date:
-                        print(f"DEBUG: 直接匹配成功 {formatted_date} -> TTM: {item['TTM市盈率']}, 4Q净利润: {item['滚动4Q净利润']}")
-                    else:
-                        print(f"DEBUG: 使用最近数据 {formatted_date} -> {matched_key} -> TTM: {item['TTM市盈率']}, 4Q净利润: {item['滚动4Q净利润']}")
-                else:
-                    item['TTM市盈率'] = None
-                    item['滚动4Q净利润'] = None
-                    item['银行滚动4Q净利润'] = None
-                    item['非银行滚动4Q净利润'] = None
-                    item['银行TTM市盈率'] = None
-                    item['非银行TTM市盈率'] = None
-                    if len(rolling_4q_dict) > 0:
-                        print(f"DEBUG: 未找到任何匹配数据 {formatted_date}，滚动4Q数据键示例: {list(rolling_4q_dict.keys())[:3]}")
-                
-                # 添加房价数据（如果存在）
-                if formatted_date in house_price_dict:
-                    item['上海新建商品住宅价格指数_同比'] = house_price_dict[formatted_date]['新建商品住宅价格指数_同比']
-                    item['上海二手住宅价格指数_同比'] = house_price_dict[formatted_date]['二手住宅价格指数_同比']
-                    item['上海新建商品住宅价格指数_环比'] = house_price_dict[formatted_date]['新建商品住宅价格指数_环比']
-                    item['上海二手住宅价格指数_环比'] = house_price_dict[formatted_date]['二手住宅价格指数_环比']
-                    item['上海新建商品住宅价格指数(2016.1=100)'] = house_price_dict[formatted_date].get('新建商品住宅价格指数(2016.1=100)')
-                    item['上海二手住宅价格指数(2016.1=100)'] = house_price_dict[formatted_date].get('二手住宅价格指数(2016.1=100)')
-                else:
-                    # 尝试其他可能的日期格式
-                    found = False
-                    for key in house_price_dict.keys():
-                        # 检查年份和月份是否匹配
-                        if '-' in formatted_date and '-' in key:
-                            if formatted_date.split('-')[0] == key.split('-')[0] and formatted_date.split('-')[1] == key.split('-')[1]:
-                                item['上海新建商品住宅价格指数_同比'] = house_price_dict[key]['新建商品住宅价格指数_同比']
-                                item['上海二手住宅价格指数_同比'] = house_price_dict[key]['二手住宅价格指数_同比']
-                                item['上海新建商品住宅价格指数_环比'] = house_price_dict[key]['新建商品住宅价格指数_环比']
-                                item['上海二手住宅价格指数_环比'] = house_price_dict[key]['二手住宅价格指数_环比']
-                                item['上海新建商品住宅价格指数(2016.1=100)'] = house_price_dict[key].get('新建商品住宅价格指数(2016.1=100)')
-                                item['上海二手住宅价格指数(2016.1=100)'] = house_price_dict[key].get('二手住宅价格指数(2016.1=100)')
-                                found = True
-                                break
-                        elif '.' in formatted_date and '.' in key:
-                            if formatted_date.split('.')[0] == key.split('.')[0] and formatted_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                item['上海新建商品住宅价格指数_同比'] = house_price_dict[key]['新建商品住宅价格指数_同比']
-                                item['上海二手住宅价格指数_同比'] = house_price_dict[key]['二手住宅价格指数_同比']
-                                item['上海新建商品住宅价格指数_环比'] = house_price_dict[key]['新建商品住宅价格指数_环比']
-                                item['上海二手住宅价格指数_环比'] = house_price_dict[key]['二手住宅价格指数_环比']
-                                item['上海新建商品住宅价格指数(2016.1=100)'] = house_price_dict[key].get('新建商品住宅价格指数(2016.1=100)')
-                                item['上海二手住宅价格指数(2016.1=100)'] = house_price_dict[key].get('二手住宅价格指数(2016.1=100)')
-                                found = True
-                                break
-                    
-                    if not found:
-                        item['上海新建商品住宅价格指数_同比'] = None
-                        item['上海二手住宅价格指数_同比'] = None
-                        item['上海新建商品住宅价格指数_环比'] = None
-                        item['上海二手住宅价格指数_环比'] = None
-                        item['上海新建商品住宅价格指数(2016.1=100)'] = None
-                        item['上海二手住宅价格指数(2016.1=100)'] = None
-                
-                # 添加自制房价指数数据（如果存在）
-                custom_house_index = None
-                if formatted_date in custom_house_price_dict:
-                    custom_house_index = custom_house_price_dict[formatted_date]
-                else:
-                    # 尝试其他可能的日期格式
-                    for key in custom_house_price_dict.keys():
-                        # 检查年份和月份是否匹配
-                        if '-' in formatted_date and '-' in key:
-                            if formatted_date.split('-')[0] == key.split('-')[0] and formatted_date.split('-')[1] == key.split('-')[1]:
-                                custom_house_index = custom_house_price_dict[key]
-                                break
-                        elif '.' in formatted_date and '.' in key:
-                            if formatted_date.split('.')[0] == key.split('.')[0] and formatted_date.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                custom_house_index = custom_house_price_dict[key]
-                                break
-                        elif '.' in formatted_date and '-' in key:
-                            # 格式转换：2016.1 -> 2016-01
-                            year, month = formatted_date.split('.')
-                            month_padded = month.zfill(2)
-                            if key == f"{year}-{month_padded}":
-                                custom_house_index = custom_house_price_dict[key]
-                                break
-                
-                item['上海二手房价指数（自制）'] = custom_house_index
-                
-                # 添加商品价格指数数据（如果存在）
-                # 商品价格指数数据现在使用日期格式（YYYY-MM-DD）作为键
-                commodity_value = None
-                print(f"DEBUG: 处理日期 {formatted_date}，商品价格指数数据条数: {len(commodity_dict)}")
-                if len(commodity_dict) == 0:
-                    print("WARNING: 商品价格指数数据为空！")
-                
-                # 解析目标年月，支持多种格式：YYYY.MM, YYYY-MM, YYYY.M, YYYY-M
-                target_year = None
-                target_month = None
-                
-                # 尝试解析日期格式
-                if '.' in formatted_date:
-                    parts = formatted_date.split('.')
-                    if len(parts) == 2:
-                        target_year = int(parts[0])
-                        target_month = int(parts[1].lstrip('0'))
-                elif '-' in formatted_date:
-                    parts = formatted_date.split('-')
-                    if len(parts) == 2:
-                        target_year = int(parts[0])
-                        target_month = int(parts[1].lstrip('0'))
-                
-                if target_year is not None and target_month is not None:
-                    # 查找该月份的最新商品价格指数数据
-                    latest_date = None
-                    matching_count = 0
-                    for date_key in commodity_dict.keys():
-                        try:
-                            # 解析日期格式 YYYY-MM-DD
-                            date_parts = date_key.split('-')
-                            if len(date_parts) == 3:
-                                year = int(date_parts[0])
-                                month = int(date_parts[1])
-                                
-                                # 如果年月匹配
-                                if year == target_year and month == target_month:
-                                    matching_count += 1
-                                    # 找到该月份的最新日期
-                                    if latest_date is None or date_key > latest_date:
-                                        latest_date = date_key
-                                        commodity_value = commodity_dict[date_key]['商品价格指数']
-                        except (ValueError, IndexError):
-                            continue
-                    print(f"DEBUG: {formatted_date} 找到 {matching_count} 个匹配日期，最新日期: {latest_date}，指数值: {commodity_value}")
-                else:
-                    # 如果格式不匹配，设置为None但不跳过整个数据项
-                    commodity_value = None
-                
-
-                
-                item['商品价格指数'] = commodity_value
-                
-                data.append(item)
-                processed_rows += 1
-                
-            except (ValueError, TypeError, KeyError) as e:
-                print(f"处理行数据时出错: {e}")
-                continue
-        
-        # 确保包含所有沪深300指数有数据但货币供应量没有数据的月份
-        if hs300_dict:
-            # 获取现有数据中的所有月份
-            existing_months = set(item['月份'] for item in data)
-
-            
-            # 检查沪深300指数数据中是否有缺失的月份
-            for hs300_month in hs300_dict.keys():
-                if hs300_month not in existing_months:
-                    # 解析年月，确保是2000年以后的数据
-                    try:
-                        year, month = hs300_month.split('.')
-                        if int(year) >= 2000:
-                            print(f"添加沪深300指数月份数据: {hs300_month}")
-                            
-                            # 创建基本数据项，货币供应量相关字段设为null
-                            item = {
-                                '月份': hs300_month,
-                                '货币和准货币_广义货币M2_同比': None,
-                                '货币_狭义货币M1_同比': None,
-                                '流通中现金_M0_同比': None,
-                                'M2总量(亿元)': None,
-                                'M1总量(亿元)': None,
-                                'M0总量(亿元)': None,
-                                'M2总量环比(%)': None,
-                                'M1总量环比(%)': None,
-                                'M0总量环比(%)': None,
-                                'M2指数(2016.1=100)': None,
-                                'M1指数(2016.1=100)': None,
-                                'M0指数(2016.1=100)': None
-                            }
-                            
-                            # 添加沪深300指数数据
-                            item['沪深300指数'] = hs300_dict[hs300_month]['沪深300指数']
-                            item['沪深300指数_同比'] = hs300_dict[hs300_month]['沪深300指数_同比']
-                            # 添加线性拟合值（如果存在）
-                            item['沪深300指数_线性拟合'] = hs300_fit_dict.get(hs300_month)
-                            # 添加±90%平行带（如果存在）
-                            item['沪深300指数_+90%'] = hs300_band_upper_dict.get(hs300_month)
-                            item['沪深300指数_-90%'] = hs300_band_lower_dict.get(hs300_month)
-                            
-                            # 添加中证商品期货价格指数数据（如果存在）
-                            if hs300_month in ccidx_dict:
-                                item['中证商品期货价格指数'] = ccidx_dict[hs300_month]['中证商品期货价格指数']
-                            else:
-                                item['中证商品期货价格指数'] = None
-                            
-                            # 添加滚动4Q净利润和TTM市盈率数据（使用最近一次数据）
-                            def find_latest_rolling_data_for_new_month(target_date, rolling_dict):
-                                """为新增月份查找最近一次的滚动4Q数据"""
-                                if target_date in rolling_dict:
-                                    return rolling_dict[target_date], target_date
-                                
-                                # 如果没有精确匹配，查找最近一次的数据
-                                try:
-                                    target_year = int(target_date.split('.')[0])
-                                    target_month = int(target_date.split('.')[1].lstrip('0'))
-                                    
-                                    # 按时间倒序排列所有可用的数据键
-                                    available_dates = []
-                                    for key in rolling_dict.keys():
-                                        try:
-                                            key_year = int(key.split('.')[0])
-                                            key_month = int(key.split('.')[1].lstrip('0'))
-                                            key_date = key_year * 12 + key_month
-                                            target_date_num = target_year * 12 + target_month
-                                            
-                                            # 只考虑目标日期之前的数据
-                                            if key_date <= target_date_num:
-                                                available_dates.append((key_date, key))
-                                        except:
-                                            continue
-                                    
-                                    if available_dates:
-                                        # 按时间倒序排列，取最近的一个
-                                        available_dates.sort(reverse=True)
-                                        latest_key = available_dates[0][1]
-                                        return rolling_dict[latest_key], latest_key
-                                except:
-                                    pass
-                                
-                                return None, None
-                            
-                            rolling_data_new, matched_key_new = find_latest_rolling_data_for_new_month(hs300_month, rolling_4q_dict)
-                            
-                            if rolling_data_new:
-                                # 注意：为了满足用户需求，这里只补全TTM市盈率用于计算，不补全净利润数据用于图表显示
-                                # 净利润数据保持为None，这样前端图表就不会显示这些补全的数据点
-                                
-                                # 根据当月沪深300指数重新计算TTM市盈率（用于TTM计算）
-                                base_ttm_pe = rolling_data_new['TTM市盈率']
-                                base_bank_ttm_pe = rolling_data_new['银行TTM市盈率']
-                                base_non_bank_ttm_pe = rolling_data_new['非银行TTM市盈率']
-                                
-                                # 获取基准季度的沪深300指数
-                                base_hs300_index = None
-                                if matched_key_new in hs300_dict:
-                                    base_hs300_index = hs300_dict[matched_key_new]['沪深300指数']
-                                
-                                # 获取当月的沪深300指数
-                                current_hs300_index = item.get('沪深300指数')
-                                
-                                if (base_ttm_pe is not None and base_hs300_index is not None and 
-                                    current_hs300_index is not None and base_hs300_index != 0):
-                                    # 计算指数比率
-                                    index_ratio = current_hs300_index / base_hs300_index
-                                    # 重新计算TTM市盈率
-                                    item['TTM市盈率'] = round(base_ttm_pe * index_ratio, 2)
-                                else:
-                                    item['TTM市盈率'] = base_ttm_pe
-                                
-                                # 计算银行TTM市盈率
-                                if (base_bank_ttm_pe is not None and base_hs300_index is not None and 
-                                    current_hs300_index is not None and base_hs300_index != 0):
-                                    index_ratio = current_hs300_index / base_hs300_index
-                                    item['银行TTM市盈率'] = round(base_bank_ttm_pe * index_ratio, 2)
-                                else:
-                                    item['银行TTM市盈率'] = base_bank_ttm_pe
-                                
-                                # 计算非银行TTM市盈率
-                                if (base_non_bank_ttm_pe is not None and base_hs300_index is not None and 
-                                    current_hs300_index is not None and base_hs300_index != 0):
-                                    index_ratio = current_hs300_index / base_hs300_index
-                                    item['非银行TTM市盈率'] = round(base_non_bank_ttm_pe * index_ratio, 2)
-                                else:
-                                    item['非银行TTM市盈率'] = base_non_bank_ttm_pe
-                                
-                                # 净利润数据保持为None，不进行补全，这样图表就不会显示这些数据点
-                                item['滚动4Q净利润'] = None
-                                item['银行滚动4Q净利润'] = None
-                                item['非银行滚动4Q净利润'] = None
-                            else:
-                                item['TTM市盈率'] = None
-                                item['滚动4Q净利润'] = None
-                                item['银行滚动4Q净利润'] = None
-                                item['非银行滚动4Q净利润'] = None
-                                item['银行TTM市盈率'] = None
-                                item['非银行TTM市盈率'] = None
-                            
-                            # 添加房价数据（如果存在）
-                            if hs300_month in house_price_dict:
-                                item['上海新建商品住宅价格指数_同比'] = house_price_dict[hs300_month]['新建商品住宅价格指数_同比']
-                                item['上海二手住宅价格指数_同比'] = house_price_dict[hs300_month]['二手住宅价格指数_同比']
-                                item['上海新建商品住宅价格指数_环比'] = house_price_dict[hs300_month]['新建商品住宅价格指数_环比']
-                                item['上海二手住宅价格指数_环比'] = house_price_dict[hs300_month]['二手住宅价格指数_环比']
-                                item['上海新建商品住宅价格指数(2016.1=100)'] = house_price_dict[hs300_month].get('新建商品住宅价格指数(2016.1=100)')
-                                item['上海二手住宅价格指数(2016.1=100)'] = house_price_dict[hs300_month].get('二手住宅价格指数(2016.1=100)')
-                            else:
-                                item['上海新建商品住宅价格指数_同比'] = None
-                                item['上海二手住宅价格指数_同比'] = None
-                                item['上海新建商品住宅价格指数_环比'] = None
-                                item['上海二手住宅价格指数_环比'] = None
-                                item['上海新建商品住宅价格指数(2016.1=100)'] = None
-                                item['上海二手住宅价格指数(2016.1=100)'] = None
-                            
-                            # 添加自制房价指数数据（如果存在）
-                            custom_house_index = None
-                            if hs300_month in custom_house_price_dict:
-                                custom_house_index = custom_house_price_dict[hs300_month]
-                            else:
-                                # 尝试其他可能的日期格式
-                                for key in custom_house_price_dict.keys():
-                                    # 检查年份和月份是否匹配
-                                    if '-' in hs300_month and '-' in key:
-                                        if hs300_month.split('-')[0] == key.split('-')[0] and hs300_month.split('-')[1] == key.split('-')[1]:
-                                            custom_house_index = custom_house_price_dict[key]
-                                            break
-                                    elif '.' in hs300_month and '.' in key:
-                                        if hs300_month.split('.')[0] == key.split('.')[0] and hs300_month.split('.')[1].lstrip('0') == key.split('.')[1].lstrip('0'):
-                                            custom_house_index = custom_house_price_dict[key]
-                                            break
-                                    elif '.' in hs300_month and '-' in key:
-                                        # 格式转换：2016.1 -> 2016-01
-                                        year, month = hs300_month.split('.')
-                                        month_padded = month.zfill(2)
-                                        if key == f"{year}-{month_padded}":
-                                            custom_house_index = custom_house_price_dict[key]
-                                            break
-                            
-                            item['上海二手房价指数（自制）'] = custom_house_index
-                            
-                            # 添加商品价格指数数据（如果存在）
-                            commodity_value = None
-                            print(f"DEBUG: 处理新增沪深300月份 {hs300_month}，商品价格指数数据条数: {len(commodity_dict)}")
-                            
-                            # 解析目标年月
-                            target_year = None
-                            target_month = None
-                            
-                            if '.' in hs300_month:
-                                parts = hs300_month.split('.')
-                                if len(parts) == 2:
-                                    target_year = int(parts[0])
-                                    target_month = int(parts[1].lstrip('0'))
-                            
-                            if target_year is not None and target_month is not None:
-                                # 查找该月份的最新商品价格指数数据
-                                latest_date = None
-                                matching_count = 0
-                                for date_key in commodity_dict.keys():
-                                    try:
-                                        # 解析日期格式 YYYY-MM-DD
-                                        date_parts = date_key.split('-')
-                                        if len(date_parts) == 3:
-                                            year = int(date_parts[0])
-                                            month = int(date_parts[1])
-                                            
-                                            # 如果年月匹配
-                                            if year == target_year and month == target_month:
-                                                matching_count += 1
-                                                # 找到该月份的最新日期
-                                                if latest_date is None or date_key > latest_date:
-                                                    latest_date = date_key
-                                                    commodity_value = commodity_dict[date_key]['商品价格指数']
-                                    except (ValueError, IndexError):
-                                        continue
-                                print(f"DEBUG: 新增月份 {hs300_month} 找到 {matching_count} 个匹配日期，最新日期: {latest_date}，指数值: {commodity_value}")
-                            
-                            item['商品价格指数'] = commodity_value
-                            
-                            data.append(item)
-                    except (ValueError, IndexError):
-                        continue
-        
+
+        money = _build_money_supply_table(money_supply_df)
+        hs300 = _get_hs300_monthly()
+        ccidx = get_ccidx_futures_index()
+        rolling_4q = get_rolling_4q_profit_data()
+        commodity = get_commodity_price_index_data()
+        house_price = _get_shanghai_house_price(money.index)
+        custom_house_price = _get_custom_house_price_index()
+        pmi = _get_pmi_indicators()
+
+        frame = _join_monthly_sources(money, hs300, ccidx, rolling_4q, commodity,
+                                      house_price, custom_house_price, pmi)
+
+        # 按时间倒序（从晚到早）输出
+        frame = frame.iloc[::-1]
+        frame = frame.astype(object).where(frame.notna(), None)
+        frame.insert(0, '月份', [_month_label(period) for period in frame.index])
+        data = frame.to_dict('records')
+
         print(f"成功获取并缓存货币供应量、总量和房价数据，共{len(data)}条记录（2000年以后）")
-        
-        # 合并PMI数据中的新订单指数和新出口订单指数
-        try:
-            pmi_file_path = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\pmi_data.json'
-            if os.path.exists(pmi_file_path):
-                with open(pmi_file_path, 'r', encoding='utf-8') as f:
-                    pmi_data = json.load(f)
-                
-                # 创建PMI数据的月份到指数的映射
-                pmi_mapping = {}
-                for item in pmi_data:
-                    date_str = item['date']  # 格式: "2010-01"
-                    year, month = date_str.split('-')
-                    # 转换为货币供应量数据的月份格式: "2010.1"
-                    formatted_date = f"{year}.{int(month)}"
-                    
-                    # 获取新订单指数和新出口订单指数
-                    new_order_index = item['indicators'].get('新订单指数(%)', None)
-                    new_export_order_index = item['indicators'].get('新出口订单指数(%)', None)
-                    # 获取工业生产者购进价格指数和燃料、动力类购进价格指数
-                    producer_price_index = item['indicators'].get('工业生产者购进价格指数(2011年1月=100)', None)
-                    fuel_power_price_index = item['indicators'].get('燃料、动力类购进价格指数(2011年1月=100)', None)
-                    
-                    pmi_mapping[formatted_date] = {
-                        '新订单指数(%)': new_order_index,
-                        '新出口订单指数(%)': new_export_order_index,
-                        '工业生产者购进价格指数(2011年1月=100)': producer_price_index,
-                        '燃料、动力类购进价格指数(2011年1月=100)': fuel_power_price_index
-                    }
-                
-                # 为每个月份数据添加PMI指数
-                for item in data:
-                    month = item['月份']
-                    if month in pmi_mapping:
-                        item['新订单指数(%)'] = pmi_mapping[month]['新订单指数(%)']
-                        item['新出口订单指数(%)'] = pmi_mapping[month]['新出口订单指数(%)']
-                        item['工业生产者购进价格指数(2011年1月=100)'] = pmi_mapping[month]['工业生产者购进价格指数(2011年1月=100)']
-                        item['燃料、动力类购进价格指数(2011年1月=100)'] = pmi_mapping[month]['燃料、动力类购进价格指数(2011年1月=100)']
-                    else:
-                        item['新订单指数(%)'] = None
-                        item['新出口订单指数(%)'] = None
-                        item['工业生产者购进价格指数(2011年1月=100)'] = None
-                        item['燃料、动力类购进价格指数(2011年1月=100)'] = None
-                
-                new_order_count = len([item for item in data if item.get('新订单指数(%)') is not None])
-                new_export_order_count = len([item for item in data if item.get('新出口订单指数(%)') is not None])
-                print(f"成功合并PMI数据，共{new_order_count}条记录有新订单指数数据，{new_export_order_count}条记录有新出口订单指数数据")
-            else:
-                print(f"PMI数据文件不存在: {pmi_file_path}")
-                # 如果PMI文件不存在，为所有数据添加None值
-                for item in data:
-                    item['新订单指数(%)'] = None
-                    item['新出口订单指数(%)'] = None
-                    item['工业生产者购进价格指数(2011年1月=100)'] = None
-                    item['燃料、动力类购进价格指数(2011年1月=100)'] = None
-        except Exception as e:
-            print(f"合并PMI数据时出错: {e}")
-            # 出错时为所有数据添加None值
-            for item in data:
-                item['新订单指数(%)'] = None
-                item['新出口订单指数(%)'] = None
-                item['工业生产者购进价格指数(2011年1月=100)'] = None
-                item['燃料、动力类购进价格指数(2011年1月=100)'] = None
-
-        # 兜底：确保所有记录都包含拟合与上下带键（即使为None）
-        for item in data:
-            if '沪深300指数_线性拟合' not in item:
-                item['沪深300指数_线性拟合'] = None
-            if '沪深300指数_+90%' not in item:
-                item['沪深300指数_+90%'] = None
-            if '沪深300指数_-90%' not in item:
-                item['沪深300指数_-90%'] = None
-
-        # 按时间正序排列数据
-        def parse_date_key(date_str):
-            """解析日期字符串，返回用于排序的元组 (年, 月)"""
-            try:
-                if '.' in date_str:
-                    year, month = date_str.split('.')
-                    return (int(year), int(month))
-                elif '-' in date_str:
-                    year, month = date_str.split('-')
-                    return (int(year), int(month))
-                else:
-                    return (0, 0)  # 默认值
-            except (ValueError, IndexError):
-                return (0, 0)  # 默认值
-        
-        # 按时间倒序排序（从晚到早）
-        data.sort(key=lambda x: parse_date_key(x['月份']), reverse=True)
-        
+
         # 准备返回数据
         result = {
             'status': 'success',
             'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'data': data
         }
-        
+
         # 保存到缓存
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        
+        write_cache(cache_file, result)
+
         return result
-    
+
     except Exception as e:
         print(f"获取货币供应量数据失败: {e}")
         # 如果缓存文件存在，尝试读取缓存
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as cache_e:
-                print(f"读取缓存文件失败: {cache_e}")
-        
+        cached = read_cache(MONEY_SUPPLY_CACHE_FILE)
+        if cached is not None:
+            return cached
+
         # 返回错误信息
         return {
             'status': 'error',
@@ -1518,206 +192,459 @@ def fetch_macro_china_money_supply():
             'data': []
         }
 
+
+def _build_money_supply_table(money_supply_df):
+    """
+    整理货币供应量数据：同比增速、总量、总量环比和以2016.1为100的指数
+
+    Args:
+        money_supply_df: ak.macro_china_money_supply() 的结果
+
+    Returns:
+        pd.DataFrame: 按月 PeriodIndex 升序排列
+    """
+    # 日期列：优先使用预期的列名，找不到时使用第一列
+    date_col = next((col for col in ['统计时间', '月份', '日期'] if col in money_supply_df.columns),
+                    money_supply_df.columns[0])
+
+    money = pd.DataFrame(index=_to_months(money_supply_df[date_col]))
+    for output_col, growth_col, keyword in MONEY_GROWTH_COLUMNS:
+        # 列名不存在时按关键字查找
+        if growth_col not in money_supply_df.columns:
+            growth_col = next((col for col in money_supply_df.columns if keyword in col and '同比' in col), None)
+        money[output_col] = _round2(pd.Series(_numeric_column(money_supply_df, growth_col))).to_numpy()
+    for name, total_col in MONEY_TOTAL_COLUMNS:
+        money[f'{name}总量(亿元)'] = _round2(pd.Series(_numeric_column(money_supply_df, total_col))).to_numpy()
+    money = _last_per_month(money)
+
+    # 环比：与上一条记录相比，第一条记录没有前值
+    for name, _ in MONEY_TOTAL_COLUMNS:
+        total = money[f'{name}总量(亿元)']
+        previous = total.shift(1)
+        money[f'{name}总量环比(%)'] = _round2(((total - previous) / previous * 100).where(previous != 0))
+
+    m1_mom = money['M1总量环比(%)'].astype(object)
+    if M1_CHANGE_MONTH in money.index and money.index[0] != M1_CHANGE_MONTH:
+        m1_mom[M1_CHANGE_MONTH] = 0
+    money['M1总量环比(%)'] = m1_mom
+
+    # 以2016.1=100计算指数，缺少基准月份时指数为空
+    for name, _ in MONEY_TOTAL_COLUMNS:
+        total = money[f'{name}总量(亿元)']
+        base = total.get(BASE_MONTH, np.nan)
+        money[f'{name}指数(2016.1=100)'] = _round2(total / base * 100)
+
+    # M1口径变更：2024.1沿用2023.12的指数，之后按2024.1以来的总量变化接续
+    if M1_CHANGE_MONTH in money.index:
+        m1_index = money['M1指数(2016.1=100)'].copy()
+        m1_total = money['M1总量(亿元)']
+        dec_2023_index = m1_index.get(M1_CHANGE_MONTH - 1, np.nan)
+        if pd.notna(dec_2023_index):
+            m1_index[M1_CHANGE_MONTH] = dec_2023_index
+        jan_2024_index = m1_index[M1_CHANGE_MONTH]
+        jan_2024_total = m1_total[M1_CHANGE_MONTH]
+        if pd.notna(jan_2024_index) and pd.notna(jan_2024_total):
+            later = m1_index.index > M1_CHANGE_MONTH
+            m1_index[later] = _round2(jan_2024_index * (m1_total[later] / jan_2024_total))
+        money['M1指数(2016.1=100)'] = m1_index
+
+    return money
+
+
+def _get_hs300_monthly():
+    """
+    获取沪深300指数月度数据：每月最后一个交易日的收盘价、同比，以及线性拟合和覆盖约90%点位的平行带
+
+    Returns:
+        pd.DataFrame: 按月 PeriodIndex 升序排列，获取失败时为空表
+    """
+    try:
+        hs300_df = ak.stock_zh_index_daily(symbol="sh000300")
+        daily = pd.DataFrame({
+            'date': hs300_df['date'].astype(str).to_numpy(),
+            'close': hs300_df['close'].astype(float).to_numpy(),
+        })
+        daily = daily[daily['date'].str.len() >= 7].sort_values(by='date', kind='stable')
+        daily.index = _to_months(daily['date'].str.slice(0, 7))
+        close = _last_per_month(daily)['close']
+
+        # 同比：与去年同月的收盘价比较
+        previous = pd.Series(close.reindex(close.index - 12).to_numpy(), index=close.index)
+        hs300 = pd.DataFrame({
+            '沪深300指数': close,
+            '沪深300指数_同比': _round2(((close - previous) / previous * 100).where(previous != 0)),
+        })
+    except Exception as e:
+        print(f"获取沪深300指数数据失败: {e}")
+        return pd.DataFrame(columns=HS300_COLUMNS, index=pd.PeriodIndex([], freq='M'))
+
+    # 线性拟合（最小二乘法，自变量为月份序号）
+    hs300['沪深300指数_线性拟合'] = np.nan
+    hs300['沪深300指数_+90%'] = np.nan
+    hs300['沪深300指数_-90%'] = np.nan
+    try:
+        values = close.to_numpy()
+        if len(values) >= 2:
+            x = np.arange(len(values))
+            mean_x = x.mean()
+            mean_y = values.mean()
+            denominator = ((x - mean_x) ** 2).sum()
+            if denominator == 0:
+                denominator = 1e-9
+            b = ((x - mean_x) * (values - mean_y)).sum() / denominator
+            a = mean_y - b * mean_x
+            fitted = a + b * x
+
+            # 上下平行带的距离取绝对残差的90分位，使约90%的点位落在带内
+            residuals_abs = np.sort(np.abs(values - fitted))
+            d = float(residuals_abs[int(round((len(residuals_abs) - 1) * 0.90))])
+            hs300['沪深300指数_线性拟合'] = _round2(pd.Series(fitted, index=hs300.index))
+            hs300['沪深300指数_+90%'] = _round2(pd.Series(fitted + d, index=hs300.index))
+            hs300['沪深300指数_-90%'] = _round2(pd.Series(fitted - d, index=hs300.index))
+    except Exception as e:
+        print(f"计算沪深300指数线性拟合失败: {e}")
+
+    return hs300
+
+
+def _get_shanghai_house_price(money_months):
+    """
+    获取上海新建商品住宅和二手住宅价格指数（同比/环比转换为增长率），并用环比累积出以2016.1为100的指数
+
+    Args:
+        money_months: 货币供应量数据的月份，房价数据与其没有重叠月份时不计算累积指数
+
+    Returns:
+        pd.DataFrame: 按月 PeriodIndex 升序排列，获取失败时为空表
+    """
+    try:
+        house_price_df = ak.macro_china_new_house_price(city_first="上海")
+        print(f"DEBUG: 成功获取房价数据，共{len(house_price_df)}条记录")
+        house_price_df = house_price_df.copy()
+        house_price_df['日期'] = house_price_df['日期'].astype(str)
+        house_price_df = house_price_df.sort_values(by='日期', kind='stable').reset_index(drop=True)
+        dates = house_price_df['日期']
+
+        house = pd.DataFrame(index=_to_months(dates))
+        for output_col, source_col in HOUSE_PRICE_COLUMNS:
+            house[output_col] = _round2(pd.Series(_numeric_column(house_price_df, source_col) - 100)).to_numpy()
+        for output_col, _ in HOUSE_INDEX_COLUMNS:
+            house[output_col] = np.nan
+
+        # 以2016年1月为100，之后的月份按环比累积
+        base_rows = np.flatnonzero(dates.str.contains('2016-01', regex=False).to_numpy())
+        if house.index.isin(money_months).any():
+            if len(base_rows) == 0:
+                print("警告：未找到2016年1月数据，无法计算基准指数")
+            else:
+                base_date = dates.iloc[base_rows[0]]
+                after = (dates > base_date).to_numpy()
+                at_base = (dates == base_date).to_numpy()
+                for output_col, mom_col in HOUSE_INDEX_COLUMNS:
+                    if mom_col not in house_price_df.columns:
+                        continue
+                    ratios = house_price_df[mom_col].to_numpy(dtype=float)[after] / 100.0
+                    chained = np.full(len(house_price_df), np.nan)
+                    chained[after] = np.cumprod(np.concatenate(([100.0], ratios)))[1:]
+                    chained[at_base] = 100.0
+                    house[output_col] = _round2(pd.Series(chained)).to_numpy()
+
+        house = _last_per_month(house)
+        print(f"房价数据获取完成，共{len(house)}个月")
+        return house
+
+    except Exception as e:
+        print(f"获取上海房价数据失败: {e}")
+        import traceback
+        print(f"详细错误信息: {traceback.format_exc()}")
+        columns = [col for col, _ in HOUSE_PRICE_COLUMNS] + [col for col, _ in HOUSE_INDEX_COLUMNS]
+        return pd.DataFrame(columns=columns, index=pd.PeriodIndex([], freq='M'))
+
+
+def _get_custom_house_price_index():
+    """
+    读取自制上海二手房价指数
+
+    Returns:
+        pd.Series: 按月 PeriodIndex 的 price_index，文件不存在或读取失败时为空
+    """
+    empty = pd.Series(dtype=object, index=pd.PeriodIndex([], freq='M'), name='上海二手房价指数（自制）')
+    try:
+        if not os.path.exists(CUSTOM_HOUSE_PRICE_FILE):
+            print(f"WARNING: 自制房价指数文件不存在: {CUSTOM_HOUSE_PRICE_FILE}")
+            return empty
+
+        with open(CUSTOM_HOUSE_PRICE_FILE, 'r', encoding='utf-8') as f:
+            custom_house_data = json.load(f)
+        print(f"DEBUG: 成功读取自制房价指数数据，基准期: {custom_house_data.get('base_period')}")
+
+        items = [(date_key, data_item.get('price_index'))
+                 for date_key, data_item in custom_house_data.get('data', {}).items()
+                 if data_item.get('price_index') is not None]
+        series = pd.Series([value for _, value in items], dtype=object,
+                           index=_to_months([date_key for date_key, _ in items]),
+                           name='上海二手房价指数（自制）')
+        series = series[series.index.notna()]
+        series = series[~series.index.duplicated(keep='first')]
+        print(f"DEBUG: 自制房价指数数据处理完成，共{len(series)}条记录")
+        return series
+
+    except Exception as e:
+        print(f"读取自制房价指数数据失败: {e}")
+        return empty
+
+
+def _get_pmi_indicators():
+    """
+    读取PMI数据中的新订单指数、新出口订单指数和购进价格指数
+
+    Returns:
+        pd.DataFrame: 按月 PeriodIndex，文件不存在或读取失败时为空表
+    """
+    empty = pd.DataFrame(columns=PMI_COLUMNS, index=pd.PeriodIndex([], freq='M'))
+    try:
+        if not os.path.exists(PMI_DATA_FILE):
+            print(f"PMI数据文件不存在: {PMI_DATA_FILE}")
+            return empty
+
+        with open(PMI_DATA_FILE, 'r', encoding='utf-8') as f:
+            pmi_data = json.load(f)
+
+        # 日期格式: "2010-01"
+        pmi = pd.DataFrame([[item['indicators'].get(col) for col in PMI_COLUMNS] for item in pmi_data],
+                           columns=PMI_COLUMNS, dtype=object,
+                           index=_to_months([item['date'] for item in pmi_data]))
+        pmi = pmi[pmi.index.notna()]
+        pmi = pmi[~pmi.index.duplicated(keep='last')]
+        print(f"成功读取PMI数据，共{len(pmi)}个月")
+        return pmi
+
+    except Exception as e:
+        print(f"合并PMI数据时出错: {e}")
+        return empty
+
+
+def _join_monthly_sources(money, hs300, ccidx, rolling_4q, commodity, house_price, custom_house_price, pmi):
+    """
+    按月份合并各数据源
+
+    月份范围为2000年以后、不超过沪深300指数最新月份的货币供应量数据，
+    以及沪深300指数有数据而货币供应量缺失的月份（货币供应量相关字段为空）。
+
+    Returns:
+        pd.DataFrame: 按月 PeriodIndex 升序排列，列顺序即输出字段顺序
+    """
+    months = money.index[money.index >= START_MONTH]
+    if not hs300.empty:
+        months = months[months <= hs300.index.max()]
+        months = months.union(hs300.index[hs300.index >= START_MONTH])
+    months = months.sort_values()
+
+    frame = money.reindex(months)
+    frame = frame.join(hs300[HS300_COLUMNS])
+    frame = frame.join(ccidx)
+    frame = frame.join(_align_rolling_4q(months, rolling_4q, hs300['沪深300指数'], months.isin(money.index)))
+    frame = frame.join(house_price)
+    frame = frame.join(custom_house_price)
+    frame = frame.join(commodity)
+    frame = frame.join(pmi)
+    return frame
+
+
+def _align_rolling_4q(months, rolling_4q, hs300_close, has_money_data):
+    """
+    为每个月匹配最近一次（不晚于当月）的滚动4Q季度数据
+
+    净利润只在当月恰好是季度数据所在月份、且货币供应量有当月数据时输出；
+    TTM市盈率按 当月沪深300指数 / 季度当月沪深300指数 折算到当月，缺少沪深300指数时沿用季度值。
+
+    Args:
+        months: 升序排列的月度 PeriodIndex
+        rolling_4q: get_rolling_4q_profit_data() 的结果
+        hs300_close: 沪深300指数月末收盘价
+        has_money_data: 布尔数组，各月份是否有货币供应量数据
+
+    Returns:
+        pd.DataFrame: 以 months 为索引的净利润和市盈率列
+    """
+    columns = ROLLING_4Q_PROFIT_COLUMNS + ROLLING_4Q_PE_COLUMNS
+    if rolling_4q.empty or len(months) == 0:
+        return pd.DataFrame(columns=columns, index=months, dtype=object)
+
+    quarters = rolling_4q.sort_index()
+    quarters = quarters.assign(
+        matched_ordinal=quarters.index.asi8,
+        base_hs300=hs300_close.reindex(quarters.index).to_numpy(),
+    )
+    merged = pd.merge_asof(pd.DataFrame({'ordinal': months.asi8}), quarters,
+                           left_on='ordinal', right_on='matched_ordinal', direction='backward')
+    merged.index = months
+
+    aligned = pd.DataFrame(index=months)
+    exact = (merged['matched_ordinal'] == merged['ordinal']).to_numpy() & np.asarray(has_money_data)
+    for col in ROLLING_4Q_PROFIT_COLUMNS:
+        aligned[col] = merged[col].where(exact)
+
+    current = hs300_close.reindex(months)
+    base = merged['base_hs300']
+    for col in ROLLING_4Q_PE_COLUMNS:
+        pe = pd.to_numeric(merged[col], errors='coerce')
+        scalable = pe.notna() & base.notna() & current.notna() & (base != 0)
+        scaled = _round2(pe * (current / base))
+        aligned[col] = merged[col].where(~scalable, scaled)
+    return aligned
+
+
 def get_ccidx_futures_index():
     """
     获取中证商品期货价格指数数据
-    
+
     Returns:
-        dict: 包含日期和指数值的字典
+        pd.Series: 按月 PeriodIndex 的每月最后一个交易日收盘点位，获取失败时为空
     """
     try:
         # 获取中证商品期货价格指数数据
         futures_index_ccidx_df = ak.futures_index_ccidx(symbol="中证商品期货价格指数")
-        
-        # 创建字典存储数据
-        ccidx_dict = {}
-        
-        for _, row in futures_index_ccidx_df.iterrows():
-            try:
-                # 获取日期和指数值
-                date_str = str(row['日期'])
-                index_value = float(row['收盘点位']) if not pd.isna(row['收盘点位']) else None
-                
-                # 将日期转换为YYYY.M格式
-                if '-' in date_str:
-                    date_parts = date_str.split('-')
-                    if len(date_parts) >= 2:
-                        year = date_parts[0]
-                        month = str(int(date_parts[1]))  # 去掉前导零
-                        formatted_date = f"{year}.{month}"
-                        
-                        # 如果该月份已存在，取最新的值（通常是月末值）
-                        if formatted_date not in ccidx_dict or date_str > ccidx_dict[formatted_date]['original_date']:
-                            ccidx_dict[formatted_date] = {
-                                '中证商品期货价格指数': round(index_value, 2) if index_value is not None else None,
-                                'original_date': date_str
-                            }
-                            
-            except Exception as e:
-                print(f"处理中证商品期货指数数据行时出错: {e}")
-                continue
-        
-        print(f"成功获取中证商品期货价格指数数据，共{len(ccidx_dict)}条记录")
-        # 调试：输出部分数据
-        if ccidx_dict:
-            sample_keys = list(ccidx_dict.keys())[:5]
-            print(f"中证商品期货价格指数数据样本: {[(k, ccidx_dict[k]) for k in sample_keys]}")
-        return ccidx_dict
-        
+
+        daily = pd.DataFrame({
+            'date': futures_index_ccidx_df['日期'].astype(str).to_numpy(),
+            'close': pd.to_numeric(futures_index_ccidx_df['收盘点位'], errors='coerce').to_numpy(),
+        })
+        # 同一日期有多条记录时取第一条，同一月份取最后一个交易日（通常是月末值）
+        daily = daily[daily['date'].str.contains('-', regex=False)]
+        daily = daily.sort_values(by='date', kind='stable').drop_duplicates(subset='date', keep='first')
+        daily.index = _to_months(daily['date'].str.slice(0, 7))
+        ccidx = _round2(_last_per_month(daily)['close']).rename('中证商品期货价格指数')
+
+        print(f"成功获取中证商品期货价格指数数据，共{len(ccidx)}条记录")
+        return ccidx
+
     except Exception as e:
         print(f"获取中证商品期货价格指数数据失败: {e}")
-        return {}
+        return pd.Series(dtype=float, index=pd.PeriodIndex([], freq='M'), name='中证商品期货价格指数')
+
 
 def get_rolling_4q_profit_data():
     """
     获取滚动4Q净利润和TTM市盈率数据
     从true_quarterly_analysis.json文件中读取pe_ratio和rolling_4q_profit数据
-    只有stock_count大于50时，当季数据才被采用
-    
+    只有stock_count大于等于175时，当季数据才被采用
+
     Returns:
-        dict: 包含日期、TTM市盈率、滚动4Q净利润、银行滚动4Q净利润和非银行滚动4Q净利润的字典
+        pd.DataFrame: 以季度末月份（PeriodIndex）为索引，包含TTM市盈率、滚动4Q净利润、
+                      银行/非银行滚动4Q净利润和银行/非银行TTM市盈率，读取失败时为空表
     """
+    columns = ROLLING_4Q_PROFIT_COLUMNS + ROLLING_4Q_PE_COLUMNS
+    empty = pd.DataFrame(columns=columns, index=pd.PeriodIndex([], freq='M'), dtype=object)
     try:
-        # 读取JSON文件
-        json_file_path = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\true_quarterly_analysis.json'
-        
+        json_file_path = ROLLING_4Q_PROFIT_FILE
+
         if not os.path.exists(json_file_path):
             print(f"TTM市盈率数据文件不存在: {json_file_path}")
-            print("返回空数据字典")
-            return {}
-        
-        print(f"DEBUG: 开始读取TTM市盈率数据文件: {json_file_path}")
-        
+            print("返回空数据")
+            return empty
+
         # 检查文件是否为空
         if os.path.getsize(json_file_path) == 0:
             print(f"TTM市盈率数据文件为空: {json_file_path}")
-            return {}
-            
+            return empty
+
         with open(json_file_path, 'r', encoding='utf-8') as f:
             content = f.read().strip()
             if not content:
                 print(f"TTM市盈率数据文件内容为空: {json_file_path}")
-                return {}
+                return empty
             data = json.loads(content)
-        
-        print(f"DEBUG: JSON文件读取成功，包含 {len(data.get('quarterly_data', {}))} 个季度数据")
-        rolling_4q_dict = {}
-        
-        # 遍历季度数据
-        quarterly_data = data.get('quarterly_data', {})
-        
-        for quarter, quarter_info in quarterly_data.items():
-            # 获取pe_ratio和rolling_4q_profit数据
-            pe_ratio = quarter_info.get('pe_ratio')
-            rolling_4q_profit = quarter_info.get('rolling_4q_profit')
-            # 获取银行和非银行滚动4Q净利润数据
-            bank_rolling_4q_profit = quarter_info.get('bank_rolling_4q_profit')
-            non_bank_rolling_4q_profit = quarter_info.get('non_bank_rolling_4q_profit')
-            # 获取银行和非银行TTM市盈率数据
-            bank_pe_ratio = quarter_info.get('bank_pe_ratio')
-            non_bank_pe_ratio = quarter_info.get('non_bank_pe_ratio')
-            stock_count = quarter_info.get('stock_count', 0)
-            
-            # 检查stock_count是否大于等于175
-            if stock_count >= 175 and (pe_ratio is not None or rolling_4q_profit is not None or bank_rolling_4q_profit is not None or non_bank_rolling_4q_profit is not None or bank_pe_ratio is not None or non_bank_pe_ratio is not None):
-                # 将季度格式转换为年月格式
-                # 例如：2024-Q1 -> 2024.3, 2024-Q2 -> 2024.6, 2024-Q3 -> 2024.9, 2024-Q4 -> 2024.12
-                year, quarter_num = quarter.split('-Q')
-                quarter_month_map = {'1': '3', '2': '6', '3': '9', '4': '12'}
-                month = quarter_month_map.get(quarter_num, '12')
-                formatted_date = f"{year}.{month}"
-                
-                rolling_4q_dict[formatted_date] = {
-                    'TTM市盈率': round(pe_ratio, 2) if pe_ratio is not None else None,
-                    '滚动4Q净利润': round(rolling_4q_profit / 100000000, 2) if rolling_4q_profit is not None else None,  # 转换为亿元
-                    '银行滚动4Q净利润': round(bank_rolling_4q_profit / 100000000, 2) if bank_rolling_4q_profit is not None else None,  # 转换为亿元
-                    '非银行滚动4Q净利润': round(non_bank_rolling_4q_profit / 100000000, 2) if non_bank_rolling_4q_profit is not None else None,  # 转换为亿元
-                    '银行TTM市盈率': round(bank_pe_ratio, 2) if bank_pe_ratio is not None else None,
-                    '非银行TTM市盈率': round(non_bank_pe_ratio, 2) if non_bank_pe_ratio is not None else None,
-                    'success_count': stock_count
-                    }
-        
-        print(f"成功获取滚动4Q净利润和TTM市盈率数据，共{len(rolling_4q_dict)}条记录")
-        # 调试：输出部分数据
-        if rolling_4q_dict:
-            sample_keys = list(rolling_4q_dict.keys())[:5]
-            print(f"滚动4Q净利润和TTM市盈率数据样本: {[(k, rolling_4q_dict[k]) for k in sample_keys]}")
-        
-        return rolling_4q_dict
-        
+
+        # 季度末月份：2024-Q1 -> 2024-03, 2024-Q2 -> 2024-06, 2024-Q3 -> 2024-09, 2024-Q4 -> 2024-12
+        quarter_month_map = {'1': 3, '2': 6, '3': 9, '4': 12}
+
+        def _round_or_none(value, scale=1):
+            return round(value / scale, 2) if value is not None else None
+
+        rows = {}
+        for quarter, quarter_info in data.get('quarterly_data', {}).items():
+            values = {
+                'TTM市盈率': quarter_info.get('pe_ratio'),
+                '滚动4Q净利润': quarter_info.get('rolling_4q_profit'),
+                '银行滚动4Q净利润': quarter_info.get('bank_rolling_4q_profit'),
+                '非银行滚动4Q净利润': quarter_info.get('non_bank_rolling_4q_profit'),
+                '银行TTM市盈率': quarter_info.get('bank_pe_ratio'),
+                '非银行TTM市盈率': quarter_info.get('non_bank_pe_ratio'),
+            }
+            # stock_count不少于175且至少有一项数据时才采用
+            if quarter_info.get('stock_count', 0) < 175 or all(v is None for v in values.values()):
+                continue
+
+            year, quarter_num = quarter.split('-Q')
+            month = pd.Period(year=int(year), month=quarter_month_map.get(quarter_num, 12), freq='M')
+            # 净利润转换为亿元
+            rows[month] = [
+                _round_or_none(values[col], 100000000) if col in ROLLING_4Q_PROFIT_COLUMNS else _round_or_none(values[col])
+                for col in columns
+            ]
+
+        if not rows:
+            return empty
+        rolling_4q = pd.DataFrame(list(rows.values()), columns=columns, dtype=object,
+                                  index=pd.PeriodIndex(list(rows.keys()), freq='M'))
+        print(f"成功获取滚动4Q净利润和TTM市盈率数据，共{len(rolling_4q)}条记录")
+        return rolling_4q
+
     except Exception as e:
         print(f"获取TTM市盈率数据失败: {e}")
-        return {}
+        return empty
+
 
 def get_commodity_price_index_data():
     """
     获取商品价格指数数据
     从commodity_price_index.json文件中读取指数数据
-    
+
     Returns:
-        dict: 包含日期和商品价格指数的字典
+        pd.Series: 按月 PeriodIndex 的每月最后一个日期的指数值，读取失败时为空
     """
+    empty = pd.Series(dtype=object, index=pd.PeriodIndex([], freq='M'), name='商品价格指数')
     try:
-        # 读取JSON文件 - 使用新的指定路径
-        json_file_path = r'C:\Users\17701\github\my_first_repo\stock_info\cache\outsource\commodity_price_index.json'
-        
-        print(f"DEBUG: 尝试读取商品价格指数文件: {json_file_path}")
-        
+        json_file_path = COMMODITY_PRICE_INDEX_FILE
+
         if not os.path.exists(json_file_path):
             print(f"商品价格指数数据文件不存在: {json_file_path}")
-            return {}
-        
-        print(f"DEBUG: 开始读取商品价格指数数据文件: {json_file_path}")
-        
+            return empty
+
         # 检查文件是否为空
         if os.path.getsize(json_file_path) == 0:
             print(f"商品价格指数数据文件为空: {json_file_path}")
-            return {}
-            
+            return empty
+
         with open(json_file_path, 'r', encoding='utf-8') as f:
             content = f.read().strip()
             if not content:
                 print(f"商品价格指数数据文件内容为空: {json_file_path}")
-                return {}
+                return empty
             data = json.loads(content)
-        
-        print(f"DEBUG: 商品价格指数JSON文件读取成功，包含 {len(data.get('指数数据', []))} 条数据")
-        commodity_dict = {}
-        
-        # 遍历指数数据
-        index_data = data.get('指数数据', [])
-        
-        for item in index_data:
-            date_str = item.get('日期')
-            index_value = item.get('指数值')
-            
-            if date_str and index_value is not None:
-                # 保持原始日期格式，不进行月份聚合
-                try:
-                    # 验证日期格式
-                    datetime.strptime(date_str, '%Y-%m-%d')
-                    
-                    # 直接使用原始日期作为键
-                    commodity_dict[date_str] = {
-                        '商品价格指数': round(index_value, 2)
-                    }
-                except ValueError:
-                    continue
-        
-        print(f"成功获取商品价格指数数据，共{len(commodity_dict)}条记录")
-        # 调试：输出部分数据
-        if commodity_dict:
-            sample_keys = list(commodity_dict.keys())[-5:]  # 显示最新的5条数据
-            print(f"商品价格指数数据样本: {[(k, commodity_dict[k]) for k in sample_keys]}")
-        
-        return commodity_dict
-        
+
+        items = [item for item in data.get('指数数据', [])
+                 if item.get('日期') and item.get('指数值') is not None]
+        daily = pd.DataFrame({
+            'date': pd.to_datetime([item['日期'] for item in items], format='%Y-%m-%d', errors='coerce'),
+            'value': pd.Series([round(item['指数值'], 2) for item in items], dtype=object),
+        })
+        # 同一日期保留最后一条，同一月份取最后一个日期
+        daily = daily.dropna(subset=['date']).sort_values(by='date', kind='stable')
+        daily = daily.drop_duplicates(subset='date', keep='last')
+        daily.index = pd.PeriodIndex(daily['date'].dt.to_period('M'))
+        commodity = _last_per_month(daily)['value'].rename('商品价格指数')
+
+        print(f"成功获取商品价格指数数据，共{len(commodity)}个月")
+        return commodity
+
     except Exception as e:
         print(f"获取商品价格指数数据失败: {e}")
-        return {}
+        return empty
 
 if __name__ == '__main__':
     # 执行数据获取
     print("开始获取宏观经济数据...")
     data = fetch_macro_china_money_supply()
-    print("宏观经济数据获取完成！")
\ No newline at end of file
+    print("宏观经济数据获取完成！")
@@ -0,0 +1,179 @@
+"""
+响应体缓存模块 - JSON响应体只序列化和压缩一次，按内容生成ETag
+
+- Payload 保存序列化后的UTF-8响应体、ETag，以及按需生成并保留的 gzip/brotli 压缩体
+- PayloadCache 按 (键, 数据版本) 保存 Payload，数据版本变化（文件修改时间、快照更新时间）时重新生成
+- 不依赖Flask，由 app 根据请求头选择 304 / 压缩体 / 原始响应体
+- 多进程运行时 PayloadCache 可以使用共享存储，一个进程生成的响应体其他进程直接复用
+"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from .shared_store import store_key
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 小于该字节数的响应体不压缩
+MIN_COMPRESS_SIZE = 1024
+
+
+def _accepted_encodings(accept_encoding):
+    """解析 Accept-Encoding 请求头，返回客户端接受的编码集合（忽略 q=0）"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        parts = [p.strip() for p in item.split(';')]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(parts[0].lower())
+    return accepted
+
+
+class Payload:
+    """预序列化的JSON响应体"""
+
+    def __init__(self, data):
+        """
+        Args:
+            data: 可JSON序列化的数据（与 jsonify 一致按键排序）
+        """
+        self._set_body(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_body(cls, body):
+        """由已序列化的响应体创建（如其他进程写入共享存储的响应体）"""
+        payload = cls.__new__(cls)
+        payload._set_body(body)
+        return payload
+
+    def _set_body(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._encoded = {}
+
+    def negotiate(self, accept_encoding):
+        """
+        按客户端接受的编码选择响应体编码
+
+        Args:
+            accept_encoding: Accept-Encoding 请求头
+
+        Returns:
+            str: Content-Encoding，不压缩时为None
+        """
+        if len(self.body) < MIN_COMPRESS_SIZE:
+            return None
+        accepted = _accepted_encodings(accept_encoding)
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def etag_for(self, encoding):
+        """某个编码的响应体的强ETag（不同编码的响应体字节不同，ETag也不同）"""
+        return f"{self.etag}-{encoding}" if encoding else self.etag
+
+    def encoded(self, encoding):
+        """
+        返回指定编码的响应体（压缩结果生成一次后复用）
+
+        Args:
+            encoding: negotiate 选择的编码，None 表示不压缩
+
+        Returns:
+            bytes: 响应体
+        """
+        if encoding is None:
+            return self.body
+        body = self._encoded.get(encoding)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(self.body, quality=5)
+            else:
+                body = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self._encoded[encoding] = body
+        return body
+
+
+class PayloadCache:
+    """按 (键, 数据版本) 缓存 Payload，最近最少使用的先淘汰"""
+
+    def __init__(self, max_entries=256, shared_store=None):
+        """
+        Args:
+            max_entries: 最多缓存的响应体数量
+            shared_store: 多进程共享存储（SharedStore），为None时只在本进程内缓存
+        """
+        self.max_entries = max_entries
+        self.shared_store = shared_store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """
+        获取响应体，版本不一致或不存在时调用 build() 生成数据并序列化
+
+        Args:
+            key: 响应标识（如路由和参数）
+            version: 数据版本，为None时不缓存
+            build: 生成响应数据的函数
+
+        Returns:
+            Payload: 预序列化的响应体
+        """
+        if version is None:
+            return Payload(build())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        payload = self._load_shared(key, version)
+        if payload is None:
+            payload = Payload(build())
+            self._save_shared(key, version, payload)
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def _load_shared(self, key, version):
+        """从共享存储读取同一数据版本的响应体"""
+        if self.shared_store is None:
+            return None
+        try:
+            entry = self.shared_store.get(store_key('payload', key))
+        except Exception as e:
+            logger.warning(f"读取共享响应体 {key} 失败: {e}")
+            return None
+        if entry is None or entry[0] != store_key(version):
+            return None
+        return Payload.from_body(entry[2])
+
+    def _save_shared(self, key, version, payload):
+        if self.shared_store is None:
+            return
+        try:
+            self.shared_store.put(store_key('payload', key), payload.body, version=store_key(version))
+        except Exception as e:
+            logger.warning(f"写入共享响应体 {key} 失败: {e}")
@@ -0,0 +1,475 @@
+"""
+后台刷新调度模块 - 数据接口始终返回最近一次成功获取的快照，过期前由后台线程刷新
+
+- 每个数据集（及按参数区分的键，如股票代码）在内存中保存最近一次有效的数据快照
+- 请求只读取快照；快照过期时返回旧快照并提交后台刷新，不在请求中等待akshare
+- 同一数据集同一键同时只有一个刷新任务，并发请求共享该任务
+- 调度线程定期检查，在快照达到 TTL 的 refresh_ahead 比例时提前刷新，并在启动时预热
+- 进程启动时先读取磁盘缓存文件（不论是否过期）作为初始快照，只有完全没有数据时请求才会等待首次获取
+- 多进程运行时通过共享存储（shared_store）交换快照：同一键由持有租约的进程获取，其他进程直接读取其结果；
+  共享存储中长期未更新的条目由调度线程定期清理
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache_utils import read_cache
+from .payload_cache import Payload
+from .shared_store import store_key
+
+logger = logging.getLogger(__name__)
+
+# 刷新任务的结果：其他进程持有租约正在获取，本进程还没有任何快照
+_LEASE_HELD = object()
+
+
+class DatasetSpec:
+    """数据集的获取方式和刷新策略"""
+
+    def __init__(self, name, fetch, ttl, cache_file=None, wrapped=False, is_valid=None,
+                 prewarm=True, keep_warm=None, is_valid_key=None):
+        """
+        Args:
+            name: 数据集名称
+            fetch: 获取最新数据的函数，带键的数据集调用 fetch(key)，否则 fetch()
+            ttl: 数据有效期（秒）
+            cache_file: 返回磁盘缓存文件路径的函数 cache_file(key)，用于启动时读取旧数据
+            wrapped: 缓存文件是否为 save_cache 格式（{'data', 'timestamp'}）
+            is_valid: 判断获取结果是否有效的函数，无效结果（接口失败时的示例/空数据）不替换已有快照
+            prewarm: 调度器启动时是否预热（带键的数据集应设为False）
+            keep_warm: 带键的数据集最近多少秒内被访问过才会在后台主动刷新，None 表示一直刷新
+            is_valid_key: 判断键是否合法的函数；键会用于拼接缓存文件路径和共享存储键，
+                不合法的键直接拒绝，不读取缓存也不提交刷新
+        """
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.wrapped = wrapped
+        self.is_valid = is_valid or (lambda data: data is not None)
+        self.prewarm = prewarm
+        self.keep_warm = keep_warm
+        self.is_valid_key = is_valid_key
+
+
+class Snapshot:
+    """某个数据集某个键的数据快照"""
+
+    def __init__(self, data, updated_at):
+        self.data = data
+        self.updated_at = updated_at
+        self.last_access = time.time()
+        self.retry_after = 0
+        # 快照数据不再变化，响应体只需序列化一次
+        self.payload = None
+
+
+class RefreshScheduler:
+    """后台刷新调度器"""
+
+    def __init__(self, interval=60, refresh_ahead=0.8, retry_interval=300, max_workers=2, max_keys=256,
+                 shared_store=None, lease_seconds=600, shared_ttl=3 * 24 * 3600, prune_interval=3600):
+        """
+        Args:
+            interval: 调度线程检查间隔（秒）
+            refresh_ahead: 快照年龄达到 TTL 的该比例时提前刷新
+            retry_interval: 刷新失败后的重试间隔（秒）
+            max_workers: 后台刷新线程数
+            max_keys: 每个数据集最多保留的键数量，超出时丢弃最久未访问的
+            shared_store: 多进程共享存储（SharedStore），为None时只在本进程内保存快照
+            lease_seconds: 刷新租约有效期（秒），应大于最慢数据集的获取时间
+            shared_ttl: 共享存储中的条目超过多少秒未更新时删除
+            prune_interval: 清理共享存储的间隔（秒）
+        """
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+        self.max_keys = max_keys
+        self.shared_store = shared_store
+        self.lease_seconds = lease_seconds
+        self.shared_ttl = shared_ttl
+        self.prune_interval = prune_interval
+        self._last_prune = 0
+        self._specs = {}
+        self._snapshots = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='data-refresh')
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def register(self, name, fetch, ttl, **kwargs):
+        """注册数据集（参数见 DatasetSpec）"""
+        self._specs[name] = DatasetSpec(name, fetch, ttl, **kwargs)
+        self._snapshots[name] = OrderedDict()
+
+    def get(self, name, key=None):
+        """
+        获取数据集快照
+
+        快照存在时立即返回（过期则同时提交后台刷新）；内存中没有时先读取磁盘缓存；
+        都没有时等待刷新任务（多个请求共享同一个任务）。
+
+        Args:
+            name: 数据集名称
+            key: 参数键（如股票代码），不带参数的数据集为None
+
+        Returns:
+            数据快照；首次获取失败时返回获取函数的结果（不保存为快照）
+        """
+        snapshot, data = self._resolve(name, key)
+        return data
+
+    def get_versioned(self, name, key=None):
+        """
+        获取数据集快照及其版本（快照更新时间），用于缓存由快照派生的数据
+
+        Returns:
+            tuple: (数据, 版本)，首次获取的结果无效时版本为None
+        """
+        snapshot, data = self._resolve(name, key)
+        return data, (snapshot.updated_at if snapshot is not None else None)
+
+    def get_payload(self, name, key=None):
+        """
+        获取数据集快照的预序列化响应体（每个快照只序列化、压缩一次）
+
+        Returns:
+            Payload: 响应体
+        """
+        snapshot, data = self._resolve(name, key)
+        if snapshot is None:
+            return Payload(data)
+        if snapshot.payload is None:
+            snapshot.payload = Payload(data)
+        return snapshot.payload
+
+    def _resolve(self, name, key):
+        """
+        Returns:
+            tuple: (快照, 数据)，首次获取的结果无效时快照为None
+        """
+        spec = self._specs[name]
+        self._check_key(spec, key)
+        snapshot = self._touch(name, key)
+        if snapshot is None:
+            snapshot = self._load_initial_snapshot(spec, key)
+        if snapshot is not None:
+            if self._is_due(spec, snapshot, time.time(), ratio=1.0):
+                self.refresh(name, key)
+            return snapshot, snapshot.data
+
+        # 没有任何可用数据，只能等待首次获取
+        data = self.refresh(name, key).result()
+        while data is _LEASE_HELD:
+            # 其他进程正在获取：在请求线程中等待其结果写入共享存储（刷新线程不被占用），
+            # 租约释放或过期后重新提交刷新
+            time.sleep(1)
+            snapshot = self._load_shared_snapshot(spec, key)
+            if snapshot is not None:
+                return snapshot, snapshot.data
+            data = self.refresh(name, key).result()
+        return self._touch(name, key), data
+
+    def refresh(self, name, key=None):
+        """
+        提交刷新任务，同一数据集同一键已有任务时返回该任务
+
+        Returns:
+            Future: 结果为获取到的数据
+        """
+        self._check_key(self._specs[name], key)
+        with self._lock:
+            future = self._inflight.get((name, key))
+            if future is None:
+                future = self._executor.submit(self._refresh, name, key)
+                self._inflight[(name, key)] = future
+            return future
+
+    def start(self):
+        """启动调度线程并预热数据集（可重复调用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        for name, spec in self._specs.items():
+            if spec.prewarm and self._load_initial_snapshot(spec, None) is None:
+                self.refresh(name)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='RefreshScheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"后台刷新调度已启动: {list(self._specs)}，检查间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止调度线程和刷新线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def status(self):
+        """
+        各数据集快照状态
+
+        Returns:
+            dict: {数据集: [{'key', 'age', 'refreshing'}, ...]}
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                name: [
+                    {
+                        'key': key,
+                        'age': round(now - snapshot.updated_at, 1),
+                        'refreshing': (name, key) in self._inflight
+                    }
+                    for key, snapshot in snapshots.items()
+                ]
+                for name, snapshots in self._snapshots.items()
+            }
+
+    @staticmethod
+    def _check_key(spec, key):
+        """键不合法时抛出 ValueError（如含路径分隔符的股票代码）"""
+        if key is not None and spec.is_valid_key is not None and not spec.is_valid_key(key):
+            raise ValueError(f"数据集 {spec.name} 的键不合法: {key!r}")
+
+    def _touch(self, name, key):
+        """取出快照并记录访问时间"""
+        with self._lock:
+            snapshot = self._snapshots[name].get(key)
+            if snapshot is not None:
+                snapshot.last_access = time.time()
+                self._snapshots[name].move_to_end(key)
+            return snapshot
+
+    def _store(self, name, key, snapshot):
+        with self._lock:
+            snapshots = self._snapshots[name]
+            snapshots[key] = snapshot
+            snapshots.move_to_end(key)
+            while len(snapshots) > self.max_keys:
+                snapshots.popitem(last=False)
+
+    def _load_initial_snapshot(self, spec, key):
+        """进程内没有快照时，依次读取共享存储和磁盘缓存文件（不检查是否过期）"""
+        snapshot = self._load_shared_snapshot(spec, key)
+        if snapshot is None:
+            snapshot = self._load_disk_snapshot(spec, key)
+        return snapshot
+
+    def _load_shared_snapshot(self, spec, key, newer_than=None):
+        """
+        读取其他进程保存到共享存储的快照
+
+        Args:
+            newer_than: 只读取更新时间晚于该时间的快照，避免重复解析已有的快照
+        """
+        if self.shared_store is None:
+            return None
+        skey = store_key(spec.name, key)
+        try:
+            if newer_than is not None:
+                updated_at = self.shared_store.updated_at(skey)
+                if updated_at is None or updated_at <= newer_than:
+                    return None
+            entry = self.shared_store.get_json(skey)
+        except Exception as e:
+            logger.warning(f"读取共享快照 {spec.name}[{key}] 失败: {e}")
+            return None
+        if entry is None or not spec.is_valid(entry[1]):
+            return None
+        snapshot = Snapshot(entry[1], entry[0])
+        self._store(spec.name, key, snapshot)
+        return snapshot
+
+    def _load_disk_snapshot(self, spec, key):
+        """读取磁盘缓存文件作为初始快照（不检查是否过期）"""
+        if spec.cache_file is None:
+            return None
+        self._check_key(spec, key)
+        cache_file = spec.cache_file(key)
+        if not os.path.exists(cache_file):
+            return None
+        cache_data = read_cache(cache_file)
+        if cache_data is None:
+            return None
+        if spec.wrapped:
+            data = cache_data.get('data')
+            updated_at = cache_data.get('timestamp', 0)
+        else:
+            data = cache_data
+            updated_at = os.path.getmtime(cache_file)
+        if not spec.is_valid(data):
+            return None
+        snapshot = Snapshot(data, updated_at)
+        self._store(spec.name, key, snapshot)
+        return snapshot
+
+    def _refresh(self, name, key):
+        """在刷新线程中获取数据，有效时替换快照"""
+        try:
+            if self.shared_store is not None:
+                return self._refresh_shared(name, key)
+            return self._fetch(name, key)
+        finally:
+            with self._lock:
+                self._inflight.pop((name, key), None)
+
+    def _refresh_shared(self, name, key):
+        """
+        多进程刷新：其他进程已保存较新的快照时直接采用，否则持有租约的进程获取数据
+
+        没有租约时不在刷新线程中等待：已有快照的进程返回旧快照（下次检查时读取其他进程的结果），
+        没有任何快照时返回 _LEASE_HELD，由等待数据的请求线程轮询共享存储。
+        """
+        spec = self._specs[name]
+        skey = store_key(name, key)
+        with self._lock:
+            current = self._snapshots[name].get(key)
+        shared = self._load_shared_snapshot(spec, key, newer_than=current.updated_at if current else None)
+        if shared is not None and not self._is_due(spec, shared, time.time(), self.refresh_ahead):
+            return shared.data
+        current = shared or current
+        try:
+            leased = self.shared_store.acquire_lease(skey, self.lease_seconds)
+        except Exception as e:
+            logger.warning(f"获取刷新租约 {name}[{key}] 失败，直接刷新: {e}")
+            return self._fetch(name, key)
+        if not leased:
+            return current.data if current is not None else _LEASE_HELD
+        try:
+            return self._fetch(name, key)
+        finally:
+            try:
+                self.shared_store.release_lease(skey)
+            except Exception as e:
+                logger.warning(f"释放刷新租约 {name}[{key}] 失败: {e}")
+
+    def _fetch(self, name, key):
+        """调用获取函数，有效时替换快照（启用共享存储时同时写入）"""
+        spec = self._specs[name]
+        start = time.time()
+        try:
+            data = spec.fetch(key) if key is not None else spec.fetch()
+            if spec.is_valid(data):
+                snapshot = Snapshot(data, time.time())
+                self._store(name, key, snapshot)
+                self._publish(name, key, snapshot)
+                logger.info(f"数据集 {name}{f'[{key}]' if key is not None else ''} 刷新完成，"
+                            f"耗时 {time.time() - start:.1f} 秒")
+            else:
+                self._mark_failed(name, key)
+                logger.warning(f"数据集 {name}{f'[{key}]' if key is not None else ''} 刷新结果无效，保留旧快照")
+            return data
+        except Exception as e:
+            self._mark_failed(name, key)
+            logger.error(f"数据集 {name}{f'[{key}]' if key is not None else ''} 刷新失败: {e}")
+            raise
+
+    def _publish(self, name, key, snapshot):
+        """把新快照写入共享存储，供其他进程读取"""
+        if self.shared_store is None:
+            return
+        try:
+            self.shared_store.put_json(store_key(name, key), snapshot.data, updated_at=snapshot.updated_at)
+        except Exception as e:
+            logger.warning(f"写入共享快照 {name}[{key}] 失败: {e}")
+
+    def _mark_failed(self, name, key):
+        with self._lock:
+            snapshot = self._snapshots[name].get(key)
+            if snapshot is not None:
+                snapshot.retry_after = time.time() + self.retry_interval
+
+    def _is_due(self, spec, snapshot, now, ratio):
+        """快照年龄是否达到 TTL 的 ratio 比例（失败重试间隔内不再刷新）"""
+        return now - snapshot.updated_at >= spec.ttl * ratio and now >= snapshot.retry_after
+
+    def _prune_shared(self, now):
+        """定期删除共享存储中长期未更新的条目"""
+        if self.shared_store is None or now - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = now
+        try:
+            removed = self.shared_store.prune(self.shared_ttl)
+        except Exception as e:
+            logger.warning(f"清理共享存储失败: {e}")
+            return
+        if removed:
+            logger.info(f"共享存储已清理 {removed} 个超过 {self.shared_ttl} 秒未更新的条目")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            now = time.time()
+            self._prune_shared(now)
+            due = []
+            with self._lock:
+                for name, snapshots in self._snapshots.items():
+                    spec = self._specs[name]
+                    for key, snapshot in snapshots.items():
+                        if key is not None and spec.keep_warm is not None and now - snapshot.last_access > spec.keep_warm:
+                            continue
+                        if self._is_due(spec, snapshot, now, self.refresh_ahead) and (name, key) not in self._inflight:
+                            due.append((name, key))
+            for name, key in due:
+                self.refresh(name, key)
+
+
+def _has_items(field):
+    """结果中指定列表字段非空时才视为有效（接口失败时各模块返回空列表）"""
+    return lambda data: isinstance(data, dict) and bool(data.get(field))
+
+
+def create_refresh_scheduler(interval=60, shared_store=None):
+    """
+    创建注册了各页面数据集的调度器
+
+    Args:
+        interval: 调度线程检查间隔（秒）
+        shared_store: 多进程共享存储，为None时只在本进程内保存快照
+
+    Returns:
+        RefreshScheduler: 未启动的调度器
+    """
+    from .hkstock_data import (HSI_HISTORICAL_CACHE_FILE, SOUTHBOUND_CACHE_FILE, US_INTEREST_RATE_CACHE_FILE,
+                               get_hkstock_data, get_hsi_historical_data, get_us_interest_rate_data)
+    from .lhb_data import LHB_CACHE_FILE, get_lhb_top10
+    from .macro_data import MONEY_SUPPLY_CACHE_FILE, fetch_macro_china_money_supply
+    from .stock_finance import finance_cache_file, get_stock_financial_data, is_valid_stock_code
+
+    scheduler = RefreshScheduler(interval=interval, shared_store=shared_store)
+    scheduler.register(
+        'lhb', lambda: get_lhb_top10(force_refresh=True), ttl=24 * 3600,
+        cache_file=lambda key: LHB_CACHE_FILE, wrapped=True,
+        # 接口失败时返回"示例股票"数据
+        is_valid=lambda data: bool(data and data.get('codes')) and not data['codes'][0].startswith('示例股票')
+    )
+    scheduler.register(
+        'stock_finance', lambda code: get_stock_financial_data(code, force_refresh=True), ttl=24 * 3600,
+        cache_file=finance_cache_file, wrapped=True,
+        # 部分数据源超时时返回的部分结果不作为快照，后台补全后写入缓存文件
+        is_valid=lambda data: (isinstance(data, dict) and 'error' not in data and data.get('name') != '获取失败'
+                               and not data.get('partial')),
+        prewarm=False, keep_warm=2 * 24 * 3600, is_valid_key=is_valid_stock_code
+    )
+    scheduler.register(
+        'hkstock', lambda: get_hkstock_data(force_refresh=True), ttl=4 * 3600,
+        cache_file=lambda key: SOUTHBOUND_CACHE_FILE, is_valid=_has_items('daily_data')
+    )
+    scheduler.register(
+        'us_interest_rate', lambda: get_us_interest_rate_data(force_refresh=True), ttl=24 * 3600,
+        cache_file=lambda key: US_INTEREST_RATE_CACHE_FILE, is_valid=_has_items('rate_data')
+    )
+    scheduler.register(
+        'hsi_historical', lambda: get_hsi_historical_data(force_refresh=True), ttl=24 * 3600,
+        cache_file=lambda key: HSI_HISTORICAL_CACHE_FILE, is_valid=_has_items('hsi_data')
+    )
+    scheduler.register(
+        'money_supply', lambda: fetch_macro_china_money_supply(force_refresh=True), ttl=2 * 3600,
+        cache_file=lambda key: MONEY_SUPPLY_CACHE_FILE,
+        is_valid=lambda data: isinstance(data, dict) and data.get('status') == 'success'
+    )
+    return scheduler
@@ -0,0 +1,201 @@
+"""
+时间序列多分辨率模块 - 长时间序列预先聚合为 日→周→月→季→年 多个级别，按请求的时间范围和点数选择级别
+
+- SeriesSpec 描述序列的日期字段、原始分辨率和各字段的聚合方式（默认取区间内最后一个非空值）
+- SeriesLevels 由原始数据行生成全部级别，每个级别保存区间起止日期，按 start/end 二分查找
+- select 选择点数不超过 max_points 的最细级别（都超过时使用最粗级别），原始级别直接返回原始数据行
+- SeriesLevelsCache 按 (键, 数据版本) 缓存 SeriesLevels，数据不变时只聚合一次
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 由细到粗的分辨率及对应的 pandas Period 频率
+RESOLUTIONS = (('day', 'D'), ('week', 'W'), ('month', 'M'), ('quarter', 'Q'), ('year', 'Y'))
+
+
+def parse_bound(value, is_end=False):
+    """
+    解析 start/end 参数，支持 YYYY、YYYY-MM、YYYY-MM-DD
+
+    Args:
+        value: 参数值，为空时返回None
+        is_end: 是否为结束日期（取该年/月/日的最后时刻）
+
+    Returns:
+        numpy.datetime64: 日期边界
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if not value:
+        return None
+    try:
+        period = pd.Period(value)
+    except Exception:
+        raise ValueError(f"日期格式错误: {value}，应为 YYYY、YYYY-MM 或 YYYY-MM-DD")
+    bound = period.end_time if is_end else period.start_time
+    return np.datetime64(bound, 'ns')
+
+
+class SeriesSpec:
+    """序列的日期字段、原始分辨率和聚合方式"""
+
+    def __init__(self, field, date_field, base='day', date_format=None, aggregations=None, round_digits=2):
+        """
+        Args:
+            field: 响应中序列所在的字段，如 'hsi_data'
+            date_field: 数据行的日期字段
+            base: 原始数据的分辨率（RESOLUTIONS 中的名称），只生成更粗的级别
+            date_format: 日期字段格式（pandas格式），None 时自动识别
+            aggregations: {输出字段: 聚合方式 或 (源字段, 聚合方式)}，聚合方式为 pandas 的
+                'last'/'first'/'max'/'min'/'mean'/'sum'；未列出的字段取区间内最后一个非空值
+            round_digits: 'mean'/'sum' 结果保留的小数位数
+        """
+        self.field = field
+        self.date_field = date_field
+        self.base = base
+        self.date_format = date_format
+        self.aggregations = aggregations or {}
+        self.round_digits = round_digits
+
+    def build(self, rows):
+        """由原始数据行生成 SeriesLevels"""
+        return SeriesLevels(self, rows)
+
+
+class _Level:
+    """某一分辨率的数据行及各行对应区间的起止日期（按时间升序）"""
+
+    def __init__(self, resolution, rows, first_dates, last_dates):
+        self.resolution = resolution
+        self.rows = rows
+        self.first_dates = first_dates
+        self.last_dates = last_dates
+
+    def bounds(self, start, end):
+        """与 [start, end] 有交集的行的下标范围"""
+        lo = 0 if start is None else int(np.searchsorted(self.last_dates, start, side='left'))
+        hi = len(self.rows) if end is None else int(np.searchsorted(self.first_dates, end, side='right'))
+        return lo, max(lo, hi)
+
+
+class SeriesLevels:
+    """一个序列的全部分辨率级别"""
+
+    def __init__(self, spec, rows):
+        """
+        Args:
+            spec: SeriesSpec
+            rows: 原始数据行（时间升序或降序，select 按相同顺序返回）
+        """
+        self.spec = spec
+        rows = list(rows)
+        dates = pd.to_datetime(pd.Series([row.get(spec.date_field) for row in rows], dtype=object),
+                               format=spec.date_format, errors='coerce')
+        valid = dates.notna().to_numpy()
+        self.descending = bool(valid.sum() > 1 and dates[valid].iloc[0] > dates[valid].iloc[-1])
+
+        order = np.argsort(dates.to_numpy(dtype='datetime64[ns]')[valid], kind='stable')
+        rows = [rows[i] for i in np.flatnonzero(valid)[order]]
+        dates = pd.DatetimeIndex(dates[valid].to_numpy()[order])
+
+        base_dates = dates.to_numpy(dtype='datetime64[ns]')
+        self.levels = [_Level(spec.base, rows, base_dates, base_dates)]
+        names = [name for name, _ in RESOLUTIONS]
+        if rows:
+            frame = pd.DataFrame.from_records(rows)
+            # 只有部分数据行带有的字段（如估算标记），聚合结果为空时不输出
+            self._sparse = set(frame.columns).difference(set(rows[0]).intersection(*rows[1:]))
+            for name, freq in RESOLUTIONS[names.index(spec.base) + 1:]:
+                self.levels.append(self._aggregate(frame, dates, name, freq))
+
+    def _aggregate(self, frame, dates, resolution, freq):
+        """按周期分组聚合，区间日期取组内实际的首末日期"""
+        spec = self.spec
+        buckets = dates.to_period(freq).asi8
+        named = {column: (column, 'last') for column in frame.columns}
+        for output, how in spec.aggregations.items():
+            named[output] = how if isinstance(how, tuple) else (output, how)
+        named['__first_date'] = ('__date', 'min')
+        named['__last_date'] = ('__date', 'max')
+
+        # 日期字段同样取区间内最后一个值，即最后一个实际日期，保持与原始数据相同的格式
+        grouped = frame.assign(__date=dates).groupby(buckets, sort=True).agg(**named)
+        for output, how in spec.aggregations.items():
+            if (how[1] if isinstance(how, tuple) else how) in ('mean', 'sum'):
+                grouped[output] = grouped[output].round(spec.round_digits)
+
+        columns = [column for column in grouped.columns if not column.startswith('__')]
+        values = grouped[columns].astype(object).where(grouped[columns].notna(), None)
+        agg_rows = [
+            {column: value for column, value in zip(columns, record) if value is not None or column not in self._sparse}
+            for record in values.itertuples(index=False, name=None)
+        ]
+        return _Level(resolution, agg_rows,
+                      grouped['__first_date'].to_numpy(dtype='datetime64[ns]'),
+                      grouped['__last_date'].to_numpy(dtype='datetime64[ns]'))
+
+    def select(self, start=None, end=None, max_points=None):
+        """
+        选择级别并截取时间范围
+
+        Args:
+            start: 开始日期（numpy.datetime64 或None）
+            end: 结束日期（numpy.datetime64 或None）
+            max_points: 最多返回的点数，None 表示不限制（返回原始分辨率）
+
+        Returns:
+            tuple: (分辨率名称, 数据行列表)，顺序与原始数据一致
+        """
+        chosen = None
+        for level in self.levels:
+            lo, hi = level.bounds(start, end)
+            chosen = (level, lo, hi)
+            if max_points is None or hi - lo <= max_points:
+                break
+        level, lo, hi = chosen
+        rows = level.rows[lo:hi]
+        if self.descending:
+            rows = rows[::-1]
+        return level.resolution, rows
+
+
+class SeriesLevelsCache:
+    """按 (键, 数据版本) 缓存 SeriesLevels，最近最少使用的先淘汰"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, spec, rows):
+        """
+        获取序列的多分辨率级别，版本不一致或不存在时重新聚合
+
+        Args:
+            key: 序列标识
+            version: 数据版本，为None时不缓存
+            spec: SeriesSpec
+            rows: 返回原始数据行的函数（只在需要重新聚合时调用）
+
+        Returns:
+            SeriesLevels
+        """
+        if version is None:
+            return spec.build(rows())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        levels = spec.build(rows())
+        with self._lock:
+            self._entries[key] = (version, levels)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return levels
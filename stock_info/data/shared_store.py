@@ -0,0 +1,192 @@
+"""
+进程间共享存储模块 - 多个工作进程通过同一个SQLite文件共享数据快照和响应体
+
+- entries 表保存 键 -> (版本, 更新时间, 内容)，刷新调度器的快照和预序列化的响应体都存放在这里
+- leases 表保存刷新租约，同一数据集同一键同时只有一个进程调用akshare，其他进程读取其结果
+- 使用WAL模式，读操作不阻塞写操作；每个线程使用各自的连接，fork后自动重新连接
+- 条目按更新时间清理（prune），长期不再更新的快照和响应体（如不再访问的股票）不会一直留在文件中
+- 只在以多进程方式启动时启用（见 serve.py），单进程运行时不使用
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 指定共享存储文件路径的环境变量，未设置时不启用
+SHARED_STORE_ENV = 'STOCK_INFO_SHARED_STORE'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version TEXT,
+    updated_at REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_updated_at ON entries (updated_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def store_key(*parts):
+    """由数据集名称、参数等生成存储键"""
+    return json.dumps(parts, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+class SharedStore:
+    """基于SQLite的进程间共享存储"""
+
+    def __init__(self, path, busy_timeout=10):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            busy_timeout: 等待其他进程写锁的最长时间（秒）
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """当前线程的连接（fork后的子进程不复用父进程的连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        读取条目
+
+        Returns:
+            tuple: (版本, 更新时间, 内容bytes)，不存在时返回None
+        """
+        row = self._connect().execute(
+            'SELECT version, updated_at, value FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], bytes(row[2])
+
+    def updated_at(self, key):
+        """条目的更新时间，不存在时返回None（不读取内容，用于判断是否需要重新加载）"""
+        row = self._connect().execute('SELECT updated_at FROM entries WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, key, value, version=None, updated_at=None):
+        """
+        写入条目（覆盖同键的旧条目）
+
+        Args:
+            key: 存储键
+            value: 内容bytes
+            version: 内容对应的数据版本
+            updated_at: 更新时间，默认当前时间
+        """
+        self._connect().execute(
+            'INSERT OR REPLACE INTO entries (key, version, updated_at, value) VALUES (?, ?, ?, ?)',
+            (key, version, updated_at if updated_at is not None else time.time(), sqlite3.Binary(value))
+        )
+
+    def get_json(self, key):
+        """
+        读取JSON条目
+
+        Returns:
+            tuple: (更新时间, 数据)，不存在或解析失败时返回None
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        try:
+            return entry[1], json.loads(entry[2])
+        except ValueError as e:
+            logger.warning(f"共享存储条目 {key} 解析失败: {e}")
+            return None
+
+    def put_json(self, key, data, updated_at=None):
+        """写入JSON条目"""
+        value = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.put(key, value, updated_at=updated_at)
+
+    def prune(self, max_age):
+        """
+        删除超过 max_age 秒未更新的条目和已过期的租约
+
+        Args:
+            max_age: 条目保留时间（秒）
+
+        Returns:
+            int: 删除的条目数
+        """
+        now = time.time()
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM entries WHERE updated_at < ?', (now - max_age,)).rowcount
+        conn.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+        return removed
+
+    def acquire_lease(self, key, seconds):
+        """
+        获取刷新租约，其他进程持有未过期的租约时返回False
+
+        Args:
+            key: 租约键
+            seconds: 租约有效期（秒），持有进程异常退出时到期后自动释放
+
+        Returns:
+            bool: 是否获得租约
+        """
+        owner = self._owner()
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT owner, expires_at FROM leases WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                conn.execute('COMMIT')
+                return False
+            conn.execute('INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)',
+                         (key, owner, now + seconds))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def release_lease(self, key):
+        """释放本线程持有的租约"""
+        self._connect().execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, self._owner()))
+
+    @staticmethod
+    def _owner():
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def open_shared_store():
+    """
+    按环境变量打开共享存储
+
+    Returns:
+        SharedStore: 未设置 STOCK_INFO_SHARED_STORE 或打开失败时返回None
+    """
+    path = os.environ.get(SHARED_STORE_ENV)
+    if not path:
+        return None
+    try:
+        return SharedStore(path)
+    except Exception as e:
+        logger.error(f"打开共享存储 {path} 失败，各进程将分别缓存: {e}")
+        return None
@@ -2,6 +2,7 @@
 A股财务数据模块 - 提供A股财务数据相关的获取函数
 """
 import os
+import re
 import json
 import time
 import akshare as ak
@@ -9,30 +10,43 @@ import pandas as pd
 from datetime import datetime, timedelta
 from .cache_utils import CACHE_DIR, read_cache, save_cache, is_cache_expired
 from .common_utils import convert_to_float
+from .fetch_pool import fetch_pool
 
 # 定义股票财务数据缓存目录
 STOCK_FINANCE_CACHE_DIR = os.path.join(CACHE_DIR, 'stock_finance')
 os.makedirs(STOCK_FINANCE_CACHE_DIR, exist_ok=True)
 
-def get_stock_financial_data(stock_code):
+# A股代码：6位数字
+STOCK_CODE_PATTERN = re.compile(r'[0-9]{6}')
+
+def is_valid_stock_code(stock_code):
+    """是否为6位数字的A股代码（代码会用于拼接缓存文件路径）"""
+    return isinstance(stock_code, str) and STOCK_CODE_PATTERN.fullmatch(stock_code) is not None
+
+def finance_cache_file(stock_code):
+    """股票财务数据缓存文件路径"""
+    return os.path.join(STOCK_FINANCE_CACHE_DIR, f'{stock_code}_finance.json')
+
+def get_stock_financial_data(stock_code, force_refresh=False):
     """
     获取股票财务数据，使用缓存机制
     
     Args:
         stock_code: 股票代码
+        force_refresh: 是否忽略缓存重新获取（后台刷新时使用）
         
     Returns:
         dict: 包含股票财务数据的字典
     """
     # 检查股票代码格式
-    if not stock_code.isdigit() or len(stock_code) != 6:
+    if not is_valid_stock_code(stock_code):
         return {'error': '请输入正确的股票代码（6位数字）'}
     
     # 构建缓存文件路径
-    cache_file = os.path.join(STOCK_FINANCE_CACHE_DIR, f'{stock_code}_finance.json')
+    cache_file = finance_cache_file(stock_code)
     
     # 检查缓存是否存在且有效
-    cache_data = read_cache(cache_file)
+    cache_data = None if force_refresh else read_cache(cache_file)
     if cache_data and not is_cache_expired(cache_data.get('timestamp', 0)):
         print(f"使用缓存的股票{stock_code}财务数据")
         return cache_data.get('data')
@@ -40,10 +54,11 @@ def get_stock_financial_data(stock_code):
     # 缓存不存在或已过期，重新获取数据
     print(f"重新获取股票{stock_code}财务数据")
     data = _fetch_stock_financial_data(stock_code)
-    
-    # 保存到缓存
-    save_cache(cache_file, data)
-    
+
+    # 保存到缓存（部分结果由后台补全后再写入）
+    if not data.get('partial'):
+        save_cache(cache_file, data)
+
     return data
 
 def _get_stock_name(stock_code):
@@ -104,250 +119,104 @@ def _get_stock_name(stock_code):
     # 所有方法都失败，返回一个更友好的格式
     return f"股票{stock_code}"
 
-def _fetch_stock_financial_data(stock_code):
-    """从API获取股票财务数据"""
-    try:
-        # 获取资产负债表数据
-        debt_df = ak.stock_financial_debt_ths(symbol=stock_code, indicator="按年度")  # 改为按年度
-        
-        # 获取利润表数据
-        benefit_df = ak.stock_financial_benefit_ths(symbol=stock_code, indicator="按年度")  # 改为按年度
-        
-        # 获取现金流量表数据
-        cash_df = ak.stock_financial_cash_ths(symbol=stock_code, indicator="按年度")
-        
-        # 确保报告期列是字符串类型
-        debt_df['报告期'] = debt_df['报告期'].astype(str)
-        benefit_df['报告期'] = benefit_df['报告期'].astype(str)
-        cash_df['报告期'] = cash_df['报告期'].astype(str)
+# 单次请求等待各数据源的最长时间（秒），超时的数据源在后台继续获取并补全缓存
+FETCH_TIMEOUT = 15
 
+def _submit_financial_sources(stock_code):
+    """
+    提交财务报表和股票名称的获取任务（相互独立，在共享线程池中并发执行）
+    
+    Returns:
+        dict: {数据源名称: Future}
+    """
+    return {
+        'debt': fetch_pool.submit(('ths_debt', stock_code), ak.stock_financial_debt_ths,
+                                  symbol=stock_code, indicator="按年度"),
+        'benefit': fetch_pool.submit(('ths_benefit', stock_code), ak.stock_financial_benefit_ths,
+                                     symbol=stock_code, indicator="按年度"),
+        'cash': fetch_pool.submit(('ths_cash', stock_code), ak.stock_financial_cash_ths,
+                                  symbol=stock_code, indicator="按年度"),
+        'name': fetch_pool.submit(('a_stock_name', stock_code), _get_stock_name, stock_code),
+    }
+
+def _fetch_stock_financial_data(stock_code, timeout=FETCH_TIMEOUT):
+    """
+    从API获取股票财务数据
+    
+    资产负债表、利润表、现金流量表和股票名称并发获取，最多等待 timeout 秒。
+    超时的数据源不再等待，返回带 partial 标记的部分结果；这些数据源在后台获取完成后写入缓存。
+    
+    Args:
+        stock_code: 股票代码
+        timeout: 等待各数据源的最长时间（秒）
         
-        # 保留原始的资产负债表数据用于完整展示
-        debt_df_original = debt_df.copy()
-        
-        # 处理资产负债表数据，计算负债率，并提取实收资本（用于概览展示）
-        # 检查是否存在实收资本列
-        has_registered_capital = '实收资本（或股本）' in debt_df.columns
-        
-        if has_registered_capital:
-            debt_df_summary = debt_df[['报告期', '*资产合计', '*负债合计', '实收资本（或股本）']].copy()
-            debt_df_summary['负债率'] = debt_df_summary.apply(
-                lambda x: convert_to_float(x['*负债合计']) / convert_to_float(x['*资产合计']) * 100 
-                if convert_to_float(x['*资产合计']) != 0 else 0, 
-                axis=1
-            )
-            debt_df_summary['实收资本'] = debt_df_summary.apply(
-                lambda x: convert_to_float(x['实收资本（或股本）']), 
-                axis=1
-            )
-            debt_df_summary = debt_df_summary[['报告期', '负债率', '实收资本']]
-        else:
-            debt_df_summary = debt_df[['报告期', '*资产合计', '*负债合计']].copy()
-            debt_df_summary['负债率'] = debt_df_summary.apply(
-                lambda x: convert_to_float(x['*负债合计']) / convert_to_float(x['*资产合计']) * 100 
-                if convert_to_float(x['*资产合计']) != 0 else 0, 
-                axis=1
-            )
-            debt_df_summary['实收资本'] = None
-            debt_df_summary = debt_df_summary[['报告期', '负债率', '实收资本']]
-        
-        # 保留原始的利润表数据用于完整展示
-        benefit_df_original = benefit_df.copy()
-        
-        # 处理利润表数据，计算净利率、毛利率和提取稀释每股收益、研发投入（用于概览展示）
-        # 检查必要的列是否存在
-        required_columns = ['报告期', '*净利润', '*营业总收入']
-        
-        # 检查是否存在稀释每股收益列、归属于母公司所有者的净利润列和研发费用列
-        has_diluted_eps = '（二）稀释每股收益' in benefit_df.columns
-        has_parent_net_profit = '归属于母公司所有者的净利润' in benefit_df.columns
-        has_rd_expense = '研发费用' in benefit_df.columns
-        
-        if not all(col in benefit_df.columns for col in required_columns):
-            print(f"利润表缺少必要的列: {[col for col in required_columns if col not in benefit_df.columns]}")
-            # 只计算存在的列
-            benefit_df_summary = benefit_df[['报告期', '*净利润', '*营业总收入']].copy()
-            benefit_df_summary['净利率'] = benefit_df_summary.apply(
-                lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
-                if convert_to_float(x['*营业总收入']) != 0 else 0, 
-                axis=1
-            )
-            # 由于缺少营业成本，无法计算毛利率
-            benefit_df_summary['毛利率'] = None
-            # 添加稀释每股收益列，但值为None
-            benefit_df_summary['稀释每股收益'] = None
-            # 添加归属于母公司所有者的净利润列，但值为None
-            benefit_df_summary['归属母公司净利润'] = None
-        else:
-            # 检查是否有营业成本列
-            if '其中：营业成本' in benefit_df.columns:
-                # 选择需要的列，如果有稀释每股收益列、归属于母公司所有者的净利润列和研发费用列，也一并选择
-                cols_to_select = ['报告期', '*净利润', '*营业总收入', '其中：营业成本']
-                if has_diluted_eps:
-                    cols_to_select.append('（二）稀释每股收益')
-                if has_parent_net_profit:
-                    cols_to_select.append('归属于母公司所有者的净利润')
-                if has_rd_expense:
-                    cols_to_select.append('研发费用')
-                
-                benefit_df_summary = benefit_df[cols_to_select].copy()
-                
-                benefit_df_summary['净利率'] = benefit_df_summary.apply(
-                    lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
-                    if convert_to_float(x['*营业总收入']) != 0 else 0, 
-                    axis=1
-                )
-                benefit_df_summary['毛利率'] = benefit_df_summary.apply(
-                    lambda x: ((convert_to_float(x['*营业总收入']) - convert_to_float(x['其中：营业成本'])) 
-                            / convert_to_float(x['*营业总收入'])) * 100 
-                    if convert_to_float(x['*营业总收入']) != 0 else 0, 
-                    axis=1
-                )
-                
-                # 处理稀释每股收益
-                if has_diluted_eps:
-                    benefit_df_summary['稀释每股收益'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['（二）稀释每股收益']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['稀释每股收益'] = None
-                
-                # 处理归属于母公司所有者的净利润
-                if has_parent_net_profit:
-                    benefit_df_summary['归属母公司净利润'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['归属于母公司所有者的净利润']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['归属母公司净利润'] = None
-                
-                # 处理研发投入
-                if has_rd_expense:
-                    benefit_df_summary['研发投入'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['研发费用']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['研发投入'] = None
-            else:
-                print("缺少'其中：营业成本'列，无法计算毛利率")
-                # 选择需要的列，如果有稀释每股收益列、归属于母公司所有者的净利润列和研发费用列，也一并选择
-                cols_to_select = ['报告期', '*净利润', '*营业总收入']
-                if has_diluted_eps:
-                    cols_to_select.append('（二）稀释每股收益')
-                if has_parent_net_profit:
-                    cols_to_select.append('归属于母公司所有者的净利润')
-                if has_rd_expense:
-                    cols_to_select.append('研发费用')
-                
-                benefit_df_summary = benefit_df[cols_to_select].copy()
-                
-                benefit_df_summary['净利率'] = benefit_df_summary.apply(
-                    lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
-                    if convert_to_float(x['*营业总收入']) != 0 else 0, 
-                    axis=1
-                )
-                benefit_df_summary['毛利率'] = None
-                
-                # 处理稀释每股收益
-                if has_diluted_eps:
-                    benefit_df_summary['稀释每股收益'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['（二）稀释每股收益']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['稀释每股收益'] = None
-                
-                # 处理归属于母公司所有者的净利润
-                if has_parent_net_profit:
-                    benefit_df_summary['归属母公司净利润'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['归属于母公司所有者的净利润']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['归属母公司净利润'] = None
-                
-                # 处理研发投入
-                if has_rd_expense:
-                    benefit_df_summary['研发投入'] = benefit_df_summary.apply(
-                        lambda x: convert_to_float(x['研发费用']), 
-                        axis=1
-                    )
-                else:
-                    benefit_df_summary['研发投入'] = None
-        
-        # 选择需要的列
-        benefit_df_summary = benefit_df_summary[['报告期', '净利率', '毛利率', '稀释每股收益', '归属母公司净利润', '研发投入']]
-        
-        # 合并数据
-        try:
-            merged_df = pd.merge(debt_df_summary, benefit_df_summary, on='报告期', how='outer')
-        except Exception as e:
-            print(f"合并数据出错: {e}")
-            # 尝试使用concat方法合并
-            print("尝试使用concat方法合并数据...")
-            debt_df_summary.set_index('报告期', inplace=True)
-            benefit_df_summary.set_index('报告期', inplace=True)
-            merged_df = pd.concat([debt_df_summary, benefit_df_summary], axis=1)
-            merged_df.reset_index(inplace=True)
+    Returns:
+        dict: 股票财务数据
+    """
+    futures = _submit_financial_sources(stock_code)
+    results, errors, pending = fetch_pool.gather(futures, timeout)
+    if errors:
+        for name, error in errors.items():
+            print(f"获取股票{stock_code}财务数据出错（{name}）: {error}")
+        return _failed_financial_data(stock_code)
+    
+    if pending:
+        print(f"股票{stock_code}的数据源 {sorted(pending)} 超过{timeout}秒未返回，先返回部分结果")
+        fetch_pool.when_done(('stock_finance', stock_code), futures.values(),
+                             lambda: _complete_stock_financial_data(stock_code, futures))
+    return _build_stock_financial_data(stock_code, results, pending)
+
+def _complete_stock_financial_data(stock_code, futures):
+    """后台任务全部完成后组装完整数据并写入缓存"""
+    results, errors, pending = fetch_pool.gather(futures, 0)
+    if errors or pending:
+        return
+    data = _build_stock_financial_data(stock_code, results)
+    if data.get('name') != "获取失败":
+        save_cache(finance_cache_file(stock_code), data)
+        print(f"股票{stock_code}财务数据已在后台补全")
+
+def _failed_financial_data(stock_code):
+    """获取失败时返回的空数据"""
+    return {
+        'code': stock_code,
+        'name': "获取失败",
+        'financial_data': [],
+        'full_financial_data': []
+    }
+
+def _build_stock_financial_data(stock_code, sources, pending=()):
+    """
+    组装股票财务数据
+    
+    Args:
+        stock_code: 股票代码
+        sources: 已获取的数据源 {'debt', 'benefit', 'cash', 'name'}，可能缺少仍在获取的部分
+        pending: 仍在获取的数据源名称
         
-        # 按报告期排序并获取最近10个年度的数据
-        merged_df = merged_df.sort_values('报告期', ascending=False).head(10)
+    Returns:
+        dict: 包含概览数据和完整财务报表数据的字典，有数据源未返回时带 partial 标记
+    """
+    try:
+        # 数据源的结果会被后续请求复用，这里只处理副本
+        statements = {}
+        for name in ('debt', 'benefit', 'cash'):
+            if name in sources:
+                df = sources[name].copy()
+                # 确保报告期列是字符串类型
+                df['报告期'] = df['报告期'].astype(str)
+                statements[name] = df
         
-        # 转换为字典列表
+        # 概览数据需要资产负债表和利润表，完整报表需要三张表
         result = []
-        for _, row in merged_df.iterrows():
-            result.append({
-                '报告期': row['报告期'],
-                '负债率': round(row['负债率'], 2) if not pd.isna(row['负债率']) else None,
-                '净利率': round(row['净利率'], 2) if not pd.isna(row['净利率']) else None,
-                '毛利率': round(row['毛利率'], 2) if not pd.isna(row['毛利率']) else None,
-                '稀释每股收益': round(row['稀释每股收益'], 4) if not pd.isna(row['稀释每股收益']) else None,
-                '归属母公司净利润': round(row['归属母公司净利润'], 2) if not pd.isna(row['归属母公司净利润']) else None,
-                '实收资本': round(row['实收资本'], 2) if not pd.isna(row['实收资本']) else None,
-                '研发投入': round(row['研发投入'], 2) if not pd.isna(row['研发投入']) else None
-            })
-        
-        # 获取股票名称
-        stock_name = _get_stock_name(stock_code)
-        
-        # 处理完整的财务报表数据（获取所有报告期的数据）
-        # 获取所有报告期的交集
-        common_periods = set(debt_df_original['报告期']) & set(benefit_df_original['报告期']) & set(cash_df['报告期'])
-        common_periods = sorted(list(common_periods), reverse=True)  # 获取所有财务周期
-        
-        # 构建完整的财务报表数据
+        if 'debt' in statements and 'benefit' in statements:
+            result = _build_financial_summary(statements['debt'], statements['benefit'])
         full_financial_data = []
-        for period in common_periods:
-            # 资产负债表数据（使用原始数据）
-            debt_row = debt_df_original[debt_df_original['报告期'] == period]
-            # 利润表数据（使用原始数据）
-            benefit_row = benefit_df_original[benefit_df_original['报告期'] == period]
-            # 现金流量表数据
-            cash_row = cash_df[cash_df['报告期'] == period]
-            
-            period_data = {'报告期': period}
-            
-            # 添加资产负债表数据
-            if not debt_row.empty:
-                for col in debt_row.columns:
-                    if col != '报告期':
-                        period_data[f'资产负债表_{col}'] = debt_row.iloc[0][col]
-            
-            # 添加利润表数据
-            if not benefit_row.empty:
-                for col in benefit_row.columns:
-                    if col != '报告期':
-                        period_data[f'利润表_{col}'] = benefit_row.iloc[0][col]
-            
-            # 添加现金流量表数据
-            if not cash_row.empty:
-                for col in cash_row.columns:
-                    if col != '报告期':
-                        period_data[f'现金流量表_{col}'] = cash_row.iloc[0][col]
-            
-            full_financial_data.append(period_data)
+        if len(statements) == 3:
+            full_financial_data = _build_full_financial_data(statements['debt'], statements['benefit'], statements['cash'])
+        
+        # 股票名称未返回时使用默认名称
+        stock_name = sources.get('name', f"股票{stock_code}")
         
         # 处理NaN值，将其转换为None以确保JSON序列化正常
         def clean_nan_values(obj):
@@ -366,15 +235,250 @@ def _fetch_stock_financial_data(stock_code):
             'financial_data': result,  # 保留原有的简化数据用于图表展示
             'full_financial_data': full_financial_data  # 新增完整的财务报表数据
         }
+        if pending:
+            # 部分数据源仍在获取，结果不写入缓存
+            result_data['partial'] = True
+            result_data['pending_sources'] = sorted(pending)
         
         # 清理结果中的NaN值
         return clean_nan_values(result_data)
     except Exception as e:
         print(f"获取股票{stock_code}财务数据出错: {e}")
         # 返回空数据
-        return {
-            'code': stock_code,
-            'name': "获取失败",
-            'financial_data': [],
-            'full_financial_data': []
-        }
\ No newline at end of file
+        return _failed_financial_data(stock_code)
+
+def _build_financial_summary(debt_df, benefit_df):
+    """
+    计算概览数据：负债率、实收资本、净利率、毛利率、稀释每股收益、归属母公司净利润和研发投入
+    
+    Returns:
+        list: 最近10个年度的数据
+    """
+    # 处理资产负债表数据，计算负债率，并提取实收资本（用于概览展示）
+    # 检查是否存在实收资本列
+    has_registered_capital = '实收资本（或股本）' in debt_df.columns
+
+    if has_registered_capital:
+        debt_df_summary = debt_df[['报告期', '*资产合计', '*负债合计', '实收资本（或股本）']].copy()
+        debt_df_summary['负债率'] = debt_df_summary.apply(
+            lambda x: convert_to_float(x['*负债合计']) / convert_to_float(x['*资产合计']) * 100 
+            if convert_to_float(x['*资产合计']) != 0 else 0, 
+            axis=1
+        )
+        debt_df_summary['实收资本'] = debt_df_summary.apply(
+            lambda x: convert_to_float(x['实收资本（或股本）']), 
+            axis=1
+        )
+        debt_df_summary = debt_df_summary[['报告期', '负债率', '实收资本']]
+    else:
+        debt_df_summary = debt_df[['报告期', '*资产合计', '*负债合计']].copy()
+        debt_df_summary['负债率'] = debt_df_summary.apply(
+            lambda x: convert_to_float(x['*负债合计']) / convert_to_float(x['*资产合计']) * 100 
+            if convert_to_float(x['*资产合计']) != 0 else 0, 
+            axis=1
+        )
+        debt_df_summary['实收资本'] = None
+        debt_df_summary = debt_df_summary[['报告期', '负债率', '实收资本']]
+
+    # 处理利润表数据，计算净利率、毛利率和提取稀释每股收益、研发投入（用于概览展示）
+    # 检查必要的列是否存在
+    required_columns = ['报告期', '*净利润', '*营业总收入']
+
+    # 检查是否存在稀释每股收益列、归属于母公司所有者的净利润列和研发费用列
+    has_diluted_eps = '（二）稀释每股收益' in benefit_df.columns
+    has_parent_net_profit = '归属于母公司所有者的净利润' in benefit_df.columns
+    has_rd_expense = '研发费用' in benefit_df.columns
+
+    if not all(col in benefit_df.columns for col in required_columns):
+        print(f"利润表缺少必要的列: {[col for col in required_columns if col not in benefit_df.columns]}")
+        # 只计算存在的列
+        benefit_df_summary = benefit_df[['报告期', '*净利润', '*营业总收入']].copy()
+        benefit_df_summary['净利率'] = benefit_df_summary.apply(
+            lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
+            if convert_to_float(x['*营业总收入']) != 0 else 0, 
+            axis=1
+        )
+        # 由于缺少营业成本，无法计算毛利率
+        benefit_df_summary['毛利率'] = None
+        # 添加稀释每股收益列，但值为None
+        benefit_df_summary['稀释每股收益'] = None
+        # 添加归属于母公司所有者的净利润列，但值为None
+        benefit_df_summary['归属母公司净利润'] = None
+    else:
+        # 检查是否有营业成本列
+        if '其中：营业成本' in benefit_df.columns:
+            # 选择需要的列，如果有稀释每股收益列、归属于母公司所有者的净利润列和研发费用列，也一并选择
+            cols_to_select = ['报告期', '*净利润', '*营业总收入', '其中：营业成本']
+            if has_diluted_eps:
+                cols_to_select.append('（二）稀释每股收益')
+            if has_parent_net_profit:
+                cols_to_select.append('归属于母公司所有者的净利润')
+            if has_rd_expense:
+                cols_to_select.append('研发费用')
+
+            benefit_df_summary = benefit_df[cols_to_select].copy()
+
+            benefit_df_summary['净利率'] = benefit_df_summary.apply(
+                lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
+                if convert_to_float(x['*营业总收入']) != 0 else 0, 
+                axis=1
+            )
+            benefit_df_summary['毛利率'] = benefit_df_summary.apply(
+                lambda x: ((convert_to_float(x['*营业总收入']) - convert_to_float(x['其中：营业成本'])) 
+                        / convert_to_float(x['*营业总收入'])) * 100 
+                if convert_to_float(x['*营业总收入']) != 0 else 0, 
+                axis=1
+            )
+
+            # 处理稀释每股收益
+            if has_diluted_eps:
+                benefit_df_summary['稀释每股收益'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['（二）稀释每股收益']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['稀释每股收益'] = None
+
+            # 处理归属于母公司所有者的净利润
+            if has_parent_net_profit:
+                benefit_df_summary['归属母公司净利润'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['归属于母公司所有者的净利润']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['归属母公司净利润'] = None
+
+            # 处理研发投入
+            if has_rd_expense:
+                benefit_df_summary['研发投入'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['研发费用']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['研发投入'] = None
+        else:
+            print("缺少'其中：营业成本'列，无法计算毛利率")
+            # 选择需要的列，如果有稀释每股收益列、归属于母公司所有者的净利润列和研发费用列，也一并选择
+            cols_to_select = ['报告期', '*净利润', '*营业总收入']
+            if has_diluted_eps:
+                cols_to_select.append('（二）稀释每股收益')
+            if has_parent_net_profit:
+                cols_to_select.append('归属于母公司所有者的净利润')
+            if has_rd_expense:
+                cols_to_select.append('研发费用')
+
+            benefit_df_summary = benefit_df[cols_to_select].copy()
+
+            benefit_df_summary['净利率'] = benefit_df_summary.apply(
+                lambda x: convert_to_float(x['*净利润']) / convert_to_float(x['*营业总收入']) * 100 
+                if convert_to_float(x['*营业总收入']) != 0 else 0, 
+                axis=1
+            )
+            benefit_df_summary['毛利率'] = None
+
+            # 处理稀释每股收益
+            if has_diluted_eps:
+                benefit_df_summary['稀释每股收益'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['（二）稀释每股收益']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['稀释每股收益'] = None
+
+            # 处理归属于母公司所有者的净利润
+            if has_parent_net_profit:
+                benefit_df_summary['归属母公司净利润'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['归属于母公司所有者的净利润']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['归属母公司净利润'] = None
+
+            # 处理研发投入
+            if has_rd_expense:
+                benefit_df_summary['研发投入'] = benefit_df_summary.apply(
+                    lambda x: convert_to_float(x['研发费用']), 
+                    axis=1
+                )
+            else:
+                benefit_df_summary['研发投入'] = None
+
+    # 选择需要的列
+    benefit_df_summary = benefit_df_summary[['报告期', '净利率', '毛利率', '稀释每股收益', '归属母公司净利润', '研发投入']]
+
+    # 合并数据
+    try:
+        merged_df = pd.merge(debt_df_summary, benefit_df_summary, on='报告期', how='outer')
+    except Exception as e:
+        print(f"合并数据出错: {e}")
+        # 尝试使用concat方法合并
+        print("尝试使用concat方法合并数据...")
+        debt_df_summary.set_index('报告期', inplace=True)
+        benefit_df_summary.set_index('报告期', inplace=True)
+        merged_df = pd.concat([debt_df_summary, benefit_df_summary], axis=1)
+        merged_df.reset_index(inplace=True)
+
+    # 按报告期排序并获取最近10个年度的数据
+    merged_df = merged_df.sort_values('报告期', ascending=False).head(10)
+
+    # 转换为字典列表
+    result = []
+    for _, row in merged_df.iterrows():
+        result.append({
+            '报告期': row['报告期'],
+            '负债率': round(row['负债率'], 2) if not pd.isna(row['负债率']) else None,
+            '净利率': round(row['净利率'], 2) if not pd.isna(row['净利率']) else None,
+            '毛利率': round(row['毛利率'], 2) if not pd.isna(row['毛利率']) else None,
+            '稀释每股收益': round(row['稀释每股收益'], 4) if not pd.isna(row['稀释每股收益']) else None,
+            '归属母公司净利润': round(row['归属母公司净利润'], 2) if not pd.isna(row['归属母公司净利润']) else None,
+            '实收资本': round(row['实收资本'], 2) if not pd.isna(row['实收资本']) else None,
+            '研发投入': round(row['研发投入'], 2) if not pd.isna(row['研发投入']) else None
+        })
+    
+    return result
+
+def _build_full_financial_data(debt_df, benefit_df, cash_df):
+    """
+    合并三张报表中所有报告期的完整数据
+    
+    Returns:
+        list: 按报告期倒序排列的数据
+    """
+    # 处理完整的财务报表数据（获取所有报告期的数据）
+    # 获取所有报告期的交集
+    common_periods = set(debt_df['报告期']) & set(benefit_df['报告期']) & set(cash_df['报告期'])
+    common_periods = sorted(list(common_periods), reverse=True)  # 获取所有财务周期
+
+    # 构建完整的财务报表数据
+    full_financial_data = []
+    for period in common_periods:
+        # 资产负债表数据（使用原始数据）
+        debt_row = debt_df[debt_df['报告期'] == period]
+        # 利润表数据（使用原始数据）
+        benefit_row = benefit_df[benefit_df['报告期'] == period]
+        # 现金流量表数据
+        cash_row = cash_df[cash_df['报告期'] == period]
+
+        period_data = {'报告期': period}
+
+        # 添加资产负债表数据
+        if not debt_row.empty:
+            for col in debt_row.columns:
+                if col != '报告期':
+                    period_data[f'资产负债表_{col}'] = debt_row.iloc[0][col]
+
+        # 添加利润表数据
+        if not benefit_row.empty:
+            for col in benefit_row.columns:
+                if col != '报告期':
+                    period_data[f'利润表_{col}'] = benefit_row.iloc[0][col]
+
+        # 添加现金流量表数据
+        if not cash_row.empty:
+            for col in cash_row.columns:
+                if col != '报告期':
+                    period_data[f'现金流量表_{col}'] = cash_row.iloc[0][col]
+
+        full_financial_data.append(period_data)
+    
+    return full_financial_data
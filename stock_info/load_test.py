@@ -0,0 +1,146 @@
+"""
+压力测试脚本 - 模拟多个用户同时访问，统计各接口的延迟分布
+
+用法:
+    python load_test.py                                   # 默认接口，16个并发，持续30秒
+    python load_test.py --base-url http://192.168.1.10:8080 --concurrency 32 --duration 60
+    python load_test.py --endpoint /api/hkstock --endpoint "/api/stock_finance?code=600519"
+"""
+import argparse
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+# 各页面加载时请求的接口
+DEFAULT_ENDPOINTS = [
+    '/api/lhb_data',
+    '/api/stock_finance?code=600519',
+    '/api/hkstock',
+    '/api/us_interest_rate',
+    '/api/hsi_historical',
+    '/api/macro/money_supply',
+    '/api/sh_house_price/data',
+    '/api/institutional_holdings/report_dates',
+    '/api/institutional_holdings/all',
+    '/api/institutional_holdings/fund',
+]
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算百分位数（sorted_values 已升序排列）"""
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _request(url, timeout, gzip):
+    """
+    发送一次GET请求
+
+    Returns:
+        tuple: (HTTP状态码或None, 耗时毫秒, 响应字节数)
+    """
+    req = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'} if gzip else {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            size = len(resp.read())
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status, size = e.code, 0
+    except Exception:
+        status, size = None, 0
+    return status, (time.perf_counter() - start) * 1000, size
+
+
+def run_load_test(base_url, endpoints, concurrency, duration, timeout=60, gzip=True):
+    """
+    并发访问各接口直到达到持续时间
+
+    每个并发用户按顺序轮流请求各接口（起始位置错开），模拟多人同时打开不同页面。
+
+    Returns:
+        tuple: ({接口: [(状态码, 耗时毫秒, 字节数), ...]}, 实际持续秒数)
+    """
+    results = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(offset):
+        i = offset
+        local = []
+        while time.perf_counter() < deadline:
+            endpoint = endpoints[i % len(endpoints)]
+            local.append((endpoint, _request(base_url + endpoint, timeout, gzip)))
+            i += 1
+        with lock:
+            for endpoint, result in local:
+                results[endpoint].append(result)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def print_report(results, elapsed, endpoints):
+    """打印各接口的请求数、错误数和延迟百分位"""
+    header = f"{'接口':<45}{'请求数':>8}{'错误':>6}{'平均ms':>9}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'最大ms':>9}"
+    print(header)
+    print('-' * len(header))
+    all_latencies = []
+    total_errors = 0
+    for endpoint in endpoints:
+        records = results.get(endpoint, [])
+        latencies = sorted(ms for _, ms, _ in records)
+        errors = sum(1 for status, _, _ in records if status is None or status >= 400)
+        all_latencies.extend(latencies)
+        total_errors += errors
+        if not latencies:
+            print(f"{endpoint:<45}{0:>8}")
+            continue
+        print(f"{endpoint:<45}{len(latencies):>8}{errors:>6}{sum(latencies) / len(latencies):>9.1f}"
+              f"{percentile(latencies, 50):>9.1f}{percentile(latencies, 90):>9.1f}"
+              f"{percentile(latencies, 99):>9.1f}{latencies[-1]:>9.1f}")
+    all_latencies.sort()
+    print('-' * len(header))
+    print(f"{'合计':<45}{len(all_latencies):>8}{total_errors:>6}"
+          f"{(sum(all_latencies) / len(all_latencies) if all_latencies else float('nan')):>9.1f}"
+          f"{percentile(all_latencies, 50):>9.1f}{percentile(all_latencies, 90):>9.1f}"
+          f"{percentile(all_latencies, 99):>9.1f}{(all_latencies[-1] if all_latencies else float('nan')):>9.1f}")
+    print(f"持续 {elapsed:.1f} 秒，吞吐量 {len(all_latencies) / elapsed:.1f} 请求/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='stock_info 接口压力测试')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080', help='服务地址')
+    parser.add_argument('--endpoint', action='append', help='要测试的接口路径（可重复），默认测试各页面的主要接口')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发用户数')
+    parser.add_argument('--duration', type=float, default=30, help='持续时间（秒）')
+    parser.add_argument('--timeout', type=float, default=60, help='单个请求超时（秒）')
+    parser.add_argument('--no-gzip', action='store_true', help='不发送 Accept-Encoding: gzip')
+    parser.add_argument('--warmup', action='store_true', help='正式测试前先把每个接口请求一次（排除首次获取数据的耗时）')
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip('/')
+    endpoints = args.endpoint or DEFAULT_ENDPOINTS
+    if args.warmup:
+        for endpoint in endpoints:
+            status, ms, _ = _request(base_url + endpoint, args.timeout, not args.no_gzip)
+            print(f"预热 {endpoint}: {status} {ms:.0f}ms")
+
+    print(f"压测 {base_url}: {len(endpoints)} 个接口，{args.concurrency} 个并发，持续 {args.duration} 秒")
+    results, elapsed = run_load_test(base_url, endpoints, args.concurrency, args.duration,
+                                     timeout=args.timeout, gzip=not args.no_gzip)
+    print_report(results, elapsed, endpoints)
+
+
+if __name__ == '__main__':
+    main()
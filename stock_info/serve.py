@@ -0,0 +1,131 @@
+"""
+生产环境启动脚本 - 使用多进程/多线程WSGI服务器运行 stock_info
+
+- gunicorn（Linux/macOS）：多个工作进程，每个进程多线程；应用和机构持股表在主进程中预加载，
+  工作进程fork后共享同一份内存，各自启动后台刷新调度器
+- waitress（Windows）：单进程多线程
+- 各进程通过共享存储（SQLite文件）交换数据快照和响应体，同一数据只由一个进程调用akshare
+
+用法:
+    python serve.py                                  # 自动选择服务器
+    python serve.py --server gunicorn --workers 4 --threads 8
+    python serve.py --server waitress --threads 16 --port 8080
+"""
+import argparse
+import logging
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SHARED_STORE = os.path.join(BASE_DIR, 'cache', 'shared_store.sqlite3')
+
+logger = logging.getLogger(__name__)
+
+
+def _load_app(preload):
+    """
+    导入Flask应用（必须在设置环境变量之后导入）
+
+    Args:
+        preload: 是否在主进程中预加载（gunicorn），此时后台刷新调度器改为在工作进程中启动
+    """
+    if preload:
+        os.environ['STOCK_INFO_PRELOAD'] = '1'
+    # app 使用相对路径访问 templates、static、logs
+    os.chdir(BASE_DIR)
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    from app import app
+    if preload:
+        # fork前加载机构持股表，工作进程共享这份内存而不是各自解析CSV
+        from data import institutional_holdings_data
+        institutional_holdings_data.data_version()
+    return app
+
+
+def _post_fork(server, worker):
+    """gunicorn工作进程启动后开始后台刷新（线程不能跨fork继承）"""
+    from data import refresh_scheduler
+    refresh_scheduler.start()
+
+
+def run_gunicorn(host, port, workers, threads):
+    """使用gunicorn启动多进程服务"""
+    from gunicorn.app.base import BaseApplication
+
+    class StockInfoApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for name, value in self.options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return _load_app(preload=True)
+
+    StockInfoApplication({
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'post_fork': _post_fork,
+        'timeout': 120,
+        'accesslog': '-',
+    }).run()
+
+
+def run_waitress(host, port, threads):
+    """使用waitress启动单进程多线程服务"""
+    from waitress import serve
+    app = _load_app(preload=False)
+    logger.info(f"waitress 启动: http://{host}:{port}，线程数 {threads}")
+    serve(app, host=host, port=port, threads=threads)
+
+
+def _choose_server():
+    """gunicorn 不支持Windows，其他平台优先使用gunicorn"""
+    if os.name != 'nt':
+        try:
+            import gunicorn  # noqa: F401
+            return 'gunicorn'
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return 'waitress'
+    except ImportError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以生产模式启动 stock_info')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=8080, help='监听端口')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress'], default='auto', help='WSGI服务器')
+    parser.add_argument('--workers', type=int, help='工作进程数（仅gunicorn，默认 min(4, CPU核数)）')
+    parser.add_argument('--threads', type=int, default=8, help='每个进程的线程数')
+    parser.add_argument('--shared-store', default=DEFAULT_SHARED_STORE, help='进程间共享存储文件路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    server = args.server if args.server != 'auto' else _choose_server()
+    if server is None:
+        sys.exit('未安装WSGI服务器，请先安装: pip install gunicorn（Linux/macOS）或 pip install waitress')
+
+    # 必须在导入 data 模块之前设置，各进程据此打开同一个共享存储
+    os.environ['STOCK_INFO_SHARED_STORE'] = os.path.abspath(args.shared_store)
+
+    if server == 'gunicorn':
+        run_gunicorn(args.host, args.port, args.workers or min(4, os.cpu_count() or 1), args.threads)
+    else:
+        if args.workers:
+            logger.warning("waitress 只支持单进程，--workers 参数被忽略，请用 --threads 调整并发数")
+        run_waitress(args.host, args.port, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,12 +10,11 @@ import logging
 import os
 import sys
 import shutil
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import multiprocessing as mp
-from multiprocessing import Queue, Process, JoinableQueue
-import time
 
 # 添加当前目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -87,34 +86,6 @@ class BacktestingSystem:
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"日志系统已配置，日志文件: {self.log_file}")
     
-    def _setup_worker_logging(self, process_id: int):
-        """
-        为工作进程配置日志系统
-        
-        Args:
-            process_id: 进程ID
-        """
-        # 清除当前进程的日志配置
-        root_logger = logging.getLogger()
-        for handler in root_logger.handlers[:]:
-            root_logger.removeHandler(handler)
-        
-        # 使用主进程的日志文件
-        if hasattr(self, 'log_file') and self.log_file:
-            # 创建文件处理器和控制台处理器
-            file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
-            console_handler = logging.StreamHandler(sys.stdout)
-            
-            # 设置格式
-            formatter = logging.Formatter(f'%(asctime)s - %(name)s - %(levelname)s - [Process-{process_id}] %(message)s')
-            file_handler.setFormatter(formatter)
-            console_handler.setFormatter(formatter)
-            
-            # 配置根日志器
-            root_logger.setLevel(logging.INFO)
-            root_logger.addHandler(file_handler)
-            root_logger.addHandler(console_handler)
-    
     def clear_output_folder(self):
         """清空output文件夹"""
         if os.path.exists(self.output_folder):
@@ -247,7 +218,8 @@ class BacktestingSystem:
             save_results: 是否保存结果
             
         Returns:
-            Dict[str, Any]: 测试结果
+            Dict[str, Any]: 测试结果，信号在 result_df（按日期、股票代码排序的DataFrame）中，
+            不再另外返回逐条的信号字典列表
         """
         # 配置日志系统
         self._setup_logging()
@@ -261,45 +233,29 @@ class BacktestingSystem:
             # 执行批量测试
             self.logger.info(f"开始批量测试 {len(stock_codes)} 个股票，使用 {num_processes} 个进程")
             
-            if num_processes == 1:
-                # 单进程处理
-                all_signals = []
-                for stock_code in stock_codes:
-                    signals = self.stock_selector.test_single_stock(stock_code, verbose=False)
-                    all_signals.extend(signals)
-            else:
-                # 多进程处理
-                all_signals = self._process_stocks_multiprocessing(stock_codes, num_processes)
+            result_df = self._collect_signals(stock_codes, num_processes)
             
-            # 转换为DataFrame
-            if all_signals:
-                result_df = pd.DataFrame(all_signals)
-                result_df = result_df.sort_values(['date', 'stock_code']).reset_index(drop=True)
-            else:
-                result_df = pd.DataFrame()
-            
-            self.logger.info(f"批量测试完成，共找到 {len(all_signals)} 个信号")
+            self.logger.info(f"批量测试完成，共找到 {len(result_df)} 个信号")
             
             if result_df.empty:
                 self.logger.warning("批量测试未找到任何信号")
                 return {
                     'stock_codes': stock_codes,
-                    'signals': [],
                     'total_signals': 0,
                     'result_df': result_df
                 }
             
-            # 转换为信号列表
-            signals = result_df.to_dict('records')
+            # 构建一次信号表，供各项分析复用
+            signal_table = self.result_analyzer.build_signal_table(result_df)
             
             # 分析结果
-            analysis = self.result_analyzer.analyze_signals(signals)
-            portfolio_perf = self.result_analyzer.calculate_portfolio_performance(signals, daily_selection_strategy='all')
+            analysis = self.result_analyzer.analyze_signals(signal_table)
+            portfolio_perf = self.result_analyzer.calculate_portfolio_performance(signal_table, daily_selection_strategy='all')
             
             # 显示摘要
             print(f"\n批量测试完成:")
             print(f"  测试股票数量: {len(stock_codes)}")
-            print(f"  找到信号数量: {len(signals)}")
+            print(f"  找到信号数量: {len(result_df)}")
             print(f"  涉及股票数量: {analysis.get('basic_stats', {}).get('unique_stocks', 0)}")
             
             if 'error' not in portfolio_perf:
@@ -313,21 +269,20 @@ class BacktestingSystem:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 output_file = os.path.join(self.output_folder, f"batch_test_{timestamp}.csv")
                 # 导出CSV数据文件
-                self.result_exporter.export_to_csv(signals, output_file, include_analysis=False)
+                self.result_exporter.export_to_csv(result_df, output_file, include_analysis=False)
                 
                 # 生成详细的txt报告文件
                 report_file = os.path.join(self.output_folder, f"batch_report_{timestamp}.txt")
-                self.result_analyzer.generate_performance_report(signals, report_file, self.get_strategy_description())
+                self.result_analyzer.generate_performance_report(signal_table, report_file, self.get_strategy_description())
             
             # 生成测试简报
             self.result_analyzer.write_backtest_result_to_file(
-                signals, self.get_strategy_description(), current_dir
+                signal_table, self.get_strategy_description(), current_dir
             )
             
             return {
                 'stock_codes': stock_codes,
-                'signals': signals,
-                'total_signals': len(signals),
+                'total_signals': len(result_df),
                 'analysis': analysis,
                 'portfolio_performance': portfolio_perf,
                 'result_df': result_df
@@ -349,7 +304,8 @@ class BacktestingSystem:
             save_results: 是否保存结果
             
         Returns:
-            Dict[str, Any]: 测试结果
+            Dict[str, Any]: 测试结果，信号在 result_df（按日期、股票代码排序的DataFrame）中，
+            不再另外返回逐条的信号字典列表
         """
         # 配置日志系统
         self._setup_logging()
@@ -372,45 +328,29 @@ class BacktestingSystem:
             # 执行全量测试 - 使用本地的批量处理逻辑
             self.logger.info(f"开始全量测试 {len(all_stock_codes)} 个股票，使用 {num_processes} 个进程")
             
-            if num_processes == 1:
-                # 单进程处理
-                all_signals = []
-                for stock_code in all_stock_codes:
-                    signals = self.stock_selector.test_single_stock(stock_code, verbose=False)
-                    all_signals.extend(signals)
-            else:
-                # 多进程处理
-                all_signals = self._process_stocks_multiprocessing(all_stock_codes, num_processes)
-            
-            # 转换为DataFrame
-            if all_signals:
-                result_df = pd.DataFrame(all_signals)
-                result_df = result_df.sort_values(['date', 'stock_code']).reset_index(drop=True)
-            else:
-                result_df = pd.DataFrame()
+            result_df = self._collect_signals(all_stock_codes, num_processes)
             
-            self.logger.info(f"全量测试完成，共找到 {len(all_signals)} 个信号")
+            self.logger.info(f"全量测试完成，共找到 {len(result_df)} 个信号")
             
             if result_df.empty:
                 self.logger.warning("全量测试未找到任何信号")
                 return {
                     'total_stocks': len(all_stock_codes),
-                    'signals': [],
                     'total_signals': 0,
                     'result_df': result_df
                 }
             
-            # 转换为信号列表
-            signals = result_df.to_dict('records')
+            # 构建一次信号表，供各项分析复用
+            signal_table = self.result_analyzer.build_signal_table(result_df)
             
             # 分析结果
-            analysis = self.result_analyzer.analyze_signals(signals)
-            portfolio_perf = self.result_analyzer.calculate_portfolio_performance(signals, daily_selection_strategy='all')
+            analysis = self.result_analyzer.analyze_signals(signal_table)
+            portfolio_perf = self.result_analyzer.calculate_portfolio_performance(signal_table, daily_selection_strategy='all')
             
             # 显示摘要
             print(f"\n全量测试完成:")
             print(f"  总股票数量: {len(all_stock_codes)}")
-            print(f"  找到信号数量: {len(signals)}")
+            print(f"  找到信号数量: {len(result_df)}")
             print(f"  涉及股票数量: {analysis.get('basic_stats', {}).get('unique_stocks', 0)}")
             print(f"  信号覆盖率: {analysis.get('basic_stats', {}).get('unique_stocks', 0) / len(all_stock_codes) * 100:.2f}%")
             
@@ -427,21 +367,20 @@ class BacktestingSystem:
                 
                 # 只导出CSV数据文件和一个报告文件
                 output_file = os.path.join(self.output_folder, f"full_test_{timestamp}.csv")
-                self.result_exporter.export_to_csv(signals, output_file, include_analysis=False)
+                self.result_exporter.export_to_csv(result_df, output_file, include_analysis=False)
                 
                 # 生成一个简单的报告文件
                 report_file = os.path.join(self.output_folder, f"full_report_{timestamp}.txt")
-                self.result_analyzer.generate_performance_report(signals, report_file, self.get_strategy_description())
+                self.result_analyzer.generate_performance_report(signal_table, report_file, self.get_strategy_description())
             
             # 生成测试简报
             self.result_analyzer.write_backtest_result_to_file(
-                signals, self.get_strategy_description(), current_dir
+                signal_table, self.get_strategy_description(), current_dir
             )
             
             return {
                 'total_stocks': len(all_stock_codes),
-                'signals': signals,
-                'total_signals': len(signals),
+                'total_signals': len(result_df),
                 'analysis': analysis,
                 'portfolio_performance': portfolio_perf,
                 'result_df': result_df
@@ -472,135 +411,231 @@ class BacktestingSystem:
         """
         return self.strategy_engine.get_strategy_description()
     
-    def _process_stocks_multiprocessing(self, stock_codes: List[str], num_processes: int) -> List[Dict[str, Any]]:
+    def _collect_signals(self, stock_codes: List[str], num_processes: int) -> pd.DataFrame:
         """
-        多进程处理股票
+        扫描股票信号并合并为按日期、股票代码排序的信号表
         
         Args:
             stock_codes: 股票代码列表
-            num_processes: 进程数量
+            num_processes: 进程数量，为1时在当前进程中处理
             
         Returns:
-            List[Dict[str, Any]]: 所有信号列表
+            pd.DataFrame: 信号表，无信号时为空DataFrame
         """
-        # 创建任务队列
-        task_queue = JoinableQueue()
-        result_queue = Queue()
-        
-        # 添加任务到队列
-        for stock_code in stock_codes:
-            task_queue.put(stock_code)
-        
-        # 创建工作进程
-        processes = []
-        for i in range(num_processes):
-            p = Process(
-                target=self._worker_process,
-                args=(task_queue, result_queue, i + 1)
-            )
-            p.start()
-            processes.append(p)
-        
-        # 等待所有任务完成
-        self.logger.info("等待所有任务完成...")
-        task_queue.join()
-        self.logger.info("所有任务已完成，开始收集结果并终止进程")
-        
-        # 等待进程完成结果提交
-        self.logger.info("等待进程完成结果提交...")
-        time.sleep(3)
-        
-        # 收集所有可用的结果
-        self.logger.info("开始收集进程结果...")
-        all_signals = []
-        result_count = 0
-        
-        while not result_queue.empty():
-            try:
-                signals = result_queue.get_nowait()
-                all_signals.extend(signals)
-                result_count += 1
-                self.logger.info(f"收集到结果批次 {result_count}，当前总信号数: {len(all_signals)}")
-            except:
-                break
-        
-        # 再等待一下，确保所有进程都有机会提交结果
-        if result_count == 0:
-            self.logger.info("第一次未收集到结果，再等待2秒...")
-            time.sleep(2)
-            while not result_queue.empty():
-                try:
-                    signals = result_queue.get_nowait()
-                    all_signals.extend(signals)
-                    result_count += 1
-                    self.logger.info(f"延迟收集到结果批次 {result_count}，当前总信号数: {len(all_signals)}")
-                except:
-                    break
-        
-        # 现在强制终止所有进程
-        self.logger.info("开始强制终止所有进程...")
-        for i, p in enumerate(processes):
-            if p.is_alive():
-                self.logger.info(f"强制终止进程 {i+1} (PID: {p.pid})")
-                p.terminate()
-                p.join(timeout=3)  # 给一点时间让进程清理
-                if p.is_alive():
-                    self.logger.warning(f"进程 {i+1} (PID: {p.pid}) 仍未结束，使用kill")
-                    p.kill()
-            else:
-                self.logger.info(f"进程 {i+1} (PID: {p.pid}) 已自然结束")
-        
-        self.logger.info("所有进程已完成")
-        self.logger.info(f"结果收集完成！共收集了 {result_count} 个进程的结果")
-        self.logger.info(f"多进程处理完成！总共找到 {len(all_signals)} 个信号")
+        if num_processes == 1:
+            # 单进程处理
+            all_signals = []
+            for stock_code in stock_codes:
+                all_signals.extend(self.stock_selector.test_single_stock(stock_code, verbose=False))
+            result_df = pd.DataFrame(all_signals)
+        else:
+            # 多进程处理
+            result_df = self._process_stocks_multiprocessing(stock_codes, num_processes)
         
-        return all_signals
+        if result_df.empty:
+            return pd.DataFrame()
+        return result_df.sort_values(['date', 'stock_code']).reset_index(drop=True)
     
-    def _worker_process(self, task_queue: JoinableQueue, result_queue: Queue, process_id: int):
+    def _process_stocks_multiprocessing(self, stock_codes: List[str], num_processes: int) -> pd.DataFrame:
         """
-        工作进程函数
+        多进程处理股票
+        
+        使用进程池按股票分发任务，通过imap_unordered逐个流式回收结果，
+        工作进程以NumPy结构化数组回传信号，全部任务完成后正常关闭进程池，
+        不依赖固定等待时间，也不强制终止进程。
         
         Args:
-            task_queue: 任务队列
-            result_queue: 结果队列
-            process_id: 进程ID
+            stock_codes: 股票代码列表
+            num_processes: 进程数量
+            
+        Returns:
+            pd.DataFrame: 所有信号（按输入股票顺序排列）
         """
-        # 在工作进程中重新配置日志系统
-        self._setup_worker_logging(process_id)
+        total = len(stock_codes)
+        if total == 0:
+            return pd.DataFrame()
+        
+        num_processes = max(1, min(num_processes, total))
+        # 每个进程分到若干批，兼顾负载均衡与进程间通信开销
+        chunksize = max(1, total // (num_processes * 4))
         
-        # 在工作进程中创建新的StockSelector实例
+        self.logger.info(f"启动进程池: {num_processes} 个进程，每批 {chunksize} 个股票")
+        
+        results_by_index = {}
+        failed_count = 0
+        completed = 0
+        
+        pool = mp.Pool(
+            processes=num_processes,
+            initializer=_init_signal_worker,
+            initargs=(self.data_folder, self.strategy_engine, self.log_file)
+        )
         try:
-            stock_selector = StockSelector(self.data_folder, self.strategy_engine)
+            for index, stock_code, records, error in pool.imap_unordered(
+                    _scan_stock_worker, enumerate(stock_codes), chunksize=chunksize):
+                completed += 1
+                if error is not None:
+                    failed_count += 1
+                    self.logger.error(f"处理股票 {stock_code} 时出错: {error}")
+                elif records is not None and len(records) > 0:
+                    results_by_index[index] = records
+                
+                if completed % 500 == 0 or completed == total:
+                    self.logger.info(f"已完成 {completed}/{total} 个股票，"
+                                     f"有信号股票 {len(results_by_index)} 个")
             
-            while True:
-                try:
-                    # 从队列获取任务
-                    stock_code = task_queue.get(timeout=1)
-                    
-                    try:
-                        # 处理单个股票
-                        signals = stock_selector.test_single_stock(stock_code, verbose=False)
-                        
-                        # 将结果放入结果队列
-                        result_queue.put(signals)
-                        
-                    except Exception as e:
-                        # 处理单个股票时出错，记录错误但继续处理其他股票
-                        print(f"进程 {process_id} 处理股票 {stock_code} 时出错: {e}")
-                        result_queue.put([])  # 放入空列表表示该股票处理失败
-                    
-                    finally:
-                        # 标记任务完成
-                        task_queue.task_done()
-                        
-                except:
-                    # 队列为空或超时，退出循环
-                    break
-                    
-        except Exception as e:
-            print(f"工作进程 {process_id} 初始化失败: {e}")
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        
+        # 按输入顺序合并结果，保证多次运行结果一致
+        signal_df = _records_to_frame([results_by_index[index] for index in sorted(results_by_index)])
+        
+        if failed_count:
+            self.logger.warning(f"共有 {failed_count} 个股票处理失败")
+        self.logger.info(f"多进程处理完成！总共找到 {len(signal_df)} 个信号")
         
-        print(f"工作进程 {process_id} 结束")
+        return signal_df
+
+
+# 工作进程内的股票选择器实例（由进程池initializer创建，每个进程一个）
+_worker_selector: Optional[StockSelector] = None
+
+
+def _configure_worker_logging(log_file: Optional[str], process_name: str):
+    """
+    为工作进程配置日志系统
+    
+    Args:
+        log_file: 主进程日志文件路径
+        process_name: 进程名称
+    """
+    # 清除当前进程的日志配置
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    
+    # 使用主进程的日志文件
+    if log_file:
+        # 创建文件处理器和控制台处理器
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        console_handler = logging.StreamHandler(sys.stdout)
+        
+        # 设置格式
+        formatter = logging.Formatter(f'%(asctime)s - %(name)s - %(levelname)s - [{process_name}] %(message)s')
+        file_handler.setFormatter(formatter)
+        console_handler.setFormatter(formatter)
+        
+        # 配置根日志器
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(file_handler)
+        root_logger.addHandler(console_handler)
+
+
+def _init_signal_worker(data_folder: str, strategy_engine: StrategyEngine, log_file: Optional[str]):
+    """
+    进程池initializer：配置日志并创建本进程的StockSelector
+    
+    Args:
+        data_folder: 股票数据文件夹路径
+        strategy_engine: 策略引擎实例
+        log_file: 主进程日志文件路径
+    """
+    global _worker_selector
+    _configure_worker_logging(log_file, mp.current_process().name)
+    _worker_selector = StockSelector(data_folder, strategy_engine)
+
+
+def _scan_stock_worker(task: Tuple[int, str]) -> Tuple[int, str, Optional[np.ndarray], Optional[str]]:
+    """
+    工作进程任务：扫描单个股票的信号
+    
+    Args:
+        task: (输入序号, 股票代码)
+        
+    Returns:
+        Tuple: (输入序号, 股票代码, 信号结构化数组, 错误信息)
+    """
+    index, stock_code = task
+    try:
+        signals = _worker_selector.test_single_stock(stock_code, verbose=False)
+        return index, stock_code, _signals_to_records(signals), None
+    except Exception as e:
+        return index, stock_code, None, str(e)
+
+
+def _signals_to_records(signals: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """
+    将信号字典列表转换为紧凑的NumPy结构化数组
+    
+    字段取所有信号键的并集（按首次出现顺序），每个字段的类型与 pd.DataFrame(signals) 推断的一致：
+    全为布尔值时为bool，全为整数时为int64，整数/浮点数（可含None或缺失）为float64（None记为NaN），
+    全为字符串时为定长Unicode，其余情况（如字符串中含None）保留为object。
+    相比逐条pickle字典大幅减少进程间传输的数据量。
+    
+    Args:
+        signals: 信号列表
+        
+    Returns:
+        Optional[np.ndarray]: 结构化数组，无信号时返回None
+    """
+    if not signals:
+        return None
+    
+    fields = list(dict.fromkeys(field for signal in signals for field in signal))
+    columns = []
+    dtype = []
+    for field in fields:
+        values = [signal.get(field) for signal in signals]
+        non_null = [value for value in values if value is not None]
+        has_null = len(non_null) < len(values)
+        if non_null and not has_null and all(isinstance(value, (bool, np.bool_)) for value in values):
+            field_dtype = np.bool_
+        elif non_null and not has_null and all(
+                isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)) for value in values):
+            field_dtype = np.int64
+        elif all(isinstance(value, (int, float, np.integer, np.floating))
+                 and not isinstance(value, (bool, np.bool_)) for value in non_null):
+            field_dtype = np.float64
+            values = [np.nan if value is None else value for value in values]
+        elif non_null and not has_null and all(isinstance(value, str) for value in values):
+            field_dtype = f'U{max(1, max(len(value) for value in values))}'
+        else:
+            field_dtype = object
+        column = np.empty(len(values), dtype=field_dtype)
+        column[:] = values
+        columns.append(column)
+        dtype.append((field, field_dtype))
+    
+    records = np.empty(len(signals), dtype=dtype)
+    for field, column in zip(fields, columns):
+        records[field] = column
+    return records
+
+
+def _records_to_frame(records_list: List[np.ndarray]) -> pd.DataFrame:
+    """
+    将各工作进程回传的结构化数组合并为一个DataFrame（不经过逐行字典）
+    
+    各数组字段相同时先用 np.concatenate 合并（字符串宽度不同会自动提升），
+    否则逐个转换后按列名对齐拼接，缺失的字段为NaN。
+    
+    Args:
+        records_list: 结构化数组列表
+        
+    Returns:
+        pd.DataFrame: 信号表
+    """
+    if not records_list:
+        return pd.DataFrame()
+    try:
+        return pd.DataFrame.from_records(np.concatenate(records_list))
+    except TypeError:
+        # 字段或字段类型（如某些股票的字段为object）不一致
+        return pd.concat([pd.DataFrame.from_records(records) for records in records_list], ignore_index=True)
 
 
 def main():
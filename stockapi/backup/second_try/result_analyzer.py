@@ -9,32 +9,145 @@ import pandas as pd
 import numpy as np
 import os
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import json
+import math
+
+
+# 信号表中预解析的交易日期列
+SIGNAL_DATE_COLUMN = 'trade_date'
+
+# 默认股票数据文件夹（用于查询前一交易日收盘价）
+DEFAULT_DATA_FOLDER = r"c:\Users\17701\github\my_first_repo\stockapi\stock_base_info\all_stocks_data"
+
+# 次日开盘/盘中走势组合：(统计键名, 开盘条件, 盘中条件)，条件取值为 'up' / 'down' / 'flat'
+OPEN_CLOSE_COMBINATIONS = [
+    ('high_open_high_close', 'up', 'up'),
+    ('high_open_low_close', 'up', 'down'),
+    ('high_open_flat_close', 'up', 'flat'),
+    ('low_open_close_up', 'down', 'up'),
+    ('low_open_low_close', 'down', 'down'),
+    ('low_open_flat_close', 'down', 'flat'),
+    ('flat_open_close_up', 'flat', 'up'),
+    ('flat_open_close_down', 'flat', 'down'),
+    ('flat_open_flat_close', 'flat', 'flat'),
+]
+
+# 后续表现统计的输出顺序（与报告中展示顺序一致）
+FOLLOW_UP_ORDER = [
+    'high_open_high_close', 'high_open_low_close', 'low_open_close_up', 'low_open_low_close',
+    'high_open_flat_close', 'low_open_flat_close', 'flat_open_close_up', 'flat_open_close_down',
+    'flat_open_flat_close',
+]
 
 
 class ResultAnalyzer:
     """回测结果分析器"""
     
-    def __init__(self):
+    def __init__(self, data_folder: str = None):
+        """
+        初始化结果分析器
+        
+        Args:
+            data_folder: 股票数据文件夹路径（用于查询前一交易日收盘价）
+        """
         self.logger = logging.getLogger(__name__)
+        self.data_folder = data_folder or DEFAULT_DATA_FOLDER
+        self._data_loader = None
+        self._data_loader_failed = False
+        # 前一交易日收盘价缓存: 股票代码 -> Series(日期 -> 前一交易日收盘价)
+        self._previous_close_cache: Dict[str, Optional[pd.Series]] = {}
+    
+    @staticmethod
+    def _is_empty(signals: Union[List[Dict[str, Any]], pd.DataFrame, None]) -> bool:
+        """判断信号集合是否为空（兼容列表与DataFrame）"""
+        return signals is None or len(signals) == 0
+    
+    def build_signal_table(self, signals: Union[List[Dict[str, Any]], pd.DataFrame]) -> pd.DataFrame:
+        """
+        构建列式信号表
+        
+        信号表只需构建一次，各分析方法均可直接接收该表，避免重复从字典列表
+        创建DataFrame。股票代码与日期转为category类型，并预先解析交易日期列。
+        
+        Args:
+            signals: 信号列表或已构建的信号表
+            
+        Returns:
+            pd.DataFrame: 信号表
+        """
+        if isinstance(signals, pd.DataFrame):
+            if SIGNAL_DATE_COLUMN in signals.columns:
+                return signals
+            df = signals.reset_index(drop=True)
+        else:
+            df = pd.DataFrame(signals if signals else [])
+        
+        if df.empty:
+            return df
+        
+        if 'date' in df.columns:
+            trade_date = pd.to_datetime(df['date'])
+            df = df.assign(**{SIGNAL_DATE_COLUMN: trade_date})
+            df['date'] = df['date'].astype('category')
+        if 'stock_code' in df.columns:
+            df['stock_code'] = df['stock_code'].astype('category')
+        
+        return df
+    
+    @staticmethod
+    def _column_values(df: pd.DataFrame, column: str) -> np.ndarray:
+        """获取数值列的float64数组，列不存在时返回全NaN数组"""
+        if column in df.columns:
+            return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+        return np.full(len(df), np.nan)
     
-    def analyze_signals(self, signals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @staticmethod
+    def _simulate_capital(return_rates: np.ndarray, initial_capital: float,
+                          position_size: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按时间顺序模拟满仓/部分仓位的资金变化
+        
+        Args:
+            return_rates: 每笔交易收益率（小数）
+            initial_capital: 初始资金
+            position_size: 每次投资占总资金的比例
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (实际生效的收益率, 资金曲线，长度为交易数+1)
+        """
+        if position_size >= 1.0:
+            factors = 1 + return_rates
+        else:
+            factors = 1 + return_rates * position_size
+        
+        portfolio_values = np.cumprod(np.concatenate(([float(initial_capital)], factors)))
+        applied_returns = return_rates.astype(np.float64, copy=True)
+        
+        # 资金不足（<=0）后不再交易，资金保持不变
+        bankrupt = np.flatnonzero(portfolio_values[:-1] <= 0)
+        if bankrupt.size > 0:
+            first = bankrupt[0]
+            portfolio_values[first + 1:] = portfolio_values[first]
+            applied_returns[first:] = 0.0
+        
+        return applied_returns, portfolio_values
+    
+    def analyze_signals(self, signals: Union[List[Dict[str, Any]], pd.DataFrame]) -> Dict[str, Any]:
         """
         分析信号数据
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             
         Returns:
             Dict[str, Any]: 分析结果
         """
-        if not signals:
+        if self._is_empty(signals):
             return {"error": "没有信号数据"}
         
-        # 转换为DataFrame便于分析
-        df = pd.DataFrame(signals)
+        df = self.build_signal_table(signals)
         
         # 基本统计
         total_signals = len(df)
@@ -59,21 +172,21 @@ class ResultAnalyzer:
         
         # 时间分布分析
         time_analysis = {}
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
+        if SIGNAL_DATE_COLUMN in df.columns:
+            dates = df[SIGNAL_DATE_COLUMN]
             time_analysis = {
                 'date_range': {
-                    'start_date': df['date'].min().strftime('%Y-%m-%d'),
-                    'end_date': df['date'].max().strftime('%Y-%m-%d')
+                    'start_date': dates.min().strftime('%Y-%m-%d'),
+                    'end_date': dates.max().strftime('%Y-%m-%d')
                 },
-                'signals_by_month': {str(k): v for k, v in df.groupby(df['date'].dt.to_period('M')).size().to_dict().items()},
-                'signals_by_weekday': df.groupby(df['date'].dt.day_name()).size().to_dict()
+                'signals_by_month': {str(k): v for k, v in dates.groupby(dates.dt.to_period('M')).size().to_dict().items()},
+                'signals_by_weekday': dates.groupby(dates.dt.day_name()).size().to_dict()
             }
         
         # 股票分布分析
         stock_analysis = {}
         if 'stock_code' in df.columns:
-            stock_counts = df['stock_code'].value_counts()
+            stock_counts = df['stock_code'].astype(object).value_counts()
             stock_analysis = {
                 'top_10_stocks': stock_counts.head(10).to_dict(),
                 'stocks_with_single_signal': (stock_counts == 1).sum(),
@@ -90,343 +203,135 @@ class ResultAnalyzer:
             'stock_analysis': stock_analysis
         }
     
-    def calculate_detailed_statistics(self, signals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def calculate_detailed_statistics(self, signals: Union[List[Dict[str, Any]], pd.DataFrame]) -> Dict[str, Any]:
         """
         计算详细的关键比例统计信息
         
+        所有开盘/盘中组合的计数均由一次性构建的布尔掩码向量化得出。
+        
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             
         Returns:
             dict: 详细统计信息
         """
-        # 转换为DataFrame便于计算
-        if isinstance(signals, pd.DataFrame):
-            df = signals
-        else:
-            if not signals:
-                return {}
-            df = pd.DataFrame(signals)
+        if self._is_empty(signals):
+            return {}
         
+        df = self.build_signal_table(signals)
         if df.empty:
             return {}
         
+        def safe_percentage(numerator, denominator):
+            return (numerator / denominator * 100) if denominator > 0 else 0.0
+        
+        def count(mask: np.ndarray) -> int:
+            return int(np.count_nonzero(mask))
+        
         # 基本统计
         total_count = len(df)
         unique_stocks = df['stock_code'].nunique() if 'stock_code' in df.columns else 0
         
-        # 次日表现统计
-        next_open_up_count = len(df[df.get('next_open_change_pct', 0) > 0]) if 'next_open_change_pct' in df.columns else 0
-        next_close_up_count = len(df[df.get('next_close_change_pct', 0) > 0]) if 'next_close_change_pct' in df.columns else 0
-        
-        # 开盘收盘组合统计
-        high_open_high_close_count = 0  # 高开高走 (次日开盘上涨且收盘高于开盘)
-        high_open_low_close_count = 0   # 高开低走 (次日开盘上涨且收盘低于开盘)
-        high_open_flat_close_count = 0  # 高开平走 (次日开盘上涨且收盘等于开盘)
-        low_open_close_up_count = 0     # 低开高走 (次日开盘下跌且收盘高于开盘)
-        low_open_low_close_count = 0    # 低开低走 (次日开盘下跌且收盘低于开盘)
-        low_open_flat_close_count = 0   # 低开平走 (次日开盘下跌且收盘等于开盘)
-        flat_open_close_up_count = 0    # 平开高走 (次日开盘平盘且收盘上涨)
-        flat_open_close_down_count = 0  # 平开低走 (次日开盘平盘且收盘下跌)
-        flat_open_flat_close_count = 0  # 平开平走 (次日开盘平盘且收盘平盘)
-        
-        if 'next_open_change_pct' in df.columns and 'next_intraday_change_pct' in df.columns:
-            high_open_high_close_count = len(df[(df['next_open_change_pct'] > 0) & (df['next_intraday_change_pct'] > 0)])
-            high_open_low_close_count = len(df[(df['next_open_change_pct'] > 0) & (df['next_intraday_change_pct'] < 0)])
-            high_open_flat_close_count = len(df[(df['next_open_change_pct'] > 0) & (df['next_intraday_change_pct'] == 0)])
-            low_open_close_up_count = len(df[(df['next_open_change_pct'] < 0) & (df['next_intraday_change_pct'] > 0)])
-            low_open_low_close_count = len(df[(df['next_open_change_pct'] < 0) & (df['next_intraday_change_pct'] < 0)])
-            low_open_flat_close_count = len(df[(df['next_open_change_pct'] < 0) & (df['next_intraday_change_pct'] == 0)])
-            flat_open_close_up_count = len(df[(df['next_open_change_pct'] == 0) & (df['next_intraday_change_pct'] > 0)])
-            flat_open_close_down_count = len(df[(df['next_open_change_pct'] == 0) & (df['next_intraday_change_pct'] < 0)])
-            flat_open_flat_close_count = len(df[(df['next_open_change_pct'] == 0) & (df['next_intraday_change_pct'] == 0)])
+        next_open_pct = self._column_values(df, 'next_open_change_pct')
+        next_close_pct = self._column_values(df, 'next_close_change_pct')
+        intraday_pct = self._column_values(df, 'next_intraday_change_pct')
+        
+        # 次日表现统计（NaN参与比较时结果均为False，与逐条统计一致）
+        next_open_up_count = count(next_open_pct > 0)
+        next_close_up_count = count(next_close_pct > 0)
+        
+        # 开盘/盘中方向掩码
+        has_open_close = 'next_open_change_pct' in df.columns and 'next_intraday_change_pct' in df.columns
+        open_masks = {'up': next_open_pct > 0, 'down': next_open_pct < 0, 'flat': next_open_pct == 0}
+        intraday_masks = {'up': intraday_pct > 0, 'down': intraday_pct < 0, 'flat': intraday_pct == 0}
+        combination_masks = {
+            name: (open_masks[open_dir] & intraday_masks[intraday_dir]) if has_open_close else np.zeros(total_count, dtype=bool)
+            for name, open_dir, intraday_dir in OPEN_CLOSE_COMBINATIONS
+        }
         
         # 中长期表现统计 - 只统计有完整数据的交易日
-        day3_up_count = len(df[(df.get('day3_change_pct', 0) > 0) & pd.notna(df.get('day3_change_pct'))]) if 'day3_change_pct' in df.columns else 0
-        day5_up_count = len(df[(df.get('day5_change_pct', 0) > 0) & pd.notna(df.get('day5_change_pct'))]) if 'day5_change_pct' in df.columns else 0
-        day10_up_count = len(df[(df.get('day10_change_pct', 0) > 0) & pd.notna(df.get('day10_change_pct'))]) if 'day10_change_pct' in df.columns else 0
-        
-        # 统计有完整数据的交易日总数
-        day3_total_count = len(df[pd.notna(df.get('day3_change_pct'))]) if 'day3_change_pct' in df.columns else 0
-        day5_total_count = len(df[pd.notna(df.get('day5_change_pct'))]) if 'day5_change_pct' in df.columns else 0
-        day10_total_count = len(df[pd.notna(df.get('day10_change_pct'))]) if 'day10_change_pct' in df.columns else 0
-        
-        # 计算高开高走股票的后续表现
-        high_open_high_close_day3_up = 0
-        high_open_high_close_day5_up = 0
-        high_open_high_close_day10_up = 0
-        
-        if high_open_high_close_count > 0:
-            high_open_high_close_signals = df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) > 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                high_open_high_close_day3_up = len(high_open_high_close_signals[(high_open_high_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(high_open_high_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                high_open_high_close_day5_up = len(high_open_high_close_signals[(high_open_high_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(high_open_high_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                high_open_high_close_day10_up = len(high_open_high_close_signals[(high_open_high_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(high_open_high_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算高开低走股票的后续表现
-        high_open_low_close_day3_up = 0
-        high_open_low_close_day5_up = 0
-        high_open_low_close_day10_up = 0
-        
-        if high_open_low_close_count > 0:
-            high_open_low_close_signals = df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) < 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                high_open_low_close_day3_up = len(high_open_low_close_signals[(high_open_low_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(high_open_low_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                high_open_low_close_day5_up = len(high_open_low_close_signals[(high_open_low_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(high_open_low_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                high_open_low_close_day10_up = len(high_open_low_close_signals[(high_open_low_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(high_open_low_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算低开收盘上涨股票的后续表现
-        low_open_close_up_day3_up = 0
-        low_open_close_up_day5_up = 0
-        low_open_close_up_day10_up = 0
-        
-        if low_open_close_up_count > 0:
-            low_open_close_up_signals = df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) > 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                low_open_close_up_day3_up = len(low_open_close_up_signals[(low_open_close_up_signals['day3_from_next_change_pct'] > 0) & pd.notna(low_open_close_up_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                low_open_close_up_day5_up = len(low_open_close_up_signals[(low_open_close_up_signals['day5_from_next_change_pct'] > 0) & pd.notna(low_open_close_up_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                low_open_close_up_day10_up = len(low_open_close_up_signals[(low_open_close_up_signals['day10_from_next_change_pct'] > 0) & pd.notna(low_open_close_up_signals['day10_from_next_change_pct'])])
-        
-        # 计算低开低走股票的后续表现
-        low_open_low_close_day3_up = 0
-        low_open_low_close_day5_up = 0
-        low_open_low_close_day10_up = 0
-        
-        if low_open_low_close_count > 0:
-            low_open_low_close_signals = df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) < 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                low_open_low_close_day3_up = len(low_open_low_close_signals[(low_open_low_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(low_open_low_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                low_open_low_close_day5_up = len(low_open_low_close_signals[(low_open_low_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(low_open_low_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                low_open_low_close_day10_up = len(low_open_low_close_signals[(low_open_low_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(low_open_low_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算高开平走股票的后续表现
-        high_open_flat_close_day3_up = 0
-        high_open_flat_close_day5_up = 0
-        high_open_flat_close_day10_up = 0
-        
-        if high_open_flat_close_count > 0:
-            high_open_flat_close_signals = df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) == 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                high_open_flat_close_day3_up = len(high_open_flat_close_signals[(high_open_flat_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(high_open_flat_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                high_open_flat_close_day5_up = len(high_open_flat_close_signals[(high_open_flat_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(high_open_flat_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                high_open_flat_close_day10_up = len(high_open_flat_close_signals[(high_open_flat_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(high_open_flat_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算低开平走股票的后续表现
-        low_open_flat_close_day3_up = 0
-        low_open_flat_close_day5_up = 0
-        low_open_flat_close_day10_up = 0
-        
-        if low_open_flat_close_count > 0:
-            low_open_flat_close_signals = df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) == 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                low_open_flat_close_day3_up = len(low_open_flat_close_signals[(low_open_flat_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(low_open_flat_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                low_open_flat_close_day5_up = len(low_open_flat_close_signals[(low_open_flat_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(low_open_flat_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                low_open_flat_close_day10_up = len(low_open_flat_close_signals[(low_open_flat_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(low_open_flat_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算平开高走股票的后续表现
-        flat_open_close_up_day3_up = 0
-        flat_open_close_up_day5_up = 0
-        flat_open_close_up_day10_up = 0
-        
-        if flat_open_close_up_count > 0:
-            flat_open_close_up_signals = df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) > 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                flat_open_close_up_day3_up = len(flat_open_close_up_signals[(flat_open_close_up_signals['day3_from_next_change_pct'] > 0) & pd.notna(flat_open_close_up_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                flat_open_close_up_day5_up = len(flat_open_close_up_signals[(flat_open_close_up_signals['day5_from_next_change_pct'] > 0) & pd.notna(flat_open_close_up_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                flat_open_close_up_day10_up = len(flat_open_close_up_signals[(flat_open_close_up_signals['day10_from_next_change_pct'] > 0) & pd.notna(flat_open_close_up_signals['day10_from_next_change_pct'])])
-        
-        # 计算平开低走股票的后续表现
-        flat_open_close_down_day3_up = 0
-        flat_open_close_down_day5_up = 0
-        flat_open_close_down_day10_up = 0
-        
-        if flat_open_close_down_count > 0:
-            flat_open_close_down_signals = df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) < 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                flat_open_close_down_day3_up = len(flat_open_close_down_signals[(flat_open_close_down_signals['day3_from_next_change_pct'] > 0) & pd.notna(flat_open_close_down_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                flat_open_close_down_day5_up = len(flat_open_close_down_signals[(flat_open_close_down_signals['day5_from_next_change_pct'] > 0) & pd.notna(flat_open_close_down_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                flat_open_close_down_day10_up = len(flat_open_close_down_signals[(flat_open_close_down_signals['day10_from_next_change_pct'] > 0) & pd.notna(flat_open_close_down_signals['day10_from_next_change_pct'])])
-        
-        # 计算平开平走股票的后续表现
-        flat_open_flat_close_day3_up = 0
-        flat_open_flat_close_day5_up = 0
-        flat_open_flat_close_day10_up = 0
-        
-        if flat_open_flat_close_count > 0:
-            flat_open_flat_close_signals = df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) == 0)]
-            if 'day3_from_next_change_pct' in df.columns:
-                flat_open_flat_close_day3_up = len(flat_open_flat_close_signals[(flat_open_flat_close_signals['day3_from_next_change_pct'] > 0) & pd.notna(flat_open_flat_close_signals['day3_from_next_change_pct'])])
-            if 'day5_from_next_change_pct' in df.columns:
-                flat_open_flat_close_day5_up = len(flat_open_flat_close_signals[(flat_open_flat_close_signals['day5_from_next_change_pct'] > 0) & pd.notna(flat_open_flat_close_signals['day5_from_next_change_pct'])])
-            if 'day10_from_next_change_pct' in df.columns:
-                flat_open_flat_close_day10_up = len(flat_open_flat_close_signals[(flat_open_flat_close_signals['day10_from_next_change_pct'] > 0) & pd.notna(flat_open_flat_close_signals['day10_from_next_change_pct'])])
-        
-        # 计算百分比
-        def safe_percentage(numerator, denominator):
-            return (numerator / denominator * 100) if denominator > 0 else 0.0
+        change_values = {days: self._column_values(df, f'day{days}_change_pct') for days in (3, 5, 10)}
+        day_up_counts = {days: count(values > 0) for days, values in change_values.items()}
+        day_total_counts = {days: count(~np.isnan(values)) for days, values in change_values.items()}
         
-        # 计算有完整数据的各种开盘收盘组合的总数
-        high_open_high_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) > 0) & 
-                                                     pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day10_from_next_change_pct'))])
-        high_open_low_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) < 0) & 
-                                                    pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                    pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                    pd.notna(df.get('day10_from_next_change_pct'))])
-        high_open_flat_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) > 0) & (df.get('next_intraday_change_pct', 0) == 0) & 
-                                                     pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day10_from_next_change_pct'))])
-        low_open_close_up_with_data_count = len(df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) > 0) & 
-                                                  pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                  pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                  pd.notna(df.get('day10_from_next_change_pct'))])
-        low_open_low_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) < 0) & 
-                                                   pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                   pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                   pd.notna(df.get('day10_from_next_change_pct'))])
-        low_open_flat_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) < 0) & (df.get('next_intraday_change_pct', 0) == 0) & 
-                                                    pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                    pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                    pd.notna(df.get('day10_from_next_change_pct'))])
-        flat_open_close_up_with_data_count = len(df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) > 0) & 
-                                                   pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                   pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                   pd.notna(df.get('day10_from_next_change_pct'))])
-        flat_open_close_down_with_data_count = len(df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) < 0) & 
-                                                     pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day10_from_next_change_pct'))])
-        flat_open_flat_close_with_data_count = len(df[(df.get('next_open_change_pct', 0) == 0) & (df.get('next_intraday_change_pct', 0) == 0) & 
-                                                     pd.notna(df.get('day3_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day5_from_next_change_pct')) & 
-                                                     pd.notna(df.get('day10_from_next_change_pct'))])
-
-        return {
+        # 基于次日收盘价的后续涨跌幅
+        from_next_values = {days: self._column_values(df, f'day{days}_from_next_change_pct') for days in (3, 5, 10)}
+        from_next_complete = ~np.isnan(from_next_values[3]) & ~np.isnan(from_next_values[5]) & ~np.isnan(from_next_values[10])
+        
+        stats = {
             'total_count': total_count,
             'unique_stocks': unique_stocks,
             'next_open_up_count': next_open_up_count,
             'next_close_up_count': next_close_up_count,
-            'high_open_high_close_count': high_open_high_close_count,
-            'high_open_low_close_count': high_open_low_close_count,
-            'high_open_flat_close_count': high_open_flat_close_count,
-            'low_open_close_up_count': low_open_close_up_count,
-            'low_open_low_close_count': low_open_low_close_count,
-            'low_open_flat_close_count': low_open_flat_close_count,
-            'flat_open_close_up_count': flat_open_close_up_count,
-            'flat_open_close_down_count': flat_open_close_down_count,
-            'flat_open_flat_close_count': flat_open_flat_close_count,
-            'high_open_high_close_with_data_count': high_open_high_close_with_data_count,
-            'high_open_low_close_with_data_count': high_open_low_close_with_data_count,
-            'high_open_flat_close_with_data_count': high_open_flat_close_with_data_count,
-            'low_open_close_up_with_data_count': low_open_close_up_with_data_count,
-            'low_open_low_close_with_data_count': low_open_low_close_with_data_count,
-            'low_open_flat_close_with_data_count': low_open_flat_close_with_data_count,
-            'flat_open_close_up_with_data_count': flat_open_close_up_with_data_count,
-            'flat_open_close_down_with_data_count': flat_open_close_down_with_data_count,
-            'flat_open_flat_close_with_data_count': flat_open_flat_close_with_data_count,
-            'day3_up_count': day3_up_count,
-            'day5_up_count': day5_up_count,
-            'day10_up_count': day10_up_count,
-            'day3_total_count': day3_total_count,
-            'day5_total_count': day5_total_count,
-            'day10_total_count': day10_total_count,
-            'high_open_high_close_day3_up': high_open_high_close_day3_up,
-            'high_open_high_close_day5_up': high_open_high_close_day5_up,
-            'high_open_high_close_day10_up': high_open_high_close_day10_up,
-            'high_open_low_close_day3_up': high_open_low_close_day3_up,
-            'high_open_low_close_day5_up': high_open_low_close_day5_up,
-            'high_open_low_close_day10_up': high_open_low_close_day10_up,
-            'low_open_close_up_day3_up': low_open_close_up_day3_up,
-            'low_open_close_up_day5_up': low_open_close_up_day5_up,
-            'low_open_close_up_day10_up': low_open_close_up_day10_up,
-            'low_open_low_close_day3_up': low_open_low_close_day3_up,
-            'low_open_low_close_day5_up': low_open_low_close_day5_up,
-            'low_open_low_close_day10_up': low_open_low_close_day10_up,
-            'high_open_flat_close_day3_up': high_open_flat_close_day3_up,
-            'high_open_flat_close_day5_up': high_open_flat_close_day5_up,
-            'high_open_flat_close_day10_up': high_open_flat_close_day10_up,
-            'low_open_flat_close_day3_up': low_open_flat_close_day3_up,
-            'low_open_flat_close_day5_up': low_open_flat_close_day5_up,
-            'low_open_flat_close_day10_up': low_open_flat_close_day10_up,
-            'flat_open_close_up_day3_up': flat_open_close_up_day3_up,
-            'flat_open_close_up_day5_up': flat_open_close_up_day5_up,
-            'flat_open_close_up_day10_up': flat_open_close_up_day10_up,
-            'flat_open_close_down_day3_up': flat_open_close_down_day3_up,
-            'flat_open_close_down_day5_up': flat_open_close_down_day5_up,
-            'flat_open_close_down_day10_up': flat_open_close_down_day10_up,
-            'flat_open_flat_close_day3_up': flat_open_flat_close_day3_up,
-            'flat_open_flat_close_day5_up': flat_open_flat_close_day5_up,
-            'flat_open_flat_close_day10_up': flat_open_flat_close_day10_up,
-            'next_open_up_pct': safe_percentage(next_open_up_count, total_count),
-            'next_close_up_pct': safe_percentage(next_close_up_count, total_count),
-            'high_open_high_close_pct': safe_percentage(high_open_high_close_count, total_count),
-            'high_open_low_close_pct': safe_percentage(high_open_low_close_count, total_count),
-            'high_open_flat_close_pct': safe_percentage(high_open_flat_close_count, total_count),
-            'low_open_close_up_pct': safe_percentage(low_open_close_up_count, total_count),
-            'low_open_low_close_pct': safe_percentage(low_open_low_close_count, total_count),
-            'low_open_flat_close_pct': safe_percentage(low_open_flat_close_count, total_count),
-            'flat_open_close_up_pct': safe_percentage(flat_open_close_up_count, total_count),
-            'flat_open_close_down_pct': safe_percentage(flat_open_close_down_count, total_count),
-            'flat_open_flat_close_pct': safe_percentage(flat_open_flat_close_count, total_count),
-            'day3_up_pct': safe_percentage(day3_up_count, day3_total_count),
-            'day5_up_pct': safe_percentage(day5_up_count, day5_total_count),
-            'day10_up_pct': safe_percentage(day10_up_count, day10_total_count),
-            'high_open_high_close_day3_up_pct': safe_percentage(high_open_high_close_day3_up, high_open_high_close_with_data_count),
-            'high_open_high_close_day5_up_pct': safe_percentage(high_open_high_close_day5_up, high_open_high_close_with_data_count),
-            'high_open_high_close_day10_up_pct': safe_percentage(high_open_high_close_day10_up, high_open_high_close_with_data_count),
-            'high_open_low_close_day3_up_pct': safe_percentage(high_open_low_close_day3_up, high_open_low_close_with_data_count),
-            'high_open_low_close_day5_up_pct': safe_percentage(high_open_low_close_day5_up, high_open_low_close_with_data_count),
-            'high_open_low_close_day10_up_pct': safe_percentage(high_open_low_close_day10_up, high_open_low_close_with_data_count),
-            'low_open_close_up_day3_up_pct': safe_percentage(low_open_close_up_day3_up, low_open_close_up_with_data_count),
-            'low_open_close_up_day5_up_pct': safe_percentage(low_open_close_up_day5_up, low_open_close_up_with_data_count),
-            'low_open_close_up_day10_up_pct': safe_percentage(low_open_close_up_day10_up, low_open_close_up_with_data_count),
-            'low_open_low_close_day3_up_pct': safe_percentage(low_open_low_close_day3_up, low_open_low_close_with_data_count),
-            'low_open_low_close_day5_up_pct': safe_percentage(low_open_low_close_day5_up, low_open_low_close_with_data_count),
-            'low_open_low_close_day10_up_pct': safe_percentage(low_open_low_close_day10_up, low_open_low_close_with_data_count),
-            'high_open_flat_close_day3_up_pct': safe_percentage(high_open_flat_close_day3_up, high_open_flat_close_with_data_count),
-            'high_open_flat_close_day5_up_pct': safe_percentage(high_open_flat_close_day5_up, high_open_flat_close_with_data_count),
-            'high_open_flat_close_day10_up_pct': safe_percentage(high_open_flat_close_day10_up, high_open_flat_close_with_data_count),
-            'low_open_flat_close_day3_up_pct': safe_percentage(low_open_flat_close_day3_up, low_open_flat_close_with_data_count),
-            'low_open_flat_close_day5_up_pct': safe_percentage(low_open_flat_close_day5_up, low_open_flat_close_with_data_count),
-            'low_open_flat_close_day10_up_pct': safe_percentage(low_open_flat_close_day10_up, low_open_flat_close_with_data_count),
-            'flat_open_close_up_day3_up_pct': safe_percentage(flat_open_close_up_day3_up, flat_open_close_up_with_data_count),
-            'flat_open_close_up_day5_up_pct': safe_percentage(flat_open_close_up_day5_up, flat_open_close_up_with_data_count),
-            'flat_open_close_up_day10_up_pct': safe_percentage(flat_open_close_up_day10_up, flat_open_close_up_with_data_count),
-            'flat_open_close_down_day3_up_pct': safe_percentage(flat_open_close_down_day3_up, flat_open_close_down_with_data_count),
-            'flat_open_close_down_day5_up_pct': safe_percentage(flat_open_close_down_day5_up, flat_open_close_down_with_data_count),
-            'flat_open_close_down_day10_up_pct': safe_percentage(flat_open_close_down_day10_up, flat_open_close_down_with_data_count),
-            'flat_open_flat_close_day3_up_pct': safe_percentage(flat_open_flat_close_day3_up, flat_open_flat_close_with_data_count),
-            'flat_open_flat_close_day5_up_pct': safe_percentage(flat_open_flat_close_day5_up, flat_open_flat_close_with_data_count),
-            'flat_open_flat_close_day10_up_pct': safe_percentage(flat_open_flat_close_day10_up, flat_open_flat_close_with_data_count)
         }
+        for name, _, _ in OPEN_CLOSE_COMBINATIONS:
+            stats[f'{name}_count'] = count(combination_masks[name])
+        for name, _, _ in OPEN_CLOSE_COMBINATIONS:
+            stats[f'{name}_with_data_count'] = count(combination_masks[name] & from_next_complete)
+        for days in (3, 5, 10):
+            stats[f'day{days}_up_count'] = day_up_counts[days]
+        for days in (3, 5, 10):
+            stats[f'day{days}_total_count'] = day_total_counts[days]
+        for name in FOLLOW_UP_ORDER:
+            for days in (3, 5, 10):
+                stats[f'{name}_day{days}_up'] = count(combination_masks[name] & (from_next_values[days] > 0))
+        
+        stats['next_open_up_pct'] = safe_percentage(next_open_up_count, total_count)
+        stats['next_close_up_pct'] = safe_percentage(next_close_up_count, total_count)
+        for name, _, _ in OPEN_CLOSE_COMBINATIONS:
+            stats[f'{name}_pct'] = safe_percentage(stats[f'{name}_count'], total_count)
+        for days in (3, 5, 10):
+            stats[f'day{days}_up_pct'] = safe_percentage(day_up_counts[days], day_total_counts[days])
+        for name in FOLLOW_UP_ORDER:
+            for days in (3, 5, 10):
+                stats[f'{name}_day{days}_up_pct'] = safe_percentage(stats[f'{name}_day{days}_up'],
+                                                                    stats[f'{name}_with_data_count'])
+        
+        return stats
     
-
-
-    def select_daily_signals(self, signals: List[Dict[str, Any]], 
+    def _select_daily_frame(self, table: pd.DataFrame, selection_strategy: str) -> pd.DataFrame:
+        """
+        在信号表上按日期分组选择信号（向量化实现）
+        
+        Args:
+            table: 信号表
+            selection_strategy: 选择策略，参见select_daily_signals
+            
+        Returns:
+            pd.DataFrame: 选择后的信号表（按日期升序）
+        """
+        if table.empty or selection_strategy == 'all':
+            return table
+        if SIGNAL_DATE_COLUMN not in table.columns or 'next_day_return' not in table.columns:
+            return table
+        
+        # 过滤掉没有收益率数据的信号
+        df = table.dropna(subset=['next_day_return'])
+        if df.empty:
+            return df
+        
+        day_key = df[SIGNAL_DATE_COLUMN].dt.normalize()
+        if selection_strategy == 'lowest_return':
+            selected_index = df['next_day_return'].groupby(day_key).idxmin()
+        elif selection_strategy == 'highest_return':
+            selected_index = df['next_day_return'].groupby(day_key).idxmax()
+        else:
+            # 'first' 及未知策略：选择当天第一个信号（按原始顺序）
+            selected_index = df.index.to_series().groupby(day_key).first()
+        
+        multi_signal_days = int((day_key.value_counts() > 1).sum())
+        if multi_signal_days:
+            self.logger.info(f"共有 {multi_signal_days} 个交易日存在多个信号，按策略 '{selection_strategy}' 各选择一个")
+        
+        return df.loc[selected_index.to_numpy()]
+    
+    def select_daily_signals(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], 
                            selection_strategy: str = 'lowest_return') -> List[Dict[str, Any]]:
         """
         处理同一天的多个信号，根据策略选择信号
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             selection_strategy: 选择策略
                 - 'lowest_return': 选择收益率最低的信号
                 - 'highest_return': 选择收益率最高的信号
@@ -436,56 +341,26 @@ class ResultAnalyzer:
         Returns:
             List[Dict[str, Any]]: 过滤后的信号列表
         """
-        if not signals or selection_strategy == 'all':
+        if self._is_empty(signals) or selection_strategy == 'all':
             return signals
         
-        # 转换为DataFrame便于处理
-        df = pd.DataFrame(signals)
-        if 'date' not in df.columns or 'next_day_return' not in df.columns:
+        table = self.build_signal_table(signals)
+        if SIGNAL_DATE_COLUMN not in table.columns or 'next_day_return' not in table.columns:
             return signals
         
-        # 过滤掉没有收益率数据的信号
-        df = df.dropna(subset=['next_day_return'])
-        if df.empty:
+        selected = self._select_daily_frame(table, selection_strategy)
+        if selected.empty:
             return []
         
-        # 转换日期格式
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # 按日期分组，每天只选择一个信号
-        selected_signals = []
-        
-        for date, group in df.groupby(df['date'].dt.date):
-            if len(group) == 1:
-                # 如果该天只有一个信号，直接添加
-                selected_signals.append(group.iloc[0].to_dict())
-            else:
-                # 如果该天有多个信号，根据策略选择
-                if selection_strategy == 'lowest_return':
-                    # 选择收益率最低的信号
-                    selected_row = group.loc[group['next_day_return'].idxmin()]
-                    self.logger.info(f"日期 {date}: 从 {len(group)} 个信号中选择收益率最低的 "
-                                   f"({selected_row['stock_code']}: {selected_row['next_day_return']:.2f}%)")
-                elif selection_strategy == 'highest_return':
-                    # 选择收益率最高的信号
-                    selected_row = group.loc[group['next_day_return'].idxmax()]
-                    self.logger.info(f"日期 {date}: 从 {len(group)} 个信号中选择收益率最高的 "
-                                   f"({selected_row['stock_code']}: {selected_row['next_day_return']:.2f}%)")
-                elif selection_strategy == 'first':
-                    # 选择第一个信号（按原始顺序）
-                    selected_row = group.iloc[0]
-                    self.logger.info(f"日期 {date}: 从 {len(group)} 个信号中选择第一个 "
-                                   f"({selected_row['stock_code']}: {selected_row['next_day_return']:.2f}%)")
-                else:
-                    # 默认选择第一个
-                    selected_row = group.iloc[0]
-                
-                selected_signals.append(selected_row.to_dict())
+        # 与原有行为保持一致：返回的信号中date为Timestamp
+        selected = selected.assign(date=selected[SIGNAL_DATE_COLUMN]).drop(columns=[SIGNAL_DATE_COLUMN])
+        selected_signals = selected.astype({'stock_code': object}).to_dict('records') if 'stock_code' in selected.columns \
+            else selected.to_dict('records')
         
-        self.logger.info(f"信号选择完成: 原始信号数 {len(signals)}, 选择后信号数 {len(selected_signals)}")
+        self.logger.info(f"信号选择完成: 原始信号数 {len(table)}, 选择后信号数 {len(selected_signals)}")
         return selected_signals
 
-    def calculate_portfolio_performance(self, signals: List[Dict[str, Any]], 
+    def calculate_portfolio_performance(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], 
                                       initial_capital: float = 100000,
                                       position_size: float = 1.0,
                                       daily_selection_strategy: str = 'lowest_return') -> Dict[str, Any]:
@@ -493,7 +368,7 @@ class ResultAnalyzer:
         计算投资组合表现 - 满仓/空仓策略
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             initial_capital: 初始资金
             position_size: 每次投资占总资金的比例（默认1.0表示满仓）
             daily_selection_strategy: 同一天多信号选择策略
@@ -501,16 +376,14 @@ class ResultAnalyzer:
         Returns:
             Dict[str, Any]: 投资组合表现
         """
-        if not signals:
+        if self._is_empty(signals):
             return {"error": "没有信号数据"}
         
         # 先进行同一天信号选择
-        selected_signals = self.select_daily_signals(signals, daily_selection_strategy)
-        if not selected_signals:
+        df = self._select_daily_frame(self.build_signal_table(signals), daily_selection_strategy)
+        if df.empty:
             return {"error": "信号选择后没有有效数据"}
         
-        # 转换为DataFrame并按日期排序
-        df = pd.DataFrame(selected_signals)
         if 'next_day_return' not in df.columns:
             return {"error": "缺少收益率数据"}
         
@@ -518,33 +391,13 @@ class ResultAnalyzer:
         if df.empty:
             return {"error": "没有有效的收益率数据"}
         
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date').reset_index(drop=True)
+        df = df.sort_values(SIGNAL_DATE_COLUMN, kind='mergesort')
         
         # 计算投资组合表现 - 满仓/空仓策略
-        capital = initial_capital
-        portfolio_values = [capital]
-        returns = []
-        
-        for _, row in df.iterrows():
-            if capital <= 0:  # 如果资金不足，跳过这次投资
-                returns.append(0)
-                portfolio_values.append(capital)
-                continue
-                
-            return_rate = row['next_day_return'] / 100  # 转换为小数
-            
-            if position_size >= 1.0:
-                # 满仓策略：资金直接按收益率变化
-                capital = capital * (1 + return_rate)
-            else:
-                # 部分仓位策略：只投资部分资金
-                investment_amount = capital * position_size
-                profit = investment_amount * return_rate
-                capital = capital + profit
-            
-            portfolio_values.append(capital)
-            returns.append(return_rate)
+        returns, portfolio_values = self._simulate_capital(
+            df['next_day_return'].to_numpy(dtype=np.float64) / 100, initial_capital, position_size
+        )
+        capital = float(portfolio_values[-1])
         
         # 计算性能指标
         total_return = (capital - initial_capital) / initial_capital
@@ -553,12 +406,11 @@ class ResultAnalyzer:
         if num_trades > 0:
             avg_return = np.mean(returns)
             std_return = np.std(returns)
-            win_rate = sum(1 for r in returns if r > 0) / num_trades
+            win_rate = np.count_nonzero(returns > 0) / num_trades
             
             # 计算最大回撤
-            portfolio_series = pd.Series(portfolio_values)
-            running_max = portfolio_series.expanding().max()
-            drawdown = (portfolio_series - running_max) / running_max
+            running_max = np.maximum.accumulate(portfolio_values)
+            drawdown = (portfolio_values - running_max) / running_max
             max_drawdown = drawdown.min()
             
             # 计算夏普比率（假设无风险利率为0）
@@ -578,15 +430,15 @@ class ResultAnalyzer:
                 'max_drawdown_pct': max_drawdown * 100,
                 'sharpe_ratio': sharpe_ratio,
                 'volatility': std_return,
-                'portfolio_values': portfolio_values,
-                'dates': ['Initial'] + df['date'].dt.strftime('%Y-%m-%d').tolist()
+                'portfolio_values': portfolio_values.tolist(),
+                'dates': ['Initial'] + df[SIGNAL_DATE_COLUMN].dt.strftime('%Y-%m-%d').tolist()
             }
         else:
             return {"error": "没有有效的交易数据"}
     
 
     
-    def calculate_yearly_returns(self, signals: List[Dict[str, Any]], 
+    def calculate_yearly_returns(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], 
                                 initial_capital: float = 100000,
                                 position_size: float = 1.0,
                                 daily_selection_strategy: str = 'lowest_return') -> Dict[str, Any]:
@@ -594,7 +446,7 @@ class ResultAnalyzer:
         计算各年度收益率统计 - 满仓/空仓策略
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             initial_capital: 初始资金
             position_size: 每次投资占总资金的比例（默认1.0表示满仓）
             daily_selection_strategy: 同一天多信号选择策略
@@ -602,87 +454,77 @@ class ResultAnalyzer:
         Returns:
             Dict[str, Any]: 年度收益率统计
         """
-        if not signals:
+        if self._is_empty(signals):
             return {"error": "没有信号数据"}
         
         # 先进行同一天信号选择
-        selected_signals = self.select_daily_signals(signals, daily_selection_strategy)
-        if not selected_signals:
+        df = self._select_daily_frame(self.build_signal_table(signals), daily_selection_strategy)
+        if df.empty:
             return {"error": "信号选择后没有有效数据"}
         
-        # 转换为DataFrame
-        df = pd.DataFrame(selected_signals)
-        
         # 检查必要字段
-        if 'date' not in df.columns or 'next_day_return' not in df.columns:
+        if SIGNAL_DATE_COLUMN not in df.columns or 'next_day_return' not in df.columns:
             return {"error": "缺少必要的日期或收益率字段"}
         
-        # 转换日期并过滤有效收益率
-        df['date'] = pd.to_datetime(df['date'])
+        # 过滤有效收益率
         df = df.dropna(subset=['next_day_return'])
         
         if df.empty:
             return {"error": "没有有效的收益率数据"}
         
         # 按日期排序，确保按时间顺序处理
-        df = df.sort_values('date').reset_index(drop=True)
-        
-        # 添加年份列
-        df['year'] = df['date'].dt.year
+        df = df.sort_values(SIGNAL_DATE_COLUMN, kind='mergesort')
+        
+        returns = df['next_day_return'].reset_index(drop=True)
+        years = df[SIGNAL_DATE_COLUMN].dt.year.to_numpy()
+        
+        # 模拟投资过程，资金曲线第i个值为第i笔交易前的账户余额
+        _, portfolio_values = self._simulate_capital(
+            returns.to_numpy(dtype=np.float64) / 100, initial_capital, position_size
+        )
+        
+        # 按年份分组聚合
+        grouped = returns.groupby(years)
+        aggregated = grouped.agg(['count', 'mean', 'median', 'std', 'min', 'max', 'sum'])
+        positive_ratio = (returns > 0).groupby(years).mean()
+        negative_ratio = (returns < 0).groupby(years).mean()
+        cumulative = (1 + returns / 100).groupby(years).prod() - 1
+        if 'stock_code' in df.columns:
+            unique_stocks = df['stock_code'].reset_index(drop=True).groupby(years, observed=True).nunique()
+        else:
+            unique_stocks = None
         
-        # 模拟投资过程，计算每年年末的账户余额
-        current_capital = initial_capital
         yearly_capital = {}  # 记录每年年末的账户余额
-        
-        # 按年份分组统计
         yearly_stats = {}
         
-        for year in sorted(df['year'].unique()):
-            year_data = df[df['year'] == year].copy()
-            
-            if len(year_data) == 0:
-                continue
-            
-            year_start_capital = current_capital
-            
-            # 按日期顺序处理该年的每个信号
-            for _, row in year_data.iterrows():
-                if current_capital <= 0:
-                    continue
-                    
-                return_rate = row['next_day_return'] / 100  # 转换为小数
-                
-                if position_size >= 1.0:
-                    # 满仓策略：资金直接按收益率变化
-                    current_capital = current_capital * (1 + return_rate)
-                else:
-                    # 部分仓位策略：只投资部分资金
-                    investment_amount = current_capital * position_size
-                    profit = investment_amount * return_rate
-                    current_capital = current_capital + profit
+        for year in aggregated.index:
+            start = int(np.searchsorted(years, year, side='left'))
+            end = int(np.searchsorted(years, year, side='right'))
+            year_start_capital = float(portfolio_values[start])
+            year_end_capital = float(portfolio_values[end])
+            row = aggregated.loc[year]
+            year = int(year)
             
             # 记录年末账户余额
-            yearly_capital[year] = current_capital
-            
-            returns = year_data['next_day_return']
+            yearly_capital[year] = year_end_capital
             
             yearly_stats[year] = {
-                'total_signals': len(year_data),
-                'mean_return': returns.mean(),
-                'median_return': returns.median(),
-                'std_return': returns.std(),
-                'min_return': returns.min(),
-                'max_return': returns.max(),
-                'positive_return_ratio': (returns > 0).mean(),
-                'negative_return_ratio': (returns < 0).mean(),
-                'win_rate': (returns > 0).mean() * 100,
-                'total_return': returns.sum(),
-                'cumulative_return': (1 + returns / 100).prod() - 1,
-                'unique_stocks': year_data['stock_code'].nunique() if 'stock_code' in year_data.columns else 0,
+                'total_signals': end - start,
+                'mean_return': row['mean'],
+                'median_return': row['median'],
+                'std_return': row['std'],
+                'min_return': row['min'],
+                'max_return': row['max'],
+                'positive_return_ratio': positive_ratio.loc[year],
+                'negative_return_ratio': negative_ratio.loc[year],
+                'win_rate': positive_ratio.loc[year] * 100,
+                'total_return': row['sum'],
+                'cumulative_return': cumulative.loc[year],
+                'unique_stocks': int(unique_stocks.loc[year]) if unique_stocks is not None else 0,
                 'year_start_capital': year_start_capital,
-                'year_end_capital': current_capital,
-                'year_profit': current_capital - year_start_capital,
-                'year_return_rate': ((current_capital - year_start_capital) / year_start_capital) * 100 if year_start_capital > 0 else 0
+                'year_end_capital': year_end_capital,
+                'year_profit': year_end_capital - year_start_capital,
+                'year_return_rate': ((year_end_capital - year_start_capital) / year_start_capital) * 100 if year_start_capital > 0 else 0
             }
         
         # 计算总体统计
@@ -695,7 +537,7 @@ class ResultAnalyzer:
             'avg_yearly_signals': np.mean([stats['total_signals'] for stats in yearly_stats.values()]) if yearly_stats else 0,
             'avg_yearly_return': np.mean([stats['total_return'] for stats in yearly_stats.values()]) if yearly_stats else 0,
             'initial_capital': initial_capital,
-            'final_capital': current_capital
+            'final_capital': float(portfolio_values[-1])
         }
         
         return {
@@ -704,21 +546,20 @@ class ResultAnalyzer:
             'yearly_capital': yearly_capital
         }
     
-    def calculate_profitable_stocks_drawdown_stats(self, signals: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def calculate_profitable_stocks_drawdown_stats(self, signals: Union[List[Dict[str, Any]], pd.DataFrame]) -> Dict[str, Any]:
         """
         计算3日上涨、5日上涨、10日上涨股票的最大回撤统计
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             
         Returns:
             Dict[str, Any]: 股票回撤统计结果
         """
-        if not signals:
+        if self._is_empty(signals):
             return {"error": "没有信号数据"}
         
-        # 转换为DataFrame
-        df = pd.DataFrame(signals)
+        df = self.build_signal_table(signals)
         
         # 检查必要的字段
         required_fields = ['day3_change_pct', 'day5_change_pct', 'day10_change_pct']
@@ -726,16 +567,30 @@ class ResultAnalyzer:
             if field not in df.columns:
                 return {"error": f"缺少{field}字段"}
         
-        def calculate_drawdown_for_group(group_df, group_name, target_days):
+        # 买入价格（当日收盘价），缺失时不参与回撤统计
+        buy_prices = self._column_values(df, 'close')
+        
+        # 次日价格：开盘价，以及最低价（缺失时使用收盘价作为备选）
+        next_open = self._column_values(df, 'next_open')
+        next_low = self._column_values(df, 'next_low')
+        next_low = np.where(np.isnan(next_low), self._column_values(df, 'next_close'), next_low)
+        
+        # 逐日最低价的累计最低值：running_min[d] 为次日至第d日期间的最低价
+        running_min = {1: np.fmin(next_open, next_low)}
+        for day in range(2, 11):
+            running_min[day] = np.fmin(running_min[day - 1], self._column_values(df, f'day{day}_low'))
+        
+        def calculate_drawdown_for_group(group_mask, group_name, target_days):
             """
             计算特定组的回撤统计
             
             Args:
-                group_df: 股票数据DataFrame
+                group_mask: 属于该组的信号掩码
                 group_name: 组名称
                 target_days: 目标天数（3, 5, 或 10）
             """
-            if group_df.empty:
+            total_count = int(np.count_nonzero(group_mask))
+            if total_count == 0:
                 return {
                     f'{group_name}_total_count': 0,
                     f'{group_name}_drawdown_lt_1pct_count': 0,
@@ -746,65 +601,22 @@ class ResultAnalyzer:
                     f'{group_name}_drawdown_lt_3pct_ratio': 0.0
                 }
             
-            total_count = len(group_df)
-            drawdown_lt_1pct_count = 0
-            drawdown_lt_2pct_count = 0
-            drawdown_lt_3pct_count = 0
+            buy_price = buy_prices[group_mask]
+            period_min_price = running_min[target_days][group_mask]
             
-            for _, row in group_df.iterrows():
-                # 买入价格（当日收盘价）
-                buy_price = row.get('close', 0)
-                if buy_price <= 0:
-                    continue
-                
-                # 收集从次日到目标天数期间的所有最低价
-                min_prices = []
-                
-                # 次日开盘价
-                next_open = row.get('next_open')
-                if pd.notna(next_open):
-                    min_prices.append(next_open)
-                
-                # 次日最低价（如果有的话）
-                next_low = row.get('next_low')
-                if pd.notna(next_low):
-                    min_prices.append(next_low)
-                else:
-                    # 如果没有次日最低价，使用次日收盘价作为备选
-                    next_close = row.get('next_close')
-                    if pd.notna(next_close):
-                        min_prices.append(next_close)
-                
-                # 收集每日的最低价
-                for day in range(2, target_days + 1):
-                    day_low_field = f'day{day}_low'
-                    if day_low_field in row and pd.notna(row[day_low_field]):
-                        min_prices.append(row[day_low_field])
-                
-                if not min_prices:
-                    continue
-                
-                # 找到期间内的最低价
-                period_min_price = min(min_prices)
-                
-                # 计算最大回撤（从买入价到期间最低价）
-                max_drawdown = (period_min_price - buy_price) / buy_price * 100
-                
-                # 统计回撤程度
-                if max_drawdown < -3.0:
-                    drawdown_lt_3pct_count += 1
-                    drawdown_lt_2pct_count += 1
-                    drawdown_lt_1pct_count += 1
-                elif max_drawdown < -2.0:
-                    drawdown_lt_2pct_count += 1
-                    drawdown_lt_1pct_count += 1
-                elif max_drawdown < -1.0:
-                    drawdown_lt_1pct_count += 1
+            # 计算最大回撤（从买入价到期间最低价），买入价无效或无价格数据时为NaN
+            with np.errstate(divide='ignore', invalid='ignore'):
+                max_drawdown = np.where(buy_price > 0, (period_min_price - buy_price) / buy_price * 100, np.nan)
+            
+            # 统计回撤程度
+            drawdown_lt_1pct_count = int(np.count_nonzero(max_drawdown < -1.0))
+            drawdown_lt_2pct_count = int(np.count_nonzero(max_drawdown < -2.0))
+            drawdown_lt_3pct_count = int(np.count_nonzero(max_drawdown < -3.0))
             
             # 计算比例
-            drawdown_lt_1pct_ratio = drawdown_lt_1pct_count / total_count * 100 if total_count > 0 else 0
-            drawdown_lt_2pct_ratio = drawdown_lt_2pct_count / total_count * 100 if total_count > 0 else 0
-            drawdown_lt_3pct_ratio = drawdown_lt_3pct_count / total_count * 100 if total_count > 0 else 0
+            drawdown_lt_1pct_ratio = drawdown_lt_1pct_count / total_count * 100
+            drawdown_lt_2pct_ratio = drawdown_lt_2pct_count / total_count * 100
+            drawdown_lt_3pct_ratio = drawdown_lt_3pct_count / total_count * 100
             
             return {
                 f'{group_name}_total_count': total_count,
@@ -816,45 +628,38 @@ class ResultAnalyzer:
                 f'{group_name}_drawdown_lt_3pct_ratio': drawdown_lt_3pct_ratio
             }
         
-        # 分别过滤出3日上涨、5日上涨、10日上涨的股票
-        day3_up_df = df[(df['day3_change_pct'] > 0) & pd.notna(df['day3_change_pct'])].copy()
-        day5_up_df = df[(df['day5_change_pct'] > 0) & pd.notna(df['day5_change_pct'])].copy()
-        day10_up_df = df[(df['day10_change_pct'] > 0) & pd.notna(df['day10_change_pct'])].copy()
-        
-        # 计算各组的回撤统计
-        day3_stats = calculate_drawdown_for_group(day3_up_df, 'day3_up', 3)
-        day5_stats = calculate_drawdown_for_group(day5_up_df, 'day5_up', 5)
-        day10_stats = calculate_drawdown_for_group(day10_up_df, 'day10_up', 10)
-        
-        # 合并结果
+        # 分别统计3日上涨、5日上涨、10日上涨的股票
         result = {}
-        result.update(day3_stats)
-        result.update(day5_stats)
-        result.update(day10_stats)
+        for days in (3, 5, 10):
+            group_mask = self._column_values(df, f'day{days}_change_pct') > 0
+            result.update(calculate_drawdown_for_group(group_mask, f'day{days}_up', days))
         
         return result
     
 
     
-    def generate_performance_report(self, signals: List[Dict[str, Any]], 
+    def generate_performance_report(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], 
                                   output_file: str = None, 
                                   strategy_description: str = None) -> str:
         """
         生成性能报告
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             output_file: 输出文件路径
             strategy_description: 策略条件描述
             
         Returns:
             str: 报告内容
         """
+        # 构建一次信号表，供各项分析复用
+        table = self.build_signal_table(signals)
+        
         # 分析信号
-        analysis = self.analyze_signals(signals)
+        analysis = self.analyze_signals(table)
         
         # 计算投资组合表现
-        portfolio_perf = self.calculate_portfolio_performance(signals)
+        portfolio_perf = self.calculate_portfolio_performance(table)
         
         # 生成报告
         report_lines = []
@@ -920,7 +725,7 @@ class ResultAnalyzer:
                 report_lines.append("")
         
         # 年度收益率统计
-        yearly_returns = self.calculate_yearly_returns(signals)
+        yearly_returns = self.calculate_yearly_returns(table)
         if 'error' not in yearly_returns and yearly_returns.get('yearly_stats'):
             yearly_stats = yearly_returns['yearly_stats']
             overall_stats = yearly_returns['overall_stats']
@@ -975,7 +780,7 @@ class ResultAnalyzer:
                 report_lines.append("")
         
         # 详细关键比例统计信息
-        detailed_stats = self.calculate_detailed_statistics(signals)
+        detailed_stats = self.calculate_detailed_statistics(table)
         if detailed_stats:
             report_lines.append("关键比例统计:")
             
@@ -1061,7 +866,7 @@ class ResultAnalyzer:
             report_lines.append("")
         
         # 3日、5日、10日上涨股票最大回撤统计
-        drawdown_stats = self.calculate_profitable_stocks_drawdown_stats(signals)
+        drawdown_stats = self.calculate_profitable_stocks_drawdown_stats(table)
         if 'error' not in drawdown_stats:
             report_lines.append("3日、5日、10日上涨股票最大回撤统计 (从买入价到目标期间的最大回撤):")
             
@@ -1094,74 +899,60 @@ class ResultAnalyzer:
 
         
         # 按年份显示所有交易信号
-        if signals:
-            # 转换为DataFrame以便处理
-            df = pd.DataFrame(signals)
-            
-            if 'date' in df.columns and len(df) > 0:
-                # 添加年份列
-                df['year'] = pd.to_datetime(df['date']).dt.year
-                
-                # 按年份分组
-                years = sorted(df['year'].unique(), reverse=True)
+        if SIGNAL_DATE_COLUMN in table.columns and len(table) > 0:
+            # 按日期倒序排列，年份随之倒序
+            ordered = table.sort_values(SIGNAL_DATE_COLUMN, ascending=False, kind='mergesort')
+            
+            # 一次性批量查询前一交易日收盘价（每只股票只加载一次数据）
+            previous_closes = self._lookup_previous_closes(ordered)
+            # 转为Python列表逐行格式化，避免逐元素访问NumPy标量的开销
+            previous_closes = previous_closes.tolist()
+            stock_codes = ordered['stock_code'].astype(object).tolist() if 'stock_code' in ordered.columns \
+                else ['N/A'] * len(ordered)
+            dates = ordered['date'].astype(object).tolist()
+            closes = self._column_values(ordered, 'close').tolist()
+            next_opens = self._column_values(ordered, 'next_open').tolist()
+            
+            years = ordered[SIGNAL_DATE_COLUMN].dt.year.to_numpy()
+            year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+            year_ends = np.r_[year_starts[1:], len(years)]
+            
+            # 构建表头
+            header = f"{'股票代码':<10} {'日期':<10} {'买入价':<6} {'买入时涨幅':<8} {'次日开盘卖出':<10} {'卖出价':<7} {'盈亏比例':<8}"
+            
+            for start, end in zip(year_starts, year_ends):
+                report_lines.append(f"{years[start]}年交易信号 (共{end - start}条):")
+                report_lines.append(header)
+                report_lines.append("=" * len(header))
                 
-                for year in years:
-                    year_data = df[df['year'] == year].sort_values('date', ascending=False)
+                for i in range(start, end):
+                    close_val = closes[i]
+                    prev_close = previous_closes[i]
+                    next_open = next_opens[i]
                     
-                    if len(year_data) > 0:
-                        report_lines.append(f"{year}年交易信号 (共{len(year_data)}条):")
-                        # 使用简单直接的表格格式化方法
-                        # 构建表头
-                        header = f"{'股票代码':<10} {'日期':<10} {'买入价':<6} {'买入时涨幅':<8} {'次日开盘卖出':<10} {'卖出价':<7} {'盈亏比例':<8}"
-                        
-                        report_lines.append(header)
-                        report_lines.append("=" * len(header))
-                        
-                        for _, row in year_data.iterrows():
-                            stock_code = row.get('stock_code', 'N/A')
-                            date = row.get('date', 'N/A')
-                            
-                            # 格式化各列数据
-                            # 买入价格
-                            if pd.notna(row.get('close')):
-                                buy_price = f"{row.get('close', 0):.2f}"
-                            else:
-                                buy_price = "N/A"
-                            
-                            # 买入时涨幅 (相对于上一交易日收盘价)
-                            buy_gain = "N/A"
-                            if pd.notna(row.get('close')):
-                                close_val = row.get('close', 0)
-                                stock_code_val = row.get('stock_code', '')
-                                date_val = row.get('date', '')
-                                
-                                # 获取前一日收盘价
-                                prev_close = self._get_previous_close_price(stock_code_val, date_val)
-                                if prev_close is not None and prev_close > 0:
-                                    buy_gain_val = ((close_val - prev_close) / prev_close) * 100
-                                    buy_gain = f"{buy_gain_val:+.2f}%"
-                            
-                            # 卖出价格和盈亏比例
-                            if pd.notna(row.get('next_open')) and pd.notna(row.get('close')):
-                                sell_price = f"{row.get('next_open', 0):.2f}"
-                                # 计算盈亏比例
-                                buy_val = row.get('close', 0)
-                                sell_val = row.get('next_open', 0)
-                                if buy_val > 0:
-                                    profit_loss_val = ((sell_val - buy_val) / buy_val) * 100
-                                    profit_loss = f"{profit_loss_val:+.2f}%"
-                                else:
-                                    profit_loss = "N/A"
-                            else:
-                                sell_price = "N/A"
-                                profit_loss = "N/A"
-                            
-                            # 组合数据行 - 使用与表头相同的格式
-                            data_row = f"{stock_code:<10} {date:<12} {buy_price:>8} {buy_gain:>10} {'':<12} {sell_price:>8} {profit_loss:>10}"
-                            
-                            report_lines.append(data_row)
-                        
-                        report_lines.append("")
+                    # 买入价格
+                    buy_price = f"{close_val:.2f}" if not math.isnan(close_val) else "N/A"
+                    
+                    # 买入时涨幅 (相对于上一交易日收盘价)
+                    buy_gain = "N/A"
+                    if not math.isnan(close_val) and not math.isnan(prev_close) and prev_close > 0:
+                        buy_gain = f"{((close_val - prev_close) / prev_close) * 100:+.2f}%"
+                    
+                    # 卖出价格和盈亏比例
+                    if not math.isnan(next_open) and not math.isnan(close_val):
+                        sell_price = f"{next_open:.2f}"
+                        if close_val > 0:
+                            profit_loss = f"{((next_open - close_val) / close_val) * 100:+.2f}%"
+                        else:
+                            profit_loss = "N/A"
+                    else:
+                        sell_price = "N/A"
+                        profit_loss = "N/A"
+                    
+                    # 组合数据行 - 使用与表头相同的格式
+                    report_lines.append(f"{stock_codes[i]:<10} {dates[i]:<12} {buy_price:>8} {buy_gain:>10} {'':<12} {sell_price:>8} {profit_loss:>10}")
+                
+                report_lines.append("")
         
         report_lines.append("=" * 60)
         
@@ -1178,7 +969,7 @@ class ResultAnalyzer:
         
         return report_content
     
-    def write_backtest_result_to_file(self, signals: List[Dict[str, Any]], 
+    def write_backtest_result_to_file(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], 
                                      strategy_description: str = None, output_dir: str = None):
         """
         将回测结果以增量方式写入final_result文件
@@ -1261,6 +1052,75 @@ class ResultAnalyzer:
         except Exception as e:
             self.logger.error(f"写入final_result文件失败: {e}")
     
+    def _get_data_loader(self):
+        """
+        获取（懒加载）股票数据加载器
+        
+        Returns:
+            StockDataLoader: 数据加载器，无法创建时返回None
+        """
+        if self._data_loader is None and not self._data_loader_failed:
+            try:
+                from data_loader import StockDataLoader
+                self._data_loader = StockDataLoader(self.data_folder)
+            except Exception as e:
+                self._data_loader_failed = True
+                self.logger.warning(f"无法创建数据加载器，前一日收盘价不可用: {e}")
+        return self._data_loader
+    
+    def _get_previous_close_series(self, stock_code: str) -> Optional[pd.Series]:
+        """
+        获取股票每个交易日对应的前一交易日收盘价（按股票缓存，每只股票只加载一次）
+        
+        Args:
+            stock_code: 股票代码
+            
+        Returns:
+            Optional[pd.Series]: 以日期为索引的前一交易日收盘价，无法获取时返回None
+        """
+        if stock_code in self._previous_close_cache:
+            return self._previous_close_cache[stock_code]
+        
+        previous_close = None
+        data_loader = self._get_data_loader()
+        if data_loader is not None:
+            try:
+                stock_data = data_loader.load_stock_data(stock_code)
+                if stock_data is not None and not stock_data.empty and 'datetime' in stock_data.columns:
+                    stock_data = stock_data.sort_values('datetime', kind='mergesort')
+                    dates = pd.to_datetime(stock_data['datetime']).dt.normalize()
+                    previous_close = pd.Series(stock_data['close'].shift(1).to_numpy(dtype=np.float64),
+                                               index=pd.DatetimeIndex(dates))
+                    previous_close = previous_close[~previous_close.index.duplicated(keep='first')]
+            except Exception as e:
+                self.logger.warning(f"获取前一日收盘价失败 {stock_code}: {e}")
+                previous_close = None
+        
+        self._previous_close_cache[stock_code] = previous_close
+        return previous_close
+    
+    def _lookup_previous_closes(self, table: pd.DataFrame) -> np.ndarray:
+        """
+        批量查询信号表中每条信号的前一交易日收盘价
+        
+        Args:
+            table: 信号表
+            
+        Returns:
+            np.ndarray: 与信号表行对齐的前一交易日收盘价，无法获取时为NaN
+        """
+        result = np.full(len(table), np.nan)
+        if 'stock_code' not in table.columns or SIGNAL_DATE_COLUMN not in table.columns:
+            return result
+        
+        trade_dates = table[SIGNAL_DATE_COLUMN].dt.normalize()
+        for stock_code, positions in table.groupby('stock_code', observed=True).indices.items():
+            previous_close = self._get_previous_close_series(stock_code)
+            if previous_close is None:
+                continue
+            result[positions] = previous_close.reindex(trade_dates.iloc[positions]).to_numpy()
+        return result
+    
     def _get_previous_close_price(self, stock_code: str, date_str: str) -> Optional[float]:
         """
         获取指定股票在指定日期的前一交易日收盘价
@@ -1272,52 +1132,16 @@ class ResultAnalyzer:
         Returns:
             Optional[float]: 前一交易日收盘价，如果无法获取则返回None
         """
+        previous_close = self._get_previous_close_series(stock_code)
+        if previous_close is None:
+            return None
+        
         try:
-            from data_loader import StockDataLoader
-            import os
-            
-            # 获取数据文件夹路径
-            data_folder = r"c:\Users\17701\github\my_first_repo\stockapi\stock_base_info\all_stocks_data"
-            
-            # 创建数据加载器
-            data_loader = StockDataLoader(data_folder)
-            
-            # 加载股票数据
-            stock_data = data_loader.load_stock_data(stock_code)
-            if stock_data is None or stock_data.empty:
-                return None
-            
-            # 确保日期列为datetime类型
-            if 'datetime' in stock_data.columns:
-                stock_data['datetime'] = pd.to_datetime(stock_data['datetime'])
-                stock_data = stock_data.sort_values('datetime')
-            else:
-                return None
-            
-            # 转换目标日期
-            target_date = pd.to_datetime(date_str)
-            
-            # 找到目标日期的索引
-            target_mask = stock_data['datetime'].dt.date == target_date.date()
-            target_indices = stock_data[target_mask].index
-            
-            if len(target_indices) == 0:
-                return None
-            
-            target_index = target_indices[0]
-            
-            # 找到前一个交易日的数据
-            prev_data = stock_data[stock_data.index < target_index]
-            if prev_data.empty:
-                return None
-            
-            # 获取最近的前一个交易日的收盘价
-            prev_close = prev_data.iloc[-1]['close']
-            return float(prev_close) if pd.notna(prev_close) else None
-            
+            prev_close = previous_close.get(pd.to_datetime(date_str).normalize())
         except Exception as e:
             self.logger.warning(f"获取前一日收盘价失败 {stock_code} {date_str}: {e}")
             return None
+        return float(prev_close) if prev_close is not None and pd.notna(prev_close) else None
 
 
 class ResultExporter:
@@ -1326,23 +1150,23 @@ class ResultExporter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def export_to_csv(self, signals: List[Dict[str, Any]], output_file: str, 
+    def export_to_csv(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], output_file: str, 
                      include_analysis: bool = True):
         """
         导出结果到CSV文件
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表（DataFrame直接导出，不再转换）
             output_file: 输出文件路径
             include_analysis: 是否包含分析结果
         """
         try:
-            if not signals:
+            if ResultAnalyzer._is_empty(signals):
                 self.logger.warning("没有信号数据可导出")
                 return
             
             # 转换为DataFrame
-            df = pd.DataFrame(signals)
+            df = signals if isinstance(signals, pd.DataFrame) else pd.DataFrame(signals)
             
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -1369,21 +1193,21 @@ class ResultExporter:
         except Exception as e:
             self.logger.error(f"导出CSV文件失败: {e}")
     
-    def export_to_excel(self, signals: List[Dict[str, Any]], output_file: str):
+    def export_to_excel(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], output_file: str):
         """
         导出结果到Excel文件
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             output_file: 输出文件路径
         """
         try:
-            if not signals:
+            if ResultAnalyzer._is_empty(signals):
                 self.logger.warning("没有信号数据可导出")
                 return
             
             # 转换为DataFrame
-            df = pd.DataFrame(signals)
+            df = signals if isinstance(signals, pd.DataFrame) else pd.DataFrame(signals)
             
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -1419,16 +1243,16 @@ class ResultExporter:
         except Exception as e:
             self.logger.error(f"导出Excel文件失败: {e}")
     
-    def export_summary_statistics(self, signals: List[Dict[str, Any]], output_dir: str):
+    def export_summary_statistics(self, signals: Union[List[Dict[str, Any]], pd.DataFrame], output_dir: str):
         """
         导出汇总统计信息
         
         Args:
-            signals: 信号列表
+            signals: 信号列表或信号表
             output_dir: 输出目录
         """
         try:
-            if not signals:
+            if ResultAnalyzer._is_empty(signals):
                 self.logger.warning("没有信号数据可导出")
                 return
             
@@ -1457,7 +1281,7 @@ class ResultExporter:
             
             # 3. 信号数据CSV
             csv_file = os.path.join(output_dir, f'signals_{timestamp}.csv')
-            df = pd.DataFrame(signals)
+            df = signals if isinstance(signals, pd.DataFrame) else pd.DataFrame(signals)
             df.to_csv(csv_file, index=False, encoding='utf-8-sig')
             
             self.logger.info(f"汇总统计信息已导出到目录: {output_dir}")
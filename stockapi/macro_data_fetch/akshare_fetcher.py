@@ -0,0 +1,220 @@
+"""
+akshare 并发抓取模块
+
+为按股票逐个调用的 akshare 接口提供统一的抓取层：
+1. 有界线程池并发执行逐股票的请求
+2. 全局限速（所有线程共享的最小请求间隔），避免被接口封禁
+3. 按 (函数名, 参数) 落盘的响应缓存，缓存有效期按接口的数据更新频率设置
+4. 与原有逐股票代码一致的重试语义：异常或空结果时等待后重试，重试耗尽返回None
+
+akshare 模块可通过构造参数注入，便于用桩模块离线测试。
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'akshare_cache')
+
+# 各接口响应缓存有效期（小时），按数据更新频率设置；0 表示不缓存
+# - 财务报表按报告期（季度）披露，披露季内也只是逐日新增，缓存一周足够
+# - 个股信息中的总股本随股本变动才更新，缓存一天
+# - 行情快照是实时数据，不缓存
+DEFAULT_CACHE_TTL_HOURS = {
+    'stock_financial_benefit_ths': 24 * 7,
+    'stock_individual_info_em': 24,
+    'stock_zh_a_spot_em': 0,
+}
+FALLBACK_CACHE_TTL_HOURS = 2  # 未在上表中列出的接口
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_DELAY = 1.0
+
+
+def _is_empty_response(result):
+    """判断接口返回是否为空（None或空DataFrame）"""
+    if result is None:
+        return True
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.empty
+    return False
+
+
+class RateLimiter:
+    """线程安全的全局限速器（保证相邻两次请求的最小间隔）"""
+
+    def __init__(self, requests_per_second):
+        """
+        Args:
+            requests_per_second: 每秒最多请求次数，<=0 表示不限速
+        """
+        self.min_interval = 1.0 / requests_per_second if requests_per_second and requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """阻塞到允许发出下一次请求"""
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_time)
+            self._next_time = scheduled + self.min_interval
+        delay = scheduled - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AkshareFetcher:
+    """带并发、限速、落盘缓存和重试的 akshare 抓取器"""
+
+    def __init__(self, ak_module=None, cache_dir=DEFAULT_CACHE_DIR, cache_ttl_hours=None,
+                 max_workers=DEFAULT_MAX_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_delay=DEFAULT_RETRY_DELAY):
+        """
+        初始化抓取器
+
+        Args:
+            ak_module: akshare 模块（或提供同名函数的桩对象），不指定则导入 akshare
+            cache_dir: 响应缓存目录，None 表示不落盘缓存
+            cache_ttl_hours: {函数名: 缓存小时数}，会覆盖默认的有效期配置
+            max_workers: 线程池最大线程数
+            requests_per_second: 全局每秒最多请求次数
+            max_retries: 默认最大重试次数
+            retry_delay: 默认重试等待秒数
+        """
+        if ak_module is None:
+            import akshare as ak_module
+        self.ak = ak_module
+        self.cache_dir = cache_dir
+        self.cache_ttl_hours = dict(DEFAULT_CACHE_TTL_HOURS)
+        if cache_ttl_hours:
+            self.cache_ttl_hours.update(cache_ttl_hours)
+        self.max_workers = max(1, int(max_workers))
+        self.max_retries = max(1, int(max_retries))
+        self.retry_delay = retry_delay
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+    def _cache_path(self, func_name, kwargs):
+        """根据函数名和参数生成缓存文件路径"""
+        key = repr(sorted(kwargs.items()))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, func_name, f"{digest}.pkl")
+
+    def _load_cached(self, func_name, kwargs):
+        """读取未过期的缓存响应，不存在或已过期返回None"""
+        ttl_hours = self.cache_ttl_hours.get(func_name, FALLBACK_CACHE_TTL_HOURS)
+        if not self.cache_dir or ttl_hours <= 0:
+            return None
+        path = self._cache_path(func_name, kwargs)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl_hours * 3600:
+                return None
+            return pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"读取 {func_name} 缓存失败: {e}")
+            return None
+
+    def _save_cached(self, func_name, kwargs, result):
+        """把响应写入缓存（先写临时文件再原子替换）"""
+        ttl_hours = self.cache_ttl_hours.get(func_name, FALLBACK_CACHE_TTL_HOURS)
+        if not self.cache_dir or ttl_hours <= 0:
+            return
+        path = self._cache_path(func_name, kwargs)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pd.to_pickle(result, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.debug(f"保存 {func_name} 缓存失败: {e}")
+
+    def call(self, func_name, max_retries=None, retry_delay=None, use_cache=True, **kwargs):
+        """
+        调用 akshare 接口（先查缓存，未命中则限速请求并按需重试）
+
+        Args:
+            func_name: akshare 函数名，如 'stock_individual_info_em'
+            max_retries: 最大重试次数，默认使用构造时的配置
+            retry_delay: 重试等待秒数，默认使用构造时的配置
+            use_cache: 是否读写响应缓存
+            **kwargs: 传给 akshare 函数的关键字参数
+
+        Returns:
+            接口返回的数据；重试耗尽仍失败或为空时返回None
+        """
+        if use_cache:
+            cached = self._load_cached(func_name, kwargs)
+            if cached is not None:
+                return cached
+
+        max_retries = self.max_retries if max_retries is None else max(1, int(max_retries))
+        retry_delay = self.retry_delay if retry_delay is None else retry_delay
+        func = getattr(self.ak, func_name)
+
+        for attempt in range(max_retries):
+            try:
+                self.rate_limiter.wait()
+                result = func(**kwargs)
+                if not _is_empty_response(result):
+                    if use_cache:
+                        self._save_cached(func_name, kwargs, result)
+                    return result
+                if attempt < max_retries - 1:
+                    logger.debug(f"{func_name}({kwargs}) 第{attempt + 1}次返回空数据，正在重试...")
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    logger.debug(f"{func_name}({kwargs}) 第{attempt + 1}次尝试出错: {str(e)[:80]}，正在重试...")
+                else:
+                    logger.debug(f"{func_name}({kwargs}) 已重试{max_retries}次仍失败: {str(e)[:80]}")
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+        return None
+
+    def map(self, fn, items, progress_label=None, progress_every=20):
+        """
+        用有界线程池并发执行逐项任务，结果按输入顺序返回
+
+        任务内部通过 call() 发起请求时共享同一个全局限速器。
+
+        Args:
+            fn: 对单个元素执行的函数
+            items: 元素列表
+            progress_label: 进度日志前缀，None 表示不输出进度
+            progress_every: 每完成多少项输出一次进度
+
+        Returns:
+            list: 与 items 一一对应的结果；任务抛出异常时对应位置为该异常对象
+        """
+        items = list(items)
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        def run(index):
+            try:
+                return fn(items[index])
+            except Exception as e:
+                return e
+
+        worker_count = min(self.max_workers, len(items))
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            futures = {executor.submit(run, i): i for i in range(len(items))}
+            for done_count, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if progress_label and done_count % progress_every == 0:
+                    logger.info(f"{progress_label}: {done_count}/{len(items)}")
+        return results
+
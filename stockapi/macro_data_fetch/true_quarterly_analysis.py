@@ -8,24 +8,41 @@ import os
 import json
 import time
 import logging
+import importlib.util
 import akshare as ak
+import numpy as np
 import pandas as pd
 import shutil
 from datetime import datetime, timedelta
 from xtquant import xtdata
 from pathlib import Path
+from akshare_fetcher import AkshareFetcher
+from collections.abc import Mapping
+from numpy.lib.stride_tricks import sliding_window_view
 
 # 缓存配置
 # 获取脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
-CACHE_FILE = os.path.join(script_dir, 'stock_data_cache.json')
+CACHE_DIR = os.path.join(script_dir, 'stock_data_cache')
 CACHE_DURATION_HOURS = 2  # 缓存有效期2小时
+PARTITIONED_CACHE_TYPES = ('daily_data', 'financial_data')  # 按股票分区保存的缓存类型
+WHOLE_CACHE_KEY = '_all'  # 非分区缓存类型的文件名
+CACHE_EXTENSIONS = ('.parquet', '.pkl')
+
+# 滚动盈利配置
+ROLLING_QUARTERS = 4  # 滚动累计的季度数
+ROLLING_PROFIT_FIELDS = (
+    ('净利润', '滚动4季度净利润'),
+    ('营业总收入', '滚动4季度营业收入'),
+    ('归属母公司净利润', '滚动4季度归属母公司净利润'),
+)
 
 # 缓存功能说明:
-# 1. 日线数据和总股本数据会自动缓存到 stock_data_cache.json 文件
-# 2. 缓存有效期为2小时，过期后会重新获取数据
-# 3. 缓存可以显著提高重复运行的速度
-# 4. 如需强制刷新数据，可删除缓存文件
+# 1. 缓存保存在 stock_data_cache/<缓存类型>/ 目录下
+# 2. 日线数据和财务数据按股票分别保存（日线数据为Parquet，未安装pyarrow时为pickle），
+#    总股本数据和股票名称整体保存为一个文件
+# 3. 每个缓存文件以修改时间作为时间戳，有效期为2小时，过期的股票会单独重新获取
+# 4. 如需强制刷新数据，可删除 stock_data_cache 目录（或其中某只股票的文件）
 
 def get_stock_name_mapping():
     """
@@ -107,13 +124,178 @@ def setup_logging():
     logger.info(f"日志系统已启动，日志文件: {log_filename}")
     return logger
 
+def _parquet_engine_available():
+    """检测是否安装了Parquet读写引擎（pyarrow或fastparquet）"""
+    for module_name in ('pyarrow', 'fastparquet'):
+        if importlib.util.find_spec(module_name) is not None:
+            return True
+    return False
+
+PARQUET_AVAILABLE = _parquet_engine_available()
+
+def _cache_type_dir(cache_type):
+    """获取某一缓存类型的目录"""
+    return os.path.join(CACHE_DIR, cache_type)
+
+def _cache_base_path(cache_type, key):
+    """获取缓存条目的文件路径（不含扩展名）"""
+    return os.path.join(_cache_type_dir(cache_type), key)
+
+def _find_cache_file(base_path):
+    """查找缓存条目对应的文件（Parquet优先），不存在则返回None"""
+    for ext in CACHE_EXTENSIONS:
+        path = base_path + ext
+        if os.path.exists(path):
+            return path
+    return None
+
+def _is_cache_file_fresh(path):
+    """根据文件修改时间判断缓存条目是否在有效期内"""
+    try:
+        return time.time() - os.path.getmtime(path) <= CACHE_DURATION_HOURS * 3600
+    except OSError:
+        return False
+
+def _write_cache_file(base_path, value):
+    """
+    写入单个缓存条目（先写临时文件再原子替换）
+    
+    DataFrame在安装了Parquet引擎时保存为Parquet，其余数据保存为pickle。
+    """
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    if isinstance(value, pd.DataFrame) and PARQUET_AVAILABLE:
+        path = base_path + '.parquet'
+        tmp_path = path + '.tmp'
+        value.to_parquet(tmp_path)
+    else:
+        path = base_path + '.pkl'
+        tmp_path = path + '.tmp'
+        pd.to_pickle(value, tmp_path)
+    os.replace(tmp_path, path)
+    
+    # 删除同一条目的其他格式旧文件
+    for ext in CACHE_EXTENSIONS:
+        other_path = base_path + ext
+        if other_path != path and os.path.exists(other_path):
+            os.remove(other_path)
+
+def _read_cache_file(path):
+    """读取单个缓存条目"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+class LazyStockCache(Mapping):
+    """
+    按股票分区的惰性缓存视图
+    
+    只记录有效缓存条目的文件路径，首次访问某只股票时才读取对应文件；
+    新获取的数据可通过update合并进来。
+    """
+    
+    def __init__(self, cache_type, stock_codes=None):
+        self.cache_type = cache_type
+        self._paths = {}
+        self._loaded = {}
+        
+        if stock_codes is None:
+            stock_codes = get_cached_stock_codes(cache_type)
+        for stock_code in stock_codes:
+            path = _find_cache_file(_cache_base_path(cache_type, stock_code))
+            if path is not None and _is_cache_file_fresh(path):
+                self._paths[stock_code] = path
+    
+    def __getitem__(self, stock_code):
+        if stock_code in self._loaded:
+            return self._loaded[stock_code]
+        path = self._paths[stock_code]
+        value = _read_cache_file(path)
+        self._loaded[stock_code] = value
+        return value
+    
+    def __contains__(self, stock_code):
+        return stock_code in self._loaded or stock_code in self._paths
+    
+    def __iter__(self):
+        yield from self._paths
+        for stock_code in self._loaded:
+            if stock_code not in self._paths:
+                yield stock_code
+    
+    def __len__(self):
+        return len(self._paths.keys() | self._loaded.keys())
+    
+    def update(self, data):
+        """合并新获取的数据（仅内存，不写盘）"""
+        self._loaded.update(data)
+
+def save_stock_cache(cache_type, stock_code, value):
+    """
+    保存单只股票的缓存条目
+    
+    Args:
+        cache_type: 缓存类型 ('daily_data' 或 'financial_data')
+        stock_code: 股票代码
+        value: 要缓存的数据
+    """
+    try:
+        _write_cache_file(_cache_base_path(cache_type, stock_code), value)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"⚠️ 保存 {cache_type}/{stock_code} 缓存失败: {e}")
+
+def load_stock_cache(cache_type, stock_code):
+    """
+    加载单只股票的缓存条目
+    
+    Args:
+        cache_type: 缓存类型 ('daily_data' 或 'financial_data')
+        stock_code: 股票代码
+    
+    Returns:
+        缓存的数据，如果缓存无效或不存在则返回None
+    """
+    path = _find_cache_file(_cache_base_path(cache_type, stock_code))
+    if path is None or not _is_cache_file_fresh(path):
+        return None
+    try:
+        return _read_cache_file(path)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"⚠️ 读取 {cache_type}/{stock_code} 缓存失败: {e}")
+        return None
+
+def get_cached_stock_codes(cache_type):
+    """
+    获取某一缓存类型下仍在有效期内的股票代码列表
+    
+    Args:
+        cache_type: 缓存类型
+    
+    Returns:
+        list: 股票代码列表
+    """
+    cache_dir = _cache_type_dir(cache_type)
+    if not os.path.isdir(cache_dir):
+        return []
+    
+    stock_codes = []
+    for filename in sorted(os.listdir(cache_dir)):
+        stem, ext = os.path.splitext(filename)
+        if ext not in CACHE_EXTENSIONS or stem == WHOLE_CACHE_KEY:
+            continue
+        if _is_cache_file_fresh(os.path.join(cache_dir, filename)) and stem not in stock_codes:
+            stock_codes.append(stem)
+    return stock_codes
+
 def save_cache(data, cache_type):
     """
-    保存数据到缓存文件
+    保存数据到缓存
+    
+    按股票分区的缓存类型（日线数据、财务数据）每只股票单独保存为一个文件，
+    其余类型整体保存为一个文件，各自以文件修改时间作为缓存时间戳。
     
     Args:
         data: 要缓存的数据
-        cache_type: 缓存类型 ('daily_data' 或 'shares_data')
+        cache_type: 缓存类型 ('daily_data'、'financial_data'、'shares_data' 或 'stock_names')
     """
     logger = logging.getLogger(__name__)
     
@@ -124,93 +306,110 @@ def save_cache(data, cache_type):
             return
         logger.info(f"📊 准备缓存 {len(data)} 只股票的日线数据")
     elif cache_type == 'shares_data':
-        if not data or (isinstance(data, (list, pd.DataFrame)) and len(data) == 0):
+        if data is None or (isinstance(data, (dict, list, pd.DataFrame)) and len(data) == 0):
             logger.warning(f"⚠️ {cache_type} 数据为空，跳过缓存保存")
             return
     
-    cache_data = {}
-    if os.path.exists(CACHE_FILE):
+    if cache_type in PARTITIONED_CACHE_TYPES and isinstance(data, Mapping):
+        for stock_code, value in data.items():
+            save_stock_cache(cache_type, stock_code, value)
+    else:
         try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-        except:
-            cache_data = {}
-    
-    # 处理pandas DataFrame的序列化
-    serialized_data = data
-    if isinstance(data, pd.DataFrame):
-        serialized_data = data.to_dict('records')
-    elif isinstance(data, dict):
-        # 递归处理字典中的DataFrame
-        serialized_data = {}
-        for key, value in data.items():
-            if isinstance(value, pd.DataFrame):
-                serialized_data[key] = value.to_dict('records')
-            else:
-                serialized_data[key] = value
-    
-    cache_data[cache_type] = {
-        'data': serialized_data,
-        'timestamp': time.time()
-    }
-    
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            _write_cache_file(_cache_base_path(cache_type, WHOLE_CACHE_KEY), data)
+        except Exception as e:
+            logger.error(f"❌ 保存 {cache_type} 缓存失败: {e}")
+            return
     logger.info(f"💾 {cache_type} 数据已缓存")
 
 def load_cache(cache_type):
     """
-    从缓存文件加载数据
+    从缓存加载数据
+    
+    按股票分区的缓存类型返回惰性加载的LazyStockCache（只包含未过期的股票），
+    其余类型直接返回整体缓存的数据。
     
     Args:
-        cache_type: 缓存类型 ('daily_data' 或 'shares_data')
+        cache_type: 缓存类型 ('daily_data'、'financial_data'、'shares_data' 或 'stock_names')
     
     Returns:
         缓存的数据，如果缓存无效或不存在则返回None
     """
     logger = logging.getLogger(__name__)
-    if not os.path.exists(CACHE_FILE):
+    
+    if cache_type in PARTITIONED_CACHE_TYPES:
+        cached = LazyStockCache(cache_type)
+        if len(cached) == 0:
+            return None
+        logger.info(f"📂 使用 {cache_type} 缓存数据，包含 {len(cached)} 只股票")
+        return cached
+    
+    path = _find_cache_file(_cache_base_path(cache_type, WHOLE_CACHE_KEY))
+    if path is None:
+        return None
+    
+    if not _is_cache_file_fresh(path):
+        logger.info(f"⏰ {cache_type} 缓存已过期")
         return None
     
     try:
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
-        
-        if cache_type not in cache_data:
-            return None
-        
-        cached_item = cache_data[cache_type]
-        cache_time = cached_item['timestamp']
-        current_time = time.time()
-        
-        # 检查缓存是否过期（2小时 = 7200秒）
-        if current_time - cache_time > CACHE_DURATION_HOURS * 3600:
-            logger.info(f"⏰ {cache_type} 缓存已过期")
-            return None
-        
+        data = _read_cache_file(path)
         logger.info(f"📂 使用 {cache_type} 缓存数据")
-        
-        # 处理DataFrame的反序列化
-        data = cached_item['data']
-        if cache_type == 'daily_data' and isinstance(data, dict):
-            # 将字典中的记录列表转换回DataFrame
-            deserialized_data = {}
-            for key, value in data.items():
-                if isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict):
-                    deserialized_data[key] = pd.DataFrame(value)
-                else:
-                    deserialized_data[key] = value
-            return deserialized_data
-        elif cache_type == 'shares_data' and isinstance(data, list):
-            # 将记录列表转换回DataFrame
-            return pd.DataFrame(data)
-        
         return data
-    
     except Exception as e:
         logger.error(f"❌ 加载 {cache_type} 缓存失败: {e}")
         return None
 
+# 共享的akshare抓取层（并发、全局限速、响应缓存）
+_akshare_fetcher = None
+
+def get_akshare_fetcher():
+    """
+    获取共享的akshare抓取器（首次调用时创建）
+    
+    Returns:
+        AkshareFetcher: 抓取器实例
+    """
+    global _akshare_fetcher
+    if _akshare_fetcher is None:
+        _akshare_fetcher = AkshareFetcher(ak_module=ak, cache_dir=os.path.join(CACHE_DIR, 'akshare'))
+    return _akshare_fetcher
+
+def set_akshare_fetcher(fetcher):
+    """
+    替换共享的akshare抓取器（例如注入使用桩akshare模块的抓取器进行离线测试）
+    
+    Args:
+        fetcher: AkshareFetcher实例，传None则在下次使用时重新创建默认实例
+    """
+    global _akshare_fetcher
+    _akshare_fetcher = fetcher
+
+def fetch_total_shares(stock_code):
+    """
+    通过akshare个股信息接口获取单只股票的总股本
+    
+    Args:
+        stock_code: 股票代码（可以包含.SZ/.SH后缀）
+    
+    Returns:
+        float or None: 总股本，获取失败或<=0时返回None
+    """
+    # akshare需要6位数字代码
+    symbol = stock_code.split('.')[0]
+    stock_info = get_akshare_fetcher().call('stock_individual_info_em', max_retries=1, symbol=symbol)
+    if stock_info is None:
+        return None
+    
+    # 查找总股本信息（支持'总股本'或包含单位的写法，如'总股本(万股)'）
+    for _, row in stock_info.iterrows():
+        item_name = str(row['item'])
+        if '总股本' in item_name:
+            converted = safe_convert_to_float(row['value'])
+            if converted is not None and converted > 0:
+                return float(converted)
+            return None
+    return None
+
 # 沪深300成分股列表（已过滤掉2010年之前没有交易数据的股票）
 # 原始数量: 300, 有效数量: 175
 CSI300_FILTERED_STOCKS = [
@@ -275,10 +474,10 @@ def get_true_quarterly_profit_data(stock_code, start_year=2010, max_retries=3):
     Returns:
         dict: 包含季度数据的字典
     """
-    # 尝试从缓存加载财务数据
-    cached_data = load_cache('financial_data')
-    if cached_data is not None and stock_code in cached_data:
-        return cached_data[stock_code]
+    # 尝试从缓存加载该股票的财务数据（只读取这一只股票的缓存文件）
+    cached_data = load_stock_cache('financial_data', stock_code)
+    if cached_data is not None:
+        return cached_data
     
     # 提取6位数字代码（去掉.SZ/.SH后缀）
     if '.' in stock_code:
@@ -292,8 +491,9 @@ def get_true_quarterly_profit_data(stock_code, start_year=2010, max_retries=3):
     # 重试机制
     for attempt in range(max_retries):
         try:
-            # 使用'按报告期'参数获取季度数据
-            df = ak.stock_financial_benefit_ths(symbol=clean_code, indicator="按报告期")
+            # 使用'按报告期'参数获取季度数据（经共享抓取层限速和缓存，重试时跳过缓存）
+            df = get_akshare_fetcher().call('stock_financial_benefit_ths', max_retries=1, use_cache=(attempt == 0),
+                                            symbol=clean_code, indicator="按报告期")
             
             if df is None or df.empty:
                 if attempt < max_retries - 1:
@@ -418,12 +618,14 @@ def get_true_quarterly_profit_data(stock_code, start_year=2010, max_retries=3):
             # 计算滚动4季度累计盈利
             quarterly_data = calculate_rolling_profit(quarterly_data)
             
-            # 数据处理成功，返回结果
-            return {
+            # 数据处理成功，写入该股票的缓存并返回结果
+            result = {
                 'stock_code': stock_code,
                 'quarterly_data': quarterly_data,
                 'total_quarters': len(quarterly_data)
             }
+            save_stock_cache('financial_data', stock_code, result)
+            return result
              
         except Exception as e:
             if attempt < max_retries - 1:
@@ -449,41 +651,25 @@ def calculate_rolling_profit(quarterly_data):
     """
     # 按时间正序排列以便计算滚动数据
     sorted_data = sorted(quarterly_data, key=lambda x: (x['年份'], x['季度']))
+    row_count = len(sorted_data)
     
-    for i, quarter in enumerate(sorted_data):
-        # 计算当前季度及之前3个季度的累计盈利（共4个季度）
-        rolling_profit = 0
-        rolling_revenue = 0
-        rolling_parent_profit = 0
-        valid_quarters = 0
-        
-        # 向前查找最多4个季度的数据
-        for j in range(max(0, i-3), i+1):
-            if j < len(sorted_data):
-                net_profit = sorted_data[j]['净利润']
-                revenue = sorted_data[j]['营业总收入']
-                parent_profit = sorted_data[j]['归属母公司净利润']
-                
-                if net_profit is not None:
-                    rolling_profit += net_profit
-                if revenue is not None:
-                    rolling_revenue += revenue
-                if parent_profit is not None:
-                    rolling_parent_profit += parent_profit
-                
-                valid_quarters += 1
-        
-        # 只有当有完整的4个季度数据时才设置滚动数据，否则设置为None
-        if valid_quarters >= 4:
-            quarter['滚动4季度净利润'] = rolling_profit if rolling_profit != 0 else None
-            quarter['滚动4季度营业收入'] = rolling_revenue if rolling_revenue != 0 else None
-            quarter['滚动4季度归属母公司净利润'] = rolling_parent_profit if rolling_parent_profit != 0 else None
-        else:
-            quarter['滚动4季度净利润'] = None
-            quarter['滚动4季度营业收入'] = None
-            quarter['滚动4季度归属母公司净利润'] = None
+    # 滚动季度数：当前季度及之前最多3个季度
+    window_counts = np.minimum(np.arange(1, row_count + 1), ROLLING_QUARTERS)
+    
+    for source_field, rolling_field in ROLLING_PROFIT_FIELDS:
+        # 缺失值（None）按0累加，与逐季度累加的口径一致
+        values = np.array([0.0 if q[source_field] is None else q[source_field] for q in sorted_data], dtype=float)
+        rolling_values = [None] * row_count
+        if row_count >= ROLLING_QUARTERS:
+            window_sums = sliding_window_view(values, ROLLING_QUARTERS).sum(axis=1).tolist()
+            # 只有当有完整的4个季度数据时才设置滚动数据，累计为0时视为无数据
+            rolling_values[ROLLING_QUARTERS - 1:] = [s if s != 0 else None for s in window_sums]
         
-        quarter['滚动季度数'] = valid_quarters
+        for quarter, rolling_value in zip(sorted_data, rolling_values):
+            quarter[rolling_field] = rolling_value
+    
+    for quarter, window_count in zip(sorted_data, window_counts.tolist()):
+        quarter['滚动季度数'] = window_count
     
     # 恢复按时间倒序排列
     return sorted(sorted_data, key=lambda x: (x['年份'], x['季度']), reverse=True)
@@ -531,7 +717,7 @@ def get_stock_market_cap(stock_code, date, max_retries=3):
     for attempt in range(max_retries):
         try:
             # 获取股票基本信息（包含总股本）
-            stock_info = ak.stock_individual_info_em(symbol=clean_code)
+            stock_info = get_akshare_fetcher().call('stock_individual_info_em', max_retries=1, symbol=clean_code)
             if stock_info is None or stock_info.empty:
                 if attempt < max_retries - 1:
                     time.sleep(0.5)
@@ -642,33 +828,32 @@ def get_all_stocks_daily_data(stock_codes, start_date, end_date):
     Returns:
         dict: 所有股票的日线数据
     """
-    # 尝试从缓存加载数据
-    cached_data = load_cache('daily_data')
-    if cached_data is not None and isinstance(cached_data, dict):
-        logger = logging.getLogger(__name__)
-        # 规范化为字典，值为DataFrame
-        all_daily_data = {}
+    logger = logging.getLogger(__name__)
+    
+    # 从按股票分区的缓存中加载仍在有效期内的股票，只重新获取缺失或过期的股票
+    all_daily_data = {}
+    cached_data = LazyStockCache('daily_data', stock_codes)
+    for code in cached_data:
         try:
-            for code, df in cached_data.items():
-                if isinstance(df, pd.DataFrame) and not df.empty:
-                    # 确保索引为DatetimeIndex且包含收盘价
-                    if '日期' in df.columns:
-                        df['日期'] = pd.to_datetime(df['日期'])
-                        df.set_index('日期', inplace=True)
-                    all_daily_data[code] = df
-            
-            # 检查缓存是否包含所有需要的股票
-            missing_codes = [c for c in stock_codes if c not in all_daily_data]
-            if not missing_codes:
-                logger.info(f"📂 使用缓存数据，包含 {len(all_daily_data)} 只股票的日线数据")
-                return all_daily_data
-            else:
-                logger.info(f"缓存缺少 {len(missing_codes)} 只股票的日线数据，将重新获取全部数据")
+            df = cached_data[code]
         except Exception as e:
-            logger.warning(f"⚠️ 缓存数据处理失败: {e}，将重新获取数据")
+            logger.warning(f"⚠️ 读取 {code} 日线缓存失败: {e}，将重新获取")
+            continue
+        if isinstance(df, pd.DataFrame) and not df.empty:
+            # 确保索引为DatetimeIndex
+            if '日期' in df.columns:
+                df['日期'] = pd.to_datetime(df['日期'])
+                df.set_index('日期', inplace=True)
+            all_daily_data[code] = df
+    
+    missing_codes = [c for c in stock_codes if c not in all_daily_data]
+    if not missing_codes:
+        logger.info(f"📂 使用缓存数据，包含 {len(all_daily_data)} 只股票的日线数据")
+        return all_daily_data
+    if all_daily_data:
+        logger.info(f"📂 缓存命中 {len(all_daily_data)} 只股票，仅需获取缺失的 {len(missing_codes)} 只股票")
     
-    logger = logging.getLogger(__name__)
-    logger.info(f"开始使用xtquant获取 {len(stock_codes)} 只股票的日线数据...")
+    logger.info(f"开始使用xtquant获取 {len(missing_codes)} 只股票的日线数据...")
     
     try:
         # 使用xtquant批量获取所有股票的日线数据
@@ -676,22 +861,22 @@ def get_all_stocks_daily_data(stock_codes, start_date, end_date):
         start_time = start_date  # xtquant使用YYYYMMDD格式
         
         # 使用xtdata.get_market_data批量获取数据
-        market_data = xtdata.get_market_data([], stock_codes, period='1d', 
+        market_data = xtdata.get_market_data([], missing_codes, period='1d', 
                                            start_time=start_time, dividend_type='none')
         
         if market_data is None or not isinstance(market_data, dict):
             logger.error("❌ xtquant返回数据为空或格式错误")
-            return {}
+            return all_daily_data
         
         logger.info(f"✅ xtquant成功返回数据，包含字段: {list(market_data.keys())}")
         
         # 转换xtquant数据格式为与原来兼容的格式
-        all_daily_data = {}
+        fetched_daily_data = {}
         success_count = 0
         failed_count = 0
         failed_examples = []
         
-        for stock_code in stock_codes:
+        for stock_code in missing_codes:
             try:
                 # 检查股票是否在返回的数据中
                 if 'close' not in market_data or stock_code not in market_data['close'].index:
@@ -730,7 +915,7 @@ def get_all_stocks_daily_data(stock_codes, start_date, end_date):
                 
                 # 过滤日期范围（如果需要）
                 if not stock_df.empty:
-                    all_daily_data[stock_code] = stock_df
+                    fetched_daily_data[stock_code] = stock_df
                     success_count += 1
                 else:
                     failed_count += 1
@@ -747,20 +932,115 @@ def get_all_stocks_daily_data(stock_codes, start_date, end_date):
         if failed_examples:
             logger.warning(f"调试信息（前5个失败原因）: {failed_examples}")
         
-        # 保存到缓存
+        # 只把新获取的股票写入缓存
         if success_count > 0:
             logger.info(f"📈 成功获取 {success_count} 只股票的日线数据，保存到缓存")
-            save_cache(all_daily_data, 'daily_data')
+            save_cache(fetched_daily_data, 'daily_data')
+            all_daily_data.update(fetched_daily_data)
         else:
             logger.error(f"❌ 所有股票的日线数据获取都失败了")
         
         return all_daily_data
         
     except Exception as e:
-        logger = logging.getLogger(__name__)
         logger.error(f"❌ xtquant获取数据失败: {str(e)}")
         logger.error(f"建议检查xtquant连接状态")
-        return {}
+        return all_daily_data
+
+def _build_quarter_close_table(results, all_daily_data, shares_data):
+    """
+    把所有股票的收盘价一次性对齐到季度末日期网格上
+    
+    对每个(股票, 季度)组合，用一次merge_asof找到季度最后一天或之前最近交易日的收盘价，
+    并关联总股本，计算市值。
+    
+    Args:
+        results: 股票季度数据结果
+        all_daily_data: 所有股票的日线数据
+        shares_data: 所有股票的总股本数据
+    
+    Returns:
+        pd.DataFrame: 每行一个(股票, 季度)组合，包含quarter_key、date、close_price、
+                      total_shares、market_cap和failure（失败原因，成功时为None）列
+    """
+    # 收集每只股票有财务数据的季度（按results中的股票顺序）
+    pair_codes = []
+    pair_years = []
+    pair_quarters = []
+    for stock_code, stock_data in results.items():
+        seen_quarters = set()
+        for quarter_data in stock_data['quarterly_data']:
+            key = (quarter_data['年份'], quarter_data['季度'])
+            if key in seen_quarters:
+                continue
+            seen_quarters.add(key)
+            pair_codes.append(stock_code)
+            pair_years.append(key[0])
+            pair_quarters.append(key[1])
+    
+    pairs = pd.DataFrame({
+        'stock_code': pd.Series(pair_codes, dtype=object),
+        'year': pair_years,
+        'quarter': pd.Series(pair_quarters, dtype=object)
+    })
+    pairs['quarter_key'] = pairs['year'].astype(str) + '-' + pairs['quarter']
+    pairs['quarter_end'] = pd.to_datetime([
+        get_quarter_end_date(year, quarter) for year, quarter in zip(pair_years, pair_quarters)
+    ])
+    pairs['order'] = np.arange(len(pairs))
+    
+    # 把各股票的收盘价拼接成长表
+    close_frames = []
+    for stock_code in pairs['stock_code'].unique():
+        daily_data = all_daily_data.get(stock_code)
+        if daily_data is None or '收盘' not in daily_data.columns:
+            continue
+        if not isinstance(daily_data.index, pd.DatetimeIndex):
+            daily_data.index = pd.to_datetime(daily_data.index)
+        close_frames.append(pd.DataFrame({
+            'stock_code': stock_code,
+            'trade_date': daily_data.index,
+            'close_price': daily_data['收盘'].to_numpy(dtype=float)
+        }))
+    
+    if close_frames:
+        closes = pd.concat(close_frames, ignore_index=True)
+    else:
+        closes = pd.DataFrame({
+            'stock_code': pd.Series(dtype=object),
+            'trade_date': pd.Series(dtype='datetime64[ns]'),
+            'close_price': pd.Series(dtype=float)
+        })
+    closes = closes.dropna(subset=['trade_date'])
+    closes['stock_code'] = closes['stock_code'].astype(object)
+    closes['trade_date'] = closes['trade_date'].astype('datetime64[ns]')
+    pairs['quarter_end'] = pairs['quarter_end'].astype('datetime64[ns]')
+    
+    # 一次merge_asof完成所有(股票, 季度)的向后查找
+    table = pd.merge_asof(
+        pairs.sort_values('quarter_end', kind='mergesort'),
+        closes.sort_values('trade_date', kind='mergesort'),
+        left_on='quarter_end',
+        right_on='trade_date',
+        by='stock_code',
+        direction='backward'
+    ).sort_values('order', kind='mergesort').reset_index(drop=True)
+    
+    # 关联总股本并计算市值
+    table['total_shares'] = table['stock_code'].map(lambda code: shares_data.get(code, np.nan)).astype(float)
+    table['market_cap'] = table['close_price'] * table['total_shares']
+    table['date'] = table['trade_date'].dt.strftime('%Y-%m-%d')
+    
+    # 按原有优先级记录失败原因
+    has_daily = table['stock_code'].isin(list(all_daily_data.keys()))
+    has_shares = table['stock_code'].isin(list(shares_data.keys()))
+    has_price = table['trade_date'].notna()
+    table['failure'] = np.select(
+        [~has_daily, ~has_shares, ~has_price],
+        ['无日线数据', '无总股本数据', '无对应日期的股价数据'],
+        default=''
+    )
+    return table
 
 def calculate_quarterly_market_cap_optimized(results, all_daily_data, shares_data, quarterly_stats):
     """
@@ -778,105 +1058,57 @@ def calculate_quarterly_market_cap_optimized(results, all_daily_data, shares_dat
     logger = logging.getLogger(__name__)
     logger.info("开始计算每个季度的市值总和...")
     
-    # 收集所有季度
-    all_quarters = set()
-    for stock_code, stock_data in results.items():
-        for quarter_data in stock_data['quarterly_data']:
-            year = quarter_data['年份']
-            quarter = quarter_data['季度']
-            quarter_key = f"{year}-{quarter}"
-            all_quarters.add((year, quarter, quarter_key))
+    table = _build_quarter_close_table(results, all_daily_data, shares_data)
+    
+    # 银行股标记按股票计算一次
+    stock_name_mapping = get_stock_name_mapping()
+    bank_flags = {code: is_bank_stock(stock_name_mapping.get(code, '')) for code in table['stock_code'].unique()}
+    table['is_bank'] = table['stock_code'].map(bank_flags).astype(bool)
+    
+    ok_mask = table['failure'] == ''
+    succeeded = table[ok_mask]
+    
+    # 按季度做列汇总
+    cap_sums = succeeded.groupby('quarter_key', sort=False)['market_cap'].sum()
+    bank_cap_sums = succeeded[succeeded['is_bank']].groupby('quarter_key', sort=False)['market_cap'].sum()
+    non_bank_cap_sums = succeeded[~succeeded['is_bank']].groupby('quarter_key', sort=False)['market_cap'].sum()
+    success_counts = ok_mask.groupby(table['quarter_key'], sort=False).sum()
+    pair_counts = table.groupby('quarter_key', sort=False).size()
+    
+    # 每个季度的股票明细
+    details_by_quarter = {}
+    for quarter_key, stock_code, market_cap, close_price, total_shares, date in zip(
+            succeeded['quarter_key'].tolist(), succeeded['stock_code'].tolist(),
+            succeeded['market_cap'].tolist(), succeeded['close_price'].tolist(),
+            succeeded['total_shares'].tolist(), succeeded['date'].tolist()):
+        details_by_quarter.setdefault(quarter_key, {})[stock_code] = {
+            'market_cap': market_cap,
+            'close_price': close_price,
+            'total_shares': total_shares,
+            'date': date
+        }
+    
+    failed = table[~ok_mask]
+    debug_by_quarter = {}
+    for quarter_key, stock_code, failure in zip(failed['quarter_key'].tolist(),
+                                                failed['stock_code'].tolist(),
+                                                failed['failure'].tolist()):
+        debug_by_quarter.setdefault(quarter_key, []).append(f"{stock_code}: {failure}")
+    
+    quarter_rows = table.drop_duplicates('quarter_key')[['year', 'quarter', 'quarter_key']]
+    quarter_rows = sorted(zip(quarter_rows['year'].tolist(), quarter_rows['quarter'].tolist(),
+                              quarter_rows['quarter_key'].tolist()), reverse=True)
     
     quarterly_market_caps = {}
     
-    # 按季度计算市值
-    for year, quarter, quarter_key in sorted(all_quarters, reverse=True):
-        logger.info(f"计算 {quarter_key} 季度市值...")
-        
+    for year, quarter, quarter_key in quarter_rows:
         quarter_end_date = get_quarter_end_date(year, quarter)
-        quarter_end_datetime = pd.to_datetime(quarter_end_date)
-        
-        total_market_cap = 0
-        success_count = 0
-        failed_count = 0
-        debug_info = []
-        
-        # 获取该季度有数据的所有股票
-        stocks_in_quarter = []
-        for stock_code, stock_data in results.items():
-            for quarter_data in stock_data['quarterly_data']:
-                if quarter_data['年份'] == year and quarter_data['季度'] == quarter:
-                    stocks_in_quarter.append(stock_code)
-                    break
-        
-        logger.info(f"该季度有财务数据的股票数: {len(stocks_in_quarter)}")
-        
-        # 存储每只股票的详细市值信息
-        stock_details = {}
-        
-        # 计算每只股票的市值
-        for stock_code in stocks_in_quarter:
-            try:
-                # 检查是否有日线数据
-                if stock_code not in all_daily_data:
-                    failed_count += 1
-                    debug_info.append(f"{stock_code}: 无日线数据")
-                    continue
-                
-                # 检查是否有总股本数据
-                if stock_code not in shares_data:
-                    failed_count += 1
-                    debug_info.append(f"{stock_code}: 无总股本数据")
-                    continue
-                
-                daily_data = all_daily_data[stock_code]
-                total_shares = shares_data[stock_code]
-                
-                # 找到季度最后一天或之前最近的交易日
-                # 确保索引是DatetimeIndex
-                if not isinstance(daily_data.index, pd.DatetimeIndex):
-                    daily_data.index = pd.to_datetime(daily_data.index)
-                
-                available_dates = daily_data.index[daily_data.index <= quarter_end_datetime]
-                if len(available_dates) == 0:
-                    failed_count += 1
-                    debug_info.append(f"{stock_code}: 无对应日期的股价数据")
-                    continue
-                
-                target_date = available_dates.max()
-                close_price = daily_data.loc[target_date, '收盘']
-                
-                # 计算市值
-                market_cap = close_price * total_shares
-                total_market_cap += market_cap
-                success_count += 1
-                
-                # 存储股票详细信息
-                stock_details[stock_code] = {
-                    'market_cap': market_cap,
-                    'close_price': close_price,
-                    'total_shares': total_shares,
-                    'date': target_date.strftime('%Y-%m-%d')
-                }
-                
-            except Exception as e:
-                failed_count += 1
-                debug_info.append(f"{stock_code}: 计算错误 - {str(e)}")
-                continue
-        
-        # 获取股票名称映射
-        stock_name_mapping = get_stock_name_mapping()
-        
-        # 分别计算银行和非银行的市值
-        bank_market_cap = 0
-        non_bank_market_cap = 0
-        
-        for stock_code, details in stock_details.items():
-            stock_name = stock_name_mapping.get(stock_code, '')
-            if is_bank_stock(stock_name):
-                bank_market_cap += details['market_cap']
-            else:
-                non_bank_market_cap += details['market_cap']
+        total_market_cap = cap_sums.get(quarter_key, 0)
+        bank_market_cap = bank_cap_sums.get(quarter_key, 0)
+        non_bank_market_cap = non_bank_cap_sums.get(quarter_key, 0)
+        success_count = int(success_counts.get(quarter_key, 0))
+        failed_count = int(pair_counts.get(quarter_key, 0)) - success_count
+        debug_info = debug_by_quarter.get(quarter_key, [])
         
         # 计算市盈率 (PE ratio)
         pe_ratio = None
@@ -907,7 +1139,7 @@ def calculate_quarterly_market_cap_optimized(results, all_daily_data, shares_dat
             'non_bank_market_cap': non_bank_market_cap,
             'bank_pe_ratio': bank_pe_ratio,
             'non_bank_pe_ratio': non_bank_pe_ratio,
-            'stock_details': stock_details
+            'stock_details': details_by_quarter.get(quarter_key, {})
         }
         
         logger.info(f"✅ {quarter_key}: 总市值 {total_market_cap/1000000000000:.2f} 万亿元")
@@ -956,36 +1188,20 @@ def get_total_shares_batch(stock_codes):
         missing_codes = [c for c in stock_codes if c not in shares_data or not shares_data.get(c)]
         if missing_codes:
             logger.info(f"缓存缺少 {len(missing_codes)} 只股票的总股本数据，开始补齐...")
-            for i, stock_code in enumerate(missing_codes, 1):
-                try:
-                    symbol = stock_code.split('.')[0]
-                    stock_info = ak.stock_individual_info_em(symbol=symbol)
-                    total_shares = None
-                    for _, row in stock_info.iterrows():
-                        item_name = str(row['item'])
-                        if '总股本' in item_name:
-                            total_shares_value = row['value']
-                            converted = safe_convert_to_float(total_shares_value)
-                            if converted is not None and converted > 0:
-                                total_shares = float(converted)
-                            break
-                    if total_shares and total_shares > 0:
-                        shares_data[stock_code] = total_shares
-                    else:
-                        logger.debug(f"{stock_code} 总股本获取为空或<=0")
-                except Exception as e:
-                    logger.debug(f"{stock_code} 获取总股本异常: {str(e)[:80]}")
-                    continue
-                finally:
-                    if i % 20 == 0:
-                        logger.info(f"补齐进度: {i}/{len(missing_codes)}")
-                    time.sleep(0.05)
+            fetched = get_akshare_fetcher().map(fetch_total_shares, missing_codes, progress_label="补齐进度")
+            for stock_code, total_shares in zip(missing_codes, fetched):
+                if isinstance(total_shares, Exception):
+                    logger.debug(f"{stock_code} 获取总股本异常: {str(total_shares)[:80]}")
+                elif total_shares and total_shares > 0:
+                    shares_data[stock_code] = total_shares
+                else:
+                    logger.debug(f"{stock_code} 总股本获取为空或<=0")
 
             # 若仍有缺失，使用行情快照作为兜底：总股本 ≈ 总市值 / 最新价
             still_missing = [c for c in missing_codes if c not in shares_data or not shares_data.get(c)]
             if still_missing:
                 try:
-                    spot_df = ak.stock_zh_a_spot_em()
+                    spot_df = get_akshare_fetcher().call('stock_zh_a_spot_em', max_retries=1)
                     # 建立 6位代码 -> (总市值, 最新价) 映射
                     code_col_candidates = ['代码', 'code', '股票代码']
                     price_col_candidates = ['最新价', '最新', 'price']
@@ -1039,42 +1255,19 @@ def get_total_shares_batch(stock_codes):
     failed_count = 0
     failed_examples = []
     
-    for i, stock_code in enumerate(stock_codes, 1):
-        if i % 20 == 0:
-            logger.info(f"进度: {i}/{len(stock_codes)}")
-        
-        try:
-            # 获取股票基本信息，akshare需要6位数字代码
-            symbol = stock_code.split('.')[0]  # 去掉后缀，只保留6位数字
-            stock_info = ak.stock_individual_info_em(symbol=symbol)
-            
-            # 查找总股本信息（支持'总股本'或包含单位的写法，如'总股本(万股)'）
-            total_shares = None
-            for _, row in stock_info.iterrows():
-                item_name = str(row['item'])
-                if '总股本' in item_name:
-                    total_shares_value = row['value']
-                    converted = safe_convert_to_float(total_shares_value)
-                    if converted is not None and converted > 0:
-                        total_shares = float(converted)
-                    break
-            
-            if total_shares is not None and total_shares > 0:
-                shares_data[stock_code] = total_shares
-                success_count += 1
-            else:
-                failed_count += 1
-                if len(failed_examples) < 5:
-                    failed_examples.append(f"{stock_code}: 总股本为空或0")
-                
-        except Exception as e:
+    fetched = get_akshare_fetcher().map(fetch_total_shares, stock_codes, progress_label="进度")
+    for stock_code, total_shares in zip(stock_codes, fetched):
+        if isinstance(total_shares, Exception):
             failed_count += 1
             if len(failed_examples) < 5:
-                failed_examples.append(f"{stock_code}: {str(e)[:50]}")
-            continue
-        
-        # 添加延迟避免请求过快
-        time.sleep(0.05)
+                failed_examples.append(f"{stock_code}: {str(total_shares)[:50]}")
+        elif total_shares is not None and total_shares > 0:
+            shares_data[stock_code] = total_shares
+            success_count += 1
+        else:
+            failed_count += 1
+            if len(failed_examples) < 5:
+                failed_examples.append(f"{stock_code}: 总股本为空或0")
     
     logger.info(f"✅ 总股本获取完成: 成功 {success_count}, 失败 {failed_count}")
     if failed_examples:
@@ -1086,7 +1279,7 @@ def get_total_shares_batch(stock_codes):
     if success_count == 0 or failed_count > success_count * 3:
         try:
             logger.info("开始使用行情快照兜底补齐总股本: 总股本 ≈ 总市值 / 最新价")
-            spot_df = ak.stock_zh_a_spot_em()
+            spot_df = get_akshare_fetcher().call('stock_zh_a_spot_em', max_retries=1)
             code_col_candidates = ['代码', 'code', '股票代码']
             price_col_candidates = ['最新价', '最新', 'price']
             mktcap_col_candidates = ['总市值', '总市值(元)', 'market_cap']
@@ -1242,28 +1435,14 @@ def get_total_shares_batch_local(stock_codes):
         still_missing = [c for c in missing_codes if c not in shares_data or not shares_data.get(c)]
         if still_missing:
             logger.info(f"🔎 本地读取失败，兜底 akshare，目标 {len(still_missing)} 只")
-            for i, stock_code in enumerate(still_missing, 1):
-                try:
-                    symbol = stock_code.split('.')[0]
-                    stock_info = ak.stock_individual_info_em(symbol=symbol)
-                    total_shares = None
-                    for _, row in stock_info.iterrows():
-                        item_name = str(row['item'])
-                        if '总股本' in item_name:
-                            converted = safe_convert_to_float(row['value'])
-                            if converted is not None and converted > 0:
-                                total_shares = float(converted)
-                            break
-                    if total_shares and total_shares > 0:
-                        shares_data[stock_code] = total_shares
-                    else:
-                        logger.debug(f"{stock_code} akshare 总股本为空或<=0")
-                except Exception as e:
-                    logger.debug(f"{stock_code} akshare 异常: {str(e)[:80]}")
-                finally:
-                    if i % 20 == 0:
-                        logger.info(f"akshare 兜底进度: {i}/{len(still_missing)}")
-                    time.sleep(0.05)
+            fetched = get_akshare_fetcher().map(fetch_total_shares, still_missing, progress_label="akshare 兜底进度")
+            for stock_code, total_shares in zip(still_missing, fetched):
+                if isinstance(total_shares, Exception):
+                    logger.debug(f"{stock_code} akshare 异常: {str(total_shares)[:80]}")
+                elif total_shares and total_shares > 0:
+                    shares_data[stock_code] = total_shares
+                else:
+                    logger.debug(f"{stock_code} akshare 总股本为空或<=0")
 
     save_cache(shares_data, 'shares_data')
     logger.info(f"补齐后 shares_data 条数: {len([c for c, v in shares_data.items() if v])}")
@@ -1338,42 +1517,50 @@ def analyze_all_stocks_true_quarterly(start_year=2010):
     logger = setup_logging()
     logger.info(f"开始分析沪深300股票的真实季度盈利情况（从{start_year}年开始）")
     
-    # 尝试从缓存加载财务数据
-    cached_financial_data = load_cache('financial_data')
-    if cached_financial_data is not None:
+    stocks = get_csi300_filtered_stocks()
+    total_stocks = len(stocks)
+    
+    # 按股票读取财务数据缓存，只有缺失或过期的股票才请求接口
+    cached_financial_data = LazyStockCache('financial_data', stocks)
+    if len(cached_financial_data) > 0:
         logger.info(f"📂 使用财务数据缓存，包含 {len(cached_financial_data)} 只股票")
-        results = cached_financial_data
-        success_count = len(results)
-        failed_stocks = []
-        total_stocks = len(results)
-    else:
-        stocks = get_csi300_filtered_stocks()
-        total_stocks = len(stocks)
-        
-        results = {}
-        success_count = 0
-        failed_stocks = []
-        
-        for i, stock_code in enumerate(stocks, 1):
-            logger.info(f"处理第 {i}/{total_stocks} 只股票: {stock_code}")
-            
-            # 获取季度数据
-            data = get_true_quarterly_profit_data(stock_code, start_year)
-            
-            if 'error' in data:
-                logger.error(f"❌ 失败: {data['error']}")
-                failed_stocks.append(stock_code)
-            else:
-                logger.info(f"✅ 成功: 获取到 {data['total_quarters']} 个季度数据")
-                results[stock_code] = data
-                success_count += 1
-            
-            # 添加延迟避免请求过快
-            time.sleep(0.2)
-        
-        # 保存财务数据到缓存
-        if results:
-            save_cache(results, 'financial_data')
+    
+    fetched_data = {}
+    missing_stocks = []
+    for stock_code in stocks:
+        if stock_code in cached_financial_data:
+            try:
+                fetched_data[stock_code] = cached_financial_data[stock_code]
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ 读取 {stock_code} 财务数据缓存失败: {e}，将重新获取")
+        missing_stocks.append(stock_code)
+    
+    # 缺失的股票通过共享抓取层并发获取（全局限速代替逐只股票的固定延迟，成功后会按股票写入缓存）
+    if missing_stocks:
+        logger.info(f"开始并发获取 {len(missing_stocks)} 只股票的季度财务数据...")
+        fetched = get_akshare_fetcher().map(
+            lambda code: get_true_quarterly_profit_data(code, start_year),
+            missing_stocks,
+            progress_label="财务数据获取进度"
+        )
+        for stock_code, data in zip(missing_stocks, fetched):
+            if isinstance(data, Exception):
+                data = {'error': f'获取股票{stock_code}数据时出错: {str(data)}'}
+            fetched_data[stock_code] = data
+    
+    results = {}
+    success_count = 0
+    failed_stocks = []
+    
+    for i, stock_code in enumerate(stocks, 1):
+        data = fetched_data[stock_code]
+        if 'error' in data:
+            logger.error(f"❌ 第 {i}/{total_stocks} 只股票 {stock_code} 失败: {data['error']}")
+            failed_stocks.append(stock_code)
+        else:
+            results[stock_code] = data
+            success_count += 1
     
     # 生成季度统计分析
     quarterly_stats = generate_quarterly_statistics(results)
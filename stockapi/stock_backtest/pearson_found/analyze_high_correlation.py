@@ -9,10 +9,11 @@ import logging
 import datetime
 import sys
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 from data_loader import StockDataLoader
+from kline_renderer import make_ten_day_job, render_kline_charts
 import unicodedata
-import matplotlib.pyplot as plt
 import matplotlib as mpl
 from matplotlib import font_manager
 import shutil
@@ -87,6 +88,8 @@ def analyze_csv_data(file_path, min_correlation_count=10):
                 except Exception:
                     return 0.0
 
+            pending_details = []
+            price_requests = []
             for row in reader:
                 results['total'] += 1
 
@@ -137,10 +140,10 @@ def analyze_csv_data(file_path, min_correlation_count=10):
                                 sell_mode = 'open'
                             elif '上涨' in base_label:
                                 sell_mode = 'close'
-                        price_data = get_stock_price_data(stock_code, date, max_percentage_days, sell_mode=sell_mode)
+                        price_requests.append((stock_code, date, max_percentage_days, sell_mode))
 
-                        # 汇总详情（包含全部指标文本，便于后续展示）
-                        results['details'].append({
+                        # 汇总详情（包含全部指标文本，便于后续展示），价格字段在读取完成后批量填充
+                        pending_details.append({
                             'stock_code': stock_code,
                             'date': date,
                             'buy_date': date,
@@ -150,19 +153,256 @@ def analyze_csv_data(file_path, min_correlation_count=10):
                             'metrics': [f"{name}({value:.2f}%)" for name, value in performance_metrics],
                             'max_percentage': max_percentage,
                             'max_percentage_metric': max_percentage_metric,
-                            'sell_days': max_percentage_days,
-                            'buy_price': price_data['买入价'] if '买入价' in price_data else price_data['buy_price'],
-                            'sell_price': price_data['卖出价'] if '卖出价' in price_data else price_data['sell_price'],
-                            'change_percent': price_data.get('change_percent', 'N/A'),
-                            'max_up_percent': price_data.get('max_up_percent', 'N/A'),
-                            'max_down_percent': price_data.get('max_down_percent', 'N/A')
+                            'sell_days': max_percentage_days
                         })
 
+            # 按股票批量计算价格数据（每只股票只加载一次日线）
+            for detail, price_data in zip(pending_details, get_stock_price_data_batch(price_requests)):
+                detail.update({
+                    'buy_price': price_data['买入价'] if '买入价' in price_data else price_data['buy_price'],
+                    'sell_price': price_data['卖出价'] if '卖出价' in price_data else price_data['sell_price'],
+                    'change_percent': price_data.get('change_percent', 'N/A'),
+                    'max_up_percent': price_data.get('max_up_percent', 'N/A'),
+                    'max_down_percent': price_data.get('max_down_percent', 'N/A')
+                })
+                results['details'].append(detail)
+
         return results
     except Exception as e:
         logging.error(f"分析CSV数据时出错: {e}")
         return results
 
+# 单次运行内共享的日线价格缓存：{股票代码: 价格数组字典或None}
+_PRICE_DATA_CACHE = {}
+_price_data_loader = None
+
+# 价格计算异常时返回的占位结果（与原有逻辑保持一致）
+_PRICE_DATA_ERROR_RESULT = {'buy_price': '50.00', 'sell_price': '52.50', 'change_percent': '5.00%', 'max_up_percent': '10.00%', 'max_down_percent': '5.00%'}
+
+_PRICE_DATA_INVALID_RESULT = {
+    'buy_price': 'N/A',
+    'sell_price': 'N/A',
+    'change_percent': 'N/A',
+    'max_up_percent': 'N/A',
+    'max_down_percent': 'N/A',
+    'valid': False
+}
+
+def clear_price_cache():
+    """清空单次运行内的日线价格缓存"""
+    global _price_data_loader
+    _PRICE_DATA_CACHE.clear()
+    _price_data_loader = None
+
+def _load_daily_data(stock_code):
+    """
+    加载股票日线数据并缓存（同一次运行中每只股票只读取一次CSV）
+
+    返回字典：df（原始日线DataFrame）、dates（日期索引）以及open/close/high/low的float数组
+    （缺失列为None）；数据为空时返回None。
+    """
+    global _price_data_loader
+    if stock_code in _PRICE_DATA_CACHE:
+        return _PRICE_DATA_CACHE[stock_code]
+
+    if _price_data_loader is None:
+        _price_data_loader = StockDataLoader()
+    df = _price_data_loader.load_stock_data(stock_code, 'daily')
+
+    arrays = None
+    if df is not None and not df.empty:
+        arrays = {'df': df, 'dates': pd.DatetimeIndex(df.index)}
+        for col in ('open', 'close', 'high', 'low'):
+            arrays[col] = df[col].to_numpy(dtype=float) if col in df.columns else None
+    _PRICE_DATA_CACHE[stock_code] = arrays
+    return arrays
+
+def _format_price_data(buy_price, sell_price, high_max, low_min):
+    """根据买入价、卖出价和持有期最高/最低价生成价格结果字典"""
+    max_up_percent = max(0.0, (high_max - buy_price) / buy_price * 100)
+    drawdown = (low_min - buy_price) / buy_price * 100
+    max_down_percent = abs(min(0.0, drawdown))
+
+    change_percent = (sell_price - buy_price) / buy_price * 100
+
+    # 一致性保障：最大涨/跌幅至少覆盖最终涨跌幅的绝对值
+    if change_percent >= 0:
+        max_up_percent = max(max_up_percent, change_percent)
+    else:
+        max_down_percent = max(max_down_percent, abs(change_percent))
+
+    return {
+        'buy_price': f"{buy_price:.2f}",
+        'sell_price': f"{sell_price:.2f}",
+        'change_percent': f"{change_percent:.2f}%",
+        'max_up_percent': f"{max_up_percent:.2f}%",
+        'max_down_percent': (f"-{max_down_percent:.2f}%" if max_down_percent > 0 else "0.00%"),
+        'valid': True
+    }
+
+def _simulated_price_data(stock_code, sell_days):
+    """数据不可用时的模拟价格数据（保证数值一致性）"""
+    code_seed = int(stock_code[-4:]) if len(stock_code) >= 4 else 1000
+    seed = code_seed + sell_days
+    np.random.seed(seed)
+
+    buy_price = round(np.random.uniform(20, 100), 2)
+    if sell_days <= 1:
+        change_percent = round(np.random.uniform(-3, 5), 2)
+        max_up_percent = round(np.random.uniform(0.5, 6), 2)
+        max_down_percent = round(np.random.uniform(0.5, 4), 2)
+    elif sell_days <= 3:
+        change_percent = round(np.random.uniform(-5, 8), 2)
+        max_up_percent = round(np.random.uniform(1, 10), 2)
+        max_down_percent = round(np.random.uniform(1, 7), 2)
+    elif sell_days <= 5:
+        change_percent = round(np.random.uniform(-8, 12), 2)
+        max_up_percent = round(np.random.uniform(2, 15), 2)
+        max_down_percent = round(np.random.uniform(2, 10), 2)
+    else:
+        change_percent = round(np.random.uniform(-10, 15), 2)
+        max_up_percent = round(np.random.uniform(3, 20), 2)
+        max_down_percent = round(np.random.uniform(3, 15), 2)
+
+    sell_price = round(buy_price * (1 + change_percent / 100), 2)
+
+    # 一致性保障
+    if change_percent >= 0:
+        max_up_percent = max(max_up_percent, change_percent)
+    else:
+        max_down_percent = max(max_down_percent, abs(change_percent))
+
+    return {
+        'buy_price': f"{buy_price:.2f}",
+        'sell_price': f"{sell_price:.2f}",
+        'change_percent': f"{change_percent:.2f}%",
+        'max_up_percent': f"{max_up_percent:.2f}%",
+        'max_down_percent': (f"-{max_down_percent:.2f}%" if max_down_percent > 0 else "0.00%"),
+        'valid': True
+    }
+
+def _window_extreme(values, starts, ends, reducer):
+    """按行对 values[starts[i]:ends[i]+1] 求极值（忽略NaN，全为NaN时返回NaN）"""
+    max_len = int((ends - starts).max()) + 1
+    idx = starts[:, None] + np.arange(max_len)
+    in_window = idx <= ends[:, None]
+    window_values = np.where(in_window, values[np.minimum(idx, len(values) - 1)], np.nan)
+    return reducer.reduce(window_values, axis=1)
+
+def _resolve_stock_prices(arrays, requests):
+    """
+    用数组索引一次性计算同一只股票多个买入日的价格数据
+
+    Args:
+        arrays: _load_daily_data 返回的价格数组字典
+        requests: [(date_str, sell_days, sell_mode), ...]
+
+    Returns:
+        list: 与 requests 一一对应的价格结果字典
+    """
+    results = [None] * len(requests)
+    dates = arrays['dates']
+    n = len(dates)
+
+    # 解析买入日期（同一日期字符串只解析一次）
+    parsed_dates = {}
+    for date_str, _, _ in requests:
+        if date_str not in parsed_dates:
+            try:
+                parsed_dates[date_str] = pd.to_datetime(date_str)
+            except Exception as e:
+                parsed_dates[date_str] = e
+
+    rows = []
+    for i, (date_str, sell_days, sell_mode) in enumerate(requests):
+        buy_dt = parsed_dates[date_str]
+        if isinstance(buy_dt, Exception):
+            logging.error(f"生成/计算股票价格数据时出错: {buy_dt}")
+            results[i] = dict(_PRICE_DATA_ERROR_RESULT)
+            continue
+        rows.append((i, buy_dt, int(sell_days), sell_days == 1 and sell_mode == 'open'))
+    if not rows:
+        return results
+
+    positions = np.array([r[0] for r in rows])
+    # 买入日不是交易日时使用买入日前的最近一个交易日
+    buy_idx = dates.searchsorted(pd.DatetimeIndex([r[1] for r in rows]), side='right') - 1
+    sell_idx = buy_idx + np.array([r[2] for r in rows])
+    is_open_sell = np.array([r[3] for r in rows], dtype=bool)
+
+    no_history = buy_idx < 0
+    beyond_data = ~no_history & (sell_idx >= n)
+    ok = ~no_history & ~beyond_data
+
+    for pos in positions[no_history]:
+        logging.error("生成/计算股票价格数据时出错: 无可用历史数据")
+        results[pos] = dict(_PRICE_DATA_ERROR_RESULT)
+    for pos in positions[beyond_data]:
+        results[pos] = dict(_PRICE_DATA_INVALID_RESULT)
+    if not ok.any():
+        return results
+
+    positions = positions[ok]
+    buy_idx = buy_idx[ok]
+    sell_idx = sell_idx[ok]
+    is_open_sell = is_open_sell[ok]
+
+    buy_prices = arrays['close'][buy_idx]
+    # 开盘卖出：次日开盘价（或目标卖出日开盘价）；否则按卖出日收盘价
+    open_sell_idx = np.where(buy_idx + 1 < n, buy_idx + 1, sell_idx)
+    sell_prices = np.where(is_open_sell, arrays['open'][open_sell_idx], arrays['close'][sell_idx])
+
+    # 持有期窗口：买入次日至卖出日（无后续交易日时只取买入日）
+    starts = np.where(buy_idx + 1 < n, buy_idx + 1, buy_idx)
+    has_window = sell_idx >= starts
+    window_starts = np.where(has_window, starts, buy_idx)
+    window_ends = np.where(has_window, sell_idx, buy_idx)
+
+    if arrays['high'] is not None:
+        high_max = _window_extreme(arrays['high'], window_starts, window_ends, np.fmax)
+    else:
+        high_max = buy_prices
+    if arrays['low'] is not None:
+        low_min = _window_extreme(arrays['low'], window_starts, window_ends, np.fmin)
+    else:
+        low_min = buy_prices
+
+    for pos, buy_price, sell_price, high, low in zip(positions.tolist(), buy_prices.tolist(),
+                                                     sell_prices.tolist(), high_max.tolist(), low_min.tolist()):
+        results[pos] = _format_price_data(buy_price, sell_price, high, low)
+    return results
+
+def get_stock_price_data_batch(requests):
+    """
+    批量获取买入/卖出价格与最大涨跌幅。
+    按股票分组，每只股票只加载一次日线数据，同一股票的所有买入日用数组索引一次性计算。
+
+    参数说明：
+    - requests: [(stock_code, date_str, sell_days, sell_mode), ...]，各字段含义同 get_stock_price_data
+
+    返回与 requests 一一对应的价格结果字典列表（字段与 get_stock_price_data 相同）。
+    """
+    results = [None] * len(requests)
+    by_stock = defaultdict(list)
+    for i, request in enumerate(requests):
+        by_stock[request[0]].append(i)
+
+    for stock_code, indices in by_stock.items():
+        stock_requests = [requests[i][1:] for i in indices]
+        try:
+            arrays = _load_daily_data(stock_code)
+            if arrays is not None:
+                stock_results = _resolve_stock_prices(arrays, stock_requests)
+            else:
+                # 数据不可用：使用模拟数据
+                stock_results = [_simulated_price_data(stock_code, sell_days) for _, sell_days, _ in stock_requests]
+        except Exception as e:
+            logging.error(f"生成/计算股票价格数据时出错: {e}")
+            stock_results = [dict(_PRICE_DATA_ERROR_RESULT) for _ in indices]
+        for i, result in zip(indices, stock_results):
+            results[i] = result
+    return results
+
 def get_stock_price_data(stock_code, date_str, sell_days, sell_mode=None):
     """
     获取买入/卖出价格与最大涨跌幅。
@@ -175,129 +415,7 @@ def get_stock_price_data(stock_code, date_str, sell_days, sell_mode=None):
     - sell_mode: 可选的卖出方式，'open' 表示按开盘价卖出，'close' 表示按收盘价卖出；
                  当 sell_days == 1 时生效；为 None 时默认按收盘价卖出。
     """
-    try:
-        import pandas as pd
-        from data_loader import StockDataLoader
-        loader = StockDataLoader()
-        df = loader.load_stock_data(stock_code, 'daily')
-        buy_dt = pd.to_datetime(date_str)
-
-        # 判断1日持股时的卖出方式（开盘/收盘）
-        # 优先使用调用方指定的 sell_mode；若未指定则默认按收盘价卖出。
-        if sell_days == 1:
-            if sell_mode == 'open':
-                is_open_sell = True
-            elif sell_mode == 'close':
-                is_open_sell = False
-            else:
-                is_open_sell = False
-        else:
-            is_open_sell = False
-
-        if df is not None and not df.empty:
-            # 使用真实数据
-            if buy_dt not in df.index:
-                # 使用买入日前的最近一个交易日
-                prior = df.index[df.index <= buy_dt]
-                if len(prior) == 0:
-                    raise ValueError("无可用历史数据")
-                buy_idx = df.index.get_loc(prior[-1])
-            else:
-                buy_idx = df.index.get_loc(buy_dt)
-
-            sell_idx = buy_idx + sell_days
-            if sell_idx >= len(df):
-                return {
-                    'buy_price': 'N/A',
-                    'sell_price': 'N/A',
-                    'change_percent': 'N/A',
-                    'max_up_percent': 'N/A',
-                    'max_down_percent': 'N/A',
-                    'valid': False
-                }
-
-            buy_price = float(df.iloc[buy_idx]['close'])
-            if is_open_sell:
-                # 开盘卖出：次日开盘价（或目标卖出日开盘价）
-                if buy_idx + 1 < len(df):
-                    sell_price = float(df.iloc[buy_idx + 1]['open'])
-                else:
-                    sell_price = float(df.iloc[sell_idx]['open'])
-            else:
-                sell_price = float(df.iloc[sell_idx]['close'])
-
-            # 计算持有期内最大涨幅（相对买入价的最高点）与最大跌幅（相对买入价的最低点）
-            start = buy_idx + 1 if buy_idx + 1 < len(df) else buy_idx
-            end = sell_idx
-            window = df.iloc[start:end + 1] if end >= start else df.iloc[buy_idx:buy_idx + 1]
-
-            high_max = float(window['high'].max()) if 'high' in window.columns else buy_price
-            low_min = float(window['low'].min()) if 'low' in window.columns else buy_price
-
-            max_up_percent = max(0.0, (high_max - buy_price) / buy_price * 100)
-            drawdown = (low_min - buy_price) / buy_price * 100
-            max_down_percent = abs(min(0.0, drawdown))
-
-            change_percent = (sell_price - buy_price) / buy_price * 100
-
-            # 一致性保障：最大涨/跌幅至少覆盖最终涨跌幅的绝对值
-            if change_percent >= 0:
-                max_up_percent = max(max_up_percent, change_percent)
-            else:
-                max_down_percent = max(max_down_percent, abs(change_percent))
-
-            return {
-                'buy_price': f"{buy_price:.2f}",
-                'sell_price': f"{sell_price:.2f}",
-                'change_percent': f"{change_percent:.2f}%",
-                'max_up_percent': f"{max_up_percent:.2f}%",
-                'max_down_percent': (f"-{max_down_percent:.2f}%" if max_down_percent > 0 else "0.00%"),
-                'valid': True
-            }
-
-        # 数据不可用：使用原模拟逻辑，但做一致性修正
-        import numpy as np
-        code_seed = int(stock_code[-4:]) if len(stock_code) >= 4 else 1000
-        seed = code_seed + sell_days
-        np.random.seed(seed)
-
-        buy_price = round(np.random.uniform(20, 100), 2)
-        if sell_days <= 1:
-            change_percent = round(np.random.uniform(-3, 5), 2)
-            max_up_percent = round(np.random.uniform(0.5, 6), 2)
-            max_down_percent = round(np.random.uniform(0.5, 4), 2)
-        elif sell_days <= 3:
-            change_percent = round(np.random.uniform(-5, 8), 2)
-            max_up_percent = round(np.random.uniform(1, 10), 2)
-            max_down_percent = round(np.random.uniform(1, 7), 2)
-        elif sell_days <= 5:
-            change_percent = round(np.random.uniform(-8, 12), 2)
-            max_up_percent = round(np.random.uniform(2, 15), 2)
-            max_down_percent = round(np.random.uniform(2, 10), 2)
-        else:
-            change_percent = round(np.random.uniform(-10, 15), 2)
-            max_up_percent = round(np.random.uniform(3, 20), 2)
-            max_down_percent = round(np.random.uniform(3, 15), 2)
-
-        sell_price = round(buy_price * (1 + change_percent / 100), 2)
-
-        # 一致性保障
-        if change_percent >= 0:
-            max_up_percent = max(max_up_percent, change_percent)
-        else:
-            max_down_percent = max(max_down_percent, abs(change_percent))
-
-        return {
-            'buy_price': f"{buy_price:.2f}",
-            'sell_price': f"{sell_price:.2f}",
-            'change_percent': f"{change_percent:.2f}%",
-            'max_up_percent': f"{max_up_percent:.2f}%",
-            'max_down_percent': (f"-{max_down_percent:.2f}%" if max_down_percent > 0 else "0.00%"),
-            'valid': True
-        }
-    except Exception as e:
-        logging.error(f"生成/计算股票价格数据时出错: {e}")
-        return {'buy_price': '50.00', 'sell_price': '52.50', 'change_percent': '5.00%', 'max_up_percent': '10.00%', 'max_down_percent': '5.00%'}
+    return get_stock_price_data_batch([(stock_code, date_str, sell_days, sell_mode)])[0]
 
 def setup_logging(log_dir='logs'):
     """设置日志记录"""
@@ -434,116 +552,25 @@ def _purge_year_kline_dirs(logs_dir):
     except Exception as e:
         logging.exception(f"清理年度子目录失败: {e}")
 
-def _plot_kline_10_days(stock_code, buy_date_str, output_root_dir):
-    """绘制从买入日起往后10个交易日的K线图，并保存到 logs/<year>/<date>_<code>.png"""
-    try:
-        # 载入日线数据
-        loader = StockDataLoader()
-        df = loader.load_stock_data(stock_code, 'daily')
-        if df is None or df.empty:
-            logging.warning(f"无法绘制K线，数据为空: {stock_code}")
-            return None
-
-        # 解析日期并定位买入索引（若当日无数据则用最近前一交易日）
-        buy_dt = pd.to_datetime(str(buy_date_str), errors='coerce')
-        if pd.isna(buy_dt):
-            logging.warning(f"无法解析买入日期，跳过绘图: {stock_code} {buy_date_str}")
-            return None
-        if buy_dt not in df.index:
-            prior = df.index[df.index <= buy_dt]
-            if len(prior) == 0:
-                logging.warning(f"买入日前无历史数据，跳过绘图: {stock_code} {buy_date_str}")
-                return None
-            buy_idx = df.index.get_loc(prior[-1])
-        else:
-            buy_idx = df.index.get_loc(buy_dt)
-
-        # 窗口范围：买入日起向后10个交易日（含买入日），不足则截断
-        window_days = 10
-        end_idx = min(buy_idx + window_days - 1, len(df) - 1)
-        window = df.iloc[buy_idx:end_idx + 1].copy()
-        if window.empty:
-            logging.warning(f"K线窗口为空，跳过绘图: {stock_code} {buy_date_str}")
-            return None
-
-        # 准备输出目录
-        year_val = buy_dt.year if not pd.isna(buy_dt) else '未知'
-        output_dir = os.path.join(output_root_dir, str(year_val))
-        os.makedirs(output_dir, exist_ok=True)
-        date_fmt = pd.to_datetime(buy_date_str).strftime('%Y-%m-%d')
-        out_name = f"{date_fmt}_{stock_code}.png"
-        out_path = os.path.join(output_dir, out_name)
-
-        # 使用matplotlib绘制简易K线（蜡烛图）
-        # 要求窗口包含列：open, high, low, close
-        required_cols = {'open', 'high', 'low', 'close'}
-        if not required_cols.issubset(set(map(str.lower, window.columns))):
-            # 尝试大小写兼容
-            cols_lower = {c.lower(): c for c in window.columns}
-            try:
-                o = window[cols_lower['open']]
-                h = window[cols_lower['high']]
-                l = window[cols_lower['low']]
-                c = window[cols_lower['close']]
-            except Exception:
-                logging.warning(f"数据列缺失，无法绘制K线: {stock_code}")
-                return None
-        else:
-            # 直接使用小写列名
-            cols_lower = {c.lower(): c for c in window.columns}
-            o = window[cols_lower['open']]
-            h = window[cols_lower['high']]
-            l = window[cols_lower['low']]
-            c = window[cols_lower['close']]
-
-        # 生成X轴刻度（0..N-1），避免时区问题
-        x = list(range(len(window)))
-
-        plt.figure(figsize=(10, 4))
-        ax = plt.gca()
-        for i in x:
-            color = '#d64f45' if c.iloc[i] >= o.iloc[i] else '#3f91d0'
-            # 最高/最低影线
-            ax.plot([i, i], [l.iloc[i], h.iloc[i]], color=color, linewidth=1)
-            # 蜡烛体
-            rect_bottom = min(o.iloc[i], c.iloc[i])
-            rect_height = abs(c.iloc[i] - o.iloc[i])
-            ax.add_patch(plt.Rectangle((i - 0.3, rect_bottom), 0.6, rect_height if rect_height > 0 else 0.02, color=color))
-
-        ax.set_xlim(-0.5, len(window) - 0.5)
-        # 给Y轴预留一些空间
-        y_min = float(l.min())
-        y_max = float(h.max())
-        y_pad = (y_max - y_min) * 0.05 if y_max > y_min else 1.0
-        ax.set_ylim(y_min - y_pad, y_max + y_pad)
-        if CN_FONT_AVAILABLE:
-            ax.set_title(f"{stock_code} {pd.to_datetime(buy_date_str).strftime('%Y-%m-%d')} 起10日K线")
-            ax.set_xlabel("交易日序号")
-            ax.set_ylabel("价格")
-        else:
-            ax.set_title(f"{stock_code} {pd.to_datetime(buy_date_str).strftime('%Y-%m-%d')} 10-day K line")
-            ax.set_xlabel("Index")
-            ax.set_ylabel("Price")
-        ax.grid(True, linestyle='--', alpha=0.3)
-
-        # 标注买入日为第0根
-        ax_text = "买入日" if CN_FONT_AVAILABLE else "Buy"
-        ax.text(0, h.iloc[0] + y_pad * 0.5, ax_text, fontsize=9, color='black')
-
-        plt.tight_layout()
-        try:
-            plt.savefig(out_path, dpi=120)
-            logging.info(f"K线图已保存: {out_path}")
-        finally:
-            plt.close()
-
-        return out_path
-    except Exception as e:
-        logging.exception(f"绘制K线图失败: {stock_code} {buy_date_str}, 错误: {e}")
-        return None
+def _daily_data_file(stock_code):
+    """获取股票日线CSV文件路径（用于判断K线图是否需要重绘）"""
+    global _price_data_loader
+    if _price_data_loader is None:
+        _price_data_loader = StockDataLoader()
+    return _price_data_loader.get_data_file_path(stock_code, 'daily')
+
+def _make_kline_job(stock_code, buy_date_str, output_root_dir):
+    """构造从买入日起往后10个交易日的K线图任务，输出到 logs/<year>/<date>_<code>.png"""
+    return make_ten_day_job(
+        stock_code, buy_date_str, output_root_dir,
+        cn_labels=CN_FONT_AVAILABLE,
+        data_files=[_daily_data_file(stock_code)]
+    )
 
 def save_results_to_file(results, output_file, eval_days=15, selected_day=5, selected_days=None):
     """将结果保存到文件"""
+    # 年度详情中需要绘制的10日K线图任务，写完结果文件后批量并行渲染
+    kline_jobs = []
     try:
         # 确保输出目录存在
         abs_path = os.path.abspath(output_file)
@@ -847,9 +874,9 @@ def save_results_to_file(results, output_file, eval_days=15, selected_day=5, sel
                             ])
                             orig_lines_y.append(','.join(detail.get('original_row', [])) if detail.get('original_row') else detail.get('original_csv_line', ''))
 
-        # 生成并保存10日K线图（保存到 logs/<year>/date_code.png）
+                            # 收集10日K线图任务（保存到 logs/<year>/date_code.png）
                             try:
-                                _plot_kline_10_days(detail['stock_code'], detail['date'], logs_root_dir)
+                                kline_jobs.append(_make_kline_job(detail['stock_code'], detail['date'], logs_root_dir))
                             except Exception:
                                 pass
                         f.write(_format_table_with_originals(details_headers, rows_y, orig_lines_y, results.get('csv_file_path', ''), details_aligns))
@@ -915,6 +942,13 @@ def save_results_to_file(results, output_file, eval_days=15, selected_day=5, sel
                 f.write(f"{year}\t{fil}\t{hp}\t{ratio:.2f}%\t{up_ratio:.2f}%\t{down_ratio:.2f}%\n")
         
         logging.info(f"结果已保存到文件: {output_file}")
+
+        # 批量并行渲染K线图（已存在且比日线数据新的图会被跳过），绘图失败不影响结果文件
+        if kline_jobs:
+            try:
+                render_kline_charts(kline_jobs)
+            except Exception as e:
+                logging.exception(f"批量绘制K线图失败: {e}")
         return True
     except Exception as e:
         # 记录详细异常信息（包含类型与堆栈）
@@ -937,6 +971,9 @@ def analyze_csv(csv_file_path, min_correlation_count=10, high_percentage=80.0, s
         logging.error(f"错误: 文件 {csv_file_path} 不存在")
         return None
     
+    # 每次分析使用新的日线价格缓存
+    clear_price_cache()
+    
     results = {
         'total_records': 0,
         'filtered_records': 0,
@@ -987,6 +1024,8 @@ def analyze_csv(csv_file_path, min_correlation_count=10, high_percentage=80.0, s
                     metrics_indices = [header.index(lbl) for lbl in metric_labels]
                     
                     logging.info(f"开始分析CSV文件: {csv_file_path}")
+                    pending_details = []
+                    price_requests = []
                     for row in reader:
                         results['total_records'] += 1
                         
@@ -1066,10 +1105,9 @@ def analyze_csv(csv_file_path, min_correlation_count=10, high_percentage=80.0, s
                                     sell_mode = 'open'
                                 elif '上涨' in base_label:
                                     sell_mode = 'close'
-                            price_data = get_stock_price_data(stock_code, buy_date, sell_days_offset, sell_mode=sell_mode)
-                            if not price_data or str(price_data.get('change_percent')) == 'N/A' or (price_data.get('valid') is False):
-                                continue
-                            results['details'].append({
+                            price_requests.append((stock_code, buy_date, sell_days_offset, sell_mode))
+                            # 价格字段在读取完成后按股票批量填充
+                            pending_details.append({
                                 'stock_code': stock_code,
                                 'date': eval_date,
                                 'actual_calc_count': actual_calc_count,
@@ -1080,15 +1118,23 @@ def analyze_csv(csv_file_path, min_correlation_count=10, high_percentage=80.0, s
                                 'sell_days': sell_days_offset,
                                 'max_percentage': max_percentage,
                                 'max_percentage_metric': f"{metric_labels[max_percentage_index]}({max_percentage}%)",
-                                'buy_price': price_data['buy_price'],
-                                'sell_price': price_data['sell_price'],
-                                'change_percent': price_data['change_percent'],
-                                'max_up_percent': price_data.get('max_up_percent', 'N/A'),
-                                'max_down_percent': price_data.get('max_down_percent', 'N/A'),
                                 'original_row': row,
                                 'original_csv_line': ','.join(row)
                             })
                     
+                    # 按股票批量计算价格数据（每只股票只加载一次日线），跳过无效价格
+                    for detail, price_data in zip(pending_details, get_stock_price_data_batch(price_requests)):
+                        if not price_data or str(price_data.get('change_percent')) == 'N/A' or (price_data.get('valid') is False):
+                            continue
+                        detail.update({
+                            'buy_price': price_data['buy_price'],
+                            'sell_price': price_data['sell_price'],
+                            'change_percent': price_data['change_percent'],
+                            'max_up_percent': price_data.get('max_up_percent', 'N/A'),
+                            'max_down_percent': price_data.get('max_down_percent', 'N/A')
+                        })
+                        results['details'].append(detail)
+                    
                     logging.info(f"CSV文件分析完成，共处理 {results['total_records']} 条记录")
                     # 如果成功读取，跳出循环
                     break
@@ -1213,6 +1259,8 @@ def main():
                         help='评测日期数：包括当日，往前数N个交易日 (默认: 15)')
     parser.add_argument('--days', type=str, default='5',
                         help='持股天数：传单个或逗号分隔列表。例如 5 或 3,5,8（范围: 2-10）')
+    parser.add_argument('--keep-kline', action='store_true',
+                        help='保留已有的年度K线图，只重绘缺失或日线数据已更新的图 (默认: 每次运行前清理)')
     
     args = parser.parse_args()
     
@@ -1229,7 +1277,8 @@ def main():
     logger.info("分析开始")
 
     # 每次运行前清理 logs 下的年度子目录（K线图输出位置），避免混淆
-    _purge_year_kline_dirs(logs_dir)
+    if not args.keep_kline:
+        _purge_year_kline_dirs(logs_dir)
 
     # 配置中文字体，避免保存图像时的中文字符缺失警告
     _configure_chinese_font()
@@ -0,0 +1,183 @@
+"""
+后台缓冲CSV写入
+
+批次循环只把待写入的行放进有界队列，由后台线程合并成大块追加写入，使磁盘I/O与下一批计算重叠：
+- 队列满时 append_rows 阻塞（背压），避免结果在内存中无限堆积
+- 每个文件的表头状态保存在内存中，只在第一次写入时读取一次文件首行
+- 相邻的同一文件、同一列集合的行合并为一次 to_csv 追加
+- 现有表头与待写入的列不一致时按表头对齐；列集合不同时把文件重写为并集列，不会错位追加
+- flush() 等待队列写空；close() 停止后台线程，之后再追加时重新启动。程序结束（含异常退出）时
+  由模块级 atexit 钩子关闭仍在运行的写入器
+"""
+
+import atexit
+import csv
+import logging
+import os
+import queue
+import threading
+import weakref
+
+import pandas as pd
+
+_STOP = object()
+
+# 后台线程仍在运行的写入器；close() 后移除，不会让已关闭的写入器一直存活到程序结束
+_open_writers = weakref.WeakSet()
+
+
+def _close_open_writers():
+    """程序结束时写空并关闭所有仍在运行的写入器"""
+    for writer in list(_open_writers):
+        writer.close()
+
+
+atexit.register(_close_open_writers)
+
+
+class AsyncCsvWriter:
+    """后台线程 + 有界队列的CSV追加写入器"""
+
+    def __init__(self, logger=None, max_queue=256, max_batch_rows=5000, synchronous=False, encoding='utf-8-sig'):
+        """
+        Args:
+            logger: 日志记录器
+            max_queue: 队列最大待写入项数
+            max_batch_rows: 后台线程一次合并写入的最大行数
+            synchronous: True 时在调用线程内直接写入（用于对比或排查问题）
+            encoding: 文件编码
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_batch_rows = max_batch_rows
+        self.synchronous = synchronous
+        self.encoding = encoding
+        self.rows_written = 0
+        self.writes = 0
+        self.errors = []
+        self._headers = {}
+        self._queue = None
+        self._thread = None
+        if not synchronous:
+            self._queue = queue.Queue(maxsize=max_queue)
+            self._start()
+
+    def _start(self):
+        """启动后台写入线程"""
+        self._thread = threading.Thread(target=self._run, name='AsyncCsvWriter', daemon=True)
+        self._thread.start()
+        _open_writers.add(self)
+
+    def append_rows(self, path, rows, columns, rebuild_on_mismatch=False):
+        """
+        追加若干行
+
+        Args:
+            path: CSV文件路径
+            rows: 行字典列表
+            columns: 列顺序
+            rebuild_on_mismatch: 现有表头与 columns 的列集合不同时，True 表示只保留新行重建文件，
+                False 表示保留已有行、把文件重写为并集列
+        """
+        if not rows:
+            return
+        item = (path, list(rows), tuple(columns), bool(rebuild_on_mismatch))
+        if self.synchronous:
+            self._write_items([item])
+        else:
+            if self._thread is None:
+                self._start()
+            self._queue.put(item)
+
+    def flush(self):
+        """等待所有已排队的行写入磁盘"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def forget(self, path=None):
+        """丢弃缓存的表头（文件在写入器之外被重写或删除后调用），path 为 None 时丢弃全部"""
+        self.flush()
+        if path is None:
+            self._headers.clear()
+        else:
+            self._headers.pop(path, None)
+
+    def close(self):
+        """写空队列并停止后台线程（可重复调用）"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+        _open_writers.discard(self)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            items = [item]
+            pending_rows = len(item[1])
+            # 合并队列中已就绪的项，凑成大块写入
+            while pending_rows < self.max_batch_rows:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is _STOP:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                items.append(extra)
+                pending_rows += len(extra[1])
+            try:
+                self._write_items(items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _write_items(self, items):
+        """把相邻的同文件、同列集合的项合并写入"""
+        start = 0
+        while start < len(items):
+            path, _, columns, rebuild = items[start]
+            end = start + 1
+            while end < len(items) and items[end][0] == path and items[end][2] == columns and items[end][3] == rebuild:
+                end += 1
+            rows = [row for item in items[start:end] for row in item[1]]
+            try:
+                self._write_rows(path, rows, list(columns), rebuild)
+            except Exception as e:
+                # 写入失败不影响后续批次，错误记录后在日志中报告
+                self.errors.append(f"{path}: {str(e)}")
+                self.logger.error(f"❌ 后台CSV写入失败: {path} | {str(e)}")
+            start = end
+
+    def _read_header(self, path):
+        """读取现有文件的表头，文件不存在或为空时返回None"""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        with open(path, 'r', encoding=self.encoding, newline='') as f:
+            return next(csv.reader(f), None)
+
+    def _write_rows(self, path, rows, columns, rebuild):
+        if path not in self._headers:
+            self._headers[path] = self._read_header(path)
+        header = self._headers[path]
+        df = pd.DataFrame(rows, columns=columns)
+        if header is None or (rebuild and set(header) != set(columns)):
+            df.to_csv(path, index=False, encoding=self.encoding, mode='w')
+            self._headers[path] = columns
+            self.logger.info(f"📝 CSV写入({'重建' if header is not None else '创建'}): {path}")
+        elif set(header) != set(columns):
+            # 列集合不同：已有行按文本原样读回，与新行一起按并集列重写，避免错位追加
+            union = list(header) + [column for column in columns if column not in header]
+            existing = pd.read_csv(path, encoding=self.encoding, dtype=str, keep_default_na=False)
+            pd.concat([existing, df.astype(object)], ignore_index=True)[union].to_csv(
+                path, index=False, encoding=self.encoding, mode='w')
+            self._headers[path] = union
+            self.logger.warning(f"⚠️ CSV表头与写入列不一致，已按并集列重写: {path}")
+        else:
+            df[header].to_csv(path, index=False, encoding=self.encoding, mode='a', header=False)
+        self.rows_written += len(rows)
+        self.writes += 1
@@ -44,6 +44,10 @@ def parse_args():
     parser.add_argument("--no_gpu", action="store_true", help="传递 --no_gpu 禁用GPU")
     parser.add_argument("--enable_histogram", action="store_true", help="传递 --enable_histogram 开启直方图统计")
     parser.add_argument("--histogram_interval", type=int, default=0, help="传递给 pearson_analyzer_gpu_3.py 的 --histogram_interval")
+    parser.add_argument(
+        "--pool_server", type=str, default=None,
+        help="传递给 pearson_analyzer_gpu_3.py 的 --pool_server（常驻对比池服务地址，各锚点复用已加载的对比股票池）"
+    )
 
     # 传递历史数据上限与数量限制（仅对对比股票生效，与 pearson_analyzer_gpu_3.py 保持一致）
     parser.add_argument(
@@ -179,6 +183,7 @@ def run_backtests_for_anchors(
     no_gpu: bool,
     enable_histogram: bool,
     histogram_interval: int,
+    pool_server: Optional[str] = None,
 ):
     """按锚点日期（每隔固定交易日）调用 pearson_analyzer_gpu_3.py。"""
     import time
@@ -240,6 +245,8 @@ def run_backtests_for_anchors(
             cmd.append("--enable_histogram")
         if histogram_interval is not None:
             cmd.extend(["--histogram_interval", str(histogram_interval)])
+        if pool_server:
+            cmd.extend(["--pool_server", pool_server])
 
         prefix = "DRY-RUN:" if dry_run else "RUN:"
         print(prefix, " ".join(cmd))
@@ -327,6 +334,7 @@ def main():
         no_gpu=args.no_gpu,
         enable_histogram=args.enable_histogram,
         histogram_interval=args.histogram_interval,
+        pool_server=args.pool_server,
     )
 
     print(f"总执行次数: {total_trading_days}")
@@ -0,0 +1,442 @@
+"""
+Pearson相关性分析基准测试脚本
+
+无需真实的 all_stocks_data 目录即可度量 pearson_analyzer_gpu_3.py 的性能：
+1. 按固定随机种子生成 N只股票 × T个交易日的合成OHLCV数据，目录结构与 StockDataLoader 一致
+2. 对每个规模组合（股票数 × 评测日期数 × 计算引擎）运行完整的 GPUBatchPearsonAnalyzer 流程，
+   每个组合在独立子进程中执行，避免内存峰值互相影响
+3. 把分析器计时器（见 perf_profiler）归并为 加载/窗口化/相关计算/阈值筛选/结果处理/CSV写入 阶段，
+   输出各阶段吞吐（历史窗口数×评测单元数/秒）、CPU时间和内存峰值的JSON
+4. 可与保存的基线JSON比对，任一阶段吞吐下降超过容差时以非0退出码结束，作为性能改动的准入门槛
+
+使用方法：
+python benchmark_pearson.py --stocks 100,1000 --eval-days 1,20 --save-baseline benchmark_results/baseline.json
+python benchmark_pearson.py --stocks 100,1000 --eval-days 1,20 --baseline benchmark_results/baseline.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_ROOT = os.path.join(SCRIPT_DIR, 'benchmark_data')
+DEFAULT_RESULTS_DIR = os.path.join(SCRIPT_DIR, 'benchmark_results')
+
+# 合成数据的最后一个交易日，固定以保证不同机器上生成的数据完全一致
+SYNTHETIC_END_DATE = '2024-12-31'
+SYNTHETIC_CODE_BASE = 600000
+
+# 基准阶段 -> 归并的分析器计时器
+STAGE_TIMERS = {
+    'loading': ('comparison_stock_loading', 'target_stock_loading'),
+    'windowing': ('historical_data_collection', 'batch_data_preparation'),
+    'correlation': ('gpu_step2_tensor_creation', 'gpu_step3_correlation_matrix', 'gpu_step3_ann_index_build',
+                    'gpu_step3_ann_search', 'cpu_parallel_correlation'),
+    'thresholding': ('gpu_step3_correlation_filtering',),
+    'result_processing': ('gpu_step3_result_aggregation', 'gpu_step3_global_statistics',
+                          'gpu_step3_detailed_results', 'integrated_result_processing'),
+    'csv_writing': ('csv_data_prep', 'csv_write', 'csv_flush'),
+}
+
+DEFAULT_TOLERANCE = 0.15
+
+
+def synthetic_stock_codes(num_stocks):
+    """生成合成股票代码列表"""
+    return [f"{SYNTHETIC_CODE_BASE + i:06d}" for i in range(num_stocks)]
+
+
+def generate_synthetic_market(data_dir, num_stocks, num_days, seed=42):
+    """
+    生成合成OHLCV日线数据（几何随机游走），按 StockDataLoader 的目录结构写入CSV
+
+    已存在且参数一致的数据集直接复用。
+
+    Args:
+        data_dir: 数据根目录
+        num_stocks: 股票数量
+        num_days: 每只股票的交易日数量
+        seed: 随机种子
+
+    Returns:
+        list: 股票代码列表
+    """
+    codes = synthetic_stock_codes(num_stocks)
+    manifest_path = os.path.join(data_dir, 'manifest.json')
+    manifest = {'num_stocks': num_stocks, 'num_days': num_days, 'seed': seed, 'end_date': SYNTHETIC_END_DATE}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                if json.load(f) == manifest:
+                    logger.info(f"复用已有合成数据: {data_dir}")
+                    return codes
+        except Exception:
+            pass
+
+    logger.info(f"生成合成数据: {num_stocks} 只股票 × {num_days} 个交易日 -> {data_dir}")
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=SYNTHETIC_END_DATE, periods=num_days)
+    date_strs = dates.strftime('%Y-%m-%d')
+
+    # 一次性生成所有股票的行情矩阵 [num_stocks, num_days]
+    start_prices = rng.uniform(5.0, 80.0, size=(num_stocks, 1))
+    log_returns = rng.normal(0.0, 0.02, size=(num_stocks, num_days))
+    close = np.maximum(start_prices * np.exp(np.cumsum(log_returns, axis=1)), 1.5)
+    prev_close = np.concatenate([start_prices, close[:, :-1]], axis=1)
+    open_ = np.maximum(prev_close * (1.0 + rng.normal(0.0, 0.005, size=close.shape)), 1.5)
+    high = np.maximum(open_, close) * (1.0 + np.abs(rng.normal(0.0, 0.01, size=close.shape)))
+    low = np.maximum(np.minimum(open_, close) * (1.0 - np.abs(rng.normal(0.0, 0.01, size=close.shape))), 1.2)
+    volume = np.round(rng.lognormal(13.0, 0.5, size=close.shape))
+
+    for i, code in enumerate(codes):
+        stock_dir = os.path.join(data_dir, f"stock_{code}_data")
+        os.makedirs(stock_dir, exist_ok=True)
+        pd.DataFrame({
+            'datetime': date_strs,
+            'open': open_[i].round(2),
+            'high': high[i].round(2),
+            'low': low[i].round(2),
+            'close': close[i].round(2),
+            'volume': volume[i],
+        }).to_csv(os.path.join(stock_dir, f"{code}_daily_history.csv"), index=False, encoding='utf-8-sig')
+        if (i + 1) % 500 == 0:
+            logger.info(f"已生成 {i + 1}/{num_stocks} 只股票")
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return codes
+
+
+def _aggregate_stages(summary, work_units):
+    """
+    把 perf_profiler 的逐计时器汇总归并为基准阶段
+
+    Args:
+        summary: PerfTraceRecorder.summary() 的结果
+        work_units: 历史窗口数 × 评测单元数
+
+    Returns:
+        dict: {阶段名: 统计}
+    """
+    timer_stats = summary.get('stages', {})
+    stages = {}
+    for stage, timers in STAGE_TIMERS.items():
+        present = [timer_stats[t] for t in timers if t in timer_stats]
+        if not present:
+            continue
+        wall_time = sum(s['wall_time'] for s in present)
+        rss_peaks = [s['rss_peak_bytes'] for s in present if s.get('rss_peak_bytes') is not None]
+        device_peaks = [s['device_peak_bytes'] for s in present if s.get('device_peak_bytes') is not None]
+        stages[stage] = {
+            'wall_time': wall_time,
+            'cpu_time': sum(s['cpu_time'] for s in present),
+            'throughput': work_units / wall_time if wall_time > 0 else None,
+            'bytes_h2d': sum(s['bytes_h2d'] for s in present),
+            'bytes_d2h': sum(s['bytes_d2h'] for s in present),
+            'rss_peak_bytes': max(rss_peaks) if rss_peaks else None,
+            'device_peak_bytes': max(device_peaks) if device_peaks else None,
+        }
+    return stages
+
+
+def run_case(case, data_dir, work_dir):
+    """
+    在当前进程中运行一个基准组合
+
+    Args:
+        case: 组合参数字典（engine/stocks/eval_days/window_size/targets 等）
+        data_dir: 合成数据目录
+        work_dir: 日志与CSV输出目录
+
+    Returns:
+        dict: 该组合的基准结果
+    """
+    # 分析器在导入时即需要 torch，放在函数内导入以便生成数据等步骤不依赖 torch
+    os.environ['ALL_STOCKS_DATA_PATH'] = data_dir
+    os.chdir(work_dir)
+    from pearson_analyzer_gpu_3 import GPUBatchPearsonAnalyzer
+    from perf_profiler import PerfTraceRecorder
+
+    codes = synthetic_stock_codes(case['stocks'])
+    csv_path = os.path.join(work_dir, f"{case['key']}.csv")
+    if os.path.exists(csv_path):
+        os.remove(csv_path)
+
+    analyzer = GPUBatchPearsonAnalyzer(
+        stock_code=codes[:case['targets']],
+        window_size=case['window_size'],
+        threshold_10=case['threshold'],
+        evaluation_days=case['eval_days'],
+        comparison_stocks=codes,
+        comparison_mode='custom',
+        backtest_date=SYNTHETIC_END_DATE,
+        csv_filename=csv_path,
+        use_gpu=(case['engine'] == 'gpu'),
+        comparison_date_count=case['comparison_days'],
+        num_processes=case['num_processes'],
+        cpu_workers=case.get('cpu_workers', 0) if case['engine'] == 'cpu' else 0,
+        evaluation_batch_size=case['evaluation_batch_size'],
+    )
+    analyzer.perf_recorder = PerfTraceRecorder(
+        device=analyzer.device,
+        step_mapping=analyzer.step_mapping,
+        rss_sample_interval=case['rss_sample_interval'],
+    )
+
+    start = time.perf_counter()
+    result = analyzer.analyze_batch()
+    wall_time = time.perf_counter() - start
+    analyzer.perf_recorder.close()
+    summary = analyzer.perf_recorder.summary()
+
+    historical_windows = len(getattr(analyzer, 'historical_periods_data', []) or [])
+    evaluation_units = case['targets'] * (result['evaluation_days'] if result else 0)
+    work_units = historical_windows * evaluation_units
+    return {
+        'engine': case['engine'],
+        'stocks': case['stocks'],
+        'eval_days': case['eval_days'],
+        'window_size': case['window_size'],
+        'targets': case['targets'],
+        'succeeded': bool(result),
+        'historical_windows': historical_windows,
+        'evaluation_units': evaluation_units,
+        'wall_time': wall_time,
+        'throughput': work_units / wall_time if wall_time > 0 else None,
+        'rss_peak_bytes': summary['run']['rss_peak_bytes'],
+        'device_peak_bytes': summary['run']['device_peak_bytes'],
+        'stages': _aggregate_stages(summary, work_units),
+        'machine': summary['machine'],
+    }
+
+
+def _run_case_in_child(result_queue, case, data_dir, work_dir):
+    """子进程入口：运行组合并把结果（或错误）放入队列"""
+    try:
+        result_queue.put(('ok', run_case(case, data_dir, work_dir)))
+    except Exception:
+        result_queue.put(('error', traceback.format_exc()))
+
+
+def run_case_isolated(case, data_dir, work_dir):
+    """
+    在独立的 spawn 子进程中运行组合（分析器内部仍可再开多进程处理历史数据）
+
+    Returns:
+        dict: 组合结果；失败时包含 error 字段
+    """
+    ctx = mp.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_case_in_child, args=(result_queue, case, data_dir, work_dir))
+    process.start()
+    while True:
+        try:
+            status, payload = result_queue.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                status, payload = 'error', f"子进程异常退出，退出码 {process.exitcode}"
+                break
+    process.join()
+    if status == 'ok':
+        return payload
+    return {'engine': case['engine'], 'stocks': case['stocks'], 'eval_days': case['eval_days'],
+            'window_size': case['window_size'], 'succeeded': False, 'error': payload}
+
+
+def compare_with_baseline(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    按组合和阶段比较吞吐
+
+    Args:
+        current: 本次基准结果
+        baseline: 基线基准结果
+        tolerance: 允许的吞吐下降比例
+
+    Returns:
+        list: [(组合, 阶段, 基线吞吐, 本次吞吐, 比值, 状态)]，
+              状态为 ok/regression/improved/missing（阶段缺失）/failed（运行失败）/skipped（本次未运行）
+    """
+    rows = []
+    for key, base_case in baseline.get('cases', {}).items():
+        cur_case = current.get('cases', {}).get(key)
+        if cur_case is None:
+            rows.append((key, '*', None, None, None, 'skipped'))
+            continue
+        if not cur_case.get('succeeded'):
+            rows.append((key, '*', None, None, None, 'failed'))
+            continue
+        pairs = [('total', base_case.get('throughput'), cur_case.get('throughput'))]
+        for stage, base_stage in base_case.get('stages', {}).items():
+            cur_stage = cur_case.get('stages', {}).get(stage, {})
+            pairs.append((stage, base_stage.get('throughput'), cur_stage.get('throughput')))
+        for stage, base_tp, cur_tp in pairs:
+            if not base_tp or cur_tp is None:
+                rows.append((key, stage, base_tp, cur_tp, None, 'missing'))
+                continue
+            ratio = cur_tp / base_tp
+            if ratio < 1.0 - tolerance:
+                status = 'regression'
+            elif ratio > 1.0 + tolerance:
+                status = 'improved'
+            else:
+                status = 'ok'
+            rows.append((key, stage, base_tp, cur_tp, ratio, status))
+    return rows
+
+
+def _format_bytes(nbytes):
+    return f"{nbytes / 1024**2:.0f}MB" if nbytes else '-'
+
+
+def print_report(results):
+    """打印各组合的阶段耗时与吞吐"""
+    for key, case in results['cases'].items():
+        if not case.get('succeeded'):
+            print(f"\n[{key}] 失败: {case.get('error', '无结果')}")
+            continue
+        print(f"\n[{key}] 历史窗口 {case['historical_windows']:,} × 评测单元 {case['evaluation_units']:,}，"
+              f"总耗时 {case['wall_time']:.2f}秒，峰值RSS {_format_bytes(case['rss_peak_bytes'])}")
+        print(f"  {'阶段':<18}{'耗时(秒)':>10}{'CPU(秒)':>10}{'窗口·评测/秒':>16}{'峰值RSS':>10}{'峰值显存':>10}")
+        for stage, stat in case['stages'].items():
+            throughput = f"{stat['throughput']:.3e}" if stat['throughput'] else '-'
+            print(f"  {stage:<18}{stat['wall_time']:>10.3f}{stat['cpu_time']:>10.3f}{throughput:>16}"
+                  f"{_format_bytes(stat['rss_peak_bytes']):>10}{_format_bytes(stat['device_peak_bytes']):>10}")
+
+
+def _parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pearson相关性分析基准测试（合成数据）')
+    parser.add_argument('--stocks', type=str, default='100,1000', help='对比股票数量列表，逗号分隔 (默认: 100,1000)')
+    parser.add_argument('--eval-days', type=str, default='1,20', help='评测日期数量列表，逗号分隔 (默认: 1,20)')
+    parser.add_argument('--window-size', type=int, default=15, help='分析窗口大小 (默认: 15)')
+    parser.add_argument('--targets', type=int, default=1, help='目标股票数量，取合成股票的前N只 (默认: 1)')
+    parser.add_argument('--days', type=int, default=None, help='每只股票的合成交易日数量 (默认: comparison-days + 最大评测日期数 + 窗口大小)')
+    parser.add_argument('--comparison-days', type=int, default=1000, help='对比股票保留的交易日数量 (默认: 1000)')
+    parser.add_argument('--engines', type=str, default='cpu,gpu', help='计算引擎列表，无CUDA时自动跳过gpu (默认: cpu,gpu)')
+    parser.add_argument('--threshold', type=float, default=0.85, help='前10天总相关系数阈值 (默认: 0.85)')
+    parser.add_argument('--evaluation-batch-size', type=int, default=100, help='每批次计算单元数 (默认: 100)')
+    parser.add_argument('--num-processes', type=int, default=None, help='历史数据处理进程数 (默认: 分析器自动检测)')
+    parser.add_argument('--cpu-workers', type=int, default=0, help='cpu 引擎按历史分区并行计算的进程数 (默认: 0，单进程)')
+    parser.add_argument('--seed', type=int, default=42, help='合成数据随机种子 (默认: 42)')
+    parser.add_argument('--data-root', type=str, default=DEFAULT_DATA_ROOT, help='合成数据根目录')
+    parser.add_argument('--output', type=str, default=None, help='结果JSON路径 (默认: benchmark_results/bench_<时间>.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='对比的基线JSON，阶段吞吐下降超过容差时返回非0')
+    parser.add_argument('--save-baseline', type=str, default=None, help='把本次结果另存为基线JSON')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的吞吐下降比例 (默认: 0.15)')
+    parser.add_argument('--rss-sample-interval', type=float, default=0.01, help='RSS采样间隔秒数，0表示仅在阶段边界采样 (默认: 0.01)')
+    parser.add_argument('--in-process', action='store_true', help='在当前进程中顺序运行各组合（调试用，内存峰值会互相影响）')
+    args = parser.parse_args()
+
+    stock_sizes = _parse_int_list(args.stocks)
+    eval_days_list = _parse_int_list(args.eval_days)
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    if 'gpu' in engines:
+        try:
+            import torch
+            cuda_available = torch.cuda.is_available()
+        except ImportError:
+            cuda_available = False
+        if not cuda_available:
+            logger.info("CUDA不可用，跳过gpu引擎")
+            engines = [e for e in engines if e != 'gpu']
+    if not engines:
+        parser.error('没有可用的计算引擎')
+
+    num_days = args.days or (args.comparison_days + max(eval_days_list) + args.window_size)
+    max_stocks = max(max(stock_sizes), args.targets)
+    data_dir = os.path.join(args.data_root, f"synthetic_{max_stocks}x{num_days}_seed{args.seed}")
+    generate_synthetic_market(data_dir, max_stocks, num_days, args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix='pearson_bench_')
+    results = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'window_size': args.window_size,
+            'targets': args.targets,
+            'days': num_days,
+            'comparison_days': args.comparison_days,
+            'threshold': args.threshold,
+            'evaluation_batch_size': args.evaluation_batch_size,
+            'seed': args.seed,
+        },
+        'machine': None,
+        'cases': {},
+    }
+
+    for engine in engines:
+        for stocks in stock_sizes:
+            for eval_days in eval_days_list:
+                key = f"{engine}_s{stocks}_e{eval_days}_w{args.window_size}"
+                case = {
+                    'key': key,
+                    'engine': engine,
+                    'stocks': stocks,
+                    'eval_days': eval_days,
+                    'window_size': args.window_size,
+                    'targets': args.targets,
+                    'threshold': args.threshold,
+                    'comparison_days': args.comparison_days,
+                    'evaluation_batch_size': args.evaluation_batch_size,
+                    'num_processes': args.num_processes,
+                    'cpu_workers': args.cpu_workers,
+                    'rss_sample_interval': args.rss_sample_interval,
+                }
+                logger.info(f"运行基准组合: {key}")
+                if args.in_process:
+                    cwd = os.getcwd()
+                    try:
+                        case_result = run_case(case, data_dir, work_dir)
+                    finally:
+                        os.chdir(cwd)
+                else:
+                    case_result = run_case_isolated(case, data_dir, work_dir)
+                results['machine'] = results['machine'] or case_result.pop('machine', None)
+                case_result.pop('machine', None)
+                results['cases'][key] = case_result
+
+    print_report(results)
+
+    output_path = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    for path in filter(None, [output_path, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"基准结果已保存: {path}")
+
+    exit_code = 0 if all(c.get('succeeded') for c in results['cases'].values()) else 1
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_with_baseline(results, baseline, args.tolerance)
+        print(f"\n与基线对比 ({args.baseline}，容差 {args.tolerance:.0%}):")
+        for key, stage, base_tp, cur_tp, ratio, status in rows:
+            if ratio is None:
+                print(f"  {status:<11}{key:<28}{stage:<18}")
+            else:
+                print(f"  {status:<11}{key:<28}{stage:<18}{base_tp:>12.3e} -> {cur_tp:>12.3e}  ({ratio:.2f}x)")
+        if any(row[5] in ('regression', 'missing', 'failed') for row in rows):
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
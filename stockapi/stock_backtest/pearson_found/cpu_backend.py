@@ -0,0 +1,192 @@
+"""
+多核CPU相关计算后端
+
+无GPU时，把历史窗口池按历史期间切分成若干分区，交给多个工作进程并行计算相关系数并筛选，
+每个进程只回传稀疏的命中结果 (股票, 评测日期, 历史期间, 平均相关, 后5天close_minus_open相关)，
+由主进程散布回与GPU路径相同形状的结果张量。
+
+- 历史张量放在共享内存中，工作进程直接映射，不复制
+- 每个工作进程的 torch 计算线程数固定为 总核数 // 进程数（在进程初始化时通过 torch.set_num_threads 设置），避免过度订阅
+- 筛选规则与 GPUBatchPearsonAnalyzer._compute_and_process_correlations_gpu 的稠密分支一致
+"""
+
+import logging
+import os
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的全局状态（由 _init_worker 设置）
+_WORKER_STATE = {}
+
+
+def _set_worker_threads(num_threads):
+    """限制当前进程的 torch 线程数（torch 已导入，OMP_NUM_THREADS 等环境变量此时不再生效）"""
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 已经开始并行计算后不能再修改
+        pass
+
+
+def _init_worker(shm_name, shape, num_threads):
+    """工作进程初始化：设置线程数并映射共享内存中的历史张量"""
+    _set_worker_threads(num_threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER_STATE['shm'] = shm
+    _WORKER_STATE['historical'] = torch.from_numpy(np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+    _WORKER_STATE['normalized'] = {}
+
+
+def _normalize(segment, dim):
+    """按字段去均值并L2归一化（与分析器相同的数值步骤）"""
+    centered = segment - segment.mean(dim=dim, keepdim=True)
+    return centered / torch.sqrt((centered ** 2).sum(dim=dim, keepdim=True) + 1e-8)
+
+
+def _partition_norms(start, end, first_len, second_len):
+    """工作进程内缓存某个分区的归一化历史片段"""
+    key = (start, end, first_len, second_len)
+    cached = _WORKER_STATE['normalized'].get(key)
+    if cached is None:
+        historical = _WORKER_STATE['historical'][start:end]
+        hist_norm_10 = _normalize(historical[:, :first_len, :], dim=1)
+        hist_norm_5 = _normalize(historical[:, -second_len:, :], dim=1) if second_len > 0 else None
+        cached = _WORKER_STATE['normalized'][key] = (hist_norm_10, hist_norm_5)
+    return cached
+
+
+def filter_partition(recent, valid_mask, hist_norm_10, hist_norm_5, config):
+    """
+    计算一组评测窗口与一个历史分区的相关系数并按阈值筛选
+
+    Args:
+        recent: [num_stocks, num_days, window_size, 3] 评测窗口
+        valid_mask: [num_stocks, num_days] 有效评测掩码，可为None
+        hist_norm_10 / hist_norm_5: 分区的归一化历史片段
+        config: 阈值配置（见 CpuPartitionBackend.compute_hits）
+
+    Returns:
+        tuple: (命中下标 [N, 3]（股票, 评测日期, 分区内历史期间）, 平均相关 [N], 后5天close_minus_open相关 [N])
+    """
+    first_len, second_len = config['first_len'], config['second_len']
+    self_thr = config['self_correlation_threshold']
+    corr_10 = torch.einsum('sblf,hlf->sbhf', _normalize(recent[:, :, :first_len, :], dim=2), hist_norm_10)
+    if second_len > 0 and hist_norm_5 is not None:
+        corr_5 = torch.einsum('sblf,hlf->sbhf', _normalize(recent[:, :, -second_len:, :], dim=2), hist_norm_5)
+    else:
+        corr_5 = corr_10[..., :0]
+    w3 = torch.tensor([1.0/3.0, 1.0/3.0, 1.0/3.0], dtype=corr_10.dtype)
+    avg_10 = (corr_10 * w3.view(1, 1, 1, 3)).sum(dim=3)
+    avg_5 = (corr_5 * w3[:corr_5.shape[-1]].view(1, 1, 1, -1)).sum(dim=3)
+
+    self_mask = (avg_10 >= self_thr) | (avg_5 >= self_thr)
+    self_mask |= (corr_10 >= self_thr).any(dim=3) | (corr_5 >= self_thr).any(dim=3)
+    hit = ~self_mask
+    if config['threshold_10'] is not None:
+        hit &= avg_10 > config['threshold_10']
+    if config['threshold_5'] is not None:
+        hit &= avg_5 > config['threshold_5']
+    for f_idx, f_thr in enumerate(config['field_thresholds_10']):
+        if f_thr is not None:
+            hit &= corr_10[..., f_idx] > f_thr
+    for f_idx, f_thr in enumerate(config['field_thresholds_5']):
+        if f_thr is not None and f_idx < corr_5.shape[-1]:
+            hit &= corr_5[..., f_idx] > f_thr
+    if valid_mask is not None:
+        hit &= valid_mask.unsqueeze(2)
+
+    index = torch.nonzero(hit)
+    cmo_5 = corr_5[..., 0][hit] if corr_5.shape[-1] > 0 else torch.zeros(index.shape[0], dtype=corr_10.dtype)
+    return index, avg_10[hit], cmo_5
+
+
+def _partition_task(args):
+    """工作进程任务：在一个历史分区上处理全部评测窗口（按评测日期分块控制内存）"""
+    start, end, recent_np, valid_np, config = args
+    hist_norm_10, hist_norm_5 = _partition_norms(start, end, config['first_len'], config['second_len'])
+    recent = torch.from_numpy(recent_np)
+    valid = torch.from_numpy(valid_np) if valid_np is not None else None
+    chunk = max(1, int(config['day_chunk']))
+    indices, avgs, cmos = [], [], []
+    for day_start in range(0, recent.shape[1], chunk):
+        day_end = min(day_start + chunk, recent.shape[1])
+        index, avg, cmo = filter_partition(
+            recent[:, day_start:day_end], valid[:, day_start:day_end] if valid is not None else None,
+            hist_norm_10, hist_norm_5, config
+        )
+        index[:, 1] += day_start
+        index[:, 2] += start
+        indices.append(index.to(torch.int64).numpy())
+        avgs.append(avg.numpy())
+        cmos.append(cmo.numpy())
+    return np.concatenate(indices), np.concatenate(avgs), np.concatenate(cmos)
+
+
+class CpuPartitionBackend:
+    """把历史张量放入共享内存，由进程池按历史分区并行计算并合并稀疏命中"""
+
+    def __init__(self, historical_tensor, num_workers, threads_per_worker=None, partitions_per_worker=2):
+        """
+        Args:
+            historical_tensor: [num_historical_periods, window_size, 3] CPU 张量
+            num_workers: 工作进程数
+            threads_per_worker: 每个进程的 torch 线程数，默认 CPU核数 // 进程数
+            partitions_per_worker: 每个进程平均分到的分区数（>1 便于负载均衡）
+        """
+        historical = np.ascontiguousarray(historical_tensor.detach().cpu().numpy(), dtype=np.float32)
+        self.shape = historical.shape
+        self.num_workers = max(1, int(num_workers))
+        self.threads_per_worker = max(1, int(threads_per_worker or (os.cpu_count() or 1) // self.num_workers))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, historical.nbytes))
+        np.ndarray(self.shape, dtype=np.float32, buffer=self._shm.buf)[...] = historical
+
+        num_periods = self.shape[0]
+        num_partitions = max(1, min(num_periods, self.num_workers * partitions_per_worker))
+        bounds = np.linspace(0, num_periods, num_partitions + 1).astype(int)
+        self.partitions = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+        self._pool = get_context('spawn').Pool(
+            processes=self.num_workers,
+            initializer=_init_worker,
+            initargs=(self._shm.name, self.shape, self.threads_per_worker),
+        )
+        logger.info(f"🧮 CPU多进程后端: {self.num_workers} 个进程 × {self.threads_per_worker} 线程, "
+                    f"{len(self.partitions)} 个历史分区, 共享历史张量 {historical.nbytes / 1024**2:.1f}MB")
+
+    def compute_hits(self, recent, valid_mask, config):
+        """
+        并行计算全部评测窗口的命中
+
+        Args:
+            recent: [num_stocks, num_days, window_size, 3] 评测窗口
+            valid_mask: [num_stocks, num_days] 有效评测掩码，可为None
+            config: {'first_len', 'second_len', 'threshold_10', 'threshold_5', 'field_thresholds_10',
+                     'field_thresholds_5', 'self_correlation_threshold', 'day_chunk'}
+
+        Returns:
+            tuple: (命中下标 [N, 3], 平均相关 [N], 后5天close_minus_open相关 [N])，均为 torch 张量
+        """
+        recent_np = np.ascontiguousarray(recent.detach().cpu().numpy(), dtype=np.float32)
+        valid_np = valid_mask.detach().cpu().numpy().astype(bool) if valid_mask is not None else None
+        tasks = [(start, end, recent_np, valid_np, config) for start, end in self.partitions]
+        results = self._pool.map(_partition_task, tasks)
+        index = np.concatenate([r[0] for r in results]) if results else np.empty((0, 3), dtype=np.int64)
+        avg = np.concatenate([r[1] for r in results]) if results else np.empty(0, dtype=np.float32)
+        cmo = np.concatenate([r[2] for r in results]) if results else np.empty(0, dtype=np.float32)
+        return torch.from_numpy(index), torch.from_numpy(avg), torch.from_numpy(cmo)
+
+    def close(self):
+        """关闭进程池并释放共享内存"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
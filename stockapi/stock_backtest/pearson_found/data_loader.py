@@ -86,6 +86,21 @@ class StockDataLoader:
         
         logger.info(f"数据加载器初始化完成，数据路径: {self.data_base_path}")
     
+    def get_data_file_path(self, stock_code: str, time_frame: str = 'daily') -> str:
+        """
+        获取指定股票、时间粒度的数据文件路径
+        
+        Args:
+            stock_code: 股票代码，如 '000001'
+            time_frame: 时间粒度，可选值：'1minute', '5minute', '30minute', 'daily'
+            
+        Returns:
+            数据CSV文件的完整路径（不检查文件是否存在）
+        """
+        stock_folder = f"stock_{stock_code}_data"
+        file_name = f"{stock_code}_{self.time_frames[time_frame]}"
+        return os.path.join(self.data_base_path, stock_folder, file_name)
+    
     def load_stock_data(self, 
                        stock_code: str, 
                        time_frame: str = 'daily',
@@ -112,10 +127,7 @@ class StockDataLoader:
                 return None
             
             # 构建文件路径
-            stock_folder = f"stock_{stock_code}_data"
-            stock_path = os.path.join(self.data_base_path, stock_folder)
-            file_name = f"{stock_code}_{self.time_frames[time_frame]}"
-            file_path = os.path.join(stock_path, file_name)
+            file_path = self.get_data_file_path(stock_code, time_frame)
             
             # 检查文件是否存在
             if not os.path.exists(file_path):
@@ -0,0 +1,431 @@
+"""
+K线图批量渲染模块
+
+把一批K线图任务分发到进程池中并行渲染：
+1. 工作进程使用 Agg 后端，且不经过 pyplot 全局状态，每个进程复用同一个 Figure
+2. 蜡烛图使用 vlines（影线）+ PolyCollection（实体）一次性绘制，不再逐根 plot/Rectangle
+3. 输出文件已存在且比数据文件新时跳过渲染
+
+支持两类任务：
+- ten_day：analyze_high_correlation 的买入日起10日K线图（按股票代码/日期在工作进程内加载日线）
+- two_panel：plot_kline_from_log 的上下对比K线图（OHLCV 数据由调用方准备好后随任务传入）
+"""
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection
+
+from data_loader import StockDataLoader
+
+logger = logging.getLogger(__name__)
+
+# 10日K线图配置（与原逐张绘制的样式一致）
+TEN_DAY_WINDOW = 10
+TEN_DAY_FIGSIZE = (10, 4)
+TEN_DAY_DPI = 120
+TEN_DAY_UP_COLOR = '#d64f45'
+TEN_DAY_DOWN_COLOR = '#3f91d0'
+
+# 上下对比K线图配置（红涨绿跌）
+TWO_PANEL_FIGSIZE = (12, 8)
+TWO_PANEL_DPI = 150
+TWO_PANEL_UP_COLOR = 'red'
+TWO_PANEL_DOWN_COLOR = 'green'
+TWO_PANEL_MAX_TICKS = 8
+
+CANDLE_WIDTH = 0.6
+MIN_CANDLE_HEIGHT = 0.02
+
+# 需要同步到工作进程的字体配置
+FONT_RC_KEYS = ('font.family', 'font.sans-serif', 'axes.unicode_minus')
+
+# 进程内渲染状态：数据加载器、日线缓存、按尺寸复用的Figure
+_render_loader = None
+_render_daily_cache = {}
+_render_figures = {}
+
+
+def _init_render_state(data_base_path):
+    """初始化当前进程的渲染状态"""
+    global _render_loader
+    _render_loader = StockDataLoader(data_base_path)
+    _render_daily_cache.clear()
+    _render_figures.clear()
+
+
+def _init_render_worker(data_base_path, font_rc):
+    """工作进程初始化：切换到Agg后端、同步字体配置并初始化渲染状态"""
+    mpl.use('Agg')
+    mpl.rcParams.update(font_rc)
+    _init_render_state(data_base_path)
+
+
+def _get_figure(figsize):
+    """获取指定尺寸的复用Figure（每次使用前清空）"""
+    fig = _render_figures.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        _render_figures[figsize] = fig
+    else:
+        fig.clf()
+    return fig
+
+
+def _get_daily_data(stock_code):
+    """加载并缓存当前进程内的股票日线数据"""
+    if stock_code not in _render_daily_cache:
+        _render_daily_cache[stock_code] = _render_loader.load_stock_data(stock_code, 'daily')
+    return _render_daily_cache[stock_code]
+
+
+def draw_candles(ax, x, opens, highs, lows, closes, up_color, down_color,
+                 width=CANDLE_WIDTH, min_height=MIN_CANDLE_HEIGHT):
+    """
+    用集合一次性绘制蜡烛图（影线用vlines，实体用PolyCollection），开盘或收盘为NaN的K线不绘制
+
+    Args:
+        ax: 目标坐标轴
+        x: 横坐标数组
+        opens, highs, lows, closes: 价格数组
+        up_color: 收盘>=开盘时的颜色
+        down_color: 收盘<开盘时的颜色
+        width: 实体宽度
+        min_height: 实体最小高度（开盘等于收盘时）
+
+    Returns:
+        np.ndarray: 每根K线的颜色
+    """
+    x = np.asarray(x, dtype=float)
+    opens = np.asarray(opens, dtype=float)
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+
+    colors = np.where(closes >= opens, up_color, down_color)
+    valid = ~(np.isnan(opens) | np.isnan(closes))
+    if not valid.any():
+        return colors
+
+    xv = x[valid]
+    cv = colors[valid]
+    ax.vlines(xv, lows[valid], highs[valid], colors=cv, linewidth=1)
+
+    bottoms = np.minimum(opens[valid], closes[valid])
+    heights = np.abs(closes[valid] - opens[valid])
+    heights = np.where(heights > 0, heights, min_height)
+    left = xv - width / 2
+    right = xv + width / 2
+    top = bottoms + heights
+    verts = np.stack([
+        np.column_stack([left, bottoms]),
+        np.column_stack([left, top]),
+        np.column_stack([right, top]),
+        np.column_stack([right, bottoms]),
+    ], axis=1)
+    ax.add_collection(PolyCollection(verts, facecolors=cv, edgecolors=cv))
+    return colors
+
+
+def draw_volume(ax, x, volumes, colors, width=CANDLE_WIDTH):
+    """用PolyCollection一次性绘制成交量柱（NaN不绘制）"""
+    x = np.asarray(x, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    valid = ~np.isnan(volumes)
+    if not valid.any():
+        return
+    xv = x[valid]
+    vv = volumes[valid]
+    left = xv - width / 2
+    right = xv + width / 2
+    zeros = np.zeros_like(vv)
+    verts = np.stack([
+        np.column_stack([left, zeros]),
+        np.column_stack([left, vv]),
+        np.column_stack([right, vv]),
+        np.column_stack([right, zeros]),
+    ], axis=1)
+    ax.add_collection(PolyCollection(verts, facecolors=colors[valid], edgecolors=colors[valid]))
+    ax.set_ylim(0, float(vv.max()) * 1.1 if vv.max() > 0 else 1.0)
+
+
+def _find_ohlc_columns(df):
+    """按大小写不敏感的方式查找 open/high/low/close 列，缺失返回None"""
+    cols_lower = {str(c).lower(): c for c in df.columns}
+    try:
+        return [cols_lower[name] for name in ('open', 'high', 'low', 'close')]
+    except KeyError:
+        return None
+
+
+def ten_day_chart_path(stock_code, buy_date_str, output_root_dir):
+    """
+    10日K线图的输出路径：<output_root_dir>/<year>/<date>_<code>.png
+
+    Returns:
+        str or None: 输出路径，日期无法解析时返回None
+    """
+    buy_dt = pd.to_datetime(str(buy_date_str), errors='coerce')
+    if pd.isna(buy_dt):
+        return None
+    return os.path.join(output_root_dir, str(buy_dt.year), f"{buy_dt.strftime('%Y-%m-%d')}_{stock_code}.png")
+
+
+def make_ten_day_job(stock_code, buy_date_str, output_root_dir, cn_labels=True, data_files=None):
+    """
+    构造10日K线图任务
+
+    Args:
+        stock_code: 股票代码
+        buy_date_str: 买入日期字符串
+        output_root_dir: 输出根目录（按年份分子目录）
+        cn_labels: 是否使用中文标题/标签
+        data_files: 用于判断输出是否过期的数据文件列表
+
+    Returns:
+        dict or None: 任务字典，日期无法解析时返回None
+    """
+    output_path = ten_day_chart_path(stock_code, buy_date_str, output_root_dir)
+    if output_path is None:
+        logger.warning(f"无法解析买入日期，跳过绘图: {stock_code} {buy_date_str}")
+        return None
+    return {
+        'kind': 'ten_day',
+        'stock_code': stock_code,
+        'buy_date': str(buy_date_str),
+        'cn_labels': cn_labels,
+        'output_path': output_path,
+        'data_files': list(data_files or []),
+    }
+
+
+def make_two_panel_job(source_ohlcv, hist_ohlcv, title_top, title_bottom, output_path, data_files=None):
+    """
+    构造上下对比K线图任务
+
+    Args:
+        source_ohlcv: 上面板OHLCV数据（列为 Open/High/Low/Close/Volume）
+        hist_ohlcv: 下面板OHLCV数据
+        title_top: 上面板标题
+        title_bottom: 下面板标题
+        output_path: 输出图片路径
+        data_files: 用于判断输出是否过期的数据文件列表
+
+    Returns:
+        dict: 任务字典
+    """
+    return {
+        'kind': 'two_panel',
+        'source_ohlcv': source_ohlcv,
+        'hist_ohlcv': hist_ohlcv,
+        'title_top': title_top,
+        'title_bottom': title_bottom,
+        'output_path': output_path,
+        'data_files': list(data_files or []),
+    }
+
+
+def _render_ten_day(job):
+    """渲染买入日起10个交易日的K线图"""
+    stock_code = job['stock_code']
+    buy_date_str = job['buy_date']
+    df = _get_daily_data(stock_code)
+    if df is None or df.empty:
+        logger.warning(f"无法绘制K线，数据为空: {stock_code}")
+        return None
+
+    # 定位买入索引（若当日无数据则用最近前一交易日）
+    buy_dt = pd.to_datetime(buy_date_str)
+    buy_idx = int(df.index.searchsorted(buy_dt, side='right')) - 1
+    if buy_idx < 0:
+        logger.warning(f"买入日前无历史数据，跳过绘图: {stock_code} {buy_date_str}")
+        return None
+
+    # 窗口范围：买入日起向后10个交易日（含买入日），不足则截断
+    end_idx = min(buy_idx + TEN_DAY_WINDOW - 1, len(df) - 1)
+    window = df.iloc[buy_idx:end_idx + 1]
+    if window.empty:
+        logger.warning(f"K线窗口为空，跳过绘图: {stock_code} {buy_date_str}")
+        return None
+
+    ohlc_cols = _find_ohlc_columns(window)
+    if ohlc_cols is None:
+        logger.warning(f"数据列缺失，无法绘制K线: {stock_code}")
+        return None
+    o, h, l, c = (window[col].to_numpy(dtype=float) for col in ohlc_cols)
+
+    # 生成X轴刻度（0..N-1），避免时区问题
+    x = np.arange(len(window))
+
+    fig = _get_figure(TEN_DAY_FIGSIZE)
+    ax = fig.add_subplot(111)
+    draw_candles(ax, x, o, h, l, c, TEN_DAY_UP_COLOR, TEN_DAY_DOWN_COLOR)
+
+    ax.set_xlim(-0.5, len(window) - 0.5)
+    # 给Y轴预留一些空间
+    y_min = float(np.nanmin(l))
+    y_max = float(np.nanmax(h))
+    y_pad = (y_max - y_min) * 0.05 if y_max > y_min else 1.0
+    ax.set_ylim(y_min - y_pad, y_max + y_pad)
+    date_label = buy_dt.strftime('%Y-%m-%d')
+    if job['cn_labels']:
+        ax.set_title(f"{stock_code} {date_label} 起10日K线")
+        ax.set_xlabel("交易日序号")
+        ax.set_ylabel("价格")
+    else:
+        ax.set_title(f"{stock_code} {date_label} 10-day K line")
+        ax.set_xlabel("Index")
+        ax.set_ylabel("Price")
+    ax.grid(True, linestyle='--', alpha=0.3)
+
+    # 标注买入日为第0根
+    ax.text(0, h[0] + y_pad * 0.5, "买入日" if job['cn_labels'] else "Buy", fontsize=9, color='black')
+
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(job['output_path']), exist_ok=True)
+    fig.savefig(job['output_path'], dpi=TEN_DAY_DPI)
+    return job['output_path']
+
+
+def _draw_ohlcv_panel(ax_price, ax_vol, ohlcv, title):
+    """在价格/成交量两个坐标轴上绘制一个面板"""
+    x = np.arange(len(ohlcv))
+    colors = draw_candles(ax_price, x, ohlcv['Open'], ohlcv['High'], ohlcv['Low'], ohlcv['Close'],
+                          TWO_PANEL_UP_COLOR, TWO_PANEL_DOWN_COLOR)
+    draw_volume(ax_vol, x, ohlcv['Volume'], colors)
+
+    ax_price.set_xlim(-0.5, len(ohlcv) - 0.5)
+    lows = ohlcv['Low'].to_numpy(dtype=float)
+    highs = ohlcv['High'].to_numpy(dtype=float)
+    if np.isfinite(lows).any():
+        y_min = float(np.nanmin(lows))
+        y_max = float(np.nanmax(highs))
+        y_pad = (y_max - y_min) * 0.05 if y_max > y_min else 1.0
+        ax_price.set_ylim(y_min - y_pad, y_max + y_pad)
+    ax_price.set_title(title, fontsize=11)
+    ax_price.set_ylabel('Price')
+    ax_vol.set_ylabel('Volume')
+
+    # 日期刻度只显示在成交量轴上
+    step = max(1, int(np.ceil(len(ohlcv) / TWO_PANEL_MAX_TICKS)))
+    ticks = x[::step]
+    ax_vol.set_xticks(ticks)
+    ax_vol.set_xticklabels([pd.Timestamp(ohlcv.index[i]).strftime('%Y-%m-%d') for i in ticks])
+    ax_price.tick_params(labelbottom=False)
+
+
+def _render_two_panel(job):
+    """渲染上下两个面板的蜡烛图与成交量"""
+    fig = _get_figure(TWO_PANEL_FIGSIZE)
+    gs = fig.add_gridspec(4, 1, height_ratios=[3, 1, 3, 1], hspace=0.35)
+
+    ax_price_top = fig.add_subplot(gs[0])
+    ax_vol_top = fig.add_subplot(gs[1], sharex=ax_price_top)
+    ax_price_bottom = fig.add_subplot(gs[2])
+    ax_vol_bottom = fig.add_subplot(gs[3], sharex=ax_price_bottom)
+
+    _draw_ohlcv_panel(ax_price_top, ax_vol_top, job['source_ohlcv'], job['title_top'])
+    _draw_ohlcv_panel(ax_price_bottom, ax_vol_bottom, job['hist_ohlcv'], job['title_bottom'])
+
+    os.makedirs(os.path.dirname(job['output_path']), exist_ok=True)
+    fig.savefig(job['output_path'], dpi=TWO_PANEL_DPI, bbox_inches='tight')
+    return job['output_path']
+
+
+_RENDERERS = {
+    'ten_day': _render_ten_day,
+    'two_panel': _render_two_panel,
+}
+
+
+def _render_job(job):
+    """渲染单个任务，返回 (输出路径或None, 错误信息或None)"""
+    try:
+        return _RENDERERS[job['kind']](job), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def is_chart_up_to_date(output_path, data_files):
+    """输出文件已存在且不早于所有数据文件时视为最新"""
+    try:
+        output_mtime = os.path.getmtime(output_path)
+    except OSError:
+        return False
+    for path in data_files:
+        try:
+            if os.path.getmtime(path) > output_mtime:
+                return False
+        except OSError:
+            continue
+    return True
+
+
+def render_kline_charts(jobs, max_workers=None, skip_up_to_date=True, data_base_path=None):
+    """
+    批量渲染K线图
+
+    Args:
+        jobs: make_ten_day_job / make_two_panel_job 构造的任务列表（None会被忽略）
+        max_workers: 进程数，默认使用CPU核数；任务较少或为1时在当前进程内渲染
+        skip_up_to_date: 输出已存在且比数据文件新时是否跳过
+        data_base_path: 日线数据根目录（ten_day任务使用），默认使用StockDataLoader的默认路径
+
+    Returns:
+        dict: {'rendered': 渲染数, 'skipped': 跳过数, 'failed': 失败数, 'paths': 与jobs对应的输出路径（失败为None）}
+    """
+    jobs = list(jobs)
+    paths = [None] * len(jobs)
+    summary = {'rendered': 0, 'skipped': 0, 'failed': 0, 'paths': paths}
+
+    # 去重（同一输出只渲染一次）并跳过已是最新的图
+    pending = {}
+    for i, job in enumerate(jobs):
+        if job is None:
+            summary['failed'] += 1
+            continue
+        output_path = job['output_path']
+        if skip_up_to_date and is_chart_up_to_date(output_path, job['data_files']):
+            paths[i] = output_path
+            summary['skipped'] += 1
+            continue
+        pending.setdefault(output_path, []).append(i)
+
+    if not pending:
+        return summary
+
+    unique_jobs = [jobs[indices[0]] for indices in pending.values()]
+    if data_base_path is None and any(job['kind'] == 'ten_day' for job in unique_jobs):
+        data_base_path = StockDataLoader().data_base_path
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(int(max_workers), len(unique_jobs)))
+
+    if max_workers == 1:
+        _init_render_state(data_base_path)
+        outcomes = [_render_job(job) for job in unique_jobs]
+    else:
+        font_rc = {key: mpl.rcParams[key] for key in FONT_RC_KEYS}
+        chunksize = max(1, len(unique_jobs) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker,
+                                 initargs=(data_base_path, font_rc)) as executor:
+            outcomes = list(executor.map(_render_job, unique_jobs, chunksize=chunksize))
+
+    for job, (output_path, error), indices in zip(unique_jobs, outcomes, pending.values()):
+        if output_path is None:
+            summary['failed'] += 1
+            if error:
+                logger.error(f"绘制K线图失败: {job['output_path']}, 错误: {error}")
+            continue
+        summary['rendered'] += 1
+        for i in indices:
+            paths[i] = output_path
+
+    logger.info(f"K线图批量渲染完成: 渲染 {summary['rendered']}, 跳过 {summary['skipped']}, 失败 {summary['failed']}")
+    return summary
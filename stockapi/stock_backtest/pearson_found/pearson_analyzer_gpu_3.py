@@ -29,6 +29,11 @@ import pandas as pd
 import torch
 import torch.nn.functional as F
 from data_loader import StockDataLoader
+from perf_profiler import PerfTraceRecorder, tensor_nbytes
+from window_index import WindowANNIndex, flatten_segment
+from window_pool import POOL_DTYPES, HistoricalWindowPool, encode_stock_windows
+from cpu_backend import CpuPartitionBackend
+from async_writer import AsyncCsvWriter
 import matplotlib.pyplot as plt
 import mplfinance as mpf
 from stock_config import get_comparison_stocks
@@ -37,70 +42,58 @@ import threading
 from collections import defaultdict
 import warnings
 import gc
+import contextlib
 import multiprocessing as mp
 from functools import partial
 
 # 忽略一些不重要的警告
 warnings.filterwarnings('ignore', category=UserWarning)
 
+# 级联筛选：估计各字段阈值通过率时的抽样规模
+CASCADE_SAMPLE_ROWS = 16
+CASCADE_SAMPLE_PERIODS = 4096
+CASCADE_CHANNEL_NAMES = ['close_minus_open_10', 'close_10', 'volume_10', 'close_minus_open_5', 'close_5', 'volume_5']
+# 级联逐配对计算的相关系数与完整计算（矩阵乘）的舍入误差界，以 tensor_dtype 的机器精度为单位：
+# 逐配对的值只用 阈值-误差界 保守筛选，落在误差界内的配对按完整计算的方式重算后再判断
+CASCADE_MARGIN_EPS = 64
+# IVF索引：候选配对超过全部配对的该比例时，该批次回退到稠密计算
+ANN_MAX_CANDIDATE_FRACTION = 0.5
+# 常驻池模式下每次查询可以改变的参数（其余参数决定对比股票池和计算引擎，变化时需要重建分析器）
+QUERY_PARAMS = (
+    'stock_code', 'backtest_date', 'evaluation_days', 'csv_filename', 'debug',
+    'evaluation_batch_size', 'batch_size',
+    'threshold_10', 'threshold_close_minus_open_10', 'threshold_close_10', 'threshold_volume_10',
+    'threshold_5', 'threshold_close_minus_open_5', 'threshold_close_5', 'threshold_volume_5',
+)
+
 
 def _process_stock_historical_data_worker(args):
     """
     多进程工作函数：处理单只股票的历史数据
     
     Args:
-        args: (stock_code, stock_data, window_size, fields, debug, stride)
+        args: (stock_code, stock_data, window_size, fields, debug, stride, pool_dtype)
     
     Returns:
-        tuple: (stock_code, historical_data_list, stats)
+        tuple: (stock_code, 编码后的窗口块（encode_stock_windows 的返回值）, stats)
     """
-    stock_code, stock_data, window_size, fields, debug, stride = args
-    
-    historical_data = []
-    stock_valid_periods = 0
-    stock_invalid_periods = 0
+    stock_code, stock_data, window_size, fields, debug, stride, pool_dtype = args
     
     try:
-        # 使用所有可用数据
-        available_data = stock_data
-        
-        if len(available_data) < window_size:
-            return stock_code, [], {'valid_periods': 0, 'invalid_periods': 0, 'skipped': True}
+        chunk = encode_stock_windows(stock_data, window_size, stride, pool_dtype)
+        if chunk is None:
+            return stock_code, None, {'valid_periods': 0, 'invalid_periods': 0, 'skipped': True}
         
-        # 生成该股票的历史期间并直接进行筛选和预处理
-        for i in range(0, len(available_data) - window_size + 1, max(1, int(stride) if stride is not None else 1)):
-            period_data = available_data.iloc[i:i + window_size]
-            
-            # 检查数据长度是否正确
-            if len(period_data) == window_size:
-                start_date = period_data.index[0]
-                end_date = period_data.index[-1]
-                
-                # 直接提取并预处理数据
-                # 构造三通道: close-open 差, close, volume
-                diff_values = (period_data['close'].values - period_data['open'].values)
-                historical_values = np.stack([
-                    diff_values,
-                    period_data['close'].values,
-                    period_data['volume'].values
-                ], axis=1)
-                
-                # 存储预处理后的数据
-                historical_data.append((historical_values, start_date, end_date, stock_code))
-                stock_valid_periods += 1
-            else:
-                stock_invalid_periods += 1
-        
-        return stock_code, historical_data, {
-            'valid_periods': stock_valid_periods, 
-            'invalid_periods': stock_invalid_periods, 
+        return stock_code, chunk, {
+            'valid_periods': len(chunk['codes']),
+            'invalid_periods': 0,
             'skipped': False
         }
         
     except Exception as e:
         if debug:
             print(f"处理股票 {stock_code} 时出错: {str(e)}")
-        return stock_code, [], {'valid_periods': 0, 'invalid_periods': 0, 'error': str(e)}
+        return stock_code, None, {'valid_periods': 0, 'invalid_periods': 0, 'error': str(e)}
 
 
 class GPUBatchPearsonAnalyzer:
@@ -121,7 +114,18 @@ class GPUBatchPearsonAnalyzer:
                  historical_stride=1,
                  histogram_interval=0,
                  cleanup_every_n_batches=1,
-                 enable_histogram=False):
+                 enable_histogram=False,
+                 profile_dir=None,
+                 torch_profile_batches=None,
+                 cascade_filter=True,
+                 ann_index=False,
+                 ann_nlist=None,
+                 ann_nprobe=None,
+                 ann_recall_sample=0,
+                 pool_dtype='float32',
+                 cpu_workers=0,
+                 async_io=True,
+                 resident_pool=False):
         """
         初始化GPU批量评测Pearson相关性分析器
         
@@ -146,17 +150,21 @@ class GPUBatchPearsonAnalyzer:
                               单股票模式: 直接表示评测日期数量
                               多股票模式: 表示总计算单元数 (股票数 × 评测日期数)
                               例如: 100股票×15评测日期=1500计算单元，batch_size=15时分100批处理 (默认: 100)
+            profile_dir: 性能剖析导出目录，指定后在运行结束时写出 Chrome trace 和运行汇总 JSON（默认: None，不导出）
+            torch_profile_batches: 需要用 torch.profiler 采集的批次编号集合（从1开始），采集结果写入 profile_dir
+            cascade_filter: 是否启用级联筛选（配置了单字段阈值时，先算最具选择性的字段，其余字段只算幸存配对）
+            ann_index: 是否用IVF索引预筛历史窗口（按平均相关阈值取候选，再精确复核）
+            ann_nlist: IVF聚类数，默认 sqrt(历史窗口数)
+            ann_nprobe: 每个评测窗口最多探查的聚类数；None 表示探查所有上界超过阈值的聚类（不漏检）
+            ann_recall_sample: 每批抽样多少个评测窗口与精确计算对照统计召回率，0 表示不统计
+            pool_dtype: 历史窗口池存储精度，'float32'（无损）、'float16' 或 'int8'（按窗口归一化后量化）
+            cpu_workers: 使用CPU计算时，按历史分区并行计算相关系数的进程数；0/1 表示单进程
+            async_io: 是否由后台线程缓冲写入结果CSV和直方图（False 时在批次循环内同步写入）
+            resident_pool: 常驻模式（供 pool_server 使用）：对比股票池只加载一次并保留在内存/显存中，
+                           之后每次 analyze_batch 只加载目标股票；运行结束时不关闭CPU多进程后端
         """
         # 支持多个股票代码
-        if isinstance(stock_code, str):
-            if ',' in stock_code:
-                self.stock_codes = [code.strip() for code in stock_code.split(',')]
-            else:
-                self.stock_codes = [stock_code]
-        elif isinstance(stock_code, list):
-            self.stock_codes = stock_code
-        else:
-            self.stock_codes = [str(stock_code)]
+        self.stock_codes = self._parse_stock_codes(stock_code)
         
         self.stock_code = self.stock_codes[0]  # 保持向后兼容性，主要股票代码
         # 统一流程：即使只有1只股票也走“多股票（列表）模式”
@@ -165,6 +173,7 @@ class GPUBatchPearsonAnalyzer:
         
         # 设置固定的绝对路径
         script_dir = r'C:\Users\17701\github\my_first_repo\stockapi\stock_backtest\pearson_found'
+        self.script_dir = script_dir
         self.log_dir = os.path.join(script_dir, 'logs')
         self.csv_results_file = os.path.join(script_dir, csv_filename)
         
@@ -208,6 +217,23 @@ class GPUBatchPearsonAnalyzer:
         self.histogram_interval = int(histogram_interval) if histogram_interval is not None else 0
         self.cleanup_every_n_batches = max(0, int(cleanup_every_n_batches) if cleanup_every_n_batches is not None else 1)
         self.enable_histogram = bool(enable_histogram)
+        self.cascade_filter = bool(cascade_filter)
+        self._cascade_channel_order = None
+        self.ann_index = bool(ann_index)
+        self.ann_nlist = ann_nlist
+        self.ann_nprobe = ann_nprobe
+        self.ann_recall_sample = int(ann_recall_sample or 0)
+        self._ann_segment = 0
+        self._ann_index_cache = None
+        self._ann_stats = defaultdict(int)
+        if pool_dtype not in POOL_DTYPES:
+            raise ValueError(f"不支持的窗口池精度: {pool_dtype}，可选: {', '.join(POOL_DTYPES)}")
+        self.pool_dtype = pool_dtype
+        self.cpu_workers = int(cpu_workers or 0)
+        self._cpu_backend = None
+        self._cpu_backend_key = None
+        self.resident_pool = bool(resident_pool)
+        self._comparison_pool_ready = False
         
         # GPU显存监控
         self.gpu_memory_stats = {
@@ -255,6 +281,9 @@ class GPUBatchPearsonAnalyzer:
             'gpu_step3_integrated_misc': ('3-3a', '一体化过程其他操作（日志/同步/数据传输）'),
             'gpu_step3_correlation_matrix': ('3-4', '相关矩阵计算'),
             'gpu_step3_correlation_filtering': ('3-5', '相关性筛选'),
+            'gpu_step3_ann_index_build': ('3-4a', 'IVF历史窗口索引构建'),
+            'gpu_step3_ann_search': ('3-4b', 'IVF索引候选检索'),
+            'cpu_parallel_correlation': ('3-4c', 'CPU多进程分区相关计算与筛选'),
             'gpu_step3_result_aggregation': ('3-6', '结果聚合'),
             'gpu_step3_batch_merging': ('3-7', '批次结果合并'),
             'gpu_step3_global_statistics': ('3-8', '全局统计计算'),
@@ -269,11 +298,36 @@ class GPUBatchPearsonAnalyzer:
             'post_batch_memory_cleanup': ('3-17', 'GPU/内存清理'),
             'csv_data_prep': ('3-18', 'CSV数据准备'),
             'csv_write': ('3-19', 'CSV写入'),
+            'csv_flush': ('3-20', '等待后台CSV写入完成'),
 
             # 总体统计
             'total_batch_analysis': ('总计', '完整批量分析')
         }
         
+        # 性能剖析导出（可选）：与计时器同步记录区间、传输字节数和内存峰值
+        self.profile_dir = profile_dir
+        self.torch_profile_batches = set(int(b) for b in torch_profile_batches) if torch_profile_batches else set()
+        self.perf_recorder = None
+        if self.profile_dir or self.torch_profile_batches:
+            self.profile_dir = self.profile_dir or os.path.join(script_dir, 'profiles')
+            self.perf_recorder = PerfTraceRecorder(
+                device=self.device,
+                step_mapping=self.step_mapping,
+                metadata={
+                    'stock_count': len(self.stock_codes),
+                    'comparison_stock_count': len(self.comparison_stocks),
+                    'comparison_mode': comparison_mode,
+                    'evaluation_days': evaluation_days,
+                    'evaluation_batch_size': evaluation_batch_size,
+                    'window_size': window_size,
+                    'historical_stride': self.historical_stride,
+                    'device': str(self.device),
+                    'use_fp16': self.use_fp16,
+                    'pool_dtype': pool_dtype,
+                    'backtest_date': backtest_date,
+                }
+            )
+        
         # 确保日志目录存在
         os.makedirs(self.log_dir, exist_ok=True)
         
@@ -282,6 +336,8 @@ class GPUBatchPearsonAnalyzer:
         
         # 设置CSV文件
         self._setup_csv_file()
+        self.async_io = bool(async_io)
+        self.result_writer = AsyncCsvWriter(self.logger, synchronous=not self.async_io)
         
         if self.is_multi_stock:
             self.logger.info(f"初始化GPU批量评测Pearson分析器，目标股票: {self.stock_codes} (多股票模式)")
@@ -297,9 +353,25 @@ class GPUBatchPearsonAnalyzer:
             self.logger.info(f"histogram_interval: {self.histogram_interval}")
             self.logger.info(f"cleanup_every_n_batches: {self.cleanup_every_n_batches}")
             self.logger.info(f"enable_histogram: {self.enable_histogram}")
+            self.logger.info(f"cascade_filter: {self.cascade_filter}")
+            self.logger.info(f"ann_index: {self.ann_index}, ann_nlist: {self.ann_nlist}, ann_nprobe: {self.ann_nprobe}")
+            self.logger.info(f"pool_dtype: {self.pool_dtype}")
+            self.logger.info(f"cpu_workers: {self.cpu_workers}")
+            self.logger.info(f"async_io: {self.async_io}")
         except Exception:
             pass
     
+    @staticmethod
+    def _parse_stock_codes(stock_code):
+        """把单个代码、逗号分隔的代码串或代码列表统一为代码列表"""
+        if isinstance(stock_code, str):
+            if ',' in stock_code:
+                return [code.strip() for code in stock_code.split(',')]
+            return [stock_code]
+        if isinstance(stock_code, list):
+            return stock_code
+        return [str(stock_code)]
+    
     def _setup_device(self):
         """设置计算设备（GPU或CPU）"""
         if self.use_gpu and torch.cuda.is_available():
@@ -478,6 +550,8 @@ class GPUBatchPearsonAnalyzer:
             'start_time': time.time(),
             'parent': parent_timer
         }
+        if self.perf_recorder is not None:
+            self.perf_recorder.start(timer_name, parent_timer)
         # 映射到阶段编号的步骤使用更醒目的info级别输出
         if hasattr(self, 'step_mapping') and timer_name in self.step_mapping:
             self.logger.info(f"⏱️ 【开始】{self._get_timer_display_name(timer_name)}")
@@ -502,6 +576,8 @@ class GPUBatchPearsonAnalyzer:
             })
             
             del self.current_timers[timer_name]
+            if self.perf_recorder is not None:
+                self.perf_recorder.end(timer_name)
             
             # 根据耗时和步骤类型决定日志级别和格式
             if hasattr(self, 'step_mapping') and timer_name in self.step_mapping:
@@ -515,6 +591,151 @@ class GPUBatchPearsonAnalyzer:
             return elapsed_time
         return 0
         
+    def _record_transfer(self, direction, tensor):
+        """
+        记录主机与设备间的传输字节数（仅在启用性能剖析且使用GPU时生效）
+        
+        Args:
+            direction: 'h2d' 或 'd2h'
+            tensor: 被传输的张量或numpy数组
+        """
+        if self.perf_recorder is not None and self.device.type == 'cuda':
+            self.perf_recorder.record_transfer(direction, tensor_nbytes(tensor))
+    
+    def _to_device(self, tensor, dtype=None):
+        """
+        把主机张量传到计算设备，按实际传输的张量记录字节数
+        
+        精度转换在主机侧完成，传输的即为目标精度的数据；cuda 下经锁页内存异步传输。
+        """
+        if dtype is not None:
+            tensor = tensor.to(dtype)
+        if tensor.device.type == self.device.type:
+            return tensor
+        if self.device.type == 'cuda':
+            tensor = tensor.pin_memory()
+            self._record_transfer('h2d', tensor)
+            return tensor.to(self.device, non_blocking=True)
+        return tensor.to(self.device)
+    
+    def _to_host(self, tensor):
+        """把设备张量拷回主机，按实际拷贝的张量记录字节数"""
+        if tensor.device.type == 'cpu':
+            return tensor
+        host = tensor.cpu()
+        self._record_transfer('d2h', host)
+        return host
+    
+    def _torch_profile_context(self, batch_idx):
+        """为选定批次返回 torch.profiler 采集上下文，其余批次返回空上下文"""
+        if (batch_idx + 1) not in self.torch_profile_batches:
+            return contextlib.nullcontext()
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.device.type == 'cuda':
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        trace_path = os.path.join(
+            self.profile_dir,
+            f"torch_profile_batch{batch_idx + 1}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+
+        def _on_trace_ready(prof):
+            prof.export_chrome_trace(trace_path)
+            self.logger.info(f"🔬 批次 {batch_idx + 1} torch.profiler 采集结果: {trace_path}")
+
+        return torch.profiler.profile(
+            activities=activities,
+            record_shapes=True,
+            profile_memory=True,
+            on_trace_ready=_on_trace_ready
+        )
+    
+    def _export_performance_profile(self):
+        """把本次运行的计时区间导出为 Chrome trace 和运行汇总 JSON"""
+        if self.perf_recorder is None or not self.profile_dir:
+            return
+        try:
+            trace_path, summary_path = self.perf_recorder.export(self.profile_dir)
+            self.logger.info(f"📈 性能剖析 trace 已导出: {trace_path}")
+            self.logger.info(f"📈 性能剖析汇总已导出: {summary_path}")
+        except Exception as e:
+            self.logger.warning(f"⚠️ 性能剖析导出失败: {str(e)}")
+    
+    def _flush_result_writer(self):
+        """等待后台CSV写入完成并报告写入错误"""
+        self.start_timer('csv_flush')
+        self.result_writer.flush()
+        self.end_timer('csv_flush')
+        if self.result_writer.errors:
+            self.logger.error(f"❌ 后台CSV写入共失败 {len(self.result_writer.errors)} 次，最近一次: {self.result_writer.errors[-1]}")
+    
+    def _get_cpu_backend(self, historical_tensor):
+        """获取（必要时创建）对应当前历史张量的CPU多进程后端"""
+        key = (historical_tensor.data_ptr(), tuple(historical_tensor.shape))
+        if self._cpu_backend is None or self._cpu_backend_key != key:
+            self._close_cpu_backend()
+            self._cpu_backend = CpuPartitionBackend(historical_tensor, self.cpu_workers)
+            self._cpu_backend_key = key
+        return self._cpu_backend
+    
+    def _close_cpu_backend(self):
+        """关闭CPU多进程后端（进程池与共享内存）"""
+        if self._cpu_backend is not None:
+            try:
+                self._cpu_backend.close()
+            except Exception as e:
+                self.logger.warning(f"⚠️ CPU多进程后端关闭失败: {str(e)}")
+            self._cpu_backend = None
+            self._cpu_backend_key = None
+    
+    def configure_query(self, **params):
+        """
+        常驻模式下为下一次 analyze_batch 更新查询参数（目标股票、回测日期、阈值、结果文件等）
+        
+        Args:
+            **params: QUERY_PARAMS 中的参数，未给出的参数保持不变
+        """
+        unknown = sorted(set(params) - set(QUERY_PARAMS))
+        if unknown:
+            raise ValueError(f"不支持的查询参数: {unknown}")
+        if 'stock_code' in params:
+            self.stock_codes = self._parse_stock_codes(params['stock_code'])
+            self.stock_code = self.stock_codes[0]
+            self.is_multi_stock = len(self.stock_codes) >= 1
+        if 'backtest_date' in params:
+            self.backtest_date = pd.to_datetime(params['backtest_date']) if params['backtest_date'] else None
+        for name in QUERY_PARAMS:
+            if name in params and name not in ('stock_code', 'backtest_date', 'csv_filename'):
+                setattr(self, name, params[name])
+        
+        if params.get('csv_filename'):
+            csv_results_file = os.path.join(self.script_dir, params['csv_filename'])
+            # 先写完上一次查询的结果，再检查/自愈结果文件；写入器缓存的表头随之作废
+            self.result_writer.flush()
+            if csv_results_file != self.csv_results_file or not os.path.exists(csv_results_file):
+                self.csv_results_file = csv_results_file
+                self._setup_csv_file()
+            self.result_writer.forget(self.csv_results_file)
+        
+        # 阈值可能变化：重新估计级联筛选顺序；计时与索引统计按本次查询重新累计
+        self._cascade_channel_order = None
+        self._ann_stats = defaultdict(int)
+        self.performance_timers = defaultdict(list)
+        self.current_timers = {}
+    
+    def warm_up(self):
+        """
+        常驻模式预热：加载对比股票池并把历史张量放到计算设备上
+        
+        Returns:
+            bool: 是否预热成功
+        """
+        if self.load_data() is None or not self.historical_periods_data:
+            return False
+        self._historical_pool_tensor(self.historical_periods_data, torch.float32)
+        self.logger.info(f"🔥 常驻对比股票池已就绪: {len(self.historical_periods_data)} 个历史期间, 设备 {self.device}")
+        return True
+    
     def _get_timer_display_name(self, timer_name):
         """获取计时器的显示名称，用于日志输出"""
         # 从step_mapping中获取更友好的名称
@@ -532,45 +753,18 @@ class GPUBatchPearsonAnalyzer:
         else:
             self.logger.info(f"📊 数据加载中: 1 个目标股票 + {len(self.comparison_stocks)} 个对比股票")
         
-        self.data_loader = StockDataLoader()
+        if self.data_loader is None:
+            self.data_loader = StockDataLoader()
         
         # 存储所有目标股票的数据
         self.multi_stock_data = {}
-        # 存储所有对比股票的数据（避免重复加载）
-        self.loaded_stocks_data = {}
-        
-        # 1. 首先加载所有对比股票数据
-        self.logger.info(f"📈 [1/3] 加载对比股票数据...")
-        self.start_timer('comparison_stock_loading')
-        successful_comparison_loads = 0
-        for stock_code in self.comparison_stocks:
-            try:
-                data = self.data_loader.load_stock_data(stock_code)
-                if data is not None and not data.empty:
-                    filtered_data = self._filter_data(data, stock_code, is_target_stock=False)
-                    if not filtered_data.empty:
-                        self.loaded_stocks_data[stock_code] = filtered_data
-                        successful_comparison_loads += 1
-                    else:
-                        if self.debug:
-                            self.logger.warning(f"对比股票 {stock_code} 过滤后数据为空")
-                else:
-                    if self.debug:
-                        self.logger.warning(f"无法加载对比股票 {stock_code} 的数据")
-                        
-            except Exception as e:
-                if self.debug:
-                    self.logger.warning(f"加载对比股票 {stock_code} 时出错: {str(e)}")
-                continue
-        
-        self.end_timer('comparison_stock_loading')
         
-        # 2. 然后处理对比股票数据
-        self.logger.info(f"📈 [2/3] 处理对比股票历史数据...")
-        self.start_timer('historical_data_collection')
-        # 收集历史期间数据
-        self._collect_historical_periods_data()
-        self.end_timer('historical_data_collection')
+        # 常驻模式：对比股票池已加载时跳过第1、2步（self_only 的历史池依赖目标股票，每次重新收集）
+        if self.resident_pool and self._comparison_pool_ready and self.comparison_mode != 'self_only':
+            self.logger.info(f"♻️ 复用常驻对比股票池: {len(self.loaded_stocks_data)} 个对比股票, {len(self.historical_periods_data)} 个历史期间")
+            successful_comparison_loads = len(self.loaded_stocks_data)
+        else:
+            successful_comparison_loads = self._load_comparison_pool()
         
         # 3. 最后加载目标股票数据（检查是否已在对比股票中）
         self.logger.info(f"📈 [3/3] 加载目标股票数据...")
@@ -620,6 +814,51 @@ class GPUBatchPearsonAnalyzer:
         self.end_timer('all_data_loading')
         return self.data
     
+    def _load_comparison_pool(self):
+        """
+        加载对比股票数据并收集历史期间窗口池（数据加载第1、2步）
+        
+        Returns:
+            int: 成功加载的对比股票数量
+        """
+        # 存储所有对比股票的数据（避免重复加载）
+        self.loaded_stocks_data = {}
+        
+        # 1. 首先加载所有对比股票数据
+        self.logger.info(f"📈 [1/3] 加载对比股票数据...")
+        self.start_timer('comparison_stock_loading')
+        successful_comparison_loads = 0
+        for stock_code in self.comparison_stocks:
+            try:
+                data = self.data_loader.load_stock_data(stock_code)
+                if data is not None and not data.empty:
+                    filtered_data = self._filter_data(data, stock_code, is_target_stock=False)
+                    if not filtered_data.empty:
+                        self.loaded_stocks_data[stock_code] = filtered_data
+                        successful_comparison_loads += 1
+                    else:
+                        if self.debug:
+                            self.logger.warning(f"对比股票 {stock_code} 过滤后数据为空")
+                else:
+                    if self.debug:
+                        self.logger.warning(f"无法加载对比股票 {stock_code} 的数据")
+                        
+            except Exception as e:
+                if self.debug:
+                    self.logger.warning(f"加载对比股票 {stock_code} 时出错: {str(e)}")
+                continue
+        
+        self.end_timer('comparison_stock_loading')
+        
+        # 2. 然后处理对比股票数据
+        self.logger.info(f"📈 [2/3] 处理对比股票历史数据...")
+        self.start_timer('historical_data_collection')
+        # 收集历史期间数据
+        self._collect_historical_periods_data()
+        self.end_timer('historical_data_collection')
+        self._comparison_pool_ready = True
+        return successful_comparison_loads
+    
     def _filter_data(self, data, stock_code, is_target_stock=False):
         """过滤股票数据，确保数据质量和日期范围
         
@@ -783,17 +1022,9 @@ class GPUBatchPearsonAnalyzer:
                 return None, [], [], None
 
             batch_data = np.stack(multi_stock_batch_data, axis=0).astype(np.float32)
-            batch_cpu = torch.from_numpy(batch_data)
-            if self.device.type == 'cuda':
-                batch_tensor = batch_cpu.pin_memory().to(self.device, non_blocking=True, dtype=self.tensor_dtype)
-            else:
-                batch_tensor = batch_cpu.to(self.device, dtype=self.tensor_dtype)
+            batch_tensor = self._to_device(torch.from_numpy(batch_data), dtype=self.tensor_dtype)
             valid_mask_np = np.array(valid_mask_list, dtype=bool)
-            valid_mask_tensor = torch.from_numpy(valid_mask_np)
-            if self.device.type == 'cuda':
-                valid_mask_tensor = valid_mask_tensor.pin_memory().to(self.device, non_blocking=True)
-            else:
-                valid_mask_tensor = valid_mask_tensor.to(self.device)
+            valid_mask_tensor = self._to_device(torch.from_numpy(valid_mask_np))
 
             self.logger.info(f"多股票批量评测数据准备完成，形状: {batch_tensor.shape}")
             self.logger.info(f"股票数量: {len(valid_stock_codes)}，评测日期数量: {len(evaluation_dates)}")
@@ -831,41 +1062,20 @@ class GPUBatchPearsonAnalyzer:
         self.start_timer('gpu_step1_data_preparation')
         self.logger.info(f"  🔍 [子步骤1/5] 历史数据准备（已优化） - 开始")
         
-        # 数据已在阶段3预处理，直接提取
-        historical_data_list = []
-        period_info_list = []
-        
-        for historical_values, start_date, end_date, stock_code in historical_periods_data:
-            historical_data_list.append(historical_values)
-            period_info_list.append({
-                'start_date': start_date,
-                'end_date': end_date,
-                'stock_code': stock_code
-            })
+        # 数据已在阶段3编码为窗口池，期间信息按需生成
+        period_info_list = historical_periods_data.period_infos()
         
-        valid_periods = len(historical_data_list)
+        valid_periods = len(period_info_list)
         self.logger.info(f"历史数据准备完成: 有效期间={valid_periods}（数据已在阶段3预处理）")
         self.end_timer('gpu_step1_data_preparation')
         self.logger.info(f"  🔍 [子步骤1/5] 历史数据准备（已优化） - 完成")
         
-        if not historical_data_list:
-            self.logger.warning("没有有效的历史期间数据")
-            return {}
-        
         # 子步骤2/5: 创建GPU历史数据张量
         self.start_timer('gpu_step2_tensor_creation')
         self.logger.info(f"  📊 [子步骤2/5] 创建GPU历史数据张量 - 开始")
-        # 根据实际字段列数动态输出形状信息
-        expected_fields = historical_data_list[0].shape[1] if historical_data_list else 'n/a'
-        self.logger.info(f"张量形状将为: [{len(historical_data_list)}, {window_size}, {expected_fields}]")
-        
-        hist_np = np.stack(historical_data_list, axis=0).astype(np.float32)
-        hist_cpu = torch.from_numpy(hist_np)
-        if self.device.type == 'cuda':
-            historical_tensor = hist_cpu.pin_memory().to(self.device, non_blocking=True, dtype=self.tensor_dtype)
-        else:
-            historical_tensor = hist_cpu.to(self.device, dtype=self.tensor_dtype)
+        self.logger.info(f"张量形状将为: [{valid_periods}, {window_size}, 3]")
         
+        historical_tensor = self._historical_pool_tensor(historical_periods_data, self.tensor_dtype)
         
         self.logger.info(f"GPU历史数据张量创建完成: {historical_tensor.shape}, 设备: {historical_tensor.device}")
         self.end_timer('gpu_step2_tensor_creation')
@@ -1138,7 +1348,7 @@ class GPUBatchPearsonAnalyzer:
         # 使用统一的计时器，覆盖原来的4-5和5-1步骤
         self.start_timer('integrated_result_processing')
         
-        correlations_np = correlations_tensor.cpu().numpy()
+        correlations_np = self._to_host(correlations_tensor).numpy()
         # 统一仅保留三个字段
         fields = ['close_minus_open', 'close', 'volume']
         
@@ -1281,59 +1491,33 @@ class GPUBatchPearsonAnalyzer:
         return final_result
 
     def _append_correlation_histogram(self, batch_correlations, batch_idx):
+        """统计当前批次各字段相关系数的直方图（20个区间），交给后台写入器追加到 static.csv"""
         try:
             fields = ['diff', 'close', 'volume']
             static_path = os.path.join(os.path.dirname(self.csv_results_file), 'static.csv')
             row = {'batch_index': int(batch_idx + 1)}
             columns = ['batch_index']
-            for seg_start, seg_suffix in [(0, '10'), (3, '5')]:
-                for f_idx, field in enumerate(fields):
+            histograms = []
+            for seg_start in (0, 3):
+                for f_idx in range(len(fields)):
                     v = batch_correlations[..., seg_start + f_idx].reshape(-1)
                     v = v[torch.isfinite(v)]
                     if v.numel() == 0:
-                        hist_rev = torch.zeros(20, dtype=torch.long, device=self.device)
-                    else:
-                        v = v.clamp(-1.0, 1.0)
-                        h = torch.histc(v.float(), bins=20, min=-1.0, max=1.0)
-                        hist_rev = h.to(dtype=torch.long).flip(0)
-                    for k in range(20):
-                        start = round(1.0 - k * 0.1, 1)
-                        end = round(start - 0.1, 1)
-                        col = f"{field}_{seg_suffix}_{start}_to_{end}"
-                        columns.append(col)
-                        row[col] = int(hist_rev[k].item())
-            df_row = pd.DataFrame([row], columns=columns)
-            if not os.path.exists(static_path):
-                df_row.to_csv(static_path, index=False, encoding='utf-8-sig', mode='w')
-                if hasattr(self, 'logger') and self.logger is not None:
-                    try:
-                        self.logger.info(f"📊 相关性直方图写入(创建): {static_path} | 批次 {int(batch_idx + 1)}")
-                    except Exception:
-                        pass
-            else:
-                try:
-                    existing = pd.read_csv(static_path, nrows=1, encoding='utf-8-sig')
-                    if 'field' in existing.columns or set(existing.columns) != set(columns):
-                        df_row.to_csv(static_path, index=False, encoding='utf-8-sig', mode='w')
-                        if hasattr(self, 'logger') and self.logger is not None:
-                            try:
-                                self.logger.info(f"📊 相关性直方图写入(重建): {static_path} | 批次 {int(batch_idx + 1)}")
-                            except Exception:
-                                pass
+                        histograms.append(torch.zeros(20, dtype=torch.long, device=self.device))
                     else:
-                        df_row.to_csv(static_path, index=False, encoding='utf-8-sig', mode='a', header=False)
-                        if hasattr(self, 'logger') and self.logger is not None:
-                            try:
-                                self.logger.info(f"📊 相关性直方图写入(追加): {static_path} | 批次 {int(batch_idx + 1)}")
-                            except Exception:
-                                pass
-                except Exception:
-                    df_row.to_csv(static_path, index=False, encoding='utf-8-sig', mode='w')
-                    if hasattr(self, 'logger') and self.logger is not None:
-                        try:
-                            self.logger.info(f"📊 相关性直方图写入(回退重建): {static_path} | 批次 {int(batch_idx + 1)}")
-                        except Exception:
-                            pass
+                        h = torch.histc(v.clamp(-1.0, 1.0).float(), bins=20, min=-1.0, max=1.0)
+                        histograms.append(h.to(dtype=torch.long).flip(0))
+            # 一次性拷回主机，避免逐个 .item() 同步
+            counts = self._to_host(torch.stack(histograms)).tolist()
+            for hist_idx, (seg_suffix, field) in enumerate((s, f) for s in ('10', '5') for f in fields):
+                for k in range(20):
+                    start = round(1.0 - k * 0.1, 1)
+                    end = round(start - 0.1, 1)
+                    col = f"{field}_{seg_suffix}_{start}_to_{end}"
+                    columns.append(col)
+                    row[col] = int(counts[hist_idx][k])
+            self.result_writer.append_rows(static_path, [row], columns, rebuild_on_mismatch=True)
+            self.logger.debug(f"📊 相关性直方图已提交写入: {static_path} | 批次 {int(batch_idx + 1)}")
         except Exception as e:
             if hasattr(self, 'logger') and self.logger is not None:
                 try:
@@ -1388,38 +1572,20 @@ class GPUBatchPearsonAnalyzer:
         self.start_timer('gpu_step1_data_preparation')
         self.logger.info(f"  🔍 [子步骤1/3] 历史数据准备（已优化） - 开始")
         
-        # 数据已在阶段3预处理，直接提取
-        historical_data_list = []
-        period_info_list = []
+        # 数据已在阶段3编码为窗口池，期间信息按需生成
+        period_info_list = historical_periods_data.period_infos()
         
-        for historical_values, start_date, end_date, stock_code in historical_periods_data:
-            historical_data_list.append(historical_values)
-            period_info_list.append({
-                'start_date': start_date,
-                'end_date': end_date,
-                'stock_code': stock_code
-            })
-        
-        valid_periods = len(historical_data_list)
+        valid_periods = len(period_info_list)
         self.logger.info(f"历史数据准备完成: 有效期间={valid_periods}（数据已在阶段3预处理）")
         self.end_timer('gpu_step1_data_preparation')
         self.logger.info(f"  🔍 [子步骤1/3] 历史数据准备（已优化） - 完成")
         
-        if not historical_data_list:
-            self.logger.warning("没有有效的历史期间数据")
-            return {}
-        
         # 子步骤2/3: 创建GPU历史数据张量
         self.start_timer('gpu_step2_tensor_creation')
         self.logger.info(f"  📊 [子步骤2/3] 创建GPU历史数据张量 - 开始")
-        expected_fields = historical_data_list[0].shape[1] if historical_data_list else 'n/a'
-        self.logger.info(f"张量形状将为: [{len(historical_data_list)}, {window_size}, {expected_fields}]")
+        self.logger.info(f"张量形状将为: [{valid_periods}, {window_size}, 3]")
         
-        historical_tensor = torch.tensor(
-            np.stack(historical_data_list, axis=0), 
-            dtype=torch.float32, 
-            device=self.device
-        )  # [num_historical_periods, window_size, 3]
+        historical_tensor = self._historical_pool_tensor(historical_periods_data, torch.float32)
         
         self.logger.info(f"GPU历史数据张量创建完成: {historical_tensor.shape}, 设备: {historical_tensor.device}")
         self.end_timer('gpu_step2_tensor_creation')
@@ -1482,29 +1648,12 @@ class GPUBatchPearsonAnalyzer:
         
         # 历史数据准备（计时，挂到3-10）
         self.start_timer('gpu_step1_data_preparation', parent_timer='gpu_step3_integrated_correlation_processing')
-        historical_data_list = []
-        period_info_list = []
-        
-        for historical_values, start_date, end_date, stock_code in historical_periods_data:
-            historical_data_list.append(historical_values)
-            period_info_list.append({
-                'start_date': start_date,
-                'end_date': end_date,
-                'stock_code': stock_code
-            })
-        
-        if not historical_data_list:
-            self.end_timer('gpu_step1_data_preparation')
-            return {}
+        period_info_list = historical_periods_data.period_infos()
         self.end_timer('gpu_step1_data_preparation')
         
-        # 创建GPU历史数据张量（计时，挂到3-10）
+        # 创建GPU历史数据张量（计时，挂到3-10）；窗口池会缓存设备张量，后续批次不再重复传输
         self.start_timer('gpu_step2_tensor_creation', parent_timer='gpu_step3_integrated_correlation_processing')
-        historical_tensor = torch.tensor(
-            np.stack(historical_data_list, axis=0), 
-            dtype=torch.float32, 
-            device=self.device
-        )  # [num_historical_periods, window_size, 3]
+        historical_tensor = self._historical_pool_tensor(historical_periods_data, torch.float32)
         self.end_timer('gpu_step2_tensor_creation')
         
         # GPU相关系数计算和结果处理（调用带子计时器的一体化实现）
@@ -1515,6 +1664,310 @@ class GPUBatchPearsonAnalyzer:
         
         return results
 
+    def _historical_pool_tensor(self, pool, dtype):
+        """
+        从窗口池获取历史张量 [num_historical_periods, window_size, 3]
+        
+        非float32窗口池直接使用编码计算相关系数（仿射不变）；debug模式下还原为原始数值，便于日志核对。
+        """
+        historical_tensor, transferred = pool.to_tensor(self.device, dtype=dtype, dequantize=self.debug)
+        if transferred is not None:
+            self._record_transfer('h2d', transferred)
+        return historical_tensor
+
+    @staticmethod
+    def _normalize_recent_segment(segment):
+        """对评测窗口片段 [num_stocks, batch_size, seg_len, 3] 做去均值和L2归一化（与历史片段的归一化方式一致）"""
+        centered = segment - segment.mean(dim=2, keepdim=True)
+        return centered / torch.sqrt((centered ** 2).sum(dim=2, keepdim=True) + 1e-8)
+    
+    def _get_cascade_order(self, batch_recent_data, hist_norm_10, hist_norm_5, first_len, second_len):
+        """
+        确定级联筛选的字段顺序：按抽样估计的通过率从低到高排列已配置的单字段阈值
+        
+        通道编号与相关矩阵最后一维一致：0-2 为前10天 close_minus_open/close/volume，3-5 为后5天。
+        抽样只在每次运行的第一个批次进行，结果缓存复用。
+        
+        Returns:
+            list: [(通道编号, 阈值张量)]，未配置任何单字段阈值时返回空列表
+        """
+        field_thresholds = [
+            self.threshold_close_minus_open_10, self.threshold_close_10, self.threshold_volume_10,
+            self.threshold_close_minus_open_5, self.threshold_close_5, self.threshold_volume_5,
+        ]
+        configured = [(channel, float(thr)) for channel, thr in enumerate(field_thresholds) if thr is not None]
+        if not configured:
+            return []
+        
+        if self._cascade_channel_order is None:
+            # 抽样：最多 CASCADE_SAMPLE_ROWS 个评测单元 × CASCADE_SAMPLE_PERIODS 个历史期间
+            sample_rows = batch_recent_data.reshape(-1, batch_recent_data.shape[-2], batch_recent_data.shape[-1])
+            sample_rows = sample_rows[:CASCADE_SAMPLE_ROWS]
+            num_periods = hist_norm_10.shape[0]
+            period_step = max(1, num_periods // CASCADE_SAMPLE_PERIODS)
+            recent_norms = (
+                self._normalize_recent_segment(sample_rows[None, :, :first_len, :])[0],
+                self._normalize_recent_segment(sample_rows[None, :, -second_len:, :])[0],
+            )
+            hist_norms = (hist_norm_10[::period_step], hist_norm_5[::period_step])
+            pass_rates = {}
+            for channel, thr in configured:
+                segment, field = divmod(channel, 3)
+                corr = torch.einsum('nl,hl->nh', recent_norms[segment][..., field], hist_norms[segment][..., field])
+                pass_rates[channel] = float((corr > thr).float().mean().item())
+            self._cascade_channel_order = sorted(pass_rates, key=lambda c: pass_rates[c])
+            self.logger.info("🔀 级联筛选顺序(抽样通过率): " + ", ".join(
+                f"{CASCADE_CHANNEL_NAMES[c]}={pass_rates[c]:.4f}" for c in self._cascade_channel_order))
+        
+        thresholds = dict(configured)
+        return [
+            (channel, torch.tensor(thresholds[channel], device=self.device, dtype=self.tensor_dtype))
+            for channel in self._cascade_channel_order if channel in thresholds
+        ]
+    
+    @staticmethod
+    def _exact_channel_correlation(recent_norms, hist_norms, channel):
+        """
+        以完整计算相同的 einsum（相同形状，只取一个字段）计算某个通道的稠密相关矩阵 [S, B, H]，
+        数值与完整的 3字段×2段 计算逐位一致
+        """
+        segment, field = divmod(channel, 3)
+        return torch.einsum('sblf,hlf->sbhf', recent_norms[segment][..., field:field + 1],
+                            hist_norms[segment][..., field:field + 1])[..., 0]
+    
+    @staticmethod
+    def _gather_pair_correlation(recent_norms, hist_norms, pair_index, channel):
+        """计算指定配对 [N, 3]（股票, 评测日期, 历史期间）在某个通道上的相关系数（与完整计算有舍入差异）"""
+        segment, field = divmod(channel, 3)
+        recent = recent_norms[segment][pair_index[:, 0], pair_index[:, 1], :, field]  # [N, seg_len]
+        hist = hist_norms[segment][pair_index[:, 2], :, field]                      # [N, seg_len]
+        return (recent * hist).sum(dim=1)
+    
+    def _cascade_pair_correlations(self, recent_norms, hist_norms, cascade_order, current_mask=None, candidate_index=None):
+        """
+        级联计算相关系数：首个（最具选择性的）通道在全部配对上按完整计算的方式稠密计算（数值精确），
+        之后每个已配置阈值的通道只在上一轮幸存的配对上逐配对计算，以 阈值-误差界 保守筛选（不会漏掉
+        完整计算下的命中），最后为幸存配对补齐其余通道（平均相关、自相关过滤需要全部6个通道）。
+        幸存配对的最终判断见 _cascade_exact_recheck 和 _cascade_finalize。
+        
+        给定 candidate_index（如IVF索引返回的候选配对）时，不做稠密计算，所有通道都只在候选配对上计算，
+        没有数值精确的通道，接近阈值的配对同样由 _cascade_exact_recheck 复核。
+        
+        Args:
+            recent_norms: (前10天, 后5天) 归一化评测片段，各为 [num_stocks, batch_size, seg_len, 3]
+            hist_norms: (前10天, 后5天) 归一化历史片段，各为 [num_historical_periods, seg_len, 3]
+            cascade_order: _get_cascade_order 的返回值
+            current_mask: 评测有效掩码 [num_stocks, batch_size]
+            candidate_index: 候选配对索引 [N, 3]（股票, 评测日期, 历史期间），需已排除无效评测单元
+            
+        Returns:
+            tuple: (幸存配对索引 [N, 3], 幸存配对的6通道相关系数 [N, 6], 数值精确的通道集合)
+        """
+        margin = CASCADE_MARGIN_EPS * torch.finfo(recent_norms[0].dtype).eps
+        if candidate_index is not None:
+            pair_index = candidate_index
+            pair_corr = torch.zeros((pair_index.shape[0], 6), dtype=recent_norms[0].dtype, device=recent_norms[0].device)
+            computed = set()
+            exact = set()
+            remaining_order = cascade_order
+        else:
+            first_channel, first_thr = cascade_order[0]
+            dense = self._exact_channel_correlation(recent_norms, hist_norms, first_channel)
+            passed = dense > first_thr
+            if current_mask is not None:
+                passed &= current_mask.unsqueeze(2)
+            pair_index = torch.nonzero(passed)
+            pair_corr = torch.zeros((pair_index.shape[0], 6), dtype=dense.dtype, device=dense.device)
+            pair_corr[:, first_channel] = dense[passed]
+            del dense, passed
+            computed = {first_channel}
+            exact = {first_channel}
+            remaining_order = cascade_order[1:]
+        
+        for channel, thr in remaining_order:
+            if pair_index.shape[0] == 0:
+                break
+            values = self._gather_pair_correlation(recent_norms, hist_norms, pair_index, channel)
+            keep = values > thr - margin
+            pair_index = pair_index[keep]
+            pair_corr = pair_corr[keep]
+            pair_corr[:, channel] = values[keep]
+            computed.add(channel)
+        
+        if pair_index.shape[0] > 0:
+            for channel in range(6):
+                if channel not in computed:
+                    pair_corr[:, channel] = self._gather_pair_correlation(recent_norms, hist_norms, pair_index, channel)
+        return pair_index, pair_corr, exact
+    
+    def _cascade_exact_recheck(self, recent_norms, hist_norms, pair_index, pair_corr, exact, cascade_order,
+                               thr_10, thr_5, self_correlation_threshold):
+        """
+        复核级联幸存配对：任一判断（单字段阈值、平均相关阈值、自相关阈值）的数值落在误差界内时，
+        把涉及的通道按完整计算的方式重算（稠密矩阵乘，只对出现这种配对的通道进行），
+        其余配对的数值与阈值的距离大于误差界，判断结果与完整计算相同。
+        IVF候选模式下所有通道都是逐配对计算的，触发复核的通道同样整体重算一次。
+        
+        Returns:
+            torch.Tensor: 复核后的6通道相关系数 [N, 6]（原地更新）
+        """
+        if pair_index.shape[0] == 0:
+            return pair_corr
+        margin = CASCADE_MARGIN_EPS * torch.finfo(pair_corr.dtype).eps
+        need = (pair_corr - self_correlation_threshold).abs() <= margin
+        for channel, thr in cascade_order:
+            need[:, channel] |= (pair_corr[:, channel] - thr).abs() <= margin
+        w3 = torch.tensor([1.0/3.0, 1.0/3.0, 1.0/3.0], dtype=self.tensor_dtype, device=self.device)
+        for segment, avg_thr in ((0, thr_10), (1, thr_5)):
+            avg = (pair_corr[:, segment * 3:segment * 3 + 3] * w3.view(1, 3)).sum(dim=1)
+            near = (avg - self_correlation_threshold).abs() <= margin
+            if avg_thr is not None:
+                near |= (avg - avg_thr).abs() <= margin
+            need[:, segment * 3:segment * 3 + 3] |= near.unsqueeze(1)
+        
+        channels = [channel for channel in range(6) if channel not in exact and bool(need[:, channel].any())]
+        for channel in channels:
+            dense = self._exact_channel_correlation(recent_norms, hist_norms, channel)
+            pair_corr[:, channel] = dense[pair_index[:, 0], pair_index[:, 1], pair_index[:, 2]]
+        if channels:
+            self.logger.debug(f"🔀 级联复核: {int(need.any(dim=1).sum().item())} 个配对接近阈值，"
+                              f"按完整计算重算通道 {[CASCADE_CHANNEL_NAMES[c] for c in channels]}")
+        return pair_corr
+    
+    def _get_ann_index(self, historical_tensor, hist_norm):
+        """
+        获取历史窗口IVF索引（同一历史张量只构建一次）
+        
+        Args:
+            historical_tensor: 历史期间张量，用于判断缓存是否仍然有效
+            hist_norm: 被索引段的归一化历史片段 [num_historical_periods, seg_len, 3]
+        """
+        cache_key = (historical_tensor.data_ptr(), tuple(historical_tensor.shape), self._ann_segment)
+        if self._ann_index_cache is None or self._ann_index_cache[0] != cache_key:
+            self.start_timer('gpu_step3_ann_index_build', parent_timer='gpu_step3_integrated_correlation_processing')
+            index = WindowANNIndex(flatten_segment(hist_norm), nlist=self.ann_nlist)
+            self.end_timer('gpu_step3_ann_index_build')
+            self._ann_index_cache = (cache_key, index)
+        return self._ann_index_cache[1]
+    
+    def _ann_candidate_pairs(self, ann_index, recent_norm, hist_norm, avg_threshold, current_mask=None):
+        """
+        用IVF索引获取当前批次平均相关可能超过阈值的候选配对
+        
+        Args:
+            ann_index: WindowANNIndex
+            recent_norm: 被索引段的归一化评测片段 [num_stocks, batch_size, seg_len, 3]
+            hist_norm: 被索引段的归一化历史片段（召回率统计时做精确对照）
+            avg_threshold: 被索引段的平均相关阈值
+            current_mask: 评测有效掩码 [num_stocks, batch_size]
+            
+        Returns:
+            torch.Tensor: 候选配对索引 [N, 3]；候选比例过高、不如稠密计算时返回None
+        """
+        num_stocks, batch_len = recent_norm.shape[:2]
+        queries = flatten_segment(recent_norm).reshape(num_stocks * batch_len, -1)
+        query_mask = current_mask.reshape(-1) if current_mask is not None else None
+        # 稠密计算的平均相关与索引上界之间有舍入差异，检索阈值放宽一个误差界（与级联筛选相同）
+        margin = CASCADE_MARGIN_EPS * torch.finfo(recent_norm.dtype).eps
+        found = ann_index.search(queries, avg_threshold - margin, nprobe=self.ann_nprobe, query_mask=query_mask,
+                                 max_candidate_fraction=ANN_MAX_CANDIDATE_FRACTION)
+        if found is None:
+            self._ann_stats['fallback_batches'] += 1
+            return None
+        query_ids, hist_ids = found
+        self._ann_stats['candidates'] += int(query_ids.numel())
+        self._ann_stats['pairs'] += int(queries.shape[0] * ann_index.num_vectors)
+        
+        if self.ann_recall_sample:
+            # 召回率：抽样查询上，精确平均相关超过阈值的配对有多少出现在候选中
+            valid_ids = torch.arange(queries.shape[0], device=queries.device)
+            if query_mask is not None:
+                valid_ids = valid_ids[query_mask]
+            sample_ids = valid_ids[:int(self.ann_recall_sample)]
+            if sample_ids.numel() > 0:
+                exact = (queries[sample_ids] @ flatten_segment(hist_norm).T) / 3.0 > avg_threshold
+                candidate = torch.zeros_like(exact)
+                row_of = torch.full((queries.shape[0],), -1, dtype=torch.long, device=queries.device)
+                row_of[sample_ids] = torch.arange(sample_ids.numel(), device=queries.device)
+                rows = row_of[query_ids]
+                sampled = rows >= 0
+                candidate[rows[sampled], hist_ids[sampled]] = True
+                self._ann_stats['recall_exact'] += int(exact.sum().item())
+                self._ann_stats['recall_found'] += int((exact & candidate).sum().item())
+        
+        return torch.stack([query_ids // batch_len, query_ids % batch_len, hist_ids], dim=1)
+    
+    def _log_ann_stats(self):
+        """输出IVF索引的候选比例与召回率统计"""
+        stats = self._ann_stats
+        if stats['pairs'] == 0 and stats['fallback_batches'] == 0:
+            return
+        ratio = stats['candidates'] / stats['pairs'] if stats['pairs'] else 0.0
+        self.logger.info(f"🗂️ IVF索引候选比例: {ratio:.4%} ({stats['candidates']}/{stats['pairs']}), "
+                         f"回退稠密计算批次: {stats['fallback_batches']}")
+        if self.ann_recall_sample:
+            recall = stats['recall_found'] / stats['recall_exact'] if stats['recall_exact'] else 1.0
+            self.logger.info(f"🗂️ IVF索引召回率(抽样, 以平均相关阈值为准): {recall:.4f} "
+                             f"({stats['recall_found']}/{stats['recall_exact']})")
+    
+    def _scatter_cpu_hits(self, cpu_hits, day_start, day_end, dense_shape):
+        """
+        把CPU多进程后端返回的稀疏命中中属于评测日期 [day_start, day_end) 的部分散布为稠密结果
+        
+        Returns:
+            tuple: (平均相关 [S, B, H], 高相关掩码 [S, B, H], 后5天close_minus_open相关 [S, B, H])
+        """
+        hit_index, hit_avg, hit_cmo = cpu_hits
+        selected = (hit_index[:, 1] >= day_start) & (hit_index[:, 1] < day_end)
+        s_idx = hit_index[selected, 0]
+        b_idx = hit_index[selected, 1] - day_start
+        h_idx = hit_index[selected, 2]
+        avg_correlations = torch.zeros(dense_shape, dtype=self.tensor_dtype, device=self.device)
+        high_corr_mask = torch.zeros(dense_shape, dtype=torch.bool, device=self.device)
+        corr5_cmo = torch.zeros(dense_shape, dtype=self.tensor_dtype, device=self.device)
+        avg_correlations[s_idx, b_idx, h_idx] = hit_avg[selected].to(self.tensor_dtype)
+        high_corr_mask[s_idx, b_idx, h_idx] = True
+        corr5_cmo[s_idx, b_idx, h_idx] = hit_cmo[selected].to(self.tensor_dtype)
+        return avg_correlations, high_corr_mask, corr5_cmo
+    
+    def _cascade_finalize(self, pair_index, pair_corr, dense_shape, cascade_order, thr_10, thr_5, self_correlation_threshold):
+        """
+        对级联幸存配对应用单字段阈值、平均相关阈值和自相关过滤，并散布回稠密结果张量
+        
+        未进入最终幸存集合的配对在输出中为0/False（下游只读取高相关位置的数值）。
+        
+        Returns:
+            tuple: (平均相关 [S, B, H], 高相关掩码 [S, B, H], 后5天close_minus_open相关 [S, B, H])
+        """
+        avg_correlations = torch.zeros(dense_shape, dtype=pair_corr.dtype, device=pair_corr.device)
+        high_corr_mask = torch.zeros(dense_shape, dtype=torch.bool, device=pair_corr.device)
+        corr5_cmo = torch.zeros(dense_shape, dtype=pair_corr.dtype, device=pair_corr.device)
+        if pair_index.shape[0] == 0:
+            return avg_correlations, high_corr_mask, corr5_cmo
+        
+        w3 = torch.tensor([1.0/3.0, 1.0/3.0, 1.0/3.0], dtype=self.tensor_dtype, device=self.device)
+        avg_10 = (pair_corr[:, :3] * w3.view(1, 3)).sum(dim=1)
+        avg_5 = (pair_corr[:, 3:] * w3.view(1, 3)).sum(dim=1)
+        # 任一通道或任一段平均值接近1视为自相关
+        field_self_mask = (
+            (pair_corr >= self_correlation_threshold).any(dim=1)
+            | (avg_10 >= self_correlation_threshold)
+            | (avg_5 >= self_correlation_threshold)
+        )
+        hit = ~field_self_mask
+        for channel, thr in cascade_order:
+            hit &= pair_corr[:, channel] > thr
+        if thr_10 is not None:
+            hit &= avg_10 > thr_10
+        if thr_5 is not None:
+            hit &= avg_5 > thr_5
+        
+        s_idx, b_idx, h_idx = pair_index[:, 0], pair_index[:, 1], pair_index[:, 2]
+        avg_correlations[s_idx, b_idx, h_idx] = avg_10.masked_fill(field_self_mask, 0.0)
+        high_corr_mask[s_idx, b_idx, h_idx] = hit
+        corr5_cmo[s_idx, b_idx, h_idx] = pair_corr[:, 3].masked_fill(field_self_mask, 0.0)
+        return avg_correlations, high_corr_mask, corr5_cmo
+
     def _compute_and_process_correlations_gpu(self, batch_recent_data, historical_tensor, 
                                             period_info_list, evaluation_days, evaluation_dates, 
                                             num_stocks, is_multi_stock, stock_codes=None, valid_mask=None):
@@ -1586,6 +2039,44 @@ class GPUBatchPearsonAnalyzer:
         else:
             hist_norm_5 = None
 
+        histogram_needed = self.enable_histogram and self.histogram_interval
+        
+        # CPU多进程后端：历史分区并行计算并筛选，只回传稀疏命中（需要完整相关矩阵时不启用）
+        cpu_hits = None
+        if self.device.type == 'cpu' and self.cpu_workers > 1 and not self.debug and not histogram_needed:
+            self.start_timer('cpu_parallel_correlation', parent_timer='gpu_step3_integrated_correlation_processing')
+            cpu_hits = self._get_cpu_backend(historical_tensor).compute_hits(batch_recent_data, valid_mask, {
+                'first_len': first_len,
+                'second_len': second_len,
+                'threshold_10': float(self.threshold_10) if self.threshold_10 is not None else None,
+                'threshold_5': float(self.threshold_5) if self.threshold_5 is not None else None,
+                'field_thresholds_10': [self.threshold_close_minus_open_10, self.threshold_close_10, self.threshold_volume_10],
+                'field_thresholds_5': [self.threshold_close_minus_open_5, self.threshold_close_5, self.threshold_volume_5],
+                'self_correlation_threshold': 0.9999,
+                'day_chunk': batch_size,
+            })
+            self.end_timer('cpu_parallel_correlation')
+        
+        # IVF索引：以被索引段的平均相关阈值为界获取候选配对，精确计算只复核候选
+        ann_index = None
+        if cpu_hits is None and self.ann_index and hist_norm_5 is not None and not self.debug and not histogram_needed:
+            ann_thresholds = (self.threshold_10, self.threshold_5)
+            self._ann_segment = 0 if self.threshold_10 is not None else 1
+            ann_threshold = ann_thresholds[self._ann_segment]
+            if ann_threshold is not None:
+                ann_index = self._get_ann_index(historical_tensor, (hist_norm_10, hist_norm_5)[self._ann_segment])
+        
+        # 级联筛选：配置了单字段阈值、且不需要完整相关矩阵（debug明细、直方图）时启用；
+        # IVF候选同样由级联路径计算和筛选，未启用级联筛选时也需要单字段阈值和后5天平均阈值
+        cascade_order = None
+        cascade_thr_5 = None
+        if (cpu_hits is None and (self.cascade_filter or ann_index is not None) and hist_norm_5 is not None
+                and not self.debug and not histogram_needed):
+            cascade_order = self._get_cascade_order(batch_recent_data, hist_norm_10, hist_norm_5, first_len, second_len)
+            if self.threshold_5 is not None:
+                cascade_thr_5 = torch.tensor(float(self.threshold_5), device=self.device, dtype=self.tensor_dtype)
+        use_cascade = self.cascade_filter and bool(cascade_order)
+
         for batch_idx, i in enumerate(range(0, evaluation_days, batch_size)):
             end_idx = min(i + batch_size, evaluation_days)
             current_batch = batch_recent_data[:, i:end_idx]  # [num_stocks, batch_size, window_size, 3]
@@ -1601,85 +2092,129 @@ class GPUBatchPearsonAnalyzer:
             
             # 计算当前批次的相关系数 - 支持多股票
             self.end_timer('gpu_step3_integrated_misc')
-            self.start_timer('gpu_step3_correlation_matrix', parent_timer='gpu_step3_integrated_correlation_processing')
-            recent_first = current_batch[:, :, :first_len, :]
-            center_r1 = recent_first - recent_first.mean(dim=2, keepdim=True)
-            denom_r1 = torch.sqrt((center_r1 ** 2).sum(dim=2, keepdim=True) + 1e-8)
-            recent_norm_10 = center_r1 / denom_r1
-            corr1 = torch.einsum('sblf,hlf->sbhf', recent_norm_10, hist_norm_10)
-            if second_len > 0 and hist_norm_5 is not None:
-                recent_second = current_batch[:, :, -second_len:, :]
-                center_r2 = recent_second - recent_second.mean(dim=2, keepdim=True)
-                denom_r2 = torch.sqrt((center_r2 ** 2).sum(dim=2, keepdim=True) + 1e-8)
-                recent_norm_5 = center_r2 / denom_r2
-                corr2 = torch.einsum('sblf,hlf->sbhf', recent_norm_5, hist_norm_5)
-                batch_correlations = torch.cat([corr1, corr2], dim=3)
+            candidate_index = None
+            if use_cascade or ann_index is not None:
+                recent_norms = (
+                    self._normalize_recent_segment(current_batch[:, :, :first_len, :]),
+                    self._normalize_recent_segment(current_batch[:, :, -second_len:, :]),
+                )
+                if ann_index is not None:
+                    self.start_timer('gpu_step3_ann_search', parent_timer='gpu_step3_integrated_correlation_processing')
+                    candidate_index = self._ann_candidate_pairs(
+                        ann_index, recent_norms[self._ann_segment], (hist_norm_10, hist_norm_5)[self._ann_segment],
+                        ann_threshold, current_mask
+                    )
+                    self.end_timer('gpu_step3_ann_search')
+            if cpu_hits is not None:
+                # 多进程后端已完成计算与筛选，这里只把本批次的命中散布为稠密结果
+                self.start_timer('gpu_step3_correlation_filtering', parent_timer='gpu_step3_integrated_correlation_processing')
+                batch_avg_correlations_filtered, batch_high_corr_mask, batch_corr5_cmo = self._scatter_cpu_hits(
+                    cpu_hits, i, end_idx, current_batch.shape[:2] + (historical_tensor.shape[0],)
+                )
+                batch_high_corr_counts = batch_high_corr_mask.sum(dim=2)  # [num_stocks, batch_size]
+                self.end_timer('gpu_step3_correlation_filtering')
+                self.start_timer('gpu_step3_integrated_misc', parent_timer='gpu_step3_integrated_correlation_processing')
+                all_corr5_close_minus_open.append(batch_corr5_cmo)
+            elif use_cascade or candidate_index is not None:
+                # 级联筛选：最具选择性的字段阈值先在全部配对（或索引候选）上计算，其余字段只对幸存配对计算
+                self.start_timer('gpu_step3_correlation_matrix', parent_timer='gpu_step3_integrated_correlation_processing')
+                pair_index, pair_corr, exact_channels = self._cascade_pair_correlations(
+                    recent_norms, (hist_norm_10, hist_norm_5), cascade_order or [], current_mask, candidate_index
+                )
+                pair_corr = self._cascade_exact_recheck(
+                    recent_norms, (hist_norm_10, hist_norm_5), pair_index, pair_corr, exact_channels,
+                    cascade_order or [], thr_10, cascade_thr_5, self_correlation_threshold
+                )
+                self.end_timer('gpu_step3_correlation_matrix')
+                self.start_timer('gpu_step3_correlation_filtering', parent_timer='gpu_step3_integrated_correlation_processing')
+                batch_avg_correlations_filtered, batch_high_corr_mask, batch_corr5_cmo = self._cascade_finalize(
+                    pair_index, pair_corr, current_batch.shape[:2] + (historical_tensor.shape[0],),
+                    cascade_order or [], thr_10, cascade_thr_5, self_correlation_threshold
+                )
+                batch_high_corr_counts = batch_high_corr_mask.sum(dim=2)  # [num_stocks, batch_size]
+                self.end_timer('gpu_step3_correlation_filtering')
+                self.start_timer('gpu_step3_integrated_misc', parent_timer='gpu_step3_integrated_correlation_processing')
+                all_corr5_close_minus_open.append(batch_corr5_cmo)
             else:
-                batch_correlations = corr1
-            self.end_timer('gpu_step3_correlation_matrix')
-            # batch_correlations: [num_stocks, batch_size, num_historical_periods, 3]
+                self.start_timer('gpu_step3_correlation_matrix', parent_timer='gpu_step3_integrated_correlation_processing')
+                recent_first = current_batch[:, :, :first_len, :]
+                center_r1 = recent_first - recent_first.mean(dim=2, keepdim=True)
+                denom_r1 = torch.sqrt((center_r1 ** 2).sum(dim=2, keepdim=True) + 1e-8)
+                recent_norm_10 = center_r1 / denom_r1
+                corr1 = torch.einsum('sblf,hlf->sbhf', recent_norm_10, hist_norm_10)
+                if second_len > 0 and hist_norm_5 is not None:
+                    recent_second = current_batch[:, :, -second_len:, :]
+                    center_r2 = recent_second - recent_second.mean(dim=2, keepdim=True)
+                    denom_r2 = torch.sqrt((center_r2 ** 2).sum(dim=2, keepdim=True) + 1e-8)
+                    recent_norm_5 = center_r2 / denom_r2
+                    corr2 = torch.einsum('sblf,hlf->sbhf', recent_norm_5, hist_norm_5)
+                    batch_correlations = torch.cat([corr1, corr2], dim=3)
+                else:
+                    batch_correlations = corr1
+                self.end_timer('gpu_step3_correlation_matrix')
+                # batch_correlations: [num_stocks, batch_size, num_historical_periods, 3]
             
-            self.start_timer('gpu_step3_correlation_filtering', parent_timer='gpu_step3_integrated_correlation_processing')
-            w3 = torch.tensor([1.0/3.0, 1.0/3.0, 1.0/3.0], dtype=self.tensor_dtype, device=self.device)
-            corr_10 = batch_correlations[..., :3]
-            corr_5 = batch_correlations[..., 3:]
-            avg_10 = (corr_10 * w3.view(1, 1, 1, 3)).sum(dim=3)
-            avg_5 = (corr_5 * w3.view(1, 1, 1, 3)).sum(dim=3)
-            self_corr_mask_10 = avg_10 >= self_correlation_threshold
-            self_corr_mask_5 = avg_5 >= self_correlation_threshold
-            self_corr_mask = self_corr_mask_10 | self_corr_mask_5
-            batch_avg_correlations_filtered = avg_10.clone()
-            batch_avg_correlations_filtered[self_corr_mask] = 0.0
-            thr_5 = torch.tensor(float(self.threshold_5), device=self.device, dtype=self.tensor_dtype) if self.threshold_5 is not None else None
-            mask_10 = (batch_avg_correlations_filtered > thr_10) if thr_10 is not None else torch.ones_like(batch_avg_correlations_filtered, dtype=torch.bool)
-            mask_5 = (avg_5 > thr_5) if thr_5 is not None else torch.ones_like(avg_5, dtype=torch.bool)
-            batch_high_corr_mask = mask_10 & mask_5
-            ft_10 = [self.threshold_close_minus_open_10, self.threshold_close_10, self.threshold_volume_10]
-            ft_5 = [self.threshold_close_minus_open_5, self.threshold_close_5, self.threshold_volume_5]
-            for f_idx, f_thr in enumerate(ft_10):
-                if f_thr is not None:
-                    f_thr_t = torch.tensor(float(f_thr), device=self.device, dtype=self.tensor_dtype)
-                    f_mask = corr_10[..., f_idx] > f_thr_t
-                    batch_high_corr_mask = batch_high_corr_mask & f_mask
-            for f_idx, f_thr in enumerate(ft_5):
-                if f_thr is not None:
-                    f_thr_t = torch.tensor(float(f_thr), device=self.device, dtype=self.tensor_dtype)
-                    f_mask = corr_5[..., f_idx] > f_thr_t
-                    batch_high_corr_mask = batch_high_corr_mask & f_mask
-            field_self_mask = (
-                (corr_10[..., 0] >= self_correlation_threshold)
-                | (corr_10[..., 1] >= self_correlation_threshold)
-                | (corr_10[..., 2] >= self_correlation_threshold)
-                | (corr_5[..., 0] >= self_correlation_threshold)
-                | (corr_5[..., 1] >= self_correlation_threshold)
-                | (corr_5[..., 2] >= self_correlation_threshold)
-            )
-            batch_avg_correlations_filtered[field_self_mask] = 0.0
-            batch_high_corr_mask = batch_high_corr_mask & (~field_self_mask)
+                self.start_timer('gpu_step3_correlation_filtering', parent_timer='gpu_step3_integrated_correlation_processing')
+                w3 = torch.tensor([1.0/3.0, 1.0/3.0, 1.0/3.0], dtype=self.tensor_dtype, device=self.device)
+                corr_10 = batch_correlations[..., :3]
+                corr_5 = batch_correlations[..., 3:]
+                avg_10 = (corr_10 * w3.view(1, 1, 1, 3)).sum(dim=3)
+                avg_5 = (corr_5 * w3.view(1, 1, 1, 3)).sum(dim=3)
+                self_corr_mask_10 = avg_10 >= self_correlation_threshold
+                self_corr_mask_5 = avg_5 >= self_correlation_threshold
+                self_corr_mask = self_corr_mask_10 | self_corr_mask_5
+                batch_avg_correlations_filtered = avg_10.clone()
+                batch_avg_correlations_filtered[self_corr_mask] = 0.0
+                thr_5 = torch.tensor(float(self.threshold_5), device=self.device, dtype=self.tensor_dtype) if self.threshold_5 is not None else None
+                mask_10 = (batch_avg_correlations_filtered > thr_10) if thr_10 is not None else torch.ones_like(batch_avg_correlations_filtered, dtype=torch.bool)
+                mask_5 = (avg_5 > thr_5) if thr_5 is not None else torch.ones_like(avg_5, dtype=torch.bool)
+                batch_high_corr_mask = mask_10 & mask_5
+                ft_10 = [self.threshold_close_minus_open_10, self.threshold_close_10, self.threshold_volume_10]
+                ft_5 = [self.threshold_close_minus_open_5, self.threshold_close_5, self.threshold_volume_5]
+                for f_idx, f_thr in enumerate(ft_10):
+                    if f_thr is not None:
+                        f_thr_t = torch.tensor(float(f_thr), device=self.device, dtype=self.tensor_dtype)
+                        f_mask = corr_10[..., f_idx] > f_thr_t
+                        batch_high_corr_mask = batch_high_corr_mask & f_mask
+                for f_idx, f_thr in enumerate(ft_5):
+                    if f_thr is not None:
+                        f_thr_t = torch.tensor(float(f_thr), device=self.device, dtype=self.tensor_dtype)
+                        f_mask = corr_5[..., f_idx] > f_thr_t
+                        batch_high_corr_mask = batch_high_corr_mask & f_mask
+                field_self_mask = (
+                    (corr_10[..., 0] >= self_correlation_threshold)
+                    | (corr_10[..., 1] >= self_correlation_threshold)
+                    | (corr_10[..., 2] >= self_correlation_threshold)
+                    | (corr_5[..., 0] >= self_correlation_threshold)
+                    | (corr_5[..., 1] >= self_correlation_threshold)
+                    | (corr_5[..., 2] >= self_correlation_threshold)
+                )
+                batch_avg_correlations_filtered[field_self_mask] = 0.0
+                batch_high_corr_mask = batch_high_corr_mask & (~field_self_mask)
 
-            # 应用评测掩码：将无效窗口的平均相关与掩码置零
-            if current_mask is not None:
-                # 扩展到历史期间维度
-                mask_3d = current_mask.unsqueeze(2).expand(-1, -1, batch_avg_correlations_filtered.shape[2])
-                invalid_3d = ~mask_3d
-                batch_avg_correlations_filtered[invalid_3d] = 0.0
-                batch_high_corr_mask[invalid_3d] = False
+                # 应用评测掩码：将无效窗口的平均相关与掩码置零
+                if current_mask is not None:
+                    # 扩展到历史期间维度
+                    mask_3d = current_mask.unsqueeze(2).expand(-1, -1, batch_avg_correlations_filtered.shape[2])
+                    invalid_3d = ~mask_3d
+                    batch_avg_correlations_filtered[invalid_3d] = 0.0
+                    batch_high_corr_mask[invalid_3d] = False
 
-            # GPU端计算每个评测日期的高相关数量
-            batch_high_corr_counts = batch_high_corr_mask.sum(dim=2)  # [num_stocks, batch_size]
-            self.end_timer('gpu_step3_correlation_filtering')
-            self.start_timer('gpu_step3_integrated_misc', parent_timer='gpu_step3_integrated_correlation_processing')
-            try:
-                if corr_5.shape[-1] > 0:
-                    batch_corr5_cmo = corr_5[..., 0].clone()
-                    batch_corr5_cmo[field_self_mask] = 0.0
-                    if current_mask is not None:
-                        batch_corr5_cmo[invalid_3d] = 0.0
-                else:
-                    batch_corr5_cmo = torch.zeros_like(batch_avg_correlations_filtered)
-                all_corr5_close_minus_open.append(batch_corr5_cmo)
-            except Exception:
-                all_corr5_close_minus_open.append(torch.zeros_like(batch_avg_correlations_filtered))
+                # GPU端计算每个评测日期的高相关数量
+                batch_high_corr_counts = batch_high_corr_mask.sum(dim=2)  # [num_stocks, batch_size]
+                self.end_timer('gpu_step3_correlation_filtering')
+                self.start_timer('gpu_step3_integrated_misc', parent_timer='gpu_step3_integrated_correlation_processing')
+                try:
+                    if corr_5.shape[-1] > 0:
+                        batch_corr5_cmo = corr_5[..., 0].clone()
+                        batch_corr5_cmo[field_self_mask] = 0.0
+                        if current_mask is not None:
+                            batch_corr5_cmo[invalid_3d] = 0.0
+                    else:
+                        batch_corr5_cmo = torch.zeros_like(batch_avg_correlations_filtered)
+                    all_corr5_close_minus_open.append(batch_corr5_cmo)
+                except Exception:
+                    all_corr5_close_minus_open.append(torch.zeros_like(batch_avg_correlations_filtered))
             # 🔧 Debug：输出筛选过程与结果统计
             if self.debug:
                 try:
@@ -1729,6 +2264,9 @@ class GPUBatchPearsonAnalyzer:
             if self.debug and batch_idx % max(1, total_batches // 5) == 0:  # 每20%进度监控一次
                 self.monitor_gpu_memory(f"GPU批次{batch_idx + 1}完成")
         
+        if ann_index is not None:
+            self._log_ann_stats()
+        
         # 合并所有批次的结果（仍在GPU上）- 支持多股票
         self.end_timer('gpu_step3_integrated_misc')
         self.start_timer('gpu_step3_batch_merging', parent_timer='gpu_step3_integrated_correlation_processing')
@@ -1813,9 +2351,9 @@ class GPUBatchPearsonAnalyzer:
         if evaluation_dates and len(evaluation_dates) > 0:
             self.logger.debug(f"🔍 进入detailed_results构建分支")
             # 传输必要的数据到CPU进行详细结果构建
-            avg_correlations_cpu = all_avg_correlations_tensor.cpu().numpy()
-            high_corr_masks_cpu = all_high_corr_masks_tensor.cpu().numpy()
-            corr5_cmo_cpu = all_corr5_cmo_tensor.cpu().numpy()
+            avg_correlations_cpu = self._to_host(all_avg_correlations_tensor).numpy()
+            high_corr_masks_cpu = self._to_host(all_high_corr_masks_tensor).numpy()
+            corr5_cmo_cpu = self._to_host(all_corr5_cmo_tensor).numpy()
             
             if is_multi_stock:
                 self.logger.debug(f"🔍 多股票模式detailed_results构建")
@@ -1940,8 +2478,8 @@ class GPUBatchPearsonAnalyzer:
         batch_results = {
             'evaluation_days': evaluation_days,
             'num_historical_periods': len(period_info_list),
-            'high_correlation_counts': all_high_corr_counts_tensor.cpu().tolist(),
-            'avg_correlations': all_avg_correlations_tensor.cpu().tolist(),
+            'high_correlation_counts': self._to_host(all_high_corr_counts_tensor).tolist(),
+            'avg_correlations': self._to_host(all_avg_correlations_tensor).tolist(),
             'period_info': period_info_list,
             'detailed_results': detailed_results,
             'summary': {
@@ -3146,6 +3684,20 @@ class GPUBatchPearsonAnalyzer:
         Returns:
             dict: 批量分析结果
         """
+        try:
+            return self._run_batch_analysis(backtest_date, evaluation_days, window_size, threshold,
+                                            comparison_mode, comparison_stocks, debug)
+        finally:
+            # 提前返回或异常时也写完已排队的结果、释放CPU多进程后端；常驻模式保留写入线程和进程池供下一次查询使用
+            if self.resident_pool:
+                self.result_writer.flush()
+            else:
+                self.result_writer.close()
+                self._close_cpu_backend()
+    
+    def _run_batch_analysis(self, backtest_date, evaluation_days, window_size, threshold,
+                            comparison_mode, comparison_stocks, debug):
+        """批量分析流程（参数含义见 analyze_batch）"""
         self.start_timer('total_batch_analysis')
         # 记录墙钟起始时间，便于在日志中提供首尾时间与总耗时摘要
         try:
@@ -3340,8 +3892,10 @@ class GPUBatchPearsonAnalyzer:
         except Exception:
             pass
         
-        # 输出性能总结
+        # 等待后台写入完成后再输出性能总结
+        self._flush_result_writer()
         self._log_performance_summary()
+        self._export_performance_profile()
         
         # 最终GPU显存监控（仅在debug模式）
         if self.debug:
@@ -3402,98 +3956,57 @@ class GPUBatchPearsonAnalyzer:
         return final_result
     
     def _collect_historical_periods_data(self):
-        """收集历史期间数据（合并了对比股票数据加载逻辑）"""
+        """收集历史期间数据（合并了对比股票数据加载逻辑），结果为紧凑的 HistoricalWindowPool"""
         self.start_timer('historical_data_collection')
         
-        self.historical_periods_data = []
+        self.historical_periods_data = HistoricalWindowPool(self.window_size, self.pool_dtype)
         
         # 检查self_only模式的特殊情况
         if self.comparison_mode == 'self_only':
             self.logger.info("📈 使用自身历史数据对比模式")
             # 在self_only模式下，收集目标股票自身的历史数据
-            self_historical_data = self._collect_self_historical_data()
-            self.historical_periods_data.extend(self_historical_data)
-            self.logger.info(f"收集到 {len(self.historical_periods_data)} 个历史期间数据")
-            self.end_timer('historical_data_collection')
-            return self.historical_periods_data
-        
+            self._collect_self_historical_data(self.historical_periods_data)
         # 对比股票数据已经在load_data中加载，无需重复加载
-        
-        # 收集对比股票历史数据
-        # 根据股票数量决定是否使用多进程
-        if len(self.loaded_stocks_data) >= 10 and self.num_processes > 1:
-            comparison_historical_data = self._collect_comparison_historical_data_multiprocess()
+        # 收集对比股票历史数据，根据股票数量决定是否使用多进程
+        elif len(self.loaded_stocks_data) >= 10 and self.num_processes > 1:
+            self._collect_comparison_historical_data_multiprocess(self.historical_periods_data)
         else:
-            comparison_historical_data = self._collect_comparison_historical_data()
-        self.historical_periods_data.extend(comparison_historical_data)
+            self._collect_comparison_historical_data(self.historical_periods_data)
+        self.historical_periods_data.finalize()
         
-        self.logger.info(f"收集到 {len(self.historical_periods_data)} 个历史期间数据")
+        self.logger.info(f"收集到 {len(self.historical_periods_data)} 个历史期间数据 "
+                         f"(窗口池 {self.pool_dtype}, {self.historical_periods_data.nbytes / 1024**2:.1f}MB)")
         self.end_timer('historical_data_collection')
         return self.historical_periods_data
     
-
-
-    
-    def _collect_comparison_historical_data(self):
-        """收集对比股票历史数据（已优化：直接筛选和预处理）"""
-        historical_data = []
+    def _collect_comparison_historical_data(self, pool):
+        """收集对比股票历史数据（已优化：直接切分窗口并编码写入窗口池）"""
         total_valid_periods = 0
-        total_invalid_periods = 0
         processed_stocks = 0
         
-        # 定义需要的字段（仅保留3列）
-        fields = ['close_minus_open', 'close', 'volume']
-        
         for stock_code, stock_data in self.loaded_stocks_data.items():
             # 使用所有可用数据，不进行日期截断
-            available_data = stock_data
-            
-            if len(available_data) < self.window_size:
+            chunk = encode_stock_windows(stock_data, self.window_size, 1, self.pool_dtype)
+            if chunk is None:
                 if self.debug:
-                    self.logger.info(f"股票 {stock_code} 数据长度 {len(available_data)} 小于窗口大小 {self.window_size}，跳过")
+                    self.logger.info(f"股票 {stock_code} 数据长度 {len(stock_data)} 小于窗口大小 {self.window_size}，跳过")
                 continue
             
-            stock_valid_periods = 0
-            stock_invalid_periods = 0
-            
-            # 生成该股票的历史期间并直接进行筛选和预处理
-            for i in range(len(available_data) - self.window_size + 1):
-                period_data = available_data.iloc[i:i + self.window_size]
-                
-                # 检查数据长度是否正确
-                if len(period_data) == self.window_size:
-                    start_date = period_data.index[0]
-                    end_date = period_data.index[-1]
-                    
-                    # 直接提取并预处理数据（3列）: close-open 差, close, volume
-                    diff_values = (period_data['close'].values - period_data['open'].values)
-                    historical_values = np.stack([
-                        diff_values,
-                        period_data['close'].values,
-                        period_data['volume'].values
-                    ], axis=1)
-                    
-                    # 存储预处理后的数据
-                    historical_data.append((historical_values, start_date, end_date, stock_code))
-                    stock_valid_periods += 1
-                    total_valid_periods += 1
-                else:
-                    stock_invalid_periods += 1
-                    total_invalid_periods += 1
-            
+            pool.append(stock_code, chunk)
+            total_valid_periods += len(chunk['codes'])
             processed_stocks += 1
             
             # 每处理100只股票打印一次进度
             if processed_stocks % 100 == 0:
                 self.logger.info(f"对比股票数据收集进度: {processed_stocks}/{len(self.loaded_stocks_data)} 只股票")
         
-        self.logger.info(f"对比股票历史数据收集完成: 处理股票={processed_stocks}, 有效期间={total_valid_periods}, 无效期间={total_invalid_periods}")
-        return historical_data
+        self.logger.info(f"对比股票历史数据收集完成: 处理股票={processed_stocks}, 有效期间={total_valid_periods}, 无效期间=0")
+        return pool
     
-    def _collect_comparison_historical_data_multiprocess(self):
+    def _collect_comparison_historical_data_multiprocess(self, pool):
         """收集对比股票历史数据（多进程版本）"""
         if not self.loaded_stocks_data:
-            return []
+            return pool
         
         # 定义需要的字段（仅保留3列）
         fields = ['close_minus_open', 'close', 'volume']
@@ -3501,27 +4014,27 @@ class GPUBatchPearsonAnalyzer:
         # 准备多进程任务参数
         tasks = []
         for stock_code, stock_data in self.loaded_stocks_data.items():
-            tasks.append((stock_code, stock_data, self.window_size, fields, self.debug, self.historical_stride))
+            tasks.append((stock_code, stock_data, self.window_size, fields, self.debug, self.historical_stride, self.pool_dtype))
         
         self.logger.debug(f"🚀 启动多进程数据预处理: {len(tasks)} 只股票，{self.num_processes} 个进程")
         
-        historical_data = []
+        chunks = []
         total_valid_periods = 0
         total_invalid_periods = 0
         processed_stocks = 0
         
         try:
             # 使用进程池处理任务
-            with mp.Pool(processes=self.num_processes) as pool:
+            with mp.Pool(processes=self.num_processes) as mp_pool:
                 # 分批处理以显示进度
                 batch_size = max(1, len(tasks) // 10)  # 分成10批显示进度
                 
                 for i in range(0, len(tasks), batch_size):
                     batch_tasks = tasks[i:i + batch_size]
-                    batch_results = pool.map(_process_stock_historical_data_worker, batch_tasks)
+                    batch_results = mp_pool.map(_process_stock_historical_data_worker, batch_tasks)
                     
                     # 处理批次结果
-                    for stock_code, stock_historical_data, stats in batch_results:
+                    for stock_code, chunk, stats in batch_results:
                         if 'error' in stats:
                             if self.debug:
                                 self.logger.warning(f"股票 {stock_code} 处理出错: {stats['error']}")
@@ -3533,7 +4046,7 @@ class GPUBatchPearsonAnalyzer:
                             continue
                         
                         # 添加到总结果中
-                        historical_data.extend(stock_historical_data)
+                        chunks.append((stock_code, chunk))
                         total_valid_periods += stats['valid_periods']
                         total_invalid_periods += stats['invalid_periods']
                         processed_stocks += 1
@@ -3544,67 +4057,28 @@ class GPUBatchPearsonAnalyzer:
         
         except Exception as e:
             self.logger.error(f"多进程处理出错，回退到单进程模式: {str(e)}")
-            return self._collect_comparison_historical_data(earliest_eval_date)
+            return self._collect_comparison_historical_data(pool)
         
+        for stock_code, chunk in chunks:
+            pool.append(stock_code, chunk)
         self.logger.info(f"✅ 多进程对比股票历史数据收集完成: 处理股票={processed_stocks}, 有效期间={total_valid_periods}, 无效期间={total_invalid_periods}")
-        return historical_data
+        return pool
     
-    def _collect_self_historical_data(self):
+    def _collect_self_historical_data(self, pool):
         """收集目标股票自身的历史数据（用于self_only模式）"""
-        historical_data = []
-        
         if self.data is None or self.data.empty:
             self.logger.warning(f"目标股票 {self.stock_code} 数据为空，无法收集历史数据")
-            return historical_data
-        
-        # 定义需要的字段（仅保留3列）
-        fields = ['open', 'close', 'volume']
+            return pool
         
         # 使用目标股票的所有可用数据
-        available_data = self.data
-        
-        if len(available_data) < self.window_size:
-            self.logger.warning(f"目标股票 {self.stock_code} 数据长度 {len(available_data)} 小于窗口大小 {self.window_size}")
-            return historical_data
-        
-        valid_periods = 0
-        invalid_periods = 0
-        
-        # 生成目标股票的历史期间数据
-        for i in range(0, len(available_data) - self.window_size + 1, max(1, self.historical_stride)):
-            period_data = available_data.iloc[i:i + self.window_size]
-            
-            # 检查数据长度是否正确
-            if len(period_data) == self.window_size:
-                start_date = period_data.index[0]
-                end_date = period_data.index[-1]
-                
-                # 直接提取并预处理数据（3列）: close-open 差, close, volume
-                diff_values = (period_data['close'].values - period_data['open'].values)
-                historical_values = np.stack([
-                    diff_values,
-                    period_data['close'].values,
-                    period_data['volume'].values
-                ], axis=1)
-                
-                # 存储预处理后的数据
-                historical_data.append((historical_values, start_date, end_date, self.stock_code))
-                valid_periods += 1
-            else:
-                invalid_periods += 1
-        
-        self.logger.info(f"目标股票 {self.stock_code} 历史数据收集完成: 有效期间={valid_periods}, 无效期间={invalid_periods}")
-        return historical_data
-    
-
-    
-
-    
-
-    
-
-    
-
+        chunk = encode_stock_windows(self.data, self.window_size, self.historical_stride, self.pool_dtype)
+        if chunk is None:
+            self.logger.warning(f"目标股票 {self.stock_code} 数据长度 {len(self.data)} 小于窗口大小 {self.window_size}")
+            return pool
+        
+        pool.append(self.stock_code, chunk)
+        self.logger.info(f"目标股票 {self.stock_code} 历史数据收集完成: 有效期间={len(chunk['codes'])}, 无效期间=0")
+        return pool
     
     def monitor_gpu_memory(self, stage_name):
         """监控GPU显存使用情况"""
@@ -3917,6 +4391,8 @@ class GPUBatchPearsonAnalyzer:
                 
                 # 批次总耗时计时开始
                 batch_total_start_wall = time.time()
+                if self.perf_recorder is not None:
+                    self.perf_recorder.current_batch = batch_idx
                 self.start_timer('batch_total_time')
                 self.logger.info(f"🔄 处理第 {batch_idx + 1}/{total_batches} 批: {current_batch_units} 个计算单元")
                 
@@ -3967,7 +4443,7 @@ class GPUBatchPearsonAnalyzer:
                 batch_valid_mask = None
                 try:
                     if batch_mask_flags:
-                        batch_valid_mask = torch.tensor(batch_mask_flags, dtype=torch.bool, device=self.device).unsqueeze(0)
+                        batch_valid_mask = self._to_device(torch.tensor(batch_mask_flags, dtype=torch.bool)).unsqueeze(0)
                 except Exception:
                     batch_valid_mask = None
                 
@@ -4006,9 +4482,10 @@ class GPUBatchPearsonAnalyzer:
                 self.start_timer('gpu_step3_integrated_correlation_processing')
                 # 调用不带计时器的GPU计算函数
                 self._global_batch_idx = batch_idx
-                batch_correlations = self._calculate_batch_gpu_correlation_no_timer(
-                    gpu_tensor_data, historical_periods_data, batch_dates_list, stock_codes=batch_evaluation_unit_stock_codes, valid_mask=batch_valid_mask
-                )
+                with self._torch_profile_context(batch_idx):
+                    batch_correlations = self._calculate_batch_gpu_correlation_no_timer(
+                        gpu_tensor_data, historical_periods_data, batch_dates_list, stock_codes=batch_evaluation_unit_stock_codes, valid_mask=batch_valid_mask
+                    )
                 self.end_timer('gpu_step3_integrated_correlation_processing')
                 
                 if self.debug:
@@ -4119,6 +4596,8 @@ class GPUBatchPearsonAnalyzer:
                 batch_size = len(batch_dates)
                 # 批次总耗时计时开始
                 batch_total_start_wall = time.time()
+                if self.perf_recorder is not None:
+                    self.perf_recorder.current_batch = batch_idx
                 self.start_timer('batch_total_time')
                 self.logger.debug(f"🔄 处理第 {batch_idx + 1}/{total_batches} 批: {batch_size} 个评测日期")
                 self.logger.info(f"📅 日期范围: {batch_dates[0]} 到 {batch_dates[-1]}")
@@ -4167,9 +4646,10 @@ class GPUBatchPearsonAnalyzer:
                 self.end_timer('batch_units_preparation')
                 
                 self._global_batch_idx = batch_idx
-                batch_correlations = self.calculate_batch_gpu_correlation_optimized(
-                    batch_recent_subset, historical_periods_data, batch_dates, stock_codes=batch_evaluation_unit_stock_codes, valid_mask=batch_valid_mask
-                )
+                with self._torch_profile_context(batch_idx):
+                    batch_correlations = self.calculate_batch_gpu_correlation_optimized(
+                        batch_recent_subset, historical_periods_data, batch_dates, stock_codes=batch_evaluation_unit_stock_codes, valid_mask=batch_valid_mask
+                    )
                 if self.debug:
                     self.monitor_gpu_memory(f"批次 {batch_idx + 1} 完成")
                 self.logger.info(f"🚀 [批次 {batch_idx + 1}] GPU计算与结果处理 - 完成")
@@ -4202,6 +4682,9 @@ class GPUBatchPearsonAnalyzer:
                 
                 self.logger.info(f"✅ 批次 {batch_idx + 1} 处理完成，累计高相关性期间: {merged_results['batch_results']['summary']['total_high_correlations']}")
         
+        if self.perf_recorder is not None:
+            self.perf_recorder.current_batch = None
+        
         # 计算最终平均值
         total_days = len(valid_dates)
         if total_days > 0:
@@ -4230,8 +4713,10 @@ class GPUBatchPearsonAnalyzer:
             self.logger.info(f"📊 总计处理: {total_days} 个评测日期，分 {total_batches} 批")
         self.logger.info(f"📈 总高相关性期间: {merged_results['batch_results']['summary']['total_high_correlations']}")
         
-        # 输出性能统计（分批处理模式）
+        # 等待后台写入完成后输出性能统计（分批处理模式）
+        self._flush_result_writer()
         self._log_performance_summary()
+        self._export_performance_profile()
         
         # 最终结果日志
         self.logger.debug(f"🏁 [最终结果] 准备返回merged_results")
@@ -4550,9 +5035,9 @@ class GPUBatchPearsonAnalyzer:
             self.logger.debug(f"💾 目标CSV文件: {self.csv_results_file}")
             self.logger.debug(f"💾 CSV文件是否存在: {os.path.exists(self.csv_results_file)}")
             
-            # 读取现有CSV文件
+            # 读取现有CSV文件（仅debug模式用于统计日志，正常运行不在批次循环内整表读取）
             self.logger.debug("💾 开始读取现有CSV文件...")
-            if os.path.exists(self.csv_results_file):
+            if self.debug and os.path.exists(self.csv_results_file):
                 try:
                     df = pd.read_csv(self.csv_results_file, encoding='utf-8-sig', dtype={'代码': str})
                     self.logger.debug(f"💾 成功读取现有CSV文件，现有记录数: {len(df)}")
@@ -4568,7 +5053,7 @@ class GPUBatchPearsonAnalyzer:
                     self.logger.debug("💾 创建空DataFrame作为备用")
             else:
                 df = pd.DataFrame()
-                self.logger.debug("💾 CSV文件不存在，创建空DataFrame")
+                self.logger.debug("💾 跳过读取现有CSV文件")
             
             # 构建评测单元列表 - 使用和批次处理时相同的逻辑
             evaluation_units = []
@@ -4695,63 +5180,52 @@ class GPUBatchPearsonAnalyzer:
                 self.logger.debug("💾 开始准备新数据写入...")
                 self.logger.debug(f"💾 待写入新数据行数: {len(new_rows)}")
                 
-                new_df = pd.DataFrame(new_rows)
+                columns = list(new_rows[0].keys())
                 self.end_timer('csv_data_prep')
-                self.logger.debug(f"💾 新DataFrame创建成功，列名: {list(new_df.columns)}")
-                
-                # 确保代码列为字符串类型
-                new_df['代码'] = new_df['代码'].astype(str)
-                
-                # 检查CSV文件是否存在，决定是否需要写入表头
-                file_exists = os.path.exists(self.csv_results_file) and os.path.getsize(self.csv_results_file) > 0
                 
-                # 使用追加模式写入CSV
-                self.logger.debug(f"💾 开始追加写入CSV文件 (文件已存在: {file_exists})...")
+                # 交给后台写入器追加（表头状态由写入器在内存中维护）；队列满时在此阻塞
+                self.logger.debug(f"💾 提交追加写入CSV文件: {len(new_rows)} 行")
                 self.start_timer('csv_write')
-                new_df.to_csv(
-                    self.csv_results_file, 
-                    mode='a' if file_exists else 'w',  # 如果文件存在则追加，否则新建
-                    header=not file_exists,  # 只有在文件不存在时才写入表头
-                    index=False, 
-                    encoding='utf-8-sig'
-                )
+                self.result_writer.append_rows(self.csv_results_file, new_rows, columns)
                 self.end_timer('csv_write')
                 
-                # 保存后验证
-                self.logger.debug(f"✅ CSV文件追加写入完成，新增 {len(new_rows)} 行数据")
-                try:
-                    # 验证文件是否存在
-                    if os.path.exists(self.csv_results_file):
-                        # 获取文件大小
-                        file_size = os.path.getsize(self.csv_results_file)
-                        file_size_mb = file_size / (1024 * 1024)
-                        self.logger.debug(f"✅ CSV文件验证 - 文件大小: {file_size} 字节 ({file_size_mb:.2f} MB)")
+                # 保存后验证（仅debug模式：需要等待后台写入完成并整表重读）
+                self.logger.debug(f"✅ CSV数据已提交写入，新增 {len(new_rows)} 行数据")
+                if self.debug:
+                    self.result_writer.flush()
+                    try:
+                        # 验证文件是否存在
+                        if os.path.exists(self.csv_results_file):
+                            # 获取文件大小
+                            file_size = os.path.getsize(self.csv_results_file)
+                            file_size_mb = file_size / (1024 * 1024)
+                            self.logger.debug(f"✅ CSV文件验证 - 文件大小: {file_size} 字节 ({file_size_mb:.2f} MB)")
                         
-                        # 重新读取文件验证行数
-                        verification_df = pd.read_csv(self.csv_results_file, encoding='utf-8-sig', dtype={'代码': str})
-                        actual_rows = len(verification_df)
-                        self.logger.debug(f"✅ CSV文件验证 - 实际行数: {actual_rows}")
-                        self.logger.debug(f"✅ CSV文件验证 - 列数: {len(verification_df.columns)}")
+                            # 重新读取文件验证行数
+                            verification_df = pd.read_csv(self.csv_results_file, encoding='utf-8-sig', dtype={'代码': str})
+                            actual_rows = len(verification_df)
+                            self.logger.debug(f"✅ CSV文件验证 - 实际行数: {actual_rows}")
+                            self.logger.debug(f"✅ CSV文件验证 - 列数: {len(verification_df.columns)}")
                         
-                        # 验证数据统计
-                        if actual_rows > 0:
-                            unique_stocks = verification_df['代码'].nunique() if '代码' in verification_df.columns else 0
-                            unique_dates = verification_df['评测日期'].nunique() if '评测日期' in verification_df.columns else 0
-                            self.logger.debug(f"✅ CSV文件验证 - 包含 {unique_stocks} 个股票, {unique_dates} 个评测日期")
+                            # 验证数据统计
+                            if actual_rows > 0:
+                                unique_stocks = verification_df['代码'].nunique() if '代码' in verification_df.columns else 0
+                                unique_dates = verification_df['评测日期'].nunique() if '评测日期' in verification_df.columns else 0
+                                self.logger.debug(f"✅ CSV文件验证 - 包含 {unique_stocks} 个股票, {unique_dates} 个评测日期")
                             
-                            # 显示最新的几条记录（前3行）
-                            if self.debug and actual_rows > 0:
-                                self.logger.debug("✅ CSV文件验证 - 最新3条记录:")
-                                for i, row in verification_df.head(3).iterrows():
-                                    self.logger.debug(f"✅   行{i+1}: {dict(row)}")
+                                # 显示最新的几条记录（前3行）
+                                if self.debug and actual_rows > 0:
+                                    self.logger.debug("✅ CSV文件验证 - 最新3条记录:")
+                                    for i, row in verification_df.head(3).iterrows():
+                                        self.logger.debug(f"✅   行{i+1}: {dict(row)}")
                         
+                            self.logger.debug(f"✅ 批量结果已成功保存到CSV文件: {self.csv_results_file}")
+                            self.logger.debug(f"✅ 本次新增 {len(new_rows)} 条逐日评测记录，文件总计 {actual_rows} 条记录")
+                        else:
+                            self.logger.error("❌ CSV文件保存后验证失败：文件不存在")
+                    except Exception as verify_error:
+                        self.logger.error(f"❌ CSV文件保存后验证时出错: {str(verify_error)}")
                         self.logger.debug(f"✅ 批量结果已成功保存到CSV文件: {self.csv_results_file}")
-                        self.logger.debug(f"✅ 本次新增 {len(new_rows)} 条逐日评测记录，文件总计 {actual_rows} 条记录")
-                    else:
-                        self.logger.error("❌ CSV文件保存后验证失败：文件不存在")
-                except Exception as verify_error:
-                    self.logger.error(f"❌ CSV文件保存后验证时出错: {str(verify_error)}")
-                    self.logger.debug(f"✅ 批量结果已成功保存到CSV文件: {self.csv_results_file}")
                 self.logger.debug(f"✅ 共保存 {len(new_rows)} 条逐日评测记录")
             else:
                 self.logger.warning("⚠️ 没有有效的评测结果需要保存")
@@ -4777,7 +5251,18 @@ def analyze_pearson_correlation_gpu_batch(stock_code, backtest_date=None, evalua
                                          historical_stride=1,
                                          histogram_interval=0,
                                          cleanup_every_n_batches=1,
-                                         enable_histogram=False):
+                                         enable_histogram=False,
+                                         profile_dir=None,
+                                         torch_profile_batches=None,
+                                         cascade_filter=True,
+                                         ann_index=False,
+                                         ann_nlist=None,
+                                         ann_nprobe=None,
+                                         ann_recall_sample=0,
+                                         pool_dtype='float32',
+                                         cpu_workers=0,
+                                         async_io=True,
+                                         pool_server=None):
     """
     GPU批量评测Pearson相关性分析的便捷函数
     
@@ -4796,6 +5281,17 @@ def analyze_pearson_correlation_gpu_batch(stock_code, backtest_date=None, evalua
         latest_date: 历史数据的日期上限 (格式: YYYY-MM-DD，仅对对比股票生效)
         comparison_date_count: 对比股票的日期总数限制（保留latest_date及其之前最近N个交易日，默认: 1000）
         evaluation_batch_size: 每批次处理的评测日期数量
+        profile_dir: 性能剖析导出目录（Chrome trace + 运行汇总 JSON），None 表示不导出
+        torch_profile_batches: 使用 torch.profiler 采集的批次编号列表（从1开始）
+        cascade_filter: 是否启用单字段阈值级联筛选
+        ann_index: 是否启用IVF历史窗口预索引
+        ann_nlist: IVF聚类数
+        ann_nprobe: 每个评测窗口最多探查的聚类数（None 表示不漏检）
+        ann_recall_sample: 每批用于统计索引召回率的抽样评测窗口数
+        pool_dtype: 历史窗口池存储精度（float32/float16/int8）
+        cpu_workers: CPU计算时按历史分区并行的进程数
+        async_io: 是否由后台线程缓冲写入结果CSV
+        pool_server: 常驻对比池服务地址（见 pool_server.py）；指定时先请求服务，服务不可用时回退到本地计算
         
     Returns:
         dict: 分析结果
@@ -4806,7 +5302,7 @@ def analyze_pearson_correlation_gpu_batch(stock_code, backtest_date=None, evalua
     if csv_filename is None:
         csv_filename = 'batch_evaluation_results.csv'
 
-    analyzer = GPUBatchPearsonAnalyzer(
+    analyzer_kwargs = dict(
         stock_code=stock_code,
         window_size=window_size,
         threshold_10=threshold_10,
@@ -4833,15 +5329,35 @@ def analyze_pearson_correlation_gpu_batch(stock_code, backtest_date=None, evalua
         historical_stride=historical_stride,
         histogram_interval=histogram_interval,
         cleanup_every_n_batches=cleanup_every_n_batches,
-        enable_histogram=enable_histogram
+        enable_histogram=enable_histogram,
+        profile_dir=profile_dir,
+        torch_profile_batches=torch_profile_batches,
+        cascade_filter=cascade_filter,
+        ann_index=ann_index,
+        ann_nlist=ann_nlist,
+        ann_nprobe=ann_nprobe,
+        ann_recall_sample=ann_recall_sample,
+        pool_dtype=pool_dtype,
+        cpu_workers=cpu_workers,
+        async_io=async_io
     )
     
+    
+    if pool_server:
+        # 延迟导入：pool_server 的服务端会反向导入本模块
+        from pool_server import request_analysis
+        result = request_analysis(pool_server, analyzer_kwargs)
+        if result is not None:
+            return result
+    
+    analyzer = GPUBatchPearsonAnalyzer(**analyzer_kwargs)
     result = analyzer.analyze_batch()
     
     return result
 
 
-if __name__ == "__main__":
+def build_arg_parser():
+    """命令行参数定义（pool_server.py 复用同一套参数）"""
     parser = argparse.ArgumentParser(description='GPU批量评测Pearson相关性分析')
     parser.add_argument('--stock_code', required=True, help="股票代码或模式名称。支持: 1)单个股票代码(000001) 2)多个逗号分隔(000001,000002) 3)预定义模式（通用 topXXX/hs300/zz500/all）")
     parser.add_argument('--backtest_date', type=str, help='回测结束日期 (YYYY-MM-DD)')
@@ -4880,11 +5396,40 @@ if __name__ == "__main__":
     parser.add_argument('--histogram_interval', type=int, default=0, help='相关分布直方图写入频率；0禁用，n表示每n批次写一次')
     parser.add_argument('--cleanup_every_n_batches', type=int, default=1, help='GPU缓存清理频率；n表示每n批清理一次，0禁用')
     parser.add_argument('--enable_histogram', action='store_true', help='启用相关性直方图统计输出（默认关闭）')
+    parser.add_argument('--disable_cascade_filter', action='store_true',
+                        help='禁用单字段阈值级联筛选，始终计算完整的 3字段×2段 相关矩阵')
+    parser.add_argument('--ann_index', action='store_true',
+                        help='启用IVF历史窗口预索引：按平均相关阈值检索候选窗口，再精确复核')
+    parser.add_argument('--ann_nlist', type=int, default=None, help='IVF聚类数 (默认: sqrt(历史窗口数))')
+    parser.add_argument('--ann_nprobe', type=int, default=None,
+                        help='每个评测窗口最多探查的聚类数，越小越快但可能漏检 (默认: 不限制，召回率为1)')
+    parser.add_argument('--ann_recall_sample', type=int, default=0,
+                        help='每批抽样多少个评测窗口统计索引召回率 (默认: 0，不统计)')
+    parser.add_argument('--pool_dtype', type=str, default='float32', choices=['float32', 'float16', 'int8'],
+                        help='历史窗口池存储精度：float32 无损；float16/int8 按窗口归一化后量化，内存约为1/2、1/4 (默认: float32)')
+    parser.add_argument('--cpu_workers', type=int, default=0,
+                        help='CPU计算（--no_gpu 或无CUDA）时按历史分区并行计算相关系数的进程数，每个进程线程数为 核数/进程数 (默认: 0，单进程)')
+    parser.add_argument('--sync_io', action='store_true',
+                        help='在批次循环内同步写入结果CSV和直方图（默认由后台线程缓冲写入，与下一批计算重叠）')
+    parser.add_argument('--profile_dir', type=str, default=None,
+                        help='性能剖析导出目录：运行结束时写出 Chrome trace/Perfetto JSON 和各阶段汇总 JSON（默认不导出）')
+    parser.add_argument('--torch_profile_batches', type=str, default=None,
+                        help='用 torch.profiler 采集的批次编号，逗号分隔，从1开始（如 1,5）；结果写入 profile_dir（未指定时为 profiles/）')
 
-    args = parser.parse_args()
+    parser.add_argument('--pool_server', type=str, default=None,
+                        help='常驻对比池服务地址（host:port 或 Unix socket 路径，见 pool_server.py）；服务不可用时回退到本地计算')
+    return parser
+
+
+def resolve_stock_codes(stock_code):
+    """
+    解析 --stock_code：逗号分隔的股票代码或预定义模式名称
     
+    Returns:
+        list: 股票代码列表
+    """
     # 解析股票代码，支持逗号分隔的多个股票或模式名称
-    input_value = args.stock_code.strip()
+    input_value = stock_code.strip()
     
     # 检查是否为预定义的模式名称（支持通用 topXXX）
     predefined_modes = ['hs300', 'zz500', 'all']
@@ -4908,15 +5453,12 @@ if __name__ == "__main__":
     else:
         # 传统的股票代码解析，支持逗号分隔的多个股票
         stock_codes = [code.strip() for code in input_value.split(',')]
-    
-    print(f"开始GPU批量评测分析，股票代码: {stock_codes}")
-    print(f"评测日期数量: {args.evaluation_days}")
-    print(f"窗口大小: {args.window_size}")
-    print(f"相关系数阈值(10天): {args.threshold_10}, 相关系数阈值(5天): {args.threshold_5}")
-    
-    # 使用真正的多股票批量处理
-    print(f"\n开始批量处理所有股票: {stock_codes}")
-    result = analyze_pearson_correlation_gpu_batch(
+    return stock_codes
+
+
+def analysis_kwargs_from_args(args, stock_codes):
+    """把命令行参数转换为 analyze_pearson_correlation_gpu_batch 的关键字参数"""
+    return dict(
         stock_code=','.join(stock_codes),  # 传递逗号分隔的股票代码
         backtest_date=args.backtest_date,
         evaluation_days=args.evaluation_days,
@@ -4943,7 +5485,36 @@ if __name__ == "__main__":
         historical_stride=args.historical_stride,
         histogram_interval=args.histogram_interval,
         cleanup_every_n_batches=args.cleanup_every_n_batches,
-        enable_histogram=args.enable_histogram
+        enable_histogram=args.enable_histogram,
+        profile_dir=args.profile_dir,
+        torch_profile_batches=[int(b) for b in args.torch_profile_batches.split(',') if b.strip()] if args.torch_profile_batches else None,
+        cascade_filter=not args.disable_cascade_filter,
+        ann_index=args.ann_index,
+        ann_nlist=args.ann_nlist,
+        ann_nprobe=args.ann_nprobe,
+        ann_recall_sample=args.ann_recall_sample,
+        pool_dtype=args.pool_dtype,
+        cpu_workers=args.cpu_workers,
+        async_io=not args.sync_io
+    )
+
+
+if __name__ == "__main__":
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    
+    stock_codes = resolve_stock_codes(args.stock_code)
+    
+    print(f"开始GPU批量评测分析，股票代码: {stock_codes}")
+    print(f"评测日期数量: {args.evaluation_days}")
+    print(f"窗口大小: {args.window_size}")
+    print(f"相关系数阈值(10天): {args.threshold_10}, 相关系数阈值(5天): {args.threshold_5}")
+    
+    # 使用真正的多股票批量处理
+    print(f"\n开始批量处理所有股票: {stock_codes}")
+    result = analyze_pearson_correlation_gpu_batch(
+        **analysis_kwargs_from_args(args, stock_codes),
+        pool_server=args.pool_server
     )
     
     # 输出总体结果
@@ -0,0 +1,304 @@
+"""
+性能剖析导出模块
+
+把 GPUBatchPearsonAnalyzer 的 start_timer/end_timer 计时转换为机器可读的结果：
+1. Chrome trace / Perfetto 可直接打开的 JSON（每个计时区间一个完整事件，批次内的区间带批次号）
+2. 每次运行一份 JSON 汇总：各阶段墙钟时间、CPU时间、主机与设备间传输字节数、
+   峰值RSS和峰值设备显存，以及机器/参数信息，便于跨机器、跨版本对比
+
+计时器允许按名称交错开闭（不要求严格嵌套），所有统计量都会累加到当前处于打开状态的每个区间上。
+psutil 可选：未安装时在 Linux 上读取 /proc/self/statm，其他平台则不记录RSS。
+"""
+
+import json
+import os
+import platform
+import socket
+import threading
+import time
+from datetime import datetime
+
+try:
+    import psutil
+    _PROCESS = psutil.Process()
+except ImportError:
+    psutil = None
+    _PROCESS = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes():
+    """当前进程常驻内存（字节），无法获取时返回None"""
+    if _PROCESS is not None:
+        try:
+            return _PROCESS.memory_info().rss
+        except Exception:
+            return None
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except Exception:
+        return None
+
+
+def process_peak_rss_bytes():
+    """进程生命周期内的峰值常驻内存（字节），无法获取时返回None"""
+    if _PROCESS is not None:
+        try:
+            info = _PROCESS.memory_info()
+            # Windows 提供 peak_wset，其他平台回退到 ru_maxrss
+            if hasattr(info, 'peak_wset'):
+                return info.peak_wset
+        except Exception:
+            pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return peak if platform.system() == 'Darwin' else peak * 1024
+    return None
+
+
+def tensor_nbytes(obj):
+    """张量或numpy数组的字节数，其他对象返回0"""
+    try:
+        return int(obj.element_size() * obj.nelement())
+    except AttributeError:
+        return int(getattr(obj, 'nbytes', 0) or 0)
+
+
+class PerfTraceRecorder:
+    """记录计时区间及其资源统计，并导出 Chrome trace 与运行汇总 JSON"""
+
+    def __init__(self, device=None, step_mapping=None, metadata=None, rss_sample_interval=0):
+        """
+        Args:
+            device: torch.device，为cuda时记录设备显存峰值
+            step_mapping: {计时器名: (阶段编号, 阶段描述)}，用于在导出结果中标注阶段
+            metadata: 写入运行汇总的附加信息（参数等）
+            rss_sample_interval: 后台采样RSS的间隔秒数；0 表示只在区间开闭时采样
+        """
+        self.track_device = (torch is not None and device is not None
+                             and getattr(device, 'type', None) == 'cuda' and torch.cuda.is_available())
+        self.device = device
+        self.step_mapping = step_mapping or {}
+        self.metadata = dict(metadata or {})
+        self.current_batch = None
+        self.spans = []
+        self.open_spans = {}
+        self.totals = {'bytes_h2d': 0, 'bytes_d2h': 0}
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._run_start_wall = time.time()
+        self._run_start_cpu = time.process_time()
+        self._run_peak_rss = current_rss_bytes() or 0
+        self._run_peak_device = 0
+        if self.track_device:
+            torch.cuda.reset_peak_memory_stats()
+        self._sampler_stop = None
+        if rss_sample_interval and rss_sample_interval > 0:
+            self._sampler_stop = threading.Event()
+            sampler = threading.Thread(target=self._sample_rss_loop, args=(rss_sample_interval,), daemon=True)
+            sampler.start()
+
+    def _sample_rss_loop(self, interval):
+        """后台线程：定期采样RSS，捕获区间内部的内存峰值"""
+        while not self._sampler_stop.wait(interval):
+            self._fold_rss()
+
+    def close(self):
+        """停止后台RSS采样线程"""
+        if self._sampler_stop is not None:
+            self._sampler_stop.set()
+
+    def _fold_device_peak(self):
+        """把自上次重置以来的设备显存峰值累加到所有打开的区间，然后重置峰值统计"""
+        if not self.track_device:
+            return
+        peak = torch.cuda.max_memory_allocated()
+        self._run_peak_device = max(self._run_peak_device, peak)
+        for span in list(self.open_spans.values()):
+            span['device_peak_bytes'] = max(span['device_peak_bytes'], peak)
+        torch.cuda.reset_peak_memory_stats()
+
+    def _fold_rss(self):
+        """采样当前RSS并累加到所有打开的区间"""
+        rss = current_rss_bytes()
+        if rss is None:
+            return
+        self._run_peak_rss = max(self._run_peak_rss, rss)
+        # 复制一份再遍历：后台采样线程与计时器所在线程可能同时访问
+        for span in list(self.open_spans.values()):
+            span['rss_peak_bytes'] = max(span['rss_peak_bytes'] or 0, rss)
+
+    def start(self, name, parent=None):
+        """开始一个计时区间（与 start_timer 同名）"""
+        self._fold_device_peak()
+        self.open_spans[name] = {
+            'name': name,
+            'parent': parent,
+            'batch': self.current_batch,
+            'tid': threading.get_ident(),
+            'start': time.perf_counter(),
+            'cpu_start': time.process_time(),
+            'bytes_h2d': 0,
+            'bytes_d2h': 0,
+            'rss_peak_bytes': None,
+            'device_peak_bytes': torch.cuda.memory_allocated() if self.track_device else 0,
+        }
+        self._fold_rss()
+
+    def end(self, name):
+        """结束计时区间，未开始的区间忽略"""
+        if name not in self.open_spans:
+            return
+        self._fold_rss()
+        self._fold_device_peak()
+        span = self.open_spans.pop(name)
+        span['wall_time'] = time.perf_counter() - span['start']
+        span['cpu_time'] = time.process_time() - span.pop('cpu_start')
+        self.spans.append(span)
+
+    def record_transfer(self, direction, nbytes):
+        """
+        记录一次主机与设备间的数据传输
+
+        Args:
+            direction: 'h2d'（主机到设备）或 'd2h'（设备到主机）
+            nbytes: 字节数
+        """
+        key = f"bytes_{direction}"
+        nbytes = int(nbytes)
+        self.totals[key] += nbytes
+        for span in list(self.open_spans.values()):
+            span[key] += nbytes
+
+    def _stage_label(self, name):
+        step = self.step_mapping.get(name)
+        return f"{step[0]} {step[1]}" if step else name
+
+    def chrome_trace(self):
+        """生成 Chrome trace 事件格式（Perfetto 兼容）的字典"""
+        events = [
+            {'ph': 'M', 'name': 'process_name', 'pid': self._pid, 'args': {'name': 'GPUBatchPearsonAnalyzer'}},
+        ]
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            args = {
+                'timer': span['name'],
+                'cpu_time_ms': round(span['cpu_time'] * 1000, 3),
+                'bytes_h2d': span['bytes_h2d'],
+                'bytes_d2h': span['bytes_d2h'],
+            }
+            if span['parent']:
+                args['parent'] = span['parent']
+            if span['batch'] is not None:
+                args['batch'] = span['batch']
+            if span['rss_peak_bytes'] is not None:
+                args['rss_peak_mb'] = round(span['rss_peak_bytes'] / 1024**2, 2)
+            if self.track_device:
+                args['device_peak_mb'] = round(span['device_peak_bytes'] / 1024**2, 2)
+            label = self._stage_label(span['name'])
+            if span['batch'] is not None:
+                label = f"{label} [批次{span['batch'] + 1}]"
+            events.append({
+                'name': label,
+                'cat': 'batch' if span['batch'] is not None else 'stage',
+                'ph': 'X',
+                'pid': self._pid,
+                'tid': span['tid'],
+                'ts': round((span['start'] - self._origin) * 1e6, 3),
+                'dur': round(span['wall_time'] * 1e6, 3),
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def summary(self):
+        """生成运行汇总字典（按计时器名聚合各阶段统计）"""
+        self._fold_rss()
+        self._fold_device_peak()
+        stages = {}
+        for span in self.spans:
+            stage = stages.get(span['name'])
+            if stage is None:
+                step = self.step_mapping.get(span['name'])
+                stage = stages[span['name']] = {
+                    'step_id': step[0] if step else None,
+                    'description': step[1] if step else None,
+                    'parent': span['parent'],
+                    'count': 0,
+                    'wall_time': 0.0,
+                    'max_wall_time': 0.0,
+                    'cpu_time': 0.0,
+                    'bytes_h2d': 0,
+                    'bytes_d2h': 0,
+                    'rss_peak_bytes': None,
+                    'device_peak_bytes': None,
+                }
+            stage['count'] += 1
+            stage['wall_time'] += span['wall_time']
+            stage['max_wall_time'] = max(stage['max_wall_time'], span['wall_time'])
+            stage['cpu_time'] += span['cpu_time']
+            stage['bytes_h2d'] += span['bytes_h2d']
+            stage['bytes_d2h'] += span['bytes_d2h']
+            if span['rss_peak_bytes'] is not None:
+                stage['rss_peak_bytes'] = max(stage['rss_peak_bytes'] or 0, span['rss_peak_bytes'])
+            if self.track_device:
+                stage['device_peak_bytes'] = max(stage['device_peak_bytes'] or 0, span['device_peak_bytes'])
+
+        machine = {
+            'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        }
+        if torch is not None:
+            machine['torch'] = torch.__version__
+            if self.track_device:
+                machine['gpu'] = torch.cuda.get_device_name(0)
+
+        peak_rss = process_peak_rss_bytes()
+        return {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'machine': machine,
+            'metadata': self.metadata,
+            'run': {
+                'wall_time': time.time() - self._run_start_wall,
+                'cpu_time': time.process_time() - self._run_start_cpu,
+                'bytes_h2d': self.totals['bytes_h2d'],
+                'bytes_d2h': self.totals['bytes_d2h'],
+                'rss_peak_bytes': max(peak_rss or 0, self._run_peak_rss) or None,
+                'device_peak_bytes': self._run_peak_device if self.track_device else None,
+            },
+            'stages': stages,
+        }
+
+    def export(self, output_dir, prefix='pearson_profile'):
+        """
+        导出 trace 和汇总 JSON
+
+        Args:
+            output_dir: 输出目录
+            prefix: 文件名前缀
+
+        Returns:
+            tuple: (trace文件路径, 汇总文件路径)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        trace_path = os.path.join(output_dir, f"{prefix}_{timestamp}_trace.json")
+        summary_path = os.path.join(output_dir, f"{prefix}_{timestamp}_summary.json")
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2, default=str)
+        return trace_path, summary_path
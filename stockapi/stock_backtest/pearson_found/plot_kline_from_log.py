@@ -32,11 +32,10 @@ from datetime import datetime
 from typing import List, Optional, Tuple, Dict
 
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib as mpl
-import mplfinance as mpf
 
 from data_loader import StockDataLoader
+from kline_renderer import make_two_panel_job, render_kline_charts
 
 
 # 全局中文字体配置，避免中文标题/标签无法显示
@@ -250,40 +249,11 @@ def plot_two_panels(source_ohlcv: pd.DataFrame,
                     title_top: str,
                     title_bottom: str,
                     save_path: str) -> None:
-    """绘制上下两个面板的蜡烛图与成交量，并保存到文件。"""
-    # 构造图与四个子轴：上价、上量、下价、下量
-    fig = plt.figure(figsize=(12, 8))
-    gs = fig.add_gridspec(4, 1, height_ratios=[3, 1, 3, 1], hspace=0.35)
-
-    ax_price_top = fig.add_subplot(gs[0])
-    ax_vol_top = fig.add_subplot(gs[1], sharex=ax_price_top)
-    ax_price_bottom = fig.add_subplot(gs[2])
-    ax_vol_bottom = fig.add_subplot(gs[3], sharex=ax_price_bottom)
-
-    # 设置红涨绿跌的配色
-    mc = mpf.make_marketcolors(
-        up='red',
-        down='green',
-        edge='inherit',
-        wick='inherit',
-        volume='inherit'
-    )
-    style_rg = mpf.make_mpf_style(marketcolors=mc)
-
-    # 上面板
-    mpf.plot(source_ohlcv, type='candle', ax=ax_price_top, volume=ax_vol_top,
-             style=style_rg, xrotation=0, datetime_format='%Y-%m-%d')
-    ax_price_top.set_title(title_top, fontsize=11)
-
-    # 下面板
-    mpf.plot(hist_ohlcv, type='candle', ax=ax_price_bottom, volume=ax_vol_bottom,
-             style=style_rg, xrotation=0, datetime_format='%Y-%m-%d')
-    ax_price_bottom.set_title(title_bottom, fontsize=11)
-
-    # 保存
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    """绘制上下两个面板的蜡烛图与成交量，并保存到文件（单张图，在当前进程内渲染）。"""
+    job = make_two_panel_job(source_ohlcv, hist_ohlcv, title_top, title_bottom, save_path)
+    summary = render_kline_charts([job], max_workers=1, skip_up_to_date=False)
+    if summary['failed']:
+        raise RuntimeError(f"绘制失败: {save_path}")
 
 
 def main():
@@ -292,6 +262,9 @@ def main():
     parser.add_argument('--output-dir', default=None, help='输出图片目录')
     parser.add_argument('--source-stock', default=None, help='覆盖源数据股票代码')
     parser.add_argument('--only-index', type=int, default=None, help='仅绘制指定期间索引，如 1')
+    parser.add_argument('--workers', type=int, default=None, help='并行绘图进程数，默认使用CPU核数')
+    parser.add_argument('--keep-existing', action='store_true',
+                        help='保留输出目录中已有的图片，只重绘缺失或数据已更新的图（默认每次清空输出目录）')
     args = parser.parse_args()
 
     log_path = args.log
@@ -327,7 +300,7 @@ def main():
     # 输出目录
     if out_dir is None:
         out_dir = os.path.join(os.path.dirname(log_path), 'kline_plots')
-    if os.path.exists(out_dir):
+    if os.path.exists(out_dir) and not args.keep_existing:
         for name in os.listdir(out_dir):
             p = os.path.join(out_dir, name)
             try:
@@ -354,7 +327,9 @@ def main():
     # 过滤评测窗口：从 eval_start_date 起，长度与历史期间长度一致；若 eval_end_date 可用则按区间
     # 日志中窗口大小通常为固定值（如15）；我们根据每个历史期间的长度来确定源窗口长度
 
-    drawn_count = 0
+    # 先收集所有绘图任务，再批量并行渲染
+    chart_jobs = []
+    chart_labels = []
     for period in periods:
         if args.only_index is not None and period['idx'] != args.only_index:
             continue
@@ -467,12 +442,21 @@ def main():
             )
         save_path = os.path.join(out_dir, save_name)
 
-        try:
-            plot_two_panels(src_ohlcv, hist_ohlcv, title_top, title_bottom, save_path)
+        chart_jobs.append(make_two_panel_job(
+            src_ohlcv, hist_ohlcv, title_top, title_bottom, save_path,
+            data_files=[loader.get_data_file_path(source_stock, 'daily'),
+                        loader.get_data_file_path(hist_stock, 'daily')]
+        ))
+        chart_labels.append(period['idx'])
+
+    summary = render_kline_charts(chart_jobs, max_workers=args.workers)
+    drawn_count = 0
+    for idx, job, path in zip(chart_labels, chart_jobs, summary['paths']):
+        if path is None:
+            print(f"❌ 绘制失败 期间#{idx}: {job['output_path']}")
+        else:
             drawn_count += 1
-            print(f"✅ 已生成: {save_path}")
-        except Exception as e:
-            print(f"❌ 绘制失败 期间#{period['idx']}: {e}")
+            print(f"✅ 已生成: {path}")
 
     if drawn_count == 0:
         print('未生成任何图像，请检查日志格式与数据可用性。')
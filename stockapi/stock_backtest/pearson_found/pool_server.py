@@ -0,0 +1,353 @@
+"""
+常驻对比股票池服务
+
+每次运行 pearson_analyzer_gpu_3.py 都要重新加载对比股票、切分历史窗口并上传到GPU，
+而交互式的单股票试算真正的计算只需要几百毫秒。本服务在一个长期运行的进程中保留预处理好的
+对比股票池（内存中的窗口池 + 显存中的历史张量 + IVF索引/CPU多进程后端等缓存），
+客户端只发送"评测哪些目标股票、用什么阈值"的查询。
+
+- 服务地址为 host:port（默认 127.0.0.1:8765）或 Unix socket 路径，基于 multiprocessing.connection，
+  连接需要 authkey：环境变量 PEARSON_POOL_AUTHKEY；未设置时服务首次启动生成随机密钥，保存在本目录的
+  .pool_server_authkey（权限0600，可用 PEARSON_POOL_AUTHKEY_FILE 指定路径），客户端读取同一文件
+- 查询参数（QUERY_PARAMS：目标股票、回测日期、评测日期数、各阈值、结果文件等）在常驻分析器上直接修改；
+  其余参数（对比模式/股票、窗口大小、日期上限、窗口池精度、计算引擎选项等）决定对比股票池，
+  与常驻池不同时按需新建，最多保留 --max_pools 个
+- 查询串行执行（共享同一块GPU），结果CSV由服务进程写入客户端指定的文件
+- 客户端连接失败时返回None，由调用方回退到本地计算
+
+启动服务（参数与 pearson_analyzer_gpu_3.py 相同，--stock_code 仅用于预热）：
+    python pool_server.py --pool_server 127.0.0.1:8765 --stock_code 000001 --comparison_mode top1000
+
+客户端：
+    python pearson_analyzer_gpu_3.py --stock_code 000001 --comparison_mode top1000 --pool_server 127.0.0.1:8765
+"""
+
+import gc
+import logging
+import os
+import secrets
+import time
+import traceback
+from collections import OrderedDict
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+DEFAULT_AUTHKEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pool_server_authkey')
+
+# 结果中不回传的大字段：完整平均相关矩阵，以及引用整个窗口池的期间信息视图
+HEAVY_RESULT_FIELDS = ('avg_correlations', 'period_info')
+
+
+def parse_address(address):
+    """
+    解析服务地址
+
+    Args:
+        address: 'host:port'、'port' 或 Unix socket 路径
+
+    Returns:
+        tuple 或 str: (host, port) 或 socket 路径
+    """
+    if isinstance(address, tuple):
+        return address
+    text = str(address).strip()
+    host, _, port = text.rpartition(':')
+    if port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return text
+
+
+def authkey_file():
+    """密钥文件路径（环境变量 PEARSON_POOL_AUTHKEY_FILE 优先）"""
+    return os.environ.get('PEARSON_POOL_AUTHKEY_FILE', DEFAULT_AUTHKEY_FILE)
+
+
+def get_authkey(create=False):
+    """
+    连接认证密钥（连接上传输的是pickle数据，只接受持有相同密钥的客户端）
+
+    优先使用环境变量 PEARSON_POOL_AUTHKEY，否则读取密钥文件。
+
+    Args:
+        create: 密钥文件不存在时生成随机密钥并以0600权限保存（服务端使用）
+
+    Returns:
+        bytes: 密钥；客户端找不到密钥时返回None
+    """
+    env_key = os.environ.get('PEARSON_POOL_AUTHKEY')
+    if env_key:
+        return env_key.encode('utf-8')
+
+    path = authkey_file()
+    if create and not os.path.exists(path):
+        key = secrets.token_hex(32)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # 另一个服务进程同时创建了密钥文件，读取它即可
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(key)
+            logger.info(f"🔑 已生成常驻对比池服务密钥: {path}")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        return None
+    if create and os.name != 'nt' and os.stat(path).st_mode & 0o077:
+        # 其他用户可读的密钥等同于没有密钥
+        os.chmod(path, 0o600)
+        logger.warning(f"⚠️ 密钥文件 {path} 权限过宽，已改为0600")
+    return key.encode('utf-8') if key else None
+
+
+def _freeze(value):
+    """把列表等不可哈希的参数值转换为可作为字典键的形式"""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def pool_key(analyzer_kwargs):
+    """
+    对比股票池与计算引擎的标识：除查询参数外的全部构造参数
+
+    self_only 模式的对比池就是目标股票自身，因此目标股票也计入标识。
+    """
+    from pearson_analyzer_gpu_3 import QUERY_PARAMS
+    items = [(k, _freeze(v)) for k, v in analyzer_kwargs.items() if k not in QUERY_PARAMS]
+    if analyzer_kwargs.get('comparison_mode') == 'self_only':
+        items.append(('stock_code', _freeze(analyzer_kwargs.get('stock_code'))))
+    return tuple(sorted(items, key=lambda item: item[0]))
+
+
+def compact_result(result):
+    """去掉不适合跨进程回传的大字段，其余结构与 analyze_batch 的返回值一致"""
+    if not result:
+        return result
+    compact = dict(result)
+    batch_results = dict(compact.get('batch_results') or {})
+    for name in HEAVY_RESULT_FIELDS:
+        batch_results.pop(name, None)
+    compact['batch_results'] = batch_results
+    return compact
+
+
+class PearsonPoolServer:
+    """持有常驻分析器并串行处理查询的服务"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, max_pools=1):
+        """
+        Args:
+            address: 监听地址（见 parse_address）
+            authkey: 连接认证密钥，默认 get_authkey(create=True)
+            max_pools: 最多同时常驻的对比股票池数量，超出时释放最久未使用的
+        """
+        self.address = parse_address(address)
+        self.authkey = authkey or get_authkey(create=True)
+        if not self.authkey:
+            raise ValueError(f"无法读取常驻对比池服务密钥: {authkey_file()}")
+        self.max_pools = max(1, int(max_pools))
+        self.requests_served = 0
+        self._analyzers = OrderedDict()
+        self._running = False
+
+    def _get_analyzer(self, analyzer_kwargs):
+        """
+        获取与参数匹配的常驻分析器，必要时新建
+
+        Returns:
+            tuple: (分析器, 是否复用了已有的常驻池)
+        """
+        key = pool_key(analyzer_kwargs)
+        analyzer = self._analyzers.get(key)
+        if analyzer is not None:
+            self._analyzers.move_to_end(key)
+            return analyzer, True
+
+        # 延迟导入：客户端只需要本模块的轻量函数
+        from pearson_analyzer_gpu_3 import GPUBatchPearsonAnalyzer
+        logger.info(f"🆕 新建常驻对比股票池: 对比模式 {analyzer_kwargs.get('comparison_mode')}, "
+                    f"窗口 {analyzer_kwargs.get('window_size')}, 精度 {analyzer_kwargs.get('pool_dtype')}")
+        analyzer = GPUBatchPearsonAnalyzer(**analyzer_kwargs, resident_pool=True)
+        self._analyzers[key] = analyzer
+        while len(self._analyzers) > self.max_pools:
+            _, evicted = self._analyzers.popitem(last=False)
+            logger.info("♻️ 常驻池数量超过上限，释放最久未使用的对比股票池")
+            self._release(evicted)
+        return analyzer, False
+
+    @staticmethod
+    def _release(analyzer):
+        """释放分析器持有的后台线程、进程池和显存"""
+        analyzer.result_writer.close()
+        analyzer._close_cpu_backend()
+        device_type = analyzer.device.type
+        del analyzer
+        gc.collect()
+        if device_type == 'cuda':
+            import torch
+            torch.cuda.empty_cache()
+
+    def warm_up(self, analyzer_kwargs):
+        """按给定参数预先加载一个对比股票池"""
+        analyzer, _ = self._get_analyzer(analyzer_kwargs)
+        if not analyzer.warm_up():
+            logger.warning("⚠️ 对比股票池预热失败，将在第一次查询时重新加载")
+
+    def analyze(self, analyzer_kwargs):
+        """
+        处理一次分析查询
+
+        Args:
+            analyzer_kwargs: GPUBatchPearsonAnalyzer 的构造参数
+
+        Returns:
+            tuple: (精简后的分析结果, 是否复用了常驻池)
+        """
+        from pearson_analyzer_gpu_3 import QUERY_PARAMS
+        analyzer, reused = self._get_analyzer(analyzer_kwargs)
+        analyzer.configure_query(**{k: v for k, v in analyzer_kwargs.items() if k in QUERY_PARAMS})
+        result = analyzer.analyze_batch()
+        return compact_result(result), reused
+
+    def handle(self, request):
+        """
+        处理一条请求
+
+        Args:
+            request: {'command': 'analyze' | 'ping' | 'shutdown', 'kwargs': 分析参数}
+
+        Returns:
+            dict: {'ok', 'result', 'error', 'elapsed', ...}
+        """
+        start = time.time()
+        command = request.get('command') if isinstance(request, dict) else None
+        try:
+            if command == 'ping':
+                return {'ok': True, 'pools': len(self._analyzers), 'requests_served': self.requests_served}
+            if command == 'shutdown':
+                self._running = False
+                return {'ok': True}
+            if command == 'analyze':
+                result, reused = self.analyze(request.get('kwargs') or {})
+                self.requests_served += 1
+                elapsed = time.time() - start
+                logger.info(f"✅ 查询完成: {request['kwargs'].get('stock_code')} | 耗时 {elapsed:.3f}秒 | "
+                            f"{'复用常驻池' if reused else '新建对比池'}")
+                return {'ok': True, 'result': result, 'pool_reused': reused, 'elapsed': elapsed}
+            return {'ok': False, 'error': f"未知命令: {command}"}
+        except Exception as e:
+            logger.error(f"❌ 查询处理失败: {str(e)}\n{traceback.format_exc()}")
+            return {'ok': False, 'error': str(e), 'elapsed': time.time() - start}
+
+    def serve_forever(self):
+        """监听并串行处理请求，直到收到 shutdown 或被中断"""
+        self._running = True
+        try:
+            with Listener(self.address, authkey=self.authkey) as listener:
+                logger.info(f"🚀 常驻对比池服务已启动: {self.address}")
+                while self._running:
+                    try:
+                        conn = listener.accept()
+                    except AuthenticationError:
+                        logger.warning("⚠️ 拒绝未通过认证的连接")
+                        continue
+                    except (EOFError, OSError) as e:
+                        # 客户端在认证握手期间断开
+                        logger.warning(f"⚠️ 接受连接失败: {str(e) or type(e).__name__}")
+                        continue
+                    with conn:
+                        try:
+                            request = conn.recv()
+                        except EOFError:
+                            continue
+                        except OSError as e:
+                            logger.warning(f"⚠️ 读取请求失败: {str(e)}")
+                            continue
+                        response = self.handle(request)
+                        try:
+                            conn.send(response)
+                        except OSError as e:
+                            # 客户端在查询完成前断开（BrokenPipeError/ConnectionResetError）
+                            logger.warning(f"⚠️ 客户端已断开，结果未送达: {str(e)}")
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，停止服务")
+        finally:
+            self.close()
+
+    def close(self):
+        """释放全部常驻池"""
+        while self._analyzers:
+            _, analyzer = self._analyzers.popitem()
+            self._release(analyzer)
+
+
+def send_command(address, request, authkey=None):
+    """
+    向服务发送一条请求
+
+    Returns:
+        dict: 服务响应；服务不可用（未启动、地址错误、没有密钥、认证失败）时返回None
+    """
+    authkey = authkey or get_authkey()
+    if not authkey:
+        logger.warning(f"⚠️ 找不到常驻对比池服务密钥（设置 PEARSON_POOL_AUTHKEY 或先启动服务生成 {authkey_file()}）")
+        return None
+    try:
+        conn = Client(parse_address(address), authkey=authkey)
+    except (OSError, AuthenticationError) as e:
+        logger.warning(f"⚠️ 常驻对比池服务 {address} 不可用: {str(e)}")
+        return None
+    with conn:
+        try:
+            conn.send(request)
+            return conn.recv()
+        except (EOFError, OSError) as e:
+            logger.warning(f"⚠️ 常驻对比池服务 {address} 连接中断: {str(e) or type(e).__name__}")
+            return None
+
+
+def request_analysis(address, analyzer_kwargs, authkey=None):
+    """
+    请求服务执行一次分析
+
+    Args:
+        address: 服务地址
+        analyzer_kwargs: GPUBatchPearsonAnalyzer 的构造参数
+
+    Returns:
+        dict: 分析结果（服务端分析失败时与本地一致返回None）；服务不可用时返回None，
+              并在日志中提示由调用方回退到本地计算
+    """
+    response = send_command(address, {'command': 'analyze', 'kwargs': analyzer_kwargs}, authkey)
+    if response is None:
+        logger.warning("⚠️ 回退到本地计算")
+        return None
+    if not response.get('ok'):
+        logger.error(f"❌ 常驻对比池服务分析失败: {response.get('error')}")
+        return None
+    logger.info(f"⚡ 常驻对比池服务完成分析: 耗时 {response.get('elapsed', 0):.3f}秒 "
+                f"({'复用常驻池' if response.get('pool_reused') else '新建对比池'})")
+    return response.get('result')
+
+
+def main():
+    from pearson_analyzer_gpu_3 import analysis_kwargs_from_args, build_arg_parser, resolve_stock_codes
+
+    parser = build_arg_parser()
+    parser.description = '常驻对比股票池服务：参数与 pearson_analyzer_gpu_3.py 相同，--pool_server 为监听地址，--stock_code 用于预热'
+    parser.add_argument('--max_pools', type=int, default=1,
+                        help='最多同时常驻的对比股票池数量（对比参数不同的查询各占一个）(默认: 1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = PearsonPoolServer(args.pool_server or DEFAULT_ADDRESS, max_pools=args.max_pools)
+    server.warm_up(analysis_kwargs_from_args(args, resolve_stock_codes(args.stock_code)))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
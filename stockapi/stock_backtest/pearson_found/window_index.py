@@ -0,0 +1,169 @@
+"""
+历史窗口近似最近邻（IVF）预索引
+
+对某一段（前10天或后5天）3个字段各自去均值、L2归一化后的片段，按字段拼接成一个向量：
+两个拼接向量的内积除以3，恰好等于该段三个字段相关系数的平均值（即 avg_10 / avg_5）。
+因此平均相关阈值筛选等价于在拼接向量上做内积阈值检索。
+
+索引结构为倒排文件（IVF）：对拼接向量做球面k-means聚类，每个历史窗口归入最近的聚类中心。
+查询时利用夹角三角不等式计算每个聚类内可能达到的最大平均相关上界，只返回上界超过阈值的
+聚类成员作为候选，再由分析器的精确计算复核。
+- nprobe=None：探查所有上界超过阈值的聚类，候选集合包含全部命中（召回率为1）
+- nprobe=k：每个查询最多探查上界最高的k个聚类，速度更快但可能漏检，可用 recall 统计评估
+
+完全基于 torch 本地实现，不依赖外部服务。
+"""
+
+import logging
+import math
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# 上界比较时的数值余量，抵消float32舍入
+BOUND_SLACK = 1e-4
+
+
+def flatten_segment(segment_norm):
+    """
+    把归一化片段按字段拼接为向量
+
+    Args:
+        segment_norm: [..., seg_len, 3] 已按字段去均值、L2归一化的片段
+
+    Returns:
+        torch.Tensor: [..., 3 * seg_len]，内积/3 等于三字段平均相关
+    """
+    return segment_norm.transpose(-1, -2).reshape(*segment_norm.shape[:-2], -1)
+
+
+class WindowANNIndex:
+    """历史窗口拼接向量上的IVF索引"""
+
+    def __init__(self, vectors, nlist=None, kmeans_iters=10, train_size=None, chunk_size=262144, seed=0):
+        """
+        构建索引
+
+        Args:
+            vectors: [num_historical_periods, dim] 历史窗口拼接向量（flatten_segment 的输出）
+            nlist: 聚类数，默认 sqrt(窗口数)
+            kmeans_iters: k-means 迭代次数
+            train_size: 训练k-means的抽样窗口数，默认 64 * nlist
+            chunk_size: 分配聚类时每块处理的窗口数，控制显存峰值
+            seed: 抽样和初始化的随机种子
+        """
+        vectors = vectors.float()  # 索引统一使用float32（arccos等运算不支持半精度）
+        num_vectors = vectors.shape[0]
+        self.device = vectors.device
+        self.dtype = vectors.dtype
+        self.num_vectors = num_vectors
+        self.nlist = max(1, min(int(nlist or round(math.sqrt(num_vectors))), num_vectors))
+        self.chunk_size = chunk_size
+
+        generator = torch.Generator(device='cpu').manual_seed(seed)
+        norms = vectors.norm(dim=1)
+        units = vectors / norms.clamp_min(1e-12).unsqueeze(1)
+
+        train_size = min(num_vectors, int(train_size or 64 * self.nlist))
+        train_idx = torch.randperm(num_vectors, generator=generator)[:train_size].to(self.device)
+        self.centroids = self._spherical_kmeans(units[train_idx], kmeans_iters, generator)
+
+        # 全量分配并按聚类排序成倒排表
+        assign = torch.empty(num_vectors, dtype=torch.long, device=self.device)
+        for start in range(0, num_vectors, chunk_size):
+            assign[start:start + chunk_size] = (units[start:start + chunk_size] @ self.centroids.T).argmax(dim=1)
+        order = torch.argsort(assign)
+        sorted_assign = assign[order]
+        self.members = order                                              # 按聚类排列的窗口下标
+        sizes = torch.bincount(sorted_assign, minlength=self.nlist)
+        self.sizes = sizes
+        self.offsets = torch.cumsum(sizes, dim=0) - sizes
+
+        # 每个聚类的最大夹角半径和最大、最小向量范数，用于计算上界
+        member_cos = (units[order] * self.centroids[sorted_assign]).sum(dim=1).clamp(-1.0, 1.0)
+        member_angle = torch.arccos(member_cos)
+        self.radius = torch.zeros(self.nlist, dtype=self.dtype, device=self.device)
+        self.radius.scatter_reduce_(0, sorted_assign, member_angle.to(self.dtype), reduce='amax', include_self=True)
+        self.max_norm = torch.zeros(self.nlist, dtype=self.dtype, device=self.device)
+        self.max_norm.scatter_reduce_(0, sorted_assign, norms[order].to(self.dtype), reduce='amax', include_self=True)
+        self.min_norm = torch.full((self.nlist,), float('inf'), dtype=self.dtype, device=self.device)
+        self.min_norm.scatter_reduce_(0, sorted_assign, norms[order].to(self.dtype), reduce='amin', include_self=True)
+        self.min_norm[sizes == 0] = 0.0
+
+        logger.info(f"🗂️ 历史窗口IVF索引: {num_vectors} 个窗口, {self.nlist} 个聚类, "
+                    f"平均聚类大小 {num_vectors / self.nlist:.1f}, 最大 {int(sizes.max().item())}")
+
+    def _spherical_kmeans(self, units, iters, generator):
+        """球面k-means：中心始终保持单位长度"""
+        init_idx = torch.randperm(units.shape[0], generator=generator)[:self.nlist].to(self.device)
+        centroids = units[init_idx].clone()
+        for _ in range(iters):
+            assign = (units @ centroids.T).argmax(dim=1)
+            sums = torch.zeros_like(centroids).index_add_(0, assign, units)
+            counts = torch.bincount(assign, minlength=self.nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空聚类保留原中心
+                sums[empty] = centroids[empty]
+            centroids = sums / sums.norm(dim=1, keepdim=True).clamp_min(1e-12)
+        return centroids
+
+    def upper_bounds(self, queries):
+        """
+        每个查询在每个聚类内可能达到的最大平均相关
+
+        最大夹角余弦为负时，成员范数越小内积越大，此时按聚类内最小范数计算（常数窗口范数为0，上界为0）。
+
+        Args:
+            queries: [num_queries, dim] 查询拼接向量
+
+        Returns:
+            torch.Tensor: [num_queries, nlist]
+        """
+        queries = queries.float()
+        q_norm = queries.norm(dim=1)
+        q_units = queries / q_norm.clamp_min(1e-12).unsqueeze(1)
+        angle = torch.arccos((q_units @ self.centroids.T).clamp(-1.0, 1.0))
+        best_cos = torch.cos((angle - self.radius.unsqueeze(0)).clamp_min(0.0))
+        member_norm = torch.where(best_cos >= 0, self.max_norm.unsqueeze(0), self.min_norm.unsqueeze(0))
+        return best_cos * q_norm.unsqueeze(1) * member_norm / 3.0
+
+    def search(self, queries, threshold, nprobe=None, query_mask=None, max_candidate_fraction=None):
+        """
+        返回平均相关可能超过阈值的候选 (查询, 历史窗口) 配对
+
+        Args:
+            queries: [num_queries, dim] 查询拼接向量
+            threshold: 平均相关阈值
+            nprobe: 每个查询最多探查的聚类数，None 表示探查所有上界超过阈值的聚类
+            query_mask: [num_queries] 有效查询掩码，无效查询不产生候选
+            max_candidate_fraction: 候选配对占全部配对的比例上限，超过时返回None（索引剪枝效果不足）
+
+        Returns:
+            tuple: (查询下标 [N], 历史窗口下标 [N])，或 None
+        """
+        bounds = self.upper_bounds(queries)
+        probe = bounds > (float(threshold) - BOUND_SLACK)
+        if query_mask is not None:
+            probe &= query_mask.unsqueeze(1)
+        if nprobe is not None and nprobe < self.nlist:
+            top = bounds.topk(int(nprobe), dim=1).indices
+            limit = torch.zeros_like(probe).scatter_(1, top, True)
+            probe &= limit
+
+        query_ids, cluster_ids = torch.nonzero(probe, as_tuple=True)
+        counts = self.sizes[cluster_ids]
+        total = int(counts.sum().item()) if counts.numel() > 0 else 0
+        if max_candidate_fraction is not None and total > max_candidate_fraction * queries.shape[0] * self.num_vectors:
+            return None
+        if total == 0:
+            empty = torch.empty(0, dtype=torch.long, device=self.device)
+            return empty, empty
+
+        # 把每个 (查询, 聚类) 展开成聚类内全部成员
+        pair_query = torch.repeat_interleave(query_ids, counts)
+        segment_start = torch.cumsum(counts, dim=0) - counts
+        within = torch.arange(total, device=self.device) - torch.repeat_interleave(segment_start, counts)
+        positions = torch.repeat_interleave(self.offsets[cluster_ids], counts) + within
+        return pair_query, self.members[positions]
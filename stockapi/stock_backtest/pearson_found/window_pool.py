@@ -0,0 +1,251 @@
+"""
+紧凑的历史窗口池
+
+替代原来的 [(ndarray[W,3] float64, Timestamp, Timestamp, str), ...] 列表：
+- 全部窗口存放在一个连续数组 [num_windows, W, 3] 中
+- 股票代码存为 int32 编号 + 代码表，起止日期存为 int32 偏移 + 共享交易日历
+- 日期和代码只在读取某个窗口的期间信息时才生成（通常只有命中的窗口）
+
+存储精度（pool_dtype）：
+- 'float32'：原始数值，与此前转换到GPU时的float32张量完全一致（默认）
+- 'float16' / 'int8'：每个窗口每个字段先减去均值、除以最大偏差（存储 scale/offset 用于还原），
+  再以半精度或8位整数保存。Pearson相关对每个字段的仿射变换不变，且对窗口内任意子片段同样成立，
+  因此相关计算可以直接使用这些编码，无需还原；误差只来自量化舍入。
+"""
+
+import numpy as np
+import pandas as pd
+import torch
+from numpy.lib.stride_tricks import sliding_window_view
+
+POOL_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8,
+}
+
+# int8 编码的最大幅值
+INT8_LEVELS = 127
+
+
+def build_stock_windows(stock_data, window_size, stride=1):
+    """
+    把单只股票的日线数据切分为历史窗口（三通道: close-open 差, close, volume）
+
+    Args:
+        stock_data: 以日期为索引、包含 open/close/volume 列的 DataFrame
+        window_size: 窗口大小
+        stride: 相邻窗口起点间隔
+
+    Returns:
+        tuple: (窗口数组 [n, W, 3] float64, 起始日期 datetime64[ns] [n], 结束日期 datetime64[ns] [n])，
+               数据不足一个窗口时返回 None
+    """
+    num_rows = len(stock_data)
+    if num_rows < window_size:
+        return None
+    stride = max(1, int(stride) if stride is not None else 1)
+    close = stock_data['close'].to_numpy(dtype=np.float64)
+    values = np.stack([
+        close - stock_data['open'].to_numpy(dtype=np.float64),
+        close,
+        stock_data['volume'].to_numpy(dtype=np.float64),
+    ], axis=1)
+    # sliding_window_view: [n, 3, W] -> [n, W, 3]
+    windows = sliding_window_view(values, window_size, axis=0)[::stride].transpose(0, 2, 1)
+    dates = pd.DatetimeIndex(stock_data.index).values
+    num_windows = windows.shape[0]
+    start_dates = dates[:num_rows - window_size + 1:stride][:num_windows]
+    end_dates = dates[window_size - 1::stride][:num_windows]
+    return windows, start_dates, end_dates
+
+
+def quantize_windows(windows, pool_dtype='float32'):
+    """
+    按存储精度编码窗口
+
+    Args:
+        windows: [n, W, 3] 原始窗口
+        pool_dtype: 'float32' / 'float16' / 'int8'
+
+    Returns:
+        tuple: (编码数组, scale [n, 3] 或 None, offset [n, 3] 或 None)，原始值 = 编码 * scale + offset
+    """
+    if pool_dtype not in POOL_DTYPES:
+        raise ValueError(f"不支持的窗口池精度: {pool_dtype}，可选: {', '.join(POOL_DTYPES)}")
+    if pool_dtype == 'float32':
+        return np.ascontiguousarray(windows, dtype=np.float32), None, None
+    offset = windows.mean(axis=1)                                   # [n, 3]
+    deviation = windows - offset[:, None, :]
+    scale = np.abs(deviation).max(axis=1)                           # [n, 3]
+    scale[scale == 0] = 1.0
+    normalized = deviation / scale[:, None, :]                      # [-1, 1]
+    if pool_dtype == 'int8':
+        codes = np.rint(normalized * INT8_LEVELS).astype(np.int8)
+        scale = scale / INT8_LEVELS
+    else:
+        codes = normalized.astype(np.float16)
+    return codes, scale.astype(np.float32), offset.astype(np.float32)
+
+
+def encode_stock_windows(stock_data, window_size, stride=1, pool_dtype='float32'):
+    """
+    切分并编码单只股票的历史窗口（可在子进程中执行，返回值体积小、便于回传）
+
+    Returns:
+        dict: {'codes', 'scale', 'offset', 'start', 'end'}，数据不足时返回 None
+    """
+    built = build_stock_windows(stock_data, window_size, stride)
+    if built is None:
+        return None
+    windows, start_dates, end_dates = built
+    codes, scale, offset = quantize_windows(windows, pool_dtype)
+    return {
+        'codes': codes,
+        'scale': scale,
+        'offset': offset,
+        'start': start_dates.astype('datetime64[ns]').view(np.int64),
+        'end': end_dates.astype('datetime64[ns]').view(np.int64),
+    }
+
+
+class PeriodInfoView:
+    """按需生成 {'start_date', 'end_date', 'stock_code'} 的只读序列，替代预先构建的期间信息列表"""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __len__(self):
+        return len(self._pool)
+
+    def __getitem__(self, index):
+        return self._pool.period_info(index)
+
+    def __iter__(self):
+        for index in range(len(self._pool)):
+            yield self._pool.period_info(index)
+
+
+class HistoricalWindowPool:
+    """历史窗口池：先逐只股票 append 编码结果，再 finalize 合并为连续数组"""
+
+    def __init__(self, window_size, pool_dtype='float32'):
+        if pool_dtype not in POOL_DTYPES:
+            raise ValueError(f"不支持的窗口池精度: {pool_dtype}，可选: {', '.join(POOL_DTYPES)}")
+        self.window_size = window_size
+        self.pool_dtype = pool_dtype
+        self.stock_codes = []          # 代码表，stock_ids 为其下标
+        self.codes = np.empty((0, window_size, 3), dtype=POOL_DTYPES[pool_dtype])
+        self.scale = None
+        self.offset = None
+        self.stock_ids = np.empty(0, dtype=np.int32)
+        self.calendar = pd.DatetimeIndex([])
+        self.start_day = np.empty(0, dtype=np.int32)
+        self.end_day = np.empty(0, dtype=np.int32)
+        self._chunks = []
+        self._tensor_cache = None
+
+    def append(self, stock_code, chunk):
+        """追加一只股票的 encode_stock_windows 结果"""
+        if chunk is None or len(chunk['codes']) == 0:
+            return
+        self._chunks.append((stock_code, chunk))
+
+    def finalize(self):
+        """合并所有已追加的股票为连续数组并建立共享日历"""
+        if not self._chunks:
+            return self
+        chunks = [chunk for _, chunk in self._chunks]
+        self.codes = np.concatenate([self.codes] + [c['codes'] for c in chunks], axis=0)
+        if self.pool_dtype != 'float32':
+            self.scale = np.concatenate(([self.scale] if self.scale is not None else []) + [c['scale'] for c in chunks], axis=0)
+            self.offset = np.concatenate(([self.offset] if self.offset is not None else []) + [c['offset'] for c in chunks], axis=0)
+
+        new_ids = []
+        for stock_code, chunk in self._chunks:
+            new_ids.append(np.full(len(chunk['codes']), len(self.stock_codes), dtype=np.int32))
+            self.stock_codes.append(stock_code)
+        self.stock_ids = np.concatenate([self.stock_ids] + new_ids)
+
+        # 日历：已有日期与新日期合并去重后，重新映射全部偏移
+        old_start = self.calendar.values[self.start_day].view(np.int64)
+        old_end = self.calendar.values[self.end_day].view(np.int64)
+        start_ns = np.concatenate([old_start] + [c['start'] for c in chunks])
+        end_ns = np.concatenate([old_end] + [c['end'] for c in chunks])
+        calendar_ns = np.unique(np.concatenate([start_ns, end_ns]))
+        self.calendar = pd.DatetimeIndex(calendar_ns.view('datetime64[ns]'))
+        self.start_day = np.searchsorted(calendar_ns, start_ns).astype(np.int32)
+        self.end_day = np.searchsorted(calendar_ns, end_ns).astype(np.int32)
+
+        self._chunks = []
+        self._tensor_cache = None
+        return self
+
+    def __len__(self):
+        return len(self.codes) + sum(len(chunk['codes']) for _, chunk in self._chunks)
+
+    @property
+    def nbytes(self):
+        """池占用的数组字节数"""
+        total = self.codes.nbytes + self.stock_ids.nbytes + self.start_day.nbytes + self.end_day.nbytes
+        if self.scale is not None:
+            total += self.scale.nbytes + self.offset.nbytes
+        return total
+
+    def period_info(self, index):
+        """第 index 个窗口的期间信息"""
+        index = int(index)
+        return {
+            'start_date': self.calendar[self.start_day[index]],
+            'end_date': self.calendar[self.end_day[index]],
+            'stock_code': self.stock_codes[self.stock_ids[index]],
+        }
+
+    def period_infos(self):
+        """全部窗口的期间信息（惰性序列）"""
+        return PeriodInfoView(self)
+
+    def values(self, indices=None):
+        """
+        还原原始数值（float32）
+
+        Args:
+            indices: 窗口下标，None 表示全部
+
+        Returns:
+            np.ndarray: [n, W, 3]
+        """
+        codes = self.codes if indices is None else self.codes[indices]
+        values = codes.astype(np.float32)
+        if self.scale is not None:
+            scale = self.scale if indices is None else self.scale[indices]
+            offset = self.offset if indices is None else self.offset[indices]
+            values = values * scale[..., None, :] + offset[..., None, :]
+        return values
+
+    def to_tensor(self, device, dtype=torch.float32, dequantize=False):
+        """
+        获取用于相关计算的历史张量 [num_windows, W, 3]，同一设备/精度只传输一次
+
+        Args:
+            device: 目标设备
+            dtype: 张量精度
+            dequantize: 是否还原为原始数值；否则直接使用编码（相关系数不受影响）
+
+        Returns:
+            tuple: (张量, 本次传输的主机张量)，复用已传输的张量时为 (张量, None)
+        """
+        key = (str(device), dtype, bool(dequantize))
+        if self._tensor_cache is not None and self._tensor_cache[0] == key:
+            return self._tensor_cache[1], None
+        self._tensor_cache = None
+        if dequantize:
+            host = torch.from_numpy(self.values())
+        else:
+            host = torch.from_numpy(self.codes)
+        if getattr(device, 'type', str(device)) == 'cuda':
+            tensor = host.pin_memory().to(device, non_blocking=True).to(dtype)
+        else:
+            tensor = host.to(device=device, dtype=dtype)
+        self._tensor_cache = (key, tensor)
+        return tensor, host